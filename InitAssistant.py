@@ -6,8 +6,9 @@ This class provides a centralized, thread-safe way to manage conversation histor
 and generate context for transfers without the mess of passing instances around.
 
 Key Features:
-- Thread-safe conversation storage per call_sid
-- Simple setter/getter interface
+- Thread-safe conversation storage per call_sid (one lock per call)
+- Simple setter/getter interface with cheap tail views for hot paths
+- HTML/JSON transcript renderings maintained incrementally as messages arrive
 - Clean context generation using OpenAI
 - No complex instance passing between classes
 """
@@ -21,6 +22,106 @@ from logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Static pieces of the HTML transcript used for transfer context
+_HTML_HEADER = (
+    "<div style='background:#f9f9f9; border:1px solid #ddd; border-radius:8px; padding:15px;'>"
+    "<div style='font-weight:bold; color:#333; margin-bottom:10px;'>Conversation Transcript:</div>"
+)
+_HTML_FOOTER = "</div>"
+
+
+def _render_html_row(msg: Dict) -> str:
+    """Render a single transcript message as an HTML row"""
+    speaker_color = "#2563eb" if msg['speaker'] == 'Agent' else "#059669"
+    return (
+        f"<div style='margin:8px 0; padding:8px; background:white; border-radius:4px;'>"
+        f"<span style='font-weight:bold; color:{speaker_color};'>{msg['speaker']}:</span> "
+        f"<span style='color:#374151;'>{msg['transcription']}</span>"
+        f"<div style='font-size:11px; color:#6b7280; margin-top:4px;'>{msg['timestamp']}</div>"
+        f"</div>"
+    )
+
+
+def _render_json_row(sequence: int, msg: Dict) -> Dict:
+    """Render a single transcript message as a JSON conversation entry"""
+    content = msg['transcription']
+    return {
+        "sequence": sequence,
+        "role": "agent" if msg['speaker'] == 'Agent' else "customer",
+        "content": content,
+        "timestamp": msg['timestamp'],
+        "character_count": len(content)
+    }
+
+
+class CallTranscript:
+    """
+    Append-only transcript for a single call.
+
+    Every append updates the HTML rows, the serialized JSON rows and the
+    running statistics, so rendering the transfer context is a join instead
+    of a rebuild. The last agent message is tracked as it arrives so the
+    STT validation path never has to scan the history.
+    """
+
+    def __init__(self, call_sid: str):
+        self.call_sid = call_sid
+        self.lock = threading.Lock()
+        self.messages: List[Dict] = []
+        self.last_agent_message: Optional[Dict] = None
+        self.participants = set()
+        self.statistics = {
+            "agent_message_count": 0,
+            "customer_message_count": 0,
+            "total_agent_characters": 0,
+            "total_customer_characters": 0,
+            "conversation_turns": 0
+        }
+        self._html_rows: List[str] = []
+        self._json_rows: List[str] = []
+
+    def append(self, message: Dict) -> None:
+        """Append a message and update the incremental renderings (caller holds self.lock)"""
+        self.messages.append(message)
+        self.participants.add(message['speaker'].lower())
+
+        row = _render_json_row(len(self.messages), message)
+        if row["role"] == "agent":
+            self.last_agent_message = message
+            self.statistics["agent_message_count"] += 1
+            self.statistics["total_agent_characters"] += row["character_count"]
+        else:
+            self.statistics["customer_message_count"] += 1
+            self.statistics["total_customer_characters"] += row["character_count"]
+        self.statistics["conversation_turns"] = len(self.messages)
+
+        self._html_rows.append(_render_html_row(message))
+        self._json_rows.append(json.dumps(row))
+
+    def tail(self, count: int) -> List[Dict]:
+        """Return the last `count` messages without copying the whole history"""
+        if count <= 0:
+            return []
+        return self.messages[-count:]
+
+    def render_html(self) -> str:
+        """Join the pre-rendered HTML rows into the transcript document"""
+        return _HTML_HEADER + "".join(self._html_rows) + _HTML_FOOTER
+
+    def render_json(self) -> str:
+        """Join the pre-serialized JSON rows into the transcript document"""
+        call_metadata = {
+            "call_id": self.call_sid,
+            "generated_at": datetime.now().isoformat(),
+            "total_messages": len(self.messages),
+            "participants": list(self.participants)
+        }
+        return (
+            '{"call_metadata": ' + json.dumps(call_metadata)
+            + ', "conversation": [' + ", ".join(self._json_rows) + ']'
+            + ', "statistics": ' + json.dumps(self.statistics) + '}'
+        )
+
 class InitAssistant:
     """
     Centralized conversation history manager for clean context transfer.
@@ -30,8 +131,9 @@ class InitAssistant:
     from helper_functions.py without messy instance passing.
     """
     
-    # Class-level storage for all conversations (thread-safe)
-    _conversations: Dict[str, List[Dict]] = {}
+    # Class-level registry of per-call transcripts. The class lock only guards
+    # the registry itself; appends and reads use the transcript's own lock.
+    _conversations: Dict[str, CallTranscript] = {}
     _lock = threading.Lock()
     
     def __init__(self):
@@ -63,12 +165,22 @@ class InitAssistant:
             'timestamp': timestamp
         }
         
-        with cls._lock:
-            if call_sid not in cls._conversations:
-                cls._conversations[call_sid] = []
-            
-            cls._conversations[call_sid].append(message_data)
-            logger.info(f"📝 Added {speaker} message to call {call_sid}: {transcription[:50]}...")
+        transcript = cls._get_or_create_transcript(call_sid)
+        with transcript.lock:
+            transcript.append(message_data)
+        logger.info(f"📝 Added {speaker} message to call {call_sid}: {transcription[:50]}...")
+
+    @classmethod
+    def _get_or_create_transcript(cls, call_sid: str) -> CallTranscript:
+        """Return the transcript for a call, creating it on first use"""
+        transcript = cls._conversations.get(call_sid)
+        if transcript is None:
+            with cls._lock:
+                transcript = cls._conversations.get(call_sid)
+                if transcript is None:
+                    transcript = CallTranscript(call_sid)
+                    cls._conversations[call_sid] = transcript
+        return transcript
     
     @classmethod
     def get_conversation_history(cls, call_sid: str) -> List[Dict]:
@@ -83,10 +195,51 @@ class InitAssistant:
             List of conversation messages in the format:
             [{'speaker': 'Agent', 'transcription': '...', 'timestamp': '...'}, ...]
         """
-        with cls._lock:
-            history = cls._conversations.get(call_sid, [])
-            logger.info(f"📖 Retrieved {len(history)} messages for call {call_sid}")
-            return history.copy()  # Return a copy to prevent external modification
+        transcript = cls._conversations.get(call_sid)
+        if transcript is None:
+            logger.info(f"📖 Retrieved 0 messages for call {call_sid}")
+            return []
+        with transcript.lock:
+            history = transcript.messages.copy()  # Return a copy to prevent external modification
+        logger.info(f"📖 Retrieved {len(history)} messages for call {call_sid}")
+        return history
+
+    @classmethod
+    def get_recent_transcriptions(cls, call_sid: str, count: int = 6) -> List[str]:
+        """
+        Get the text of the last `count` messages for a call.
+        Used on every user utterance, so it only touches the tail of the history.
+
+        Args:
+            call_sid: Unique call identifier
+            count: Number of trailing messages to return
+
+        Returns:
+            List of transcription strings, oldest first
+        """
+        transcript = cls._conversations.get(call_sid)
+        if transcript is None:
+            return []
+        with transcript.lock:
+            return [msg['transcription'] for msg in transcript.tail(count)]
+
+    @classmethod
+    def get_last_agent_message(cls, call_sid: str) -> str:
+        """
+        Get the most recent Agent transcription for a call.
+
+        Args:
+            call_sid: Unique call identifier
+
+        Returns:
+            The last agent message text, or an empty string if the agent hasn't spoken yet
+        """
+        transcript = cls._conversations.get(call_sid)
+        if transcript is None:
+            return ""
+        with transcript.lock:
+            last = transcript.last_agent_message
+            return last['transcription'] if last else ""
     
     @classmethod
     def get_context_for_transfer(cls, call_sid: str, client: Any = None) -> Dict[str, str]:
@@ -109,9 +262,17 @@ class InitAssistant:
         """
         logger.info(f"🔄 Generating transfer context for call {call_sid}")
         
-        # Get conversation history
-        history = cls.get_conversation_history(call_sid)
-        
+        transcript = cls._conversations.get(call_sid)
+        if transcript is None:
+            logger.error(f"❌ No conversation history found for call {call_sid}")
+            return {}
+
+        # Snapshot the history and the incrementally maintained renderings together
+        with transcript.lock:
+            history = transcript.messages.copy()
+            context_detail_html = transcript.render_html()
+            context_detail_json = transcript.render_json()
+
         if not history:
             logger.error(f"❌ No conversation history found for call {call_sid}")
             return {}
@@ -119,8 +280,6 @@ class InitAssistant:
         try:
             # Generate title and summary in single OpenAI call (more efficient)
             title_and_summary = cls._generate_title_and_summary(history, client)
-            context_detail_html = cls._generate_detail_html(history)
-            context_detail_json = cls._generate_json_history(call_sid, history)
             
             result = {
                 'ContextCallTitle': title_and_summary.get('title', 'Customer Support'),
@@ -228,73 +387,21 @@ class InitAssistant:
     
     @classmethod
     def _generate_detail_html(cls, history: List[Dict]) -> str:
-        """Generate detailed HTML conversation transcript"""
+        """Generate detailed HTML conversation transcript for an arbitrary history"""
         try:
-            html_parts = [
-                "<div style='background:#f9f9f9; border:1px solid #ddd; border-radius:8px; padding:15px;'>",
-                "<div style='font-weight:bold; color:#333; margin-bottom:10px;'>Conversation Transcript:</div>"
-            ]
-            
-            for msg in history:
-                speaker_color = "#2563eb" if msg['speaker'] == 'Agent' else "#059669"
-                html_parts.append(
-                    f"<div style='margin:8px 0; padding:8px; background:white; border-radius:4px;'>"
-                    f"<span style='font-weight:bold; color:{speaker_color};'>{msg['speaker']}:</span> "
-                    f"<span style='color:#374151;'>{msg['transcription']}</span>"
-                    f"<div style='font-size:11px; color:#6b7280; margin-top:4px;'>{msg['timestamp']}</div>"
-                    f"</div>"
-                )
-            
-            html_parts.append("</div>")
-            return "".join(html_parts)
-            
+            return _HTML_HEADER + "".join(_render_html_row(msg) for msg in history) + _HTML_FOOTER
         except Exception as e:
             logger.error(f"Error generating HTML detail: {e}")
             return "<div>Error generating conversation detail</div>"
     
     @classmethod
     def _generate_json_history(cls, call_sid: str, history: List[Dict]) -> str:
-        """Generate structured JSON conversation history"""
+        """Generate structured JSON conversation history for an arbitrary history"""
         try:
-            json_data = {
-                "call_metadata": {
-                    "call_id": call_sid,
-                    "generated_at": datetime.now().isoformat(),
-                    "total_messages": len(history),
-                    "participants": list(set(msg['speaker'].lower() for msg in history))
-                },
-                "conversation": [],
-                "statistics": {
-                    "agent_message_count": 0,
-                    "customer_message_count": 0,
-                    "total_agent_characters": 0,
-                    "total_customer_characters": 0,
-                    "conversation_turns": len(history)
-                }
-            }
-            
-            for i, msg in enumerate(history, 1):
-                role = "agent" if msg['speaker'] == 'Agent' else "customer"
-                content = msg['transcription']
-                
-                json_data["conversation"].append({
-                    "sequence": i,
-                    "role": role,
-                    "content": content,
-                    "timestamp": msg['timestamp'],
-                    "character_count": len(content)
-                })
-                
-                # Update statistics
-                if role == "agent":
-                    json_data["statistics"]["agent_message_count"] += 1
-                    json_data["statistics"]["total_agent_characters"] += len(content)
-                else:
-                    json_data["statistics"]["customer_message_count"] += 1
-                    json_data["statistics"]["total_customer_characters"] += len(content)
-            
-            return json.dumps(json_data)
-            
+            transcript = CallTranscript(call_sid)
+            for msg in history:
+                transcript.append(msg)
+            return transcript.render_json()
         except Exception as e:
             logger.error(f"Error generating JSON history: {e}")
             return json.dumps({"error": "Failed to generate history", "call_id": call_sid})
@@ -309,10 +416,9 @@ class InitAssistant:
             call_sid: Unique call identifier
         """
         with cls._lock:
-            if call_sid in cls._conversations:
-                message_count = len(cls._conversations[call_sid])
-                del cls._conversations[call_sid]
-                logger.info(f"🧹 Cleared {message_count} messages for call {call_sid}")
+            transcript = cls._conversations.pop(call_sid, None)
+        if transcript is not None:
+            logger.info(f"🧹 Cleared {len(transcript.messages)} messages for call {call_sid}")
     
     @classmethod
     def get_active_calls(cls) -> List[str]:
@@ -324,11 +430,10 @@ class InitAssistant:
     def get_stats(cls) -> Dict[str, Any]:
         """Get statistics about stored conversations"""
         with cls._lock:
-            total_calls = len(cls._conversations)
-            total_messages = sum(len(history) for history in cls._conversations.values())
-            
-            return {
-                "active_calls": total_calls,
-                "total_messages": total_messages,
-                "call_ids": list(cls._conversations.keys())
-            }
+            transcripts = list(cls._conversations.values())
+        
+        return {
+            "active_calls": len(transcripts),
+            "total_messages": sum(len(t.messages) for t in transcripts),
+            "call_ids": [t.call_sid for t in transcripts]
+        }
@@ -0,0 +1,35 @@
+"""
+Fleet Metrics API Routes
+
+Live metrics of the voice workers, read from the snapshots they write (see
+fleet_metrics): active calls, event-loop lag, backend latency histograms
+per endpoint, cache hit ratios, LLM tokens and cost per minute.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from fleet_metrics import read_fleet_metrics, render_prometheus
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_prometheus_metrics() -> PlainTextResponse:
+    """Fleet metrics in the Prometheus text exposition format."""
+    fleet = await run_in_threadpool(read_fleet_metrics)
+    return PlainTextResponse(render_prometheus(fleet), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/json")
+async def get_json_metrics() -> Dict[str, Any]:
+    """Fleet metrics as JSON, with latency percentile estimates."""
+    return await run_in_threadpool(read_fleet_metrics)
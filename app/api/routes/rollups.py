@@ -0,0 +1,66 @@
+"""
+Cost Rollup API Routes
+
+Read-only API endpoints serving the per-affiliate, per-model, per-day cost
+and latency rollups flushed by the voice agent workers (see cost_rollups).
+Raw call documents are never read.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from cost_rollups import ALL_MODELS, query_rollups
+
+
+router = APIRouter(prefix="/api/rollups", tags=["rollups"])
+
+DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_collection = None
+
+
+def get_rollup_collection():
+    """The cost_rollups collection, connected on first use."""
+    global _collection
+    if _collection is None:
+        import pymongo
+
+        client = pymongo.MongoClient(os.getenv("MONGODB_URI"),
+                                     serverSelectionTimeoutMS=int(os.getenv("MONGODB_TIMEOUT_MS", "5000")))
+        _collection = client.costlogger.cost_rollups
+    return _collection
+
+
+def _check_day(name: str, value: Optional[str]) -> None:
+    if value is not None and not DAY_PATTERN.match(value):
+        raise HTTPException(status_code=422, detail=f"{name} must be YYYY-MM-DD")
+
+
+@router.get("")
+async def get_rollups(
+    affiliate_id: Optional[str] = Query(None, description="Only this affiliate"),
+    model: Optional[str] = Query(None, description=f"Only this model; '{ALL_MODELS}' for per-call totals"),
+    start: Optional[str] = Query(None, description="First day (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last day (YYYY-MM-DD)"),
+    limit: int = Query(1000, ge=1, le=10000),
+) -> Dict[str, Any]:
+    """
+    Get cost and latency rollups.
+
+    Each record holds the totals of one day, affiliate and model, with latency
+    percentiles estimated from its histograms.
+    """
+    _check_day("start", start)
+    _check_day("end", end)
+    try:
+        records: List[Dict[str, Any]] = await run_in_threadpool(
+            query_rollups, get_rollup_collection(), affiliate_id, model, start, end, limit)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Rollup store unavailable: {e}")
+    return {"count": len(records), "rollups": records}
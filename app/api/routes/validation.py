@@ -6,6 +6,7 @@ Read-only API endpoints for NEMT validation using the unified schema.
 
 from __future__ import annotations
 
+from datetime import datetime, timezone
 from typing import Any, Dict
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
@@ -16,6 +17,15 @@ from app.schemas.nemt_trip import try_validate, format_validation_error, VALID_P
 
 router = APIRouter(prefix="/api/validate", tags=["validation"])
 
+# Validations served by this process
+_validation_counts = {"total": 0, "succeeded": 0, "errors": 0}
+
+
+def _count_validation(ok: bool) -> None:
+    _validation_counts["total"] += 1
+    if ok:
+        _validation_counts["succeeded"] += 1
+
 
 class ValidationRequest(BaseModel):
     """Request model for validation endpoints"""
@@ -38,6 +48,7 @@ async def validate_nemt_endpoint(request: ValidationRequest) -> ValidationRespon
     """
     try:
         ok, model, error = try_validate(request.payload)
+        _count_validation(ok)
         
         return ValidationResponse(
             success=ok,
@@ -50,6 +61,7 @@ async def validate_nemt_endpoint(request: ValidationRequest) -> ValidationRespon
         )
         
     except Exception as e:
+        _validation_counts["errors"] += 1
         error_response = {
             "error": "ValidationError",
             "details": [{
@@ -78,6 +90,7 @@ async def validate_test_endpoint(request: ValidationRequest) -> ValidationRespon
     """
     try:
         ok, model, error = try_validate(request.payload)
+        _count_validation(ok)
         
         return ValidationResponse(
             success=ok,
@@ -90,6 +103,7 @@ async def validate_test_endpoint(request: ValidationRequest) -> ValidationRespon
         )
         
     except Exception as e:
+        _validation_counts["errors"] += 1
         error_response = {
             "error": "ValidationError",
             "details": [{
@@ -123,12 +137,15 @@ async def get_validation_config() -> Dict[str, Any]:
 @router.get("/metrics")
 async def get_validation_metrics_endpoint() -> Dict[str, Any]:
     """Get validation metrics and statistics."""
+    total = _validation_counts["total"]
     return {
         "status": "active",
         "validation_mode": "nemt",
-        "total_validations": 0,  # Would be tracked in real implementation
-        "success_rate": 100.0,   # Would be calculated in real implementation
-        "timestamp": "2024-01-01T00:00:00Z"
+        "total_validations": total,
+        "successful_validations": _validation_counts["succeeded"],
+        "validation_errors": _validation_counts["errors"],
+        "success_rate": round(100.0 * _validation_counts["succeeded"] / total, 2) if total else None,
+        "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 
@@ -12,6 +12,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.api.routes.validation import router as validation_router
+from app.api.routes.rollups import router as rollups_router
+from app.api.routes.metrics import router as metrics_router
 
 
 # Create FastAPI app
@@ -34,6 +36,8 @@ app.add_middleware(
 
 # Include validation router
 app.include_router(validation_router)
+app.include_router(rollups_router)
+app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -79,6 +83,9 @@ async def get_app_config():
         },
         "available_endpoints": {
             "validation": "/api/validate",
+            "rollups": "/api/rollups",
+            "metrics": "/metrics",
+            "metrics_json": "/metrics/json",
             "docs": "/docs",
             "health": "/health",
             "config": "/config"
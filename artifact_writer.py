@@ -0,0 +1,317 @@
+"""
+Background artifact writer.
+
+Per-call artifacts (final prompts, booking payloads, transfer payloads, latency
+traces) are handed to a worker-wide writer thread through a bounded queue, so a
+slow disk never adds latency to a live call. Writes are batched with one fsync pass per
+batch, and artifacts from previous days are rolled into daily tar.gz archives.
+"""
+
+import atexit
+import fcntl
+import os
+import queue
+import tarfile
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from logging_config import get_logger
+
+logger = get_logger('artifact_writer')
+
+# Artifact kinds; each is a directory under the base directory
+PROMPT_ARTIFACT = "prompt"
+TRIP_PAYLOAD_ARTIFACT = "trip_book_payload"
+TRANSFER_PAYLOAD_ARTIFACT = "context_transfer_payload"
+TRACE_ARTIFACT = "call_trace"
+ARTIFACT_KINDS = (PROMPT_ARTIFACT, TRIP_PAYLOAD_ARTIFACT, TRANSFER_PAYLOAD_ARTIFACT, TRACE_ARTIFACT)
+
+# Shared prompt templates referenced by per-call prompt artifacts; never archived
+PROMPT_TEMPLATE_ARTIFACT = "prompt_templates"
+
+ARTIFACT_BASE_DIR = os.getenv("ARTIFACT_BASE_DIR", "logs")
+ARTIFACT_QUEUE_SIZE = int(os.getenv("ARTIFACT_QUEUE_SIZE", "1000"))
+ARTIFACT_BATCH_SIZE = int(os.getenv("ARTIFACT_BATCH_SIZE", "64"))
+ARTIFACT_ARCHIVE_ENABLED = os.getenv("ARTIFACT_ARCHIVE_ENABLED", "true").lower() == "true"
+
+
+class ArtifactWriter:
+    """Worker-wide asynchronous writer for per-call artifacts."""
+
+    def __init__(self,
+                 base_dir: str = ARTIFACT_BASE_DIR,
+                 max_queue: int = ARTIFACT_QUEUE_SIZE,
+                 batch_size: int = ARTIFACT_BATCH_SIZE,
+                 flush_interval: float = 0.5,
+                 archive: bool = ARTIFACT_ARCHIVE_ENABLED,
+                 kinds: Iterable[str] = ARTIFACT_KINDS):
+        self.base_dir = base_dir
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.archive_enabled = archive
+        # Kinds rolled into daily archives
+        self.kinds = set(kinds)
+
+        self._queue: "queue.Queue[Optional[Tuple[str, str, str]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._known_dirs = set()
+        self._last_archive_date: Optional[date] = None
+
+        # Statistics
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.archived = 0
+
+    def start(self) -> None:
+        """Start the writer thread if it isn't running yet."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, kind: str, filename: str, content: str) -> bool:
+        """
+        Queue an artifact for writing without blocking.
+
+        Args:
+            kind: Artifact kind (directory under the base directory)
+            filename: File name within the kind directory
+            content: Text content to write
+
+        Returns:
+            bool: False if the queue was full and the artifact was dropped
+        """
+        self.start()
+        with self._pending_cond:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((kind, filename, content))
+        except queue.Full:
+            with self._pending_cond:
+                self._pending -= 1
+                self._pending_cond.notify_all()
+            self.dropped += 1
+            logger.warning(f"⚠️ Artifact queue full, dropped {kind}/{filename}")
+            return False
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued artifact has been written. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._pending_cond:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        """Writer thread: drain the queue in batches."""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._maybe_archive()
+                continue
+
+            batch: List[Tuple[str, str, str]] = []
+            stop = item is None
+            if item is not None:
+                batch.append(item)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"❌ Artifact batch write failed: {e}")
+                finally:
+                    with self._pending_cond:
+                        self._pending -= len(batch)
+                        self._pending_cond.notify_all()
+
+            if stop:
+                return
+            self._maybe_archive()
+
+    def _write_batch(self, batch: List[Tuple[str, str, str]]) -> None:
+        """Write a batch of artifacts, then fsync them in one pass."""
+        # Later writes to the same file supersede earlier ones in the batch
+        latest: Dict[str, str] = {}
+        for kind, filename, content in batch:
+            latest[os.path.join(self.base_dir, kind, filename)] = content
+
+        written = []
+        for path, content in latest.items():
+            directory = os.path.dirname(path)
+            if directory not in self._known_dirs:
+                os.makedirs(directory, exist_ok=True)
+                self._known_dirs.add(directory)
+            try:
+                f = open(path, "w", encoding="utf-8")
+                f.write(content)
+                f.flush()
+                written.append(f)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Could not write artifact {path}: {e}")
+
+        for f in written:
+            try:
+                os.fsync(f.fileno())
+            except OSError:
+                pass
+            finally:
+                f.close()
+
+        self.written += len(written)
+        self.batches += 1
+
+    def _maybe_archive(self) -> None:
+        """Archive previous days' artifacts once per day."""
+        if not self.archive_enabled:
+            return
+        today = date.today()
+        if self._last_archive_date == today:
+            return
+        self._last_archive_date = today
+        try:
+            self.archive_old_artifacts(today)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Artifact archiving failed: {e}")
+
+    def archive_old_artifacts(self, today: Optional[date] = None) -> int:
+        """
+        Move artifacts last modified before `today` into daily archives.
+
+        Files are grouped by modification date into
+        <base_dir>/archive/<kind>/<YYYY-MM-DD>.tar.gz and removed afterwards.
+
+        Returns:
+            int: Number of files archived
+        """
+        today = today or date.today()
+        os.makedirs(self.base_dir, exist_ok=True)
+        # Every worker process archives the same directories; one at a time
+        lock_path = os.path.join(self.base_dir, ".archive.lock")
+        with open(lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                archived = self._archive_locked(today)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self.archived += archived
+        return archived
+
+    def _archive_locked(self, today: date) -> int:
+        """Archive previous days' artifacts; caller holds the archive lock."""
+        archived = 0
+        for kind in sorted(self.kinds):
+            kind_dir = os.path.join(self.base_dir, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+
+            by_day: Dict[date, List[str]] = {}
+            for entry in os.scandir(kind_dir):
+                try:
+                    if not entry.is_file():
+                        continue
+                    day = datetime.fromtimestamp(entry.stat().st_mtime).date()
+                except FileNotFoundError:
+                    continue
+                if day < today:
+                    by_day.setdefault(day, []).append(entry.path)
+
+            if not by_day:
+                continue
+
+            archive_dir = os.path.join(self.base_dir, "archive", kind)
+            os.makedirs(archive_dir, exist_ok=True)
+            for day, paths in sorted(by_day.items()):
+                archive_path = self._archive_path(archive_dir, day)
+                with tarfile.open(archive_path, "w:gz") as tar:
+                    for path in sorted(paths):
+                        tar.add(path, arcname=os.path.basename(path))
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                archived += len(paths)
+                logger.info(f"🗜️ Archived {len(paths)} {kind} artifacts to {archive_path}")
+        return archived
+
+    @staticmethod
+    def _archive_path(archive_dir: str, day: date) -> str:
+        """Pick an unused archive file name for the day."""
+        path = os.path.join(archive_dir, f"{day.isoformat()}.tar.gz")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(archive_dir, f"{day.isoformat()}.{n}.tar.gz")
+            n += 1
+        return path
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get writer statistics."""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "archived": self.archived,
+        }
+
+
+# Worker-wide writer instance
+_artifact_writer = None
+_artifact_writer_lock = threading.Lock()
+
+
+def get_artifact_writer() -> ArtifactWriter:
+    """Get the worker-wide artifact writer."""
+    global _artifact_writer
+    if _artifact_writer is None:
+        with _artifact_writer_lock:
+            if _artifact_writer is None:
+                _artifact_writer = ArtifactWriter()
+                atexit.register(_artifact_writer.close)
+    return _artifact_writer
+
+
+def write_artifact(kind: str, filename: str, content: str) -> bool:
+    """Queue an artifact on the worker-wide writer."""
+    return get_artifact_writer().write(kind, filename, content)
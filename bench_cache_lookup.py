@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for cache_manager phone lookups.
+
+Fills the in-memory caches with N entries (nothing is written to disk) and
+times lookups that need phone normalization, e.g. "+1 (301) 555-0123" against
+a key stored as "3015550123". The indexed lookup should stay flat as N grows;
+the legacy linear scan is timed alongside for comparison.
+
+Usage:
+    python bench_cache_lookup.py [--sizes 1000 10000 100000] [--lookups 2000]
+"""
+
+import argparse
+import logging
+import random
+import time
+
+import cache_manager
+
+
+def legacy_affiliate_scan(phone_number, ttl=cache_manager.DEFAULT_CACHE_TTL):
+    """The pre-index fallback: strip and compare every key"""
+    for key in cache_manager.affiliate_cache.keys():
+        if key.startswith('ids:'):
+            continue
+        key_digits = ''.join(filter(str.isdigit, key))
+        phone_digits = ''.join(filter(str.isdigit, phone_number))
+        if key_digits and phone_digits and (key_digits[-10:] == phone_digits[-10:] or key_digits == phone_digits):
+            entry = cache_manager.affiliate_cache.peek(key)
+            if time.time() - entry.stored_at < ttl:
+                return entry.value
+    return None
+
+
+def populate(size):
+    """Fill the affiliate and client caches with `size` entries each"""
+    now = time.time()
+    cache_manager.affiliate_cache.clear()
+    cache_manager.client_info_cache.clear()
+    for i in range(size):
+        phone = f"{3010000000 + i}"
+        cache_manager.affiliate_cache.set(phone, {"AffiliateID": i % 50}, now)
+        cache_manager.client_info_cache.set(f"{phone}:{i % 50}:1", {"client_id": i}, now)
+    cache_manager.rebuild_indexes()
+
+
+def formatted(phone):
+    """Format a 10-digit phone the way callers often present it"""
+    return f"+1 ({phone[:3]}) {phone[3:6]}-{phone[6:]}"
+
+
+def time_per_lookup(fn, queries):
+    """Average microseconds per call of fn over queries"""
+    start = time.perf_counter()
+    for query in queries:
+        fn(*query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache_manager lookups")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--legacy-lookups", type=int, default=20, help="Lookups for the (slow) legacy scan")
+    args = parser.parse_args()
+
+    # Per-lookup HIT/MISS log lines would dominate the measurement
+    cache_manager.logger.setLevel(logging.WARNING)
+    # Lift the size limits so every populated entry stays resident
+    for cache in (cache_manager.affiliate_cache, cache_manager.client_info_cache):
+        cache.max_entries = cache.max_bytes = None
+
+    rng = random.Random(42)
+    print(f"{'entries':>10} {'affiliate us':>14} {'client us':>12} {'legacy scan us':>16}")
+    for size in args.sizes:
+        populate(size)
+        phones = [f"{3010000000 + rng.randrange(size)}" for _ in range(args.lookups)]
+
+        affiliate_us = time_per_lookup(cache_manager.get_affiliate_from_cache,
+                                       [(formatted(p),) for p in phones])
+        client_us = time_per_lookup(cache_manager.get_client_from_cache,
+                                    [(formatted(p), (int(p) - 3010000000) % 50, 1) for p in phones])
+        legacy_us = time_per_lookup(legacy_affiliate_scan,
+                                    [(formatted(p),) for p in phones[:args.legacy_lookups]])
+
+        print(f"{size:>10} {affiliate_us:>14.2f} {client_us:>12.2f} {legacy_us:>16.1f}")
+
+    cache_manager.affiliate_cache.clear()
+    cache_manager.client_info_cache.clear()
+    cache_manager.rebuild_indexes()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark for event-loop lag caused by logging.
+
+Runs N simulated calls concurrently on one event loop. Each call logs the way
+the tools do (INFO progress lines plus DEBUG dumps of large payloads and API
+responses, into its per-call file) between short awaits, while a probe task
+measures how late the loop wakes it up. Every combination of inline/queued
+handlers and DEBUG on/off is run against a temporary logs directory.
+
+Usage:
+    python bench_logging_lag.py [--calls 50] [--turns 40] [--payload-items 200] [--rate-limit 0]
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from call_context import start_call_context
+from logging_config import IVRLogger
+
+PROBE_INTERVAL = 0.005
+
+
+def make_payload(items):
+    """A booking-payload-sized structure"""
+    return {
+        "addressInfo": {"Trips": [{"PickupAddress": f"{i} Main St, Rockville, MD", "PickupLat": 39.08 + i / 1e4,
+                                   "PickupLng": -77.15, "Notes": "x" * 40} for i in range(items)]},
+        "riderInfo": {"FirstName": "Jane", "LastName": "Doe", "Phone": "3015550123"},
+    }
+
+
+async def simulated_call(index, logger, turns, payload):
+    """One call: a tool turn per iteration, logging around a simulated API await"""
+    start_call_context(f"bench-{index}").call_sid = f"bench-{index}"
+    for turn in range(turns):
+        logger.info(f"📞 Call {index} turn {turn}: calling API")
+        logger.debug("Payload sent: %s", payload)
+        await asyncio.sleep(0.002)
+        logger.debug("Response: %s", payload["addressInfo"])
+        logger.info(f"✅ Call {index} turn {turn}: done")
+
+
+async def probe(stop, lags):
+    """Record how late the loop wakes a task sleeping PROBE_INTERVAL"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def run_calls(logger, calls, turns, payload):
+    """Run the calls with the probe; returns loop lags (ms) and wall time (s)"""
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(simulated_call(i, logger, turns, payload)) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    return lags, elapsed
+
+
+def run_config(async_logging, level, args, payload):
+    """Benchmark one logging configuration in a fresh logs directory"""
+    with tempfile.TemporaryDirectory() as logs_dir:
+        instance = IVRLogger(logs_dir=logs_dir, async_logging=async_logging, level=level)
+        instance.rate_limit_filter.rate = args.rate_limit
+        # Keep the console quiet; file and per-call handlers do the work
+        instance.handlers[2].setLevel("CRITICAL")
+        logger = instance.get_logger('bench')
+        try:
+            lags, elapsed = asyncio.run(run_calls(logger, args.calls, args.turns, payload))
+            drain_start = time.perf_counter()
+            instance.flush(timeout=120)
+            drain = time.perf_counter() - drain_start
+        finally:
+            instance.close()
+    lags.sort()
+    return {
+        "mean": statistics.mean(lags),
+        "p99": lags[int(len(lags) * 0.99) - 1],
+        "max": lags[-1],
+        "elapsed": elapsed,
+        "drain": drain,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure event-loop lag caused by logging")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--payload-items", type=int, default=200)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Records/s per logger below WARNING (0 = off)")
+    args = parser.parse_args()
+
+    payload = make_payload(args.payload_items)
+    print(f"{args.calls} concurrent calls x {args.turns} turns, payload of {args.payload_items} trips\n")
+    print(f"{'handlers':>8} {'level':>6} | {'lag mean':>9} {'lag p99':>9} {'lag max':>9} | {'run':>7} {'drain':>7}")
+    for async_logging in (False, True):
+        for level in ("DEBUG", "INFO"):
+            result = run_config(async_logging, level, args, payload)
+            print(f"{'queued' if async_logging else 'inline':>8} {level:>6} | "
+                  f"{result['mean']:>7.2f}ms {result['p99']:>7.2f}ms {result['max']:>7.2f}ms | "
+                  f"{result['elapsed']:>6.2f}s {result['drain']:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
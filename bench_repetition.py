@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the supervisor's repetition detector.
+
+Feeds N synthetic bot turns (drawn from paraphrase families, so loops do
+occur) through a RepetitionDetector and times vectorising a turn, updating
+the similarity window and checking for a loop, per turn, for each window
+size given. Each turn costs one matrix-vector product over the window, so
+the per-turn cost should stay in the tens of microseconds; larger windows
+mostly add to the loop check, which looks for mutually similar turns.
+
+Usage:
+    python bench_repetition.py [--turns 5000] [--windows 4 8 32] [--dims 4096]
+"""
+
+import argparse
+import random
+import time
+
+from repetition_detector import RepetitionDetector
+
+FAMILIES = [
+    ["Where would you like to be picked up?", "Where should we pick you up?",
+     "What is the pickup address for your ride?"],
+    ["I can only help with transportation. Do you need a ride?",
+     "I'm only able to help with transportation services. Would you like to book a ride?"],
+    ["Sorry, I couldn't find that address. Could you repeat it?",
+     "I could not find that address. Can you say the address again?"],
+    ["What time is your appointment?", "When is your appointment scheduled?"],
+    ["Your ride is booked for 10 AM tomorrow.", "Your trip to Mercy Hospital is confirmed for 9:30 AM."],
+    ["Is there anything else I can help you with today?", "Can I help you with anything else?"],
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the repetition detector")
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[4, 8, 32])
+    parser.add_argument("--dims", type=int, default=4096)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    turns = [rng.choice(rng.choice(FAMILIES)) for _ in range(args.turns)]
+
+    detector = RepetitionDetector(dims=args.dims)
+    started = time.perf_counter()
+    for text in turns:
+        detector.vectorize(text)
+    vectorize_us = (time.perf_counter() - started) / len(turns) * 1e6
+    print(f"vectorize: {vectorize_us:.1f} us/turn")
+
+    for window in args.windows:
+        detector = RepetitionDetector(window=window, dims=args.dims)
+        loops = 0
+        started = time.perf_counter()
+        for text in turns:
+            detector.add(text)
+            loops += detector.is_repetitive()
+        per_turn_us = (time.perf_counter() - started) / len(turns) * 1e6
+        print(f"window {window:>3}: {per_turn_us:6.1f} us/turn (add + loop check), loops flagged on {loops} turns")
+
+
+if __name__ == "__main__":
+    main()
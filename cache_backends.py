@@ -0,0 +1,248 @@
+"""
+Pluggable persistent backends for cache_manager.
+
+Every LiveKit job process on a host imports cache_manager and keeps its own
+in-memory caches. The persistent backend is what they share: entries one
+worker stores become visible to the others through read-through on a local
+miss, and every worker starts warm from it.
+
+Backends (selected with CACHE_BACKEND):
+    sqlite  WAL-mode SQLite file on the host (default, see cache_store)
+    redis   Any server speaking the Redis protocol (CACHE_REDIS_URL), for
+            sharing one cache across hosts
+
+The Redis backend uses a minimal RESP client over a plain socket, so no
+client library is required. Its entries are stored as JSON rather than
+pickled: anyone able to write to a shared Redis could otherwise run code in
+every worker that loads them.
+"""
+
+import json
+import os
+import socket
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from logging_config import get_logger
+from cache_store import CacheBackend, Delete, SQLiteCacheStore, _delete_bound
+
+logger = get_logger('cache_backends')
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_PREFIX = os.getenv("CACHE_REDIS_PREFIX", "ivr_cache:")
+# Server-side expiry of Redis entries; bounds growth even if no worker purges them
+CACHE_REDIS_KEY_TTL = int(os.getenv("CACHE_REDIS_KEY_TTL", str(24 * 3600)))
+
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespConnection:
+    """Minimal thread-safe RESP2 client with pipelining."""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._send_and_read(setup)
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    @staticmethod
+    def _encode(args: Tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _send_and_read(self, commands: List[Tuple]) -> List[Any]:
+        self._sock.sendall(b"".join(self._encode(command) for command in commands))
+        replies = [self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def pipeline(self, commands: List[Tuple]) -> List[Any]:
+        """Send commands in one round trip and return their replies, reconnecting once on failure."""
+        if not commands:
+            return []
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send_and_read(commands)
+                except (OSError, ConnectionError) as e:
+                    self._disconnect()
+                    if attempt:
+                        raise
+                    logger.warning(f"Redis connection lost ({e}), reconnecting")
+
+    def execute(self, *args) -> Any:
+        """Send one command and return its reply."""
+        return self.pipeline([args])[0]
+
+
+class RedisCacheStore(CacheBackend):
+    """Cache entries as JSON [value, timestamp] strings under <prefix><namespace>:<key>.
+
+    Values round-trip as JSON types, so tuples come back as lists.
+    """
+
+    remote = True
+
+    def __init__(self, url: str = CACHE_REDIS_URL, prefix: str = CACHE_REDIS_PREFIX,
+                 key_ttl: Optional[int] = CACHE_REDIS_KEY_TTL):
+        self.prefix = prefix
+        self.key_ttl = key_ttl
+        self.conn = RespConnection(url)
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    def _scan(self, pattern: str) -> List[bytes]:
+        keys, cursor = [], b"0"
+        while True:
+            cursor, batch = self.conn.execute("SCAN", cursor, "MATCH", pattern, "COUNT", 500)
+            keys.extend(batch)
+            if cursor in (b"0", 0, "0"):
+                return keys
+
+    @staticmethod
+    def _decode(raw: Optional[bytes]) -> Optional[Tuple[Any, float]]:
+        if raw is None:
+            return None
+        try:
+            value, stored_at = json.loads(raw)
+            return value, float(stored_at)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable Redis cache entry: {e}")
+            return None
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        return self._decode(self.conn.execute("GET", self._key(namespace, key)))
+
+    def load(self, namespace: str) -> Dict[str, Tuple[Any, float]]:
+        prefix = f"{self.prefix}{namespace}:"
+        keys = self._scan(prefix + "*")
+        entries = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            for redis_key, raw in zip(batch, self.conn.execute("MGET", *batch)):
+                entry = self._decode(raw)
+                if entry is not None:
+                    entries[redis_key.decode()[len(prefix):]] = entry
+        return entries
+
+    def count(self) -> int:
+        return len(self._scan(self.prefix + "*"))
+
+    def write_batch(self, upserts: Iterable[Tuple[str, str, Any, float]], deletes: Iterable[Delete]) -> None:
+        upserts = list(upserts)
+        deletes = [_delete_bound(delete) for delete in deletes]
+        keys = [self._key(ns, key) for ns, key, _, _ in upserts] + [self._key(ns, key) for ns, key, _ in deletes]
+        if not keys:
+            return
+
+        # Newer wins: compare against the current versions before writing.
+        # Not atomic across workers, but a lost race only keeps a slightly older entry.
+        current = [self._decode(raw) for raw in self.conn.execute("MGET", *keys)]
+        commands = []
+        for (ns, key, value, stored_at), existing in zip(upserts, current):
+            if existing is not None and existing[1] > stored_at:
+                continue
+            try:
+                payload = json.dumps([value, stored_at], separators=(",", ":"))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Not caching {ns}:{key} in Redis, value is not JSON-serializable: {e}")
+                continue
+            command = ("SET", self._key(ns, key), payload)
+            commands.append(command + ("EX", self.key_ttl) if self.key_ttl else command)
+        for (ns, key, bound), existing in zip(deletes, current[len(upserts):]):
+            if existing is not None and existing[1] <= bound:
+                commands.append(("DEL", self._key(ns, key)))
+        self.conn.pipeline(commands)
+
+    def clear(self) -> None:
+        keys = self._scan(self.prefix + "*")
+        for start in range(0, len(keys), 500):
+            self.conn.execute("DEL", *keys[start:start + 500])
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def create_cache_store(backend: str = CACHE_BACKEND, db_file: Optional[str] = None,
+                       redis_url: str = CACHE_REDIS_URL) -> CacheBackend:
+    """
+    Create the configured persistent cache backend.
+    Args:
+        backend (str): 'sqlite' or 'redis'
+        db_file (str): SQLite file for the sqlite backend
+        redis_url (str): Server URL for the redis backend
+    """
+    if backend == "redis":
+        store = RedisCacheStore(redis_url)
+        logger.info(f"🗄️ Using Redis cache backend at {store.conn.host}:{store.conn.port}")
+        return store
+    if backend != "sqlite":
+        logger.warning(f"Unknown CACHE_BACKEND '{backend}', using sqlite")
+    return SQLiteCacheStore(db_file)
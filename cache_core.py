@@ -0,0 +1,242 @@
+"""
+Bounded LRU + TTL cache core.
+
+Each cache namespace is a TTLCache: an LRU-ordered map with a time-to-live,
+optional caps on entry count and approximate byte size, lazy expiry on
+access and per-namespace statistics. Removals (expiry, eviction, delete) are
+reported through an optional on_remove(key, entry, reason) callback so owners
+can keep side indexes and persistent copies in step.
+"""
+
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from logging_config import get_logger
+
+logger = get_logger('cache_core')
+
+DEFAULT_TTL = 3600
+
+# Removal reasons passed to on_remove callbacks
+REMOVED_EXPIRED = "expired"
+REMOVED_EVICTED = "evicted"
+REMOVED_DELETED = "deleted"
+
+
+def approximate_size(value: Any) -> int:
+    """Approximate the memory footprint of a value by its pickled size."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+@dataclass
+class CacheEntry:
+    """A cached value with its store time and approximate size."""
+    value: Any
+    stored_at: float
+    size: int = 0
+
+
+class TTLCache:
+    """Thread-safe LRU cache with TTL expiry and entry/byte limits."""
+
+    def __init__(self,
+                 namespace: str,
+                 ttl: float = DEFAULT_TTL,
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = approximate_size,
+                 on_remove: Optional[Callable[[Hashable, "CacheEntry", str], None]] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_remove = on_remove
+
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Return the value for key if present and fresh, else None.
+
+        Args:
+            key: Cache key
+            ttl: Maximum acceptable age for this lookup (defaults to the cache TTL)
+        """
+        max_age = self.ttl if ttl is None else ttl
+        removed = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            age = time.time() - entry.stored_at
+            if age >= max_age:
+                self.misses += 1
+                if age >= self.ttl:
+                    self._remove(key)
+                    self.expirations += 1
+                    removed.append((key, entry, REMOVED_EXPIRED))
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+
+        self._notify(removed)
+        return None
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """Return the entry for key without touching LRU order, statistics or expiry."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any, stored_at: Optional[float] = None) -> None:
+        """Store a value, evicting least recently used entries beyond the limits."""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            logger.warning(f"Not caching {self.namespace}/{key}: {size} bytes exceeds the {self.max_bytes} byte limit")
+            return
+        entry = CacheEntry(value, time.time() if stored_at is None else stored_at, size)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            self.sets += 1
+            evicted = self._enforce_limits(keep=key)
+
+        self._notify(evicted)
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove a key. Returns True if it was present."""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            entry = self._remove(key)
+        self._notify([(key, entry, REMOVED_DELETED)])
+        return True
+
+    def purge_expired(self) -> List[Hashable]:
+        """Remove every expired entry. Returns the removed keys."""
+        now = time.time()
+        with self._lock:
+            expired = [(key, entry, REMOVED_EXPIRED) for key, entry in self._entries.items()
+                       if now - entry.stored_at >= self.ttl]
+            for key, _, _ in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        self._notify(expired)
+        return [key for key, _, _ in expired]
+
+    def load(self, entries: Dict[Hashable, Tuple[Any, float]]) -> None:
+        """Bulk-load (value, stored_at) pairs, oldest first, within the limits."""
+        for key, (value, stored_at) in sorted(entries.items(), key=lambda item: item[1][1]):
+            self.set(key, value, stored_at)
+
+    def clear(self) -> None:
+        """Remove every entry without reporting removals."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def keys(self) -> List[Hashable]:
+        """Snapshot of the keys, least recently used first."""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def entries(self) -> List[Tuple[Hashable, CacheEntry]]:
+        """Snapshot of (key, entry) pairs, least recently used first."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _remove(self, key: Hashable) -> CacheEntry:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def _enforce_limits(self, keep: Hashable) -> List[Tuple[Hashable, CacheEntry, str]]:
+        """Evict LRU entries until within limits; never evicts `keep`."""
+        evicted = []
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            evicted.append((key, self._remove(key), REMOVED_EVICTED))
+            self.evictions += 1
+        return evicted
+
+    def _notify(self, removed: List[Tuple[Hashable, CacheEntry, str]]) -> None:
+        if self.on_remove is None:
+            return
+        for key, entry, reason in removed:
+            try:
+                self.on_remove(key, entry, reason)
+            except Exception as e:
+                logger.warning(f"Cache {self.namespace} removal callback failed for {key}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics for this namespace."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes if self.max_bytes is not None else None,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+
+# Registry of caches by namespace
+_caches: Dict[str, TTLCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(namespace: str, **kwargs) -> TTLCache:
+    """Get the cache for a namespace, creating it with kwargs on first use."""
+    with _registry_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = TTLCache(namespace, **kwargs)
+            _caches[namespace] = cache
+        return cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Get statistics for every registered namespace."""
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.namespace: cache.get_stats() for cache in caches}
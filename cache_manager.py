@@ -1,149 +1,429 @@
+import asyncio
+import atexit
+import copy
 import time
 import os
 import pickle
+import threading
 from logging_config import get_logger
+from cache_core import get_cache, get_cache_stats, REMOVED_EVICTED
+from cache_store import WriteBehindPersister
+from cache_backends import CACHE_BACKEND, create_cache_store
 
 # Initialize logger
 logger = get_logger('cache_manager')
 
 # Define constants first - important to avoid NameError
 DEFAULT_CACHE_TTL = 3600  # 1 hour cache duration
+# How long past the TTL an affiliate/client entry may still be served while it is refreshed
+CACHE_STALE_GRACE = int(os.getenv("CACHE_STALE_GRACE", str(24 * 3600)))
+# How often a client hit is re-checked against a remote shared store (Redis)
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "5"))
 
 # File paths for persistent cache storage
 CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+CACHE_DB_FILE = os.path.join(CACHE_DIR, 'cache.db')
+# Legacy pickle files, migrated into CACHE_DB_FILE on load
 AFFILIATE_CACHE_FILE = os.path.join(CACHE_DIR, 'affiliate_cache.pkl')
 CLIENT_CACHE_FILE = os.path.join(CACHE_DIR, 'client_cache.pkl')
 
+# Cache namespaces (also the namespaces in the persistent store)
+AFFILIATE_NAMESPACE = 'affiliate'
+CLIENT_NAMESPACE = 'client'
+AFFILIATE_DETAILS_NAMESPACE = 'affiliate_details'
+SERVICE_AREA_NAMESPACE = 'service_area'
+GEOCODE_NAMESPACE = 'geocode'
+PAYMENT_TYPES_NAMESPACE = 'payment_types'
+WARMUP_NAMESPACE = 'warmup'
+
+# Size limits per namespace
+AFFILIATE_CACHE_MAX_ENTRIES = int(os.getenv("AFFILIATE_CACHE_MAX_ENTRIES", "10000"))
+CLIENT_CACHE_MAX_ENTRIES = int(os.getenv("CLIENT_CACHE_MAX_ENTRIES", "50000"))
+CLIENT_CACHE_MAX_BYTES = int(os.getenv("CLIENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+AFFILIATE_DETAILS_MAX_ENTRIES = int(os.getenv("AFFILIATE_DETAILS_MAX_ENTRIES", "1000"))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(24 * 3600)))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "20000"))
+GEOCODE_CACHE_MAX_BYTES = int(os.getenv("GEOCODE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
 # Ensure cache directory exists
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
     logger.info(f"Created cache directory: {CACHE_DIR}")
 
-# Cache dictionaries
-affiliate_cache = {}
-client_info_cache = {}
+# Guards the normalized lookup indexes
+_cache_lock = threading.RLock()
+
+# Normalized lookup indexes, maintained at store time
+# affiliate: last 10 digits -> cache key
+# client: (last 10 digits, affiliate_id, family_id) -> cache key
+affiliate_phone_index = {}
+client_phone_index = {}
+
+# Persistent store shared by all workers, and its write-behind flusher
+_store = None
+_persister = None
+
+# Local misses served from the shared store
+_shared_hits = 0
+
+# (namespace, key) -> monotonic time of the last remote shared-store check of a local hit
+_synced = {}
+_shared_checks = 0
+
+# Stale-while-revalidate state and metrics
+_refreshing = set()
+_refresh_tasks = set()
+_stale_serves = 0
+_refreshes = 0
+_refresh_failures = 0
+
+
+def normalize_phone(phone_number):
+    """Reduce a phone number to its last 10 digits ('' if it has none)"""
+    return ''.join(filter(str.isdigit, str(phone_number)))[-10:]
+
+
+def normalize_address(address):
+    """Case- and whitespace-insensitive key for an address"""
+    return ' '.join(str(address).lower().split())
+
+
+def _affiliate_index_key(key):
+    if key.startswith('ids:'):
+        return None
+    return normalize_phone(key) or None
+
+
+def _client_index_key(key):
+    try:
+        cached_phone, cached_affiliate, cached_family = key.split(':')
+    except ValueError:
+        return None
+    digits = normalize_phone(cached_phone)
+    return (digits, cached_affiliate, cached_family) if digits else None
+
+
+def _index_affiliate_key(key):
+    """Add an affiliate cache key to the phone index"""
+    index_key = _affiliate_index_key(key)
+    if index_key:
+        with _cache_lock:
+            affiliate_phone_index[index_key] = key
+
+
+def _index_client_key(key):
+    """Add a client cache key to the phone index"""
+    index_key = _client_index_key(key)
+    if index_key:
+        with _cache_lock:
+            client_phone_index[index_key] = key
+
+
+def _on_removed(namespace, index, index_key_fn):
+    """Build a removal callback that drops the index entry and the persisted row"""
+    def on_remove(key, entry, reason):
+        index_key = index_key_fn(key) if index is not None else None
+        if index_key:
+            with _cache_lock:
+                if index.get(index_key) == key:
+                    del index[index_key]
+        # Evictions only relieve this worker's memory; the shared row stays for
+        # the others. Expiry and deletes remove only the version this worker
+        # held, never a newer one another worker has stored since.
+        if _persister is None or reason == REMOVED_EVICTED:
+            return
+        _persister.mark_removed(namespace, key, entry.stored_at)
+    return on_remove
+
+
+# Cache namespaces. Affiliate and client entries are kept for the stale grace
+# window past their TTL; lookups still treat them as expired after the TTL.
+affiliate_cache = get_cache(
+    AFFILIATE_NAMESPACE, ttl=DEFAULT_CACHE_TTL + CACHE_STALE_GRACE, max_entries=AFFILIATE_CACHE_MAX_ENTRIES,
+    on_remove=_on_removed(AFFILIATE_NAMESPACE, affiliate_phone_index, _affiliate_index_key))
+client_info_cache = get_cache(
+    CLIENT_NAMESPACE, ttl=DEFAULT_CACHE_TTL + CACHE_STALE_GRACE, max_entries=CLIENT_CACHE_MAX_ENTRIES, max_bytes=CLIENT_CACHE_MAX_BYTES,
+    on_remove=_on_removed(CLIENT_NAMESPACE, client_phone_index, _client_index_key))
+affiliate_details_cache = get_cache(
+    AFFILIATE_DETAILS_NAMESPACE, ttl=DEFAULT_CACHE_TTL, max_entries=AFFILIATE_DETAILS_MAX_ENTRIES,
+    on_remove=_on_removed(AFFILIATE_DETAILS_NAMESPACE, None, None))
+service_area_cache = get_cache(
+    SERVICE_AREA_NAMESPACE, ttl=GEOCODE_CACHE_TTL, max_entries=AFFILIATE_DETAILS_MAX_ENTRIES,
+    on_remove=_on_removed(SERVICE_AREA_NAMESPACE, None, None))
+payment_types_cache = get_cache(
+    PAYMENT_TYPES_NAMESPACE, ttl=DEFAULT_CACHE_TTL, max_entries=AFFILIATE_DETAILS_MAX_ENTRIES,
+    on_remove=_on_removed(PAYMENT_TYPES_NAMESPACE, None, None))
+# Marks when the shared cache was last warmed (see cache_warmup)
+warmup_cache = get_cache(
+    WARMUP_NAMESPACE, ttl=DEFAULT_CACHE_TTL, on_remove=_on_removed(WARMUP_NAMESPACE, None, None))
+geocode_cache = get_cache(
+    GEOCODE_NAMESPACE, ttl=GEOCODE_CACHE_TTL, max_entries=GEOCODE_CACHE_MAX_ENTRIES, max_bytes=GEOCODE_CACHE_MAX_BYTES,
+    on_remove=_on_removed(GEOCODE_NAMESPACE, None, None))
+
+_caches = {
+    AFFILIATE_NAMESPACE: affiliate_cache,
+    CLIENT_NAMESPACE: client_info_cache,
+    AFFILIATE_DETAILS_NAMESPACE: affiliate_details_cache,
+    SERVICE_AREA_NAMESPACE: service_area_cache,
+    GEOCODE_NAMESPACE: geocode_cache,
+    PAYMENT_TYPES_NAMESPACE: payment_types_cache,
+    WARMUP_NAMESPACE: warmup_cache,
+}
+
+
+def rebuild_indexes():
+    """Rebuild the normalized lookup indexes from the caches"""
+    with _cache_lock:
+        affiliate_phone_index.clear()
+        client_phone_index.clear()
+        # Index oldest first so the most recently stored key wins
+        for key, _ in sorted(affiliate_cache.entries(), key=lambda item: item[1].stored_at):
+            _index_affiliate_key(key)
+        for key, _ in sorted(client_info_cache.entries(), key=lambda item: item[1].stored_at):
+            _index_client_key(key)
+
+
+def _resolve_entry(namespace, key):
+    """Current (data, timestamp) of a key, or None once it has been removed"""
+    entry = _caches[namespace].peek(key)
+    return (entry.value, entry.stored_at) if entry is not None else None
+
+
+_indexers = {
+    AFFILIATE_NAMESPACE: _index_affiliate_key,
+    CLIENT_NAMESPACE: _index_client_key,
+}
+
+
+def _read_through(namespace, key, ttl=None):
+    """
+    Serve a local miss from the shared store, where another worker may have
+    stored the entry. Fresh entries are copied into the local cache.
+    """
+    global _shared_hits
+    cache = _caches[namespace]
+    try:
+        entry = _store.get(namespace, key)
+    except Exception as e:
+        logger.warning(f"Shared cache lookup failed for {namespace}/{key}: {e}")
+        return None
+    if entry is None:
+        return None
+
+    data, timestamp = entry
+    max_age = cache.ttl if ttl is None else ttl
+    if time.time() - timestamp >= min(max_age, cache.ttl):
+        return None
+
+    cache.set(key, data, stored_at=timestamp)
+    indexer = _indexers.get(namespace)
+    if indexer is not None:
+        indexer(key)
+    _shared_hits += 1
+    logger.info(f"Shared cache HIT for {namespace}: {key}")
+    return data
+
+
+async def _refresh_entry(namespace, key, refresh, store):
+    """Fetch fresh data for a stale entry and store it"""
+    global _refreshes, _refresh_failures
+    try:
+        data = await refresh()
+        # The fetch functions report failures as strings; never replace good data with them
+        if not isinstance(data, dict):
+            raise ValueError(f"unexpected result {str(data)[:100]!r}")
+        store(data)
+        _refreshes += 1
+        logger.info(f"🔄 Refreshed stale {namespace} cache entry: {key}")
+    except Exception as e:
+        _refresh_failures += 1
+        logger.warning(f"⚠️ Background refresh failed for {namespace} cache entry {key}: {e}")
+    finally:
+        with _cache_lock:
+            _refreshing.discard((namespace, key))
+
+
+def _serve_stale(namespace, key, ttl, refresh, store):
+    """
+    Return an entry expired less than CACHE_STALE_GRACE ago and refresh it in
+    the background. Returns None outside the grace window or without a running
+    event loop to refresh on.
+    """
+    global _stale_serves
+    entry = _caches[namespace].peek(key)
+    if entry is None:
+        return None
+    age = time.time() - entry.stored_at
+    if age >= ttl + CACHE_STALE_GRACE:
+        return None
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+    with _cache_lock:
+        start_refresh = (namespace, key) not in _refreshing
+        if start_refresh:
+            _refreshing.add((namespace, key))
+        _stale_serves += 1
+    if start_refresh:
+        # Keep a reference so the task is not garbage collected mid-flight
+        task = loop.create_task(_refresh_entry(namespace, key, refresh, store))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+    logger.info(f"Cache STALE for {namespace}: {key} (age {age:.0f}s), refreshing in background")
+    return entry.value
+
+
+def _sync_with_shared(namespace, key):
+    """
+    Reconcile a local hit with the shared store, where other workers patch and
+    invalidate entries. Returns the current value, or None if the entry was
+    invalidated elsewhere.
+
+    A local store answers from a kept-open connection in microseconds; a
+    remote store is checked at most every CACHE_SYNC_INTERVAL seconds per key.
+    """
+    global _shared_checks
+    cache = _caches[namespace]
+    local = cache.peek(key)
+    if local is None:
+        return None
+    if _persister.is_pending(namespace, key):
+        # Local change not flushed yet; it is the newest version
+        return local.value
+
+    if _store.remote:
+        now = time.monotonic()
+        if now - _synced.get((namespace, key), -CACHE_SYNC_INTERVAL) < CACHE_SYNC_INTERVAL:
+            return local.value
+        if len(_synced) >= CLIENT_CACHE_MAX_ENTRIES:
+            _synced.clear()
+        _synced[(namespace, key)] = now
+
+    try:
+        shared = _store.get(namespace, key)
+    except Exception as e:
+        logger.warning(f"Shared cache check failed for {namespace}/{key}: {e}")
+        return local.value
+    _shared_checks += 1
+
+    if shared is None:
+        logger.info(f"Cache entry {namespace}/{key} was invalidated by another worker")
+        cache.delete(key)
+        return None
+    data, timestamp = shared
+    if timestamp > local.stored_at:
+        cache.set(key, data, stored_at=timestamp)
+        return data
+    return local.value
+
+
+def init_persistence(db_file=CACHE_DB_FILE, backend=CACHE_BACKEND):
+    """Open the persistent store and start a write-behind flusher for it"""
+    global _store, _persister
+    if _persister is not None:
+        _persister.close()
+    _store = create_cache_store(backend, db_file=db_file)
+    _persister = WriteBehindPersister(_store, _resolve_entry, before_flush=clean_expired_entries)
+    _synced.clear()
+
+
+def _migrate_legacy_pickles():
+    """Move entries from the legacy pickle files into the persistent store"""
+    for namespace, path in ((AFFILIATE_NAMESPACE, AFFILIATE_CACHE_FILE), (CLIENT_NAMESPACE, CLIENT_CACHE_FILE)):
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                legacy = pickle.load(f)
+            existing = _store.load(namespace)
+            upserts = [(namespace, key, data, timestamp)
+                       for key, (data, timestamp) in legacy.items() if key not in existing]
+            _store.write_batch(upserts, [])
+            os.replace(path, path + '.migrated')
+            logger.info(f"Migrated {len(upserts)} {namespace} entries from {path}")
+        except Exception as e:
+            logger.error(f"Error migrating legacy cache file {path}: {e}")
 
 
 # Load caches from disk if they exist
 def load_caches():
-    """Load cached data from disk files"""
-    global affiliate_cache, client_info_cache
+    """Load cached data from the persistent store"""
     try:
-        if os.path.exists(AFFILIATE_CACHE_FILE):
-            with open(AFFILIATE_CACHE_FILE, 'rb') as f:
-                affiliate_cache = pickle.load(f)
-                logger.info(f"Loaded affiliate cache with {len(affiliate_cache)} entries")
-                
-        if os.path.exists(CLIENT_CACHE_FILE):
-            with open(CLIENT_CACHE_FILE, 'rb') as f:
-                client_info_cache = pickle.load(f)
-                logger.info(f"Loaded client cache with {len(client_info_cache)} entries")
+        _migrate_legacy_pickles()
+        persisted = {namespace: _store.load(namespace) for namespace in _caches}
     except Exception as e:
-        logger.error(f"Error loading cache files: {e}")
-        # If there was an error loading, use empty dictionaries
-        affiliate_cache = {}
-        client_info_cache = {}
+        logger.error(f"Error loading cache store: {e}")
+        # If there was an error loading, start empty
+        persisted = {namespace: {} for namespace in _caches}
+
+    for namespace, cache in _caches.items():
+        cache.clear()
+        cache.load(persisted[namespace])
+    rebuild_indexes()
+    logger.info(f"Loaded caches: " + ", ".join(f"{namespace}={len(cache)}" for namespace, cache in _caches.items()))
 
 
 # Clean expired entries
 def clean_expired_entries():
-    """Remove expired entries from both caches"""
-    current_time = time.time()
-    affiliate_removed = 0
-    client_removed = 0
-    
-    # Clean expired affiliate entries
-    keys_to_remove = []
-    for key, (data, timestamp) in affiliate_cache.items():
-        if current_time - timestamp > DEFAULT_CACHE_TTL:
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del affiliate_cache[key]
-        affiliate_removed += 1
-    
-    # Clean expired client entries
-    keys_to_remove = []
-    for key, (data, timestamp) in client_info_cache.items():
-        if current_time - timestamp > DEFAULT_CACHE_TTL:
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del client_info_cache[key]
-        client_removed += 1
-    
-    if affiliate_removed > 0 or client_removed > 0:
-        logger.info(f"Cleaned {affiliate_removed} expired affiliate entries and {client_removed} expired client entries")
+    """Remove expired entries from every cache"""
+    removed = {namespace: len(cache.purge_expired()) for namespace, cache in _caches.items()}
+    if any(removed.values()):
+        logger.info(f"Cleaned expired cache entries: {removed}")
 
 
 # Save caches to disk
 def save_caches():
-    """Save caches to disk and clean expired entries"""
-    clean_expired_entries()
-    
-    try:
-        with open(AFFILIATE_CACHE_FILE, 'wb') as f:
-            pickle.dump(affiliate_cache, f)
-            
-        with open(CLIENT_CACHE_FILE, 'wb') as f:
-            pickle.dump(client_info_cache, f)
-            
-        logger.info(f"Saved caches to disk: {len(affiliate_cache)} affiliate entries, {len(client_info_cache)} client entries")
-    except Exception as e:
-        logger.error(f"Error saving cache files: {e}")
+    """Clean expired entries and flush pending changes to disk now"""
+    written = _persister.flush()
+    logger.info(f"Flushed {written} cache changes: {len(affiliate_cache)} affiliate entries, {len(client_info_cache)} client entries")
 
 
 # Get affiliate from cache
-def get_affiliate_from_cache(phone_number, ttl=DEFAULT_CACHE_TTL):
+def get_affiliate_from_cache(phone_number, ttl=DEFAULT_CACHE_TTL, refresh=None):
     """
     Get affiliate information from cache if it exists and isn't expired
     Args:
         phone_number (str): The phone number used as cache key
         ttl (int): Time to live in seconds
+        refresh (callable): Optional coroutine function returning fresh affiliate data.
+            When given, an entry expired within the stale grace window is returned
+            immediately and refreshed in the background.
     Returns:
         dict or None: Cached affiliate information or None if not found/expired
     """
     # Normalize phone number to string
     phone_number = str(phone_number).strip()
-    
+
     # Try direct lookup first
     if phone_number in affiliate_cache:
-        data, timestamp = affiliate_cache[phone_number]
-        age = time.time() - timestamp
-        if age < ttl:
+        key = phone_number
+        data = affiliate_cache.get(key, ttl)
+        if data is not None:
             logger.info(f"Cache HIT for affiliate: {phone_number}")
             return data
-        else:
-            logger.info(f"Cache EXPIRED for affiliate: {phone_number}")
-            return None
-            
-    # Check for special format keys (like 'ids:1:21')
-    if phone_number.startswith('ids:'):
+        logger.info(f"Cache EXPIRED for affiliate: {phone_number}")
+    elif phone_number.startswith('ids:'):
         # For ids: format keys, only do exact matching
-        logger.info(f"Cache MISS for affiliate with ID format: {phone_number}")
-        return None
-    
-    # Try to match phone number by digits
-    for key in affiliate_cache.keys():
-        # Skip keys that use the ids: format
-        if key.startswith('ids:'):
-            continue
-            
-        # Check if phone numbers match after stripping all non-digits
-        key_digits = ''.join(filter(str.isdigit, key))
-        phone_digits = ''.join(filter(str.isdigit, phone_number))
-        
-        # Check if the last 10 digits match
-        if key_digits and phone_digits and (key_digits[-10:] == phone_digits[-10:] or key_digits == phone_digits):
-            data, timestamp = affiliate_cache[key]
-            age = time.time() - timestamp
-            
-            if age < ttl:
+        key = None
+    else:
+        # Try to match phone number by its normalized digits
+        key = affiliate_phone_index.get(normalize_phone(phone_number))
+        if key is not None:
+            data = affiliate_cache.get(key, ttl)
+            if data is not None:
                 logger.info(f"Cache HIT for affiliate with phone number match: {phone_number} ↔ {key}")
                 return data
-            
-    logger.info(f"Cache MISS for affiliate: {phone_number}")
-    return None
+
+    data = _read_through(AFFILIATE_NAMESPACE, phone_number, ttl)
+    if data is None and refresh is not None and key is not None:
+        data = _serve_stale(AFFILIATE_NAMESPACE, key, ttl, refresh,
+                            lambda fresh: store_affiliate_in_cache(key, fresh))
+    if data is None:
+        logger.info(f"Cache MISS for affiliate: {phone_number}")
+    return data
 
 
 # Store affiliate in cache
@@ -156,29 +436,18 @@ def store_affiliate_in_cache(phone_number, affiliate_data):
     """
     # Normalize phone number unless it's using the special 'ids:' format
     phone_number = str(phone_number).strip()
-    
-    # Store with current timestamp
-    current_time = time.time()
-    affiliate_cache[phone_number] = (affiliate_data, current_time)
-    
-    # Save cache to disk for persistence between calls
-    save_caches()
-    
+
+    affiliate_cache.set(phone_number, affiliate_data)
+    _index_affiliate_key(phone_number)
+
+    # Persisted by the background flusher
+    _persister.mark(AFFILIATE_NAMESPACE, phone_number)
+
     logger.info(f"Stored affiliate in cache: {phone_number}")
-    
-    # For phone numbers (not special formats), also store a normalized version
-    if not phone_number.startswith('ids:'):
-        # Store a normalized version with only digits
-        normalized_key = ''.join(filter(str.isdigit, phone_number))
-        if normalized_key and normalized_key != phone_number:
-            # Only store if it's different from the original key
-            affiliate_cache[normalized_key] = (affiliate_data, current_time)
-            logger.info(f"Also stored normalized affiliate key: {normalized_key}")
-            save_caches()
 
 
 # Get client from cache
-def get_client_from_cache(phone_number, affiliate_id, family_id, ttl=DEFAULT_CACHE_TTL):
+def get_client_from_cache(phone_number, affiliate_id, family_id, ttl=DEFAULT_CACHE_TTL, refresh=None):
     """
     Get client information from cache if it exists and isn't expired
     Args:
@@ -186,6 +455,9 @@ def get_client_from_cache(phone_number, affiliate_id, family_id, ttl=DEFAULT_CAC
         affiliate_id (str): The affiliate ID
         family_id (str): The family ID
         ttl (int): Time to live in seconds
+        refresh (callable): Optional coroutine function returning fresh client data.
+            When given, an entry expired within the stale grace window is returned
+            immediately and refreshed in the background.
     Returns:
         dict or None: Cached client information or None if not found/expired
     """
@@ -193,47 +465,38 @@ def get_client_from_cache(phone_number, affiliate_id, family_id, ttl=DEFAULT_CAC
     phone_number = str(phone_number).strip()
     affiliate_id = str(affiliate_id).strip()
     family_id = str(family_id).strip()
-    
+
     # Create the standard cache key
     cache_key = f"{phone_number}:{affiliate_id}:{family_id}"
-    
+
     # Try direct lookup first
     if cache_key in client_info_cache:
-        data, timestamp = client_info_cache[cache_key]
-        age = time.time() - timestamp
-        if age < ttl:
+        key = cache_key
+        data = client_info_cache.get(key, ttl)
+        if data is not None:
+            data = _sync_with_shared(CLIENT_NAMESPACE, key)
+        if data is not None:
             logger.info(f"Cache HIT for client: {cache_key}")
             return data
-        else:
-            logger.info(f"Cache EXPIRED for client: {cache_key}")
-            return None
-    
-    # Try to match by phone number digits
-    for key in client_info_cache.keys():
-        try:
-            cached_phone, cached_affiliate, cached_family = key.split(':')
-            
-            # Check if affiliate and family IDs match
-            if cached_affiliate == affiliate_id and cached_family == family_id:
-                # Check if phone numbers match after stripping all non-digits
-                cached_phone_digits = ''.join(filter(str.isdigit, cached_phone))
-                search_phone_digits = ''.join(filter(str.isdigit, phone_number))
-                
-                # Check if the last 10 digits match
-                if cached_phone_digits[-10:] == search_phone_digits[-10:] or cached_phone_digits == search_phone_digits:
-                    data, timestamp = client_info_cache[key]
-                    age = time.time() - timestamp
-                    
-                    if age < ttl:
-                        logger.info(f"Cache HIT for client with phone number match: {phone_number} ↔ {cached_phone}")
-                        return data
-                    
-        except (ValueError, IndexError):
-            # Skip keys that don't have the expected format
-            continue
-    
-    logger.info(f"Cache MISS for client: {cache_key}")
-    return None
+        logger.info(f"Cache EXPIRED for client: {cache_key}")
+    else:
+        # Try to match by the normalized phone number digits
+        key = client_phone_index.get((normalize_phone(phone_number), affiliate_id, family_id))
+        if key is not None:
+            data = client_info_cache.get(key, ttl)
+            if data is not None:
+                data = _sync_with_shared(CLIENT_NAMESPACE, key)
+            if data is not None:
+                logger.info(f"Cache HIT for client with phone number match: {phone_number} ↔ {key.split(':')[0]}")
+                return data
+
+    data = _read_through(CLIENT_NAMESPACE, cache_key, ttl)
+    if data is None and refresh is not None and key is not None:
+        data = _serve_stale(CLIENT_NAMESPACE, key, ttl, refresh,
+                            lambda fresh: store_client_in_cache(*key.split(':'), fresh))
+    if data is None:
+        logger.info(f"Cache MISS for client: {cache_key}")
+    return data
 
 
 # Store client in cache
@@ -250,47 +513,195 @@ def store_client_in_cache(phone_number, affiliate_id, family_id, client_data):
     phone_number = str(phone_number).strip()
     affiliate_id = str(affiliate_id).strip()
     family_id = str(family_id).strip()
-    
+
     # Create the standard cache key
     cache_key = f"{phone_number}:{affiliate_id}:{family_id}"
-    
-    # Store with current timestamp
-    current_time = time.time()
-    client_info_cache[cache_key] = (client_data, current_time)
-    
-    # Save cache to disk for persistence between calls
-    save_caches()
-    
+
+    client_info_cache.set(cache_key, client_data)
+    _index_client_key(cache_key)
+
+    # Persisted by the background flusher
+    _persister.mark(CLIENT_NAMESPACE, cache_key)
+
     logger.info(f"Stored client in cache: {cache_key}")
-    
-    # Also store a normalized version with digits-only phone number
-    normalized_phone = ''.join(filter(str.isdigit, phone_number))
-    if normalized_phone and normalized_phone != phone_number:
-        normalized_key = f"{normalized_phone}:{affiliate_id}:{family_id}"
-        client_info_cache[normalized_key] = (client_data, current_time)
-        logger.info(f"Also stored normalized client key: {normalized_key}")
-        save_caches()
+
+
+def is_cacheable_client_info(client_data):
+    """
+    Whether a rider lookup result is worth caching: at least one rider with a
+    real client ID. Failed lookups fall back to a placeholder new rider.
+    """
+    if not isinstance(client_data, dict) or not client_data.get("number_of_riders"):
+        return False
+    riders = [rider for name, rider in client_data.items() if name.startswith("rider_")]
+    return bool(riders) and all(str(rider.get("client_id")) not in ("-1", "0", "None") for rider in riders)
+
+
+def _client_entry_key(phone_number, affiliate_id, family_id):
+    """Key of the cached client entry for these IDs (exact or phone-normalized match), or None"""
+    phone_number = str(phone_number).strip()
+    affiliate_id = str(affiliate_id).strip()
+    family_id = str(family_id).strip()
+    cache_key = f"{phone_number}:{affiliate_id}:{family_id}"
+    if cache_key in client_info_cache:
+        return cache_key
+    return client_phone_index.get((normalize_phone(phone_number), affiliate_id, family_id))
+
+
+def invalidate_client_in_cache(phone_number, affiliate_id, family_id):
+    """
+    Drop a client entry here and in the shared store, so the next call
+    fetches fresh profiles
+    Args:
+        phone_number (str): The client's phone number
+        affiliate_id (str): The affiliate ID
+        family_id (str): The family ID
+    """
+    key = _client_entry_key(phone_number, affiliate_id, family_id)
+    exact_key = f"{str(phone_number).strip()}:{str(affiliate_id).strip()}:{str(family_id).strip()}"
+    if key is not None:
+        client_info_cache.delete(key)
+    # Delete whatever version other workers stored as well
+    for stale_key in {key, exact_key} - {None}:
+        _persister.mark_removed(CLIENT_NAMESPACE, stale_key)
+    logger.info(f"🧹 Invalidated client cache entry: {key or exact_key}")
+
+
+def patch_client_in_cache(phone_number, affiliate_id, family_id, patch):
+    """
+    Update a cached client entry in place after an event that changed it
+    Args:
+        phone_number (str): The client's phone number
+        affiliate_id (str): The affiliate ID
+        family_id (str): The family ID
+        patch (callable): Mutates a copy of the cached data; returning False means
+            the change cannot be applied and the entry is invalidated instead
+    Returns:
+        bool: True if the entry was patched
+    """
+    key = _client_entry_key(phone_number, affiliate_id, family_id)
+    entry = client_info_cache.peek(key) if key is not None else None
+    if entry is None:
+        return False
+
+    data = copy.deepcopy(entry.value)
+    try:
+        applied = patch(data) is not False
+    except Exception as e:
+        logger.warning(f"Client cache patch failed for {key}: {e}")
+        applied = False
+    if not applied:
+        invalidate_client_in_cache(phone_number, affiliate_id, family_id)
+        return False
+
+    # A new timestamp lets other workers see the patched version is newer than theirs
+    client_info_cache.set(key, data)
+    _persister.mark(CLIENT_NAMESPACE, key)
+    logger.info(f"🩹 Patched client cache entry: {key}")
+    return True
+
+
+# Generic namespaces (affiliate details, service areas, geocodes, payment types)
+def get_cached(namespace, key):
+    """
+    Get a value from one of the generic cache namespaces
+    Args:
+        namespace (str): Cache namespace
+        key (str): Cache key
+    Returns:
+        Cached value or None if not found/expired
+    """
+    key = str(key)
+    data = _caches[namespace].get(key)
+    if data is None:
+        data = _read_through(namespace, key)
+    logger.debug(f"Cache {'HIT' if data is not None else 'MISS'} for {namespace}: {key}")
+    return data
+
+
+def delete_cached(namespace, key):
+    """
+    Delete a value from one of the generic cache namespaces, here and (the
+    version this worker stored) in the shared store
+    Args:
+        namespace (str): Cache namespace
+        key (str): Cache key
+    """
+    key = str(key)
+    _caches[namespace].delete(key)
+    logger.debug(f"Deleted {namespace} from cache: {key}")
+
+
+def has_cached(namespace, key):
+    """Whether this worker holds an entry for key (fresh or not), without touching statistics"""
+    return _caches[namespace].peek(str(key)) is not None
+
+
+def store_cached(namespace, key, value):
+    """
+    Store a value in one of the generic cache namespaces
+    Args:
+        namespace (str): Cache namespace
+        key (str): Cache key
+        value: Value to cache
+    """
+    key = str(key)
+    _caches[namespace].set(key, value)
+    _persister.mark(namespace, key)
+    logger.debug(f"Stored {namespace} in cache: {key}")
+
+
+def get_stats():
+    """Per-namespace cache statistics"""
+    stats = get_cache_stats()
+    stats["persistence"] = {
+        "pending": _persister.pending(),
+        "flushes": _persister.flushes,
+        "rows_written": _persister.rows_written,
+        "errors": _persister.errors,
+        "shared_hits": _shared_hits,
+        "shared_checks": _shared_checks,
+    }
+    stats["stale_while_revalidate"] = {
+        "grace": CACHE_STALE_GRACE,
+        "stale_serves": _stale_serves,
+        "refreshes": _refreshes,
+        "refresh_failures": _refresh_failures,
+        "in_flight": len(_refreshing),
+    }
+    return stats
 
 
 # Clear all caches
 def clear_cache():
-    """Clear all caches and delete cache files"""
+    """Clear all caches and delete persisted entries"""
     # Clear in-memory caches
-    affiliate_cache.clear()
-    client_info_cache.clear()
-    
-    # Delete cache files
+    for cache in _caches.values():
+        cache.clear()
+    with _cache_lock:
+        affiliate_phone_index.clear()
+        client_phone_index.clear()
+    _synced.clear()
+    _persister.discard_pending()
+
+    # Delete persisted entries
     try:
+        _store.clear()
         if os.path.exists(AFFILIATE_CACHE_FILE):
             os.remove(AFFILIATE_CACHE_FILE)
         if os.path.exists(CLIENT_CACHE_FILE):
             os.remove(CLIENT_CACHE_FILE)
-        logger.info("Cleared all caches and removed cache files")
+        logger.info("Cleared all caches and persisted entries")
     except Exception as e:
         logger.error(f"Error deleting cache files: {e}")
 
 
+def _flush_on_exit():
+    if _persister is not None:
+        _persister.close()
+
+
 # Load caches at initialization
+init_persistence()
 load_caches()
-logger.info(f"Loaded client cache keys: {list(client_info_cache.keys())}")
-logger.info(f"Loaded affiliate cache keys: {list(affiliate_cache.keys())}")
+atexit.register(_flush_on_exit)
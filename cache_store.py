@@ -0,0 +1,306 @@
+"""
+Write-behind SQLite persistence for the in-memory caches.
+
+The caches in cache_manager live in memory (see cache_core); this module only
+keeps them durable. Stores mark a (namespace, key) pair dirty, and a background
+thread flushes the dirty entries in one SQLite transaction after a short
+debounce. Storing one entry therefore costs O(1) I/O instead of re-pickling
+every cache. Transactions make each flush atomic, so a crash mid-write never
+leaves a truncated cache file behind.
+
+The store is shared by every worker process on the host: writes only replace
+a row with a newer one and removals only delete the version that expired, so
+concurrent workers never roll each other's entries back. Other backends (see
+cache_backends) implement the same CacheBackend interface.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from logging_config import get_logger
+
+logger = get_logger('cache_store')
+
+CACHE_FLUSH_DELAY = float(os.getenv("CACHE_FLUSH_DELAY", "1.0"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+
+
+# A delete is (namespace, key) or (namespace, key, stored_at); the latter only
+# removes the row if it is no newer than stored_at
+Delete = Union[Tuple[str, str], Tuple[str, str, float]]
+
+
+class CacheBackend(ABC):
+    """Interface of a persistent cache store shared between processes."""
+
+    # Whether reads are network round trips (callers then rate-limit them)
+    remote = False
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """Get the (value, timestamp) of one entry, or None."""
+
+    @abstractmethod
+    def load(self, namespace: str) -> Dict[str, Tuple[Any, float]]:
+        """Load every entry of a namespace."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored entries across namespaces."""
+
+    @abstractmethod
+    def write_batch(self, upserts: Iterable[Tuple[str, str, Any, float]], deletes: Iterable[Delete]) -> None:
+        """Apply upserts (newer wins) and deletes."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete every entry."""
+
+    def close(self) -> None:
+        """Release any connections."""
+
+
+def _delete_bound(delete: Delete) -> Tuple[str, str, float]:
+    namespace, key = delete[0], delete[1]
+    return namespace, key, delete[2] if len(delete) > 2 else float("inf")
+
+
+class SQLiteCacheStore(CacheBackend):
+    """SQLite table of (namespace, key) -> (pickled value, timestamp)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's kept-open read connection; opening one costs far more than a lookup."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """Get the (value, timestamp) of one entry, or None."""
+        # fetchall() runs the statement to completion so no read snapshot stays open
+        rows = self._reader().execute(
+            "SELECT value, stored_at FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchall()
+        if not rows:
+            return None
+        row = rows[0]
+        try:
+            return pickle.loads(row[0]), row[1]
+        except Exception as e:
+            logger.warning(f"Skipping unreadable cache entry {namespace}/{key}: {e}")
+            return None
+
+    def load(self, namespace: str) -> Dict[str, Tuple[Any, float]]:
+        """Load every entry of a namespace."""
+        entries = {}
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT key, value, stored_at FROM cache_entries WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        for key, value, stored_at in rows:
+            try:
+                entries[key] = (pickle.loads(value), stored_at)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable cache entry {namespace}/{key}: {e}")
+        return entries
+
+    def count(self) -> int:
+        """Number of stored entries across namespaces."""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    def write_batch(self,
+                    upserts: Iterable[Tuple[str, str, Any, float]],
+                    deletes: Iterable[Delete]) -> None:
+        """Apply upserts (newer wins) and deletes in a single transaction."""
+        rows = [(ns, key, pickle.dumps(value), stored_at) for ns, key, value, stored_at in upserts]
+        deletes = [_delete_bound(delete) for delete in deletes]
+        with closing(self._connect()) as conn, conn:
+            if rows:
+                conn.executemany(
+                    "INSERT INTO cache_entries (namespace, key, value, stored_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, stored_at = excluded.stored_at "
+                    "WHERE excluded.stored_at >= cache_entries.stored_at",
+                    rows,
+                )
+            if deletes:
+                conn.executemany(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ? AND stored_at <= ?", deletes
+                )
+
+    def clear(self) -> None:
+        """Delete every entry."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM cache_entries")
+
+    def close(self) -> None:
+        """Close the read connections."""
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._local = threading.local()
+
+
+class WriteBehindPersister:
+    """Debounced background flusher of dirty cache entries."""
+
+    def __init__(self,
+                 store: CacheBackend,
+                 resolve: Callable[[str, str], Optional[Tuple[Any, float]]],
+                 delay: float = CACHE_FLUSH_DELAY,
+                 before_flush: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            store: Backing store
+            resolve: Returns the current (value, timestamp) of a key, or None if it was removed
+            delay: Debounce delay in seconds between the first mark and the flush
+            before_flush: Hook run in the flush thread before each flush (e.g. expiry cleanup)
+        """
+        self.store = store
+        self.resolve = resolve
+        self.delay = delay
+        self.before_flush = before_flush
+
+        self._dirty = set()
+        self._removed: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Statistics
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    def mark(self, namespace: str, key: str) -> None:
+        """Mark a key as changed; it will be written by the next flush."""
+        with self._lock:
+            self._dirty.add((namespace, key))
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def mark_removed(self, namespace: str, key: str, stored_at: float = float("inf")) -> None:
+        """
+        Mark a key as removed. Unless it is stored again first, the next flush
+        deletes the persisted row if it is no newer than stored_at.
+        """
+        with self._lock:
+            self._removed[(namespace, key)] = max(stored_at, self._removed.get((namespace, key), stored_at))
+        self.mark(namespace, key)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="cache-write-behind", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait()
+            if self._stopped:
+                return
+            # Debounce: let further stores accumulate into the same flush
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all dirty entries now. Returns the number of rows written."""
+        with self._flush_lock:
+            if self.before_flush is not None:
+                try:
+                    self.before_flush()
+                except Exception as e:
+                    logger.warning(f"Cache pre-flush hook failed: {e}")
+
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                removed, self._removed = self._removed, {}
+            if not dirty:
+                return 0
+
+            upserts, deletes = [], []
+            for namespace, key in dirty:
+                entry = self.resolve(namespace, key)
+                if entry is None:
+                    deletes.append((namespace, key, removed.get((namespace, key), float("inf"))))
+                else:
+                    upserts.append((namespace, key, entry[0], entry[1]))
+
+            try:
+                self.store.write_batch(upserts, deletes)
+            except Exception as e:
+                self.errors += 1
+                # Keep the keys dirty so the next flush retries them
+                with self._lock:
+                    self._dirty |= dirty
+                    for removal, stored_at in removed.items():
+                        self._removed.setdefault(removal, stored_at)
+                logger.error(f"Error flushing cache entries: {e}")
+                return 0
+
+            self.flushes += 1
+            self.rows_written += len(dirty)
+            logger.debug(f"Flushed {len(upserts)} cache entries, removed {len(deletes)}")
+            return len(dirty)
+
+    def discard_pending(self) -> None:
+        """Forget all unflushed changes."""
+        with self._lock:
+            self._dirty.clear()
+            self._removed.clear()
+
+    def is_pending(self, namespace: str, key: str) -> bool:
+        """Whether a key has changes waiting to be flushed."""
+        with self._lock:
+            return (namespace, key) in self._dirty
+
+    def pending(self) -> int:
+        """Number of entries waiting to be flushed."""
+        with self._lock:
+            return len(self._dirty)
+
+    def close(self) -> None:
+        """Flush pending entries and stop the background thread."""
+        self.flush()
+        self._stopped = True
+        self._wakeup.set()
+        self.store.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Cache warmup for affiliates and their per-affiliate data.
+
+After a deploy the first call to each trunk pays for affiliate resolution,
+affiliate details and payment types. This job enumerates every affiliate from
+GET_AFFILIATE_API, stores it under its trunk number and its ids: key, and
+prefetches details and payment types (optionally the service-area counties,
+which cost a web search each) with bounded concurrency. Everything lands in
+the shared cache, so all workers on the host start warm.
+
+It runs at worker start through the LiveKit prewarm hook (skipped when
+another worker warmed the shared cache recently) or from the command line:
+
+Usage:
+    python cache_warmup.py [--concurrency 8] [--service-area] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import cache_manager
+from logging_config import get_logger
+from side_functions import fetch_affiliates, fetch_affiliate_details, fetch_payment_types, get_service_area_counties
+from token_estimator import load_encodings
+
+logger = get_logger('cache_warmup')
+
+WARMUP_CONCURRENCY = int(os.getenv("CACHE_WARMUP_CONCURRENCY", "8"))
+WARMUP_ON_START = os.getenv("CACHE_WARMUP_ON_START", "true").lower() == "true"
+WARMUP_SERVICE_AREA = os.getenv("CACHE_WARMUP_SERVICE_AREA", "false").lower() == "true"
+# LiveKit kills processes whose prewarm exceeds initialize_process_timeout (10s by
+# default); past this timeout the warmup carries on in the background instead
+WARMUP_TIMEOUT = float(os.getenv("CACHE_WARMUP_TIMEOUT", "8"))
+# A "running" marker older than this belongs to a warmup that died; workers warm again
+WARMUP_RUNNING_TTL = float(os.getenv("CACHE_WARMUP_RUNNING_TTL", "300"))
+
+WARMUP_MARKER_KEY = "last_run"
+
+
+@dataclass
+class WarmupReport:
+    """Outcome of one warmup run."""
+    affiliates: int = 0
+    entries: Dict[str, int] = field(default_factory=dict)
+    failures: int = 0
+    duration_s: float = 0.0
+
+    @property
+    def total_entries(self) -> int:
+        return sum(self.entries.values())
+
+
+async def warm_cache(concurrency: int = WARMUP_CONCURRENCY, service_area: bool = WARMUP_SERVICE_AREA) -> WarmupReport:
+    """
+    Populate the shared cache for every configured affiliate
+    Args:
+        concurrency (int): Maximum affiliates prefetched at once
+        service_area (bool): Also resolve service-area counties (one web search per affiliate)
+    Returns:
+        WarmupReport: Counts of affiliates, cached entries per namespace and failures
+    """
+    start = time.perf_counter()
+    report = WarmupReport()
+    entries = {namespace: 0 for namespace in (cache_manager.AFFILIATE_NAMESPACE,
+                                              cache_manager.AFFILIATE_DETAILS_NAMESPACE,
+                                              cache_manager.PAYMENT_TYPES_NAMESPACE)}
+    if service_area:
+        entries[cache_manager.SERVICE_AREA_NAMESPACE] = 0
+
+    # Mark the run first so workers starting meanwhile do not warm as well
+    cache_manager.store_cached(cache_manager.WARMUP_NAMESPACE, WARMUP_MARKER_KEY,
+                               {"status": "running", "started_at": time.time()})
+    cache_manager.save_caches()
+
+    try:
+        affiliates = await fetch_affiliates()
+    except Exception:
+        _clear_marker()
+        raise
+    if not affiliates:
+        # fetch_affiliates reports failures as an empty list; let the next worker retry
+        logger.warning("⚠️ [WARMUP] No affiliates fetched, clearing the warmup marker")
+        _clear_marker()
+        report.duration_s = round(time.perf_counter() - start, 3)
+        return report
+    report.affiliates = len(affiliates)
+
+    affiliate_ids = []
+    for affiliate in affiliates:
+        trunk_number = affiliate.get("TwillioPhoneNumber")
+        if trunk_number:
+            cache_manager.store_affiliate_in_cache(trunk_number, affiliate)
+            entries[cache_manager.AFFILIATE_NAMESPACE] += 1
+        if affiliate.get("AffiliateFamilyID") is not None and affiliate.get("AffiliateID") is not None:
+            cache_manager.store_affiliate_in_cache(f"ids:{affiliate['AffiliateFamilyID']}:{affiliate['AffiliateID']}", affiliate)
+            entries[cache_manager.AFFILIATE_NAMESPACE] += 1
+            if affiliate["AffiliateID"] not in affiliate_ids:
+                affiliate_ids.append(affiliate["AffiliateID"])
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def prefetch(affiliate_id):
+        async with semaphore:
+            try:
+                bounds, _, _ = await fetch_affiliate_details(affiliate_id)
+                await fetch_payment_types(affiliate_id)
+                if service_area and cache_manager.has_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, affiliate_id):
+                    if await get_service_area_counties(affiliate_id, bounds):
+                        entries[cache_manager.SERVICE_AREA_NAMESPACE] += 1
+            except Exception as e:
+                logger.warning(f"Warmup failed for affiliate {affiliate_id}: {e}")
+
+            # The fetch functions cache only successful responses
+            complete = True
+            for namespace in (cache_manager.AFFILIATE_DETAILS_NAMESPACE, cache_manager.PAYMENT_TYPES_NAMESPACE):
+                if cache_manager.has_cached(namespace, affiliate_id):
+                    entries[namespace] += 1
+                else:
+                    complete = False
+            if not complete:
+                report.failures += 1
+
+    await asyncio.gather(*(prefetch(affiliate_id) for affiliate_id in affiliate_ids))
+
+    report.entries = entries
+    report.duration_s = round(time.perf_counter() - start, 3)
+    cache_manager.store_cached(cache_manager.WARMUP_NAMESPACE, WARMUP_MARKER_KEY, {"status": "done", **asdict(report)})
+    cache_manager.save_caches()
+
+    logger.info(f"🔥 [WARMUP] Cached {report.total_entries} entries for {report.affiliates} affiliates "
+                f"in {report.duration_s:.2f}s ({report.failures} failures): {entries}")
+    return report
+
+
+def _clear_marker() -> None:
+    """Remove this run's warmup marker so another worker can warm the cache."""
+    cache_manager.delete_cached(cache_manager.WARMUP_NAMESPACE, WARMUP_MARKER_KEY)
+    cache_manager.save_caches()
+
+
+def run_warmup(timeout: Optional[float] = WARMUP_TIMEOUT, **kwargs) -> Optional[WarmupReport]:
+    """
+    Run warm_cache on its own event loop in a background thread, waiting at
+    most timeout seconds. Returns the report, or None if it is still running
+    (it then finishes in the background) or failed.
+    """
+    result = {}
+
+    def target():
+        try:
+            result["report"] = asyncio.run(warm_cache(**kwargs))
+        except Exception as e:
+            logger.error(f"Cache warmup failed: {e}")
+
+    thread = threading.Thread(target=target, name="cache-warmup", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        logger.warning(f"⚠️ [WARMUP] Still running after {timeout}s, continuing in the background")
+        return None
+    return result.get("report")
+
+
+def prewarm(proc=None) -> None:
+    """LiveKit prewarm hook: load the token encodings, then warm the shared cache unless another worker did recently."""
+    load_encodings()
+    if not WARMUP_ON_START:
+        return
+    last_run = cache_manager.get_cached(cache_manager.WARMUP_NAMESPACE, WARMUP_MARKER_KEY)
+    if last_run is not None and last_run.get("status") == "running" \
+            and time.time() - last_run.get("started_at", 0) >= WARMUP_RUNNING_TTL:
+        logger.warning("⚠️ [WARMUP] Previous warmup never finished, warming again")
+        last_run = None
+    if last_run is not None:
+        logger.info(f"[WARMUP] Shared cache already warmed ({last_run.get('status')}), skipping")
+        return
+    run_warmup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the shared affiliate cache")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY)
+    parser.add_argument("--service-area", action="store_true", default=WARMUP_SERVICE_AREA,
+                        help="Also resolve service-area counties (one web search per affiliate)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(warm_cache(concurrency=args.concurrency, service_area=args.service_area))
+    if args.json:
+        print(json.dumps({**asdict(report), "total_entries": report.total_entries}, indent=2))
+    else:
+        print(f"Warmed {report.total_entries} entries for {report.affiliates} affiliates "
+              f"in {report.duration_s:.2f}s ({report.failures} failures)")
+        for namespace, count in report.entries.items():
+            print(f"  {namespace:>18}: {count}")
+
+
+if __name__ == "__main__":
+    main()
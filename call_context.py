@@ -0,0 +1,73 @@
+"""
+Per-call context shared by cost tracking and logging.
+
+Several LiveKit jobs can run as asyncio tasks on one thread, so the current
+call cannot live in a threading.local: usage and logs from concurrent calls
+would be attributed to whichever call set it last. The context is held in a
+ContextVar instead. asyncio tasks and asyncio.to_thread copy the context they
+are created in, so tasks spawned by tools, the supervisor or room event
+handlers carry the call they belong to.
+
+The variable holds a mutable CallContext rather than the individual values,
+so a value set inside a child task (e.g. the transfer status set by a tool)
+is seen by the rest of the call.
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class CallContext:
+    """Identifiers of the call the current task belongs to."""
+    call_id: Optional[str] = None
+    session_id: str = 'no-session'
+    call_sid: Optional[str] = None
+    x_call_id: Optional[str] = None
+    transfer_status: Optional[str] = None
+    trace: Optional[Any] = None  # tracing.CallTrace, created on first span
+
+
+_current_call: ContextVar[Optional[CallContext]] = ContextVar('ivr_call_context', default=None)
+
+
+def start_call_context(call_id: Optional[str] = None) -> CallContext:
+    """
+    Bind a fresh CallContext to the current task. Call it at the start of a
+    job, before creating the tasks (room, session, supervisor) that should
+    share it.
+    """
+    context = CallContext(call_id=call_id)
+    _current_call.set(context)
+    return context
+
+
+def bind_call_context(context: CallContext) -> None:
+    """
+    Bind an existing CallContext to the current task. Callbacks run by tasks
+    the call did not create (e.g. LiveKit shutdown callbacks, which run in the
+    job runner's task) do not inherit the call's context and must bind it.
+    """
+    _current_call.set(context)
+
+
+def get_call_context() -> Optional[CallContext]:
+    """Get the CallContext of the current task, if any."""
+    return _current_call.get()
+
+
+def ensure_call_context() -> CallContext:
+    """Get the CallContext of the current task, binding a fresh one if there is none."""
+    context = _current_call.get()
+    if context is None:
+        context = start_call_context()
+    return context
+
+
+def get_call_value(name: str, default=None):
+    """Get one field of the current CallContext, or default outside a call."""
+    context = _current_call.get()
+    if context is None:
+        return default
+    return getattr(context, name)
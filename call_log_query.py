@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Find one call's records in the compressed structured call logs.
+
+Looks the call up by call_sid or X-Call-ID in the segment indexes and
+decompresses only the frames that hold its records (see structured_logs).
+
+Usage:
+    python call_log_query.py <call_sid | x_call_id> [--dir logs/calls_jsonl] [--phase transfer] [--level ERROR] [--json]
+    python call_log_query.py --list [--dir logs/calls_jsonl]
+"""
+
+import argparse
+import json
+import sys
+
+from structured_logs import LOG_JSONL_DIR, iter_call_records, load_indexes
+
+
+def list_calls(log_dir):
+    """Print every indexed call with its segment"""
+    for segment, calls in load_indexes(log_dir):
+        for call_sid, info in calls.items():
+            print(f"{call_sid}\t{info.get('x_call_id') or '-'}\t{len(info['frames'])} frame(s)\t{segment.name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query structured call logs")
+    parser.add_argument("call_id", nargs="?", help="call_sid or X-Call-ID")
+    parser.add_argument("--dir", default=LOG_JSONL_DIR, help="Directory of the JSONL segments")
+    parser.add_argument("--phase", help="Only records with this phase")
+    parser.add_argument("--level", help="Only records at this level or above (e.g. WARNING)")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON lines")
+    parser.add_argument("--list", action="store_true", help="List indexed calls")
+    args = parser.parse_args()
+
+    if args.list:
+        list_calls(args.dir)
+        return
+    if not args.call_id:
+        parser.error("a call_sid or X-Call-ID is required")
+
+    levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+    min_level = levels.index(args.level.upper()) if args.level else 0
+    stats = {}
+    found = 0
+    for record in iter_call_records(args.call_id, args.dir, stats=stats):
+        if args.phase and record.get("phase") != args.phase:
+            continue
+        if levels.index(record.get("level", "DEBUG")) < min_level:
+            continue
+        found += 1
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            latency = f" ({record['latency_ms']} ms)" if "latency_ms" in record else ""
+            phase = f" [{record['phase']}]" if "phase" in record else ""
+            print(f"{record['ts']} {record['level']:<8} {record['logger']}{phase}{latency} - {record['message']}")
+
+    print(f"{found} record(s) from {stats.get('frames_read', 0)} frame(s), "
+          f"{stats.get('bytes_read', 0)} compressed bytes read", file=sys.stderr)
+    if not found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import aiohttp
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from logging_config import get_logger
+from tracing import http_trace_config
 from timezone_utils import now_eastern, format_eastern_datetime_iso
 
 logger = get_logger('context_manager')
@@ -219,7 +220,7 @@ class ContextTransferManager:
         try:
             logger.info(f"Sending context data to API: {self.context_api_url}")
             
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(
                     self.context_api_url, 
                     json=context_data,
@@ -0,0 +1,391 @@
+"""
+Batched cost-log sink for MongoDB.
+
+log_usage used to insert each call's cost document with a synchronous
+pymongo insert_one inside the async shutdown callback, so a slow or
+unreachable Mongo stalled the event loop for every other call on the worker.
+Documents are now handed to a worker-wide writer thread through a bounded
+queue and written with insert_many in batches, retried with exponential
+backoff.
+
+When Mongo stays unreachable (or the queue is full) documents are appended to
+an on-disk JSONL spool, one file per process, in MongoDB Extended JSON so
+ObjectIds and datetimes survive. Spooled documents are replayed once Mongo
+accepts writes again. Every document gets its _id before the first attempt,
+so a retry of a batch that was partly written never inserts duplicates.
+
+LiveKit job processes end with os._exit, so atexit hooks never run there;
+the entrypoint flushes the sink at the end of each call. A flush that times
+out spools whatever is still queued or being written, so nothing is lost
+when the process exits right after (a document both spooled and written is
+skipped as a duplicate on replay).
+"""
+
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId, json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from logging_config import get_logger
+
+logger = get_logger('cost_log_sink')
+
+COST_LOG_QUEUE_SIZE = int(os.getenv("COST_LOG_QUEUE_SIZE", "1000"))
+COST_LOG_BATCH_SIZE = int(os.getenv("COST_LOG_BATCH_SIZE", "50"))
+COST_LOG_MAX_RETRIES = int(os.getenv("COST_LOG_MAX_RETRIES", "3"))
+COST_LOG_RETRY_BACKOFF = float(os.getenv("COST_LOG_RETRY_BACKOFF", "0.5"))
+COST_LOG_SPOOL_DIR = os.getenv("COST_LOG_SPOOL_DIR", os.path.join("logs", "costlog_spool"))
+
+# MongoDB duplicate key error: the document was written by an earlier attempt
+DUPLICATE_KEY_ERROR = 11000
+
+
+class CostLogSink:
+    """Worker-wide batched writer of cost-log documents."""
+
+    def __init__(self,
+                 collection,
+                 spool_dir: str = COST_LOG_SPOOL_DIR,
+                 max_queue: int = COST_LOG_QUEUE_SIZE,
+                 batch_size: int = COST_LOG_BATCH_SIZE,
+                 max_retries: int = COST_LOG_MAX_RETRIES,
+                 retry_backoff: float = COST_LOG_RETRY_BACKOFF,
+                 flush_interval: float = 1.0):
+        self.collection = collection
+        self.spool_dir = spool_dir
+        self.spool_file = os.path.join(spool_dir, f"costlogs.{os.getpid()}.jsonl")
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.flush_interval = flush_interval
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        # Batch the writer thread is currently writing
+        self._in_flight: List[Dict[str, Any]] = []
+        # Set while Mongo is failing; spooled documents are replayed after the next success
+        self._unhealthy = False
+
+        # Statistics
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        """Start the writer thread if it isn't running yet."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cost-log-sink", daemon=True)
+                self._thread.start()
+
+    def submit(self, doc: Dict[str, Any]) -> bool:
+        """
+        Queue a cost-log document without blocking.
+
+        Args:
+            doc: Document to insert; an _id is assigned if it has none
+
+        Returns:
+            bool: True if queued, False if the queue was full and it was spooled to disk
+        """
+        doc.setdefault("_id", ObjectId())
+        self.start()
+        with self._pending_cond:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            with self._pending_cond:
+                self._pending -= 1
+                self._pending_cond.notify_all()
+            logger.warning(f"⚠️ Cost-log queue full, spooling document {doc['_id']} to disk")
+            self._spool([doc])
+            return False
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Wait until every queued document has been written or spooled. On
+        timeout the documents still queued or being written are spooled to
+        disk and False is returned.
+        """
+        deadline = time.monotonic() + timeout
+        with self._pending_cond:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._pending_cond.wait(remaining)
+            else:
+                return True
+        self._spool_unwritten()
+        return False
+
+    def _spool_unwritten(self) -> None:
+        """Spool the documents still queued (taking them off the queue) and a copy of the batch in flight."""
+        docs = list(self._in_flight)
+        drained, stop = 0, False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+            else:
+                docs.append(item)
+                drained += 1
+        if stop:
+            self._queue.put(None)
+        if drained:
+            with self._pending_cond:
+                self._pending -= drained
+                self._pending_cond.notify_all()
+        if docs:
+            logger.warning(f"⚠️ Cost-log flush timed out, spooling {len(docs)} unwritten document(s)")
+            self._spool(docs)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        """Writer thread: replay leftovers from earlier runs, then drain the queue in batches."""
+        try:
+            self.replay_spool()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Cost-log spool replay failed: {e}")
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch: List[Dict[str, Any]] = []
+            stop = item is None
+            if item is not None:
+                batch.append(item)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._in_flight = batch
+                try:
+                    unwritten = self._write_with_retry(batch)
+                    if unwritten:
+                        self._unhealthy = True
+                        self._spool(unwritten)
+                    elif self._unhealthy:
+                        self._unhealthy = False
+                        self.replay_spool()
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"❌ Cost-log batch failed: {e}")
+                finally:
+                    self._in_flight = []
+                    with self._pending_cond:
+                        self._pending -= len(batch)
+                        self._pending_cond.notify_all()
+
+            if stop:
+                return
+
+    def _insert(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert documents with one insert_many. Returns the documents that still
+        need writing; duplicates count as written since _ids are fixed up front.
+        """
+        try:
+            self.collection.insert_many(docs, ordered=False)
+            return []
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])
+                      if error.get("code") != DUPLICATE_KEY_ERROR}
+            if e.details.get("writeConcernErrors"):
+                # Unknown which documents were kept; rewriting them all is safe
+                return docs
+            return [doc for index, doc in enumerate(docs) if index in failed]
+
+    def _write_with_retry(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write documents, retrying with exponential backoff. Returns the documents that were not written."""
+        remaining = docs
+        attempts = self.max_retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                remaining = self._insert(remaining)
+            except PyMongoError as e:
+                logger.warning(f"⚠️ Cost-log insert attempt {attempt}/{attempts} failed: {e}")
+            else:
+                if not remaining:
+                    break
+                logger.warning(f"⚠️ Cost-log insert attempt {attempt}/{attempts}: {len(remaining)} document(s) rejected")
+            if attempt < attempts:
+                self.retries += 1
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+
+        self.written += len(docs) - len(remaining)
+        if remaining:
+            logger.error(f"❌ Giving up on {len(remaining)} cost-log document(s) after {attempts} attempts")
+        else:
+            self.batches += 1
+            logger.info(f"✅ Wrote {len(docs)} cost-log document(s) to MongoDB")
+        return remaining
+
+    def _spool(self, docs: List[Dict[str, Any]]) -> None:
+        """Append documents to this process's spool file."""
+        try:
+            with self._spool_lock:
+                os.makedirs(self.spool_dir, exist_ok=True)
+                with open(self.spool_file, "a", encoding="utf-8") as f:
+                    for doc in docs:
+                        doc.setdefault("_id", ObjectId())
+                        f.write(json_util.dumps(doc, json_options=CANONICAL_JSON_OPTIONS) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.spooled += len(docs)
+            logger.warning(f"💾 Spooled {len(docs)} cost-log document(s) to {self.spool_file}")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Could not spool {len(docs)} cost-log document(s): {e}")
+
+    def _spool_files(self) -> List[str]:
+        """This process's spool file plus those left behind by processes that have exited."""
+        files = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "costlogs.*.jsonl"))):
+            if path == self.spool_file:
+                files.append(path)
+                continue
+            try:
+                pid = int(os.path.basename(path).split(".")[1])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                files.append(path)
+        return files
+
+    def replay_spool(self) -> int:
+        """
+        Write spooled documents to Mongo. Documents that still fail stay in
+        this process's spool file.
+
+        Returns:
+            int: Number of documents replayed
+        """
+        replayed = 0
+        for path in self._spool_files():
+            with self._spool_lock:
+                # Named after this process, so a crash mid-replay leaves it to the next worker
+                claimed = os.path.join(self.spool_dir, f"costlogs.{os.getpid()}.replay.jsonl")
+                try:
+                    os.replace(path, claimed)
+                except FileNotFoundError:
+                    continue
+            try:
+                with open(claimed, encoding="utf-8") as f:
+                    docs = [json_util.loads(line, json_options=CANONICAL_JSON_OPTIONS) for line in f if line.strip()]
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Could not read cost-log spool {claimed}: {e}")
+                continue
+
+            failed: List[Dict[str, Any]] = []
+            for start in range(0, len(docs), self.batch_size):
+                batch = docs[start:start + self.batch_size]
+                if failed:
+                    # Stop hammering an unreachable Mongo; keep the rest in order
+                    failed.extend(batch)
+                    continue
+                unwritten = self._write_with_retry(batch)
+                replayed += len(batch) - len(unwritten)
+                failed.extend(unwritten)
+            os.remove(claimed)
+            if failed:
+                self._unhealthy = True
+                self._spool(failed)
+                break
+
+        if replayed:
+            self.replayed += replayed
+            logger.info(f"♻️ Replayed {replayed} spooled cost-log document(s)")
+        return replayed
+
+    def spooled_count(self) -> int:
+        """Count documents waiting in spool files."""
+        count = 0
+        for path in glob.glob(os.path.join(self.spool_dir, "costlogs.*.jsonl")):
+            with open(path, encoding="utf-8") as f:
+                count += sum(1 for line in f if line.strip())
+        return count
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get sink statistics."""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "errors": self.errors,
+        }
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this pid is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Worker-wide sink instance
+_cost_log_sink = None
+_cost_log_sink_lock = threading.Lock()
+
+
+def get_cost_log_sink(collection=None) -> CostLogSink:
+    """Get the worker-wide cost-log sink, creating it for `collection` on first use."""
+    global _cost_log_sink
+    if _cost_log_sink is None:
+        with _cost_log_sink_lock:
+            if _cost_log_sink is None:
+                if collection is None:
+                    raise ValueError("The cost-log sink needs a collection on first use")
+                _cost_log_sink = CostLogSink(collection)
+                atexit.register(_cost_log_sink.close)
+    return _cost_log_sink
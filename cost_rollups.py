@@ -0,0 +1,311 @@
+"""
+Aggregated cost and latency rollups.
+
+Each call's cost document is folded into running totals keyed by
+(day, affiliate, model) as the call ends, so fleet questions ("what did
+affiliate 65 spend on gpt-4.1-mini last week", "what is the LLM p90 today")
+are answered from a few small rollup records instead of scanning every call.
+
+Two kinds of rollup record are kept per day and affiliate:
+
+- model "all": calls, duration, cost per component, token and audio totals
+  and latency histograms per span kind (from the call's trace)
+- one per LLM model used: calls, tokens and cost of that model
+
+Totals are held as flat field deltas and flushed periodically by a
+background thread as $inc upserts into the cost_rollups collection, so
+several workers can add to the same record. A failed flush keeps its deltas
+for the next one. query_rollups() serves the records, with percentiles
+estimated from the histograms, without touching raw call documents.
+"""
+
+import atexit
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from logging_config import get_logger
+
+logger = get_logger('cost_rollups')
+
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "60"))
+
+ALL_MODELS = "all"
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LLM_COMPONENTS = ("agent", "supervisor", "websearch")
+
+RollupKey = Tuple[str, str, str]  # (day, affiliate_id, model)
+
+
+def bucket_label(duration_ms: float) -> str:
+    """Histogram bucket of a duration, e.g. 'le_250' or 'le_inf'."""
+    for bound in LATENCY_BUCKETS_MS:
+        if duration_ms <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+def histogram_percentile(buckets: Dict[str, int], p: float) -> Optional[float]:
+    """
+    Estimate a percentile (ms) as the upper bound of the bucket holding it;
+    past the last bound the last bound is returned.
+    """
+    total = sum(buckets.values())
+    if not total:
+        return None
+    rank = total * p / 100
+    seen = 0
+    for bound in LATENCY_BUCKETS_MS:
+        seen += buckets.get(f"le_{bound}", 0)
+        if seen >= rank:
+            return float(bound)
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def rollup_id(key: RollupKey) -> str:
+    return "|".join(key)
+
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn dotted field paths into nested dicts."""
+    nested: Dict[str, Any] = {}
+    for path, value in flat.items():
+        target = nested
+        *parents, leaf = path.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return nested
+
+
+def call_deltas(doc: Dict[str, Any], trace=None) -> Dict[RollupKey, Dict[str, float]]:
+    """
+    The rollup increments contributed by one call's cost document.
+
+    Args:
+        doc: Cost document built by log_usage
+        trace: The call's tracing.CallTrace, for latency histograms
+    """
+    start = doc.get("start_time")
+    day = start.strftime("%Y-%m-%d") if isinstance(start, datetime) else datetime.now().strftime("%Y-%m-%d")
+    affiliate_id = str(doc.get("affiliate_id") or "unknown")
+    tokens = doc.get("tokens", {})
+    cost = doc.get("cost", {})
+    audio = doc.get("audio_usage", {})
+
+    totals = {
+        "calls": 1,
+        "duration_seconds": doc.get("duration_seconds") or 0,
+        "tokens.input": tokens.get("total", {}).get("input_tokens", 0),
+        "tokens.output": tokens.get("total", {}).get("output_tokens", 0),
+        "stt_seconds": audio.get("stt", {}).get("audio_seconds", 0),
+        "tts_characters": audio.get("tts", {}).get("characters", 0),
+        "cost.total": cost.get("total_cost", 0),
+    }
+    for component in LLM_COMPONENTS + ("stt", "tts"):
+        totals[f"cost.{component}"] = cost.get(f"{component}_cost", 0)
+    if trace is not None:
+        for span in list(trace.spans):
+            prefix = f"latency.{span.kind}"
+            totals[f"{prefix}.count"] = totals.get(f"{prefix}.count", 0) + 1
+            totals[f"{prefix}.sum_ms"] = totals.get(f"{prefix}.sum_ms", 0) + span.duration_ms
+            label = f"{prefix}.buckets.{bucket_label(span.duration_ms)}"
+            totals[label] = totals.get(label, 0) + 1
+
+    deltas = {(day, affiliate_id, ALL_MODELS): totals}
+    for component in LLM_COMPONENTS:
+        usage = tokens.get(component, {})
+        model = usage.get("model")
+        if not model or not (usage.get("input_tokens") or usage.get("output_tokens")):
+            continue
+        model_totals = deltas.setdefault((day, affiliate_id, model), {"calls": 1})
+        for field, value in (("tokens.input", usage.get("input_tokens", 0)),
+                             ("tokens.output", usage.get("output_tokens", 0)),
+                             ("cost.total", cost.get(f"{component}_cost", 0))):
+            model_totals[field] = model_totals.get(field, 0) + value
+    return deltas
+
+
+def _merge(target: Dict[RollupKey, Dict[str, float]], deltas: Dict[RollupKey, Dict[str, float]]) -> None:
+    for key, fields in deltas.items():
+        totals = target.setdefault(key, {})
+        for field, value in fields.items():
+            totals[field] = totals.get(field, 0) + value
+
+
+def _matches(key: RollupKey, affiliate_id, model, start_day, end_day) -> bool:
+    day, key_affiliate, key_model = key
+    return ((affiliate_id is None or key_affiliate == str(affiliate_id))
+            and (model is None or key_model == model)
+            and (start_day is None or day >= start_day)
+            and (end_day is None or day <= end_day))
+
+
+def format_rollup(record: Dict[str, Any], percentiles: Iterable[int] = (50, 90, 99)) -> Dict[str, Any]:
+    """Add mean and percentile estimates to each latency histogram of a nested rollup record."""
+    for stats in record.get("latency", {}).values():
+        count = stats.get("count", 0)
+        stats["mean_ms"] = round(stats.get("sum_ms", 0) / count, 1) if count else None
+        for p in percentiles:
+            stats[f"p{p}_ms"] = histogram_percentile(stats.get("buckets", {}), p)
+    return record
+
+
+class CostRollupAggregator:
+    """Worker-wide running cost and latency totals per day, affiliate and model."""
+
+    def __init__(self, collection=None, flush_interval: float = ROLLUP_FLUSH_INTERVAL):
+        self.collection = collection
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        # Since process start, for in-process queries
+        self._totals: Dict[RollupKey, Dict[str, float]] = {}
+        # Not yet flushed to the collection
+        self._pending: Dict[RollupKey, Dict[str, float]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # Statistics
+        self.calls = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def start(self) -> None:
+        """Start the flush thread if there is a collection and it isn't running yet."""
+        if self.collection is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cost-rollups", daemon=True)
+                self._thread.start()
+
+    def record_call(self, doc: Dict[str, Any], trace=None) -> None:
+        """Fold one call's cost document (and latency trace) into the rollups."""
+        deltas = call_deltas(doc, trace)
+        with self._lock:
+            _merge(self._totals, deltas)
+            _merge(self._pending, deltas)
+            self.calls += 1
+        self.start()
+
+    def flush(self) -> bool:
+        """Write pending deltas to the collection. On failure they are kept for the next flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.collection is None:
+            return True
+
+        from pymongo import UpdateOne
+        from pymongo.errors import PyMongoError
+
+        now = datetime.now()
+        operations = []
+        for key, fields in pending.items():
+            day, affiliate_id, model = key
+            operations.append(UpdateOne(
+                {"_id": rollup_id(key)},
+                {"$inc": fields,
+                 "$set": {"updated_at": now},
+                 "$setOnInsert": {"day": day, "affiliate_id": affiliate_id, "model": model}},
+                upsert=True))
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            self.flush_errors += 1
+            with self._lock:
+                _merge(self._pending, pending)
+            logger.warning(f"⚠️ Could not flush {len(pending)} cost rollup(s), retrying next flush: {e}")
+            return False
+        self.flushes += 1
+        logger.debug("Flushed %d cost rollup(s)", len(pending))
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Cost rollup flush failed: {e}")
+
+    def close(self) -> None:
+        """Stop the flush thread and write what is pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval)
+            self._thread = None
+        self.flush()
+
+    def query(self,
+              affiliate_id: Optional[str] = None,
+              model: Optional[str] = None,
+              start_day: Optional[str] = None,
+              end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rollups of this process since it started, in the same shape as query_rollups()."""
+        with self._lock:
+            items = [(key, dict(fields)) for key, fields in self._totals.items()
+                     if _matches(key, affiliate_id, model, start_day, end_day)]
+        records = []
+        for key, fields in sorted(items):
+            record = {"_id": rollup_id(key), "day": key[0], "affiliate_id": key[1], "model": key[2]}
+            record.update(_nest(fields))
+            records.append(format_rollup(record))
+        return records
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get aggregator statistics."""
+        with self._lock:
+            return {"calls": self.calls, "rollups": len(self._totals), "pending": len(self._pending),
+                    "flushes": self.flushes, "flush_errors": self.flush_errors}
+
+
+def query_rollups(collection,
+                  affiliate_id: Optional[str] = None,
+                  model: Optional[str] = None,
+                  start_day: Optional[str] = None,
+                  end_day: Optional[str] = None,
+                  limit: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Read flushed rollup records from the cost_rollups collection.
+
+    Args:
+        collection: The cost_rollups collection
+        affiliate_id: Only this affiliate
+        model: Only this model; "all" for the per-call totals
+        start_day: First day, YYYY-MM-DD (inclusive)
+        end_day: Last day, YYYY-MM-DD (inclusive)
+        limit: Maximum number of records
+
+    Returns:
+        Rollup records sorted by day, affiliate and model, with latency percentile estimates
+    """
+    query: Dict[str, Any] = {}
+    if affiliate_id is not None:
+        query["affiliate_id"] = str(affiliate_id)
+    if model is not None:
+        query["model"] = model
+    if start_day or end_day:
+        query["day"] = {}
+        if start_day:
+            query["day"]["$gte"] = start_day
+        if end_day:
+            query["day"]["$lte"] = end_day
+    cursor = collection.find(query).sort([("day", 1), ("affiliate_id", 1), ("model", 1)]).limit(limit)
+    return [format_rollup(record) for record in cursor]
+
+
+_cost_rollups = None
+_cost_rollups_lock = threading.Lock()
+
+
+def get_cost_rollups(collection=None) -> CostRollupAggregator:
+    """Get the worker-wide rollup aggregator, flushing to `collection` if given on first use."""
+    global _cost_rollups
+    if _cost_rollups is None:
+        with _cost_rollups_lock:
+            if _cost_rollups is None:
+                _cost_rollups = CostRollupAggregator(collection)
+                atexit.register(_cost_rollups.close)
+    return _cost_rollups
@@ -7,7 +7,10 @@ import asyncio
 from dataclasses import dataclass, field
 from typing import Dict, Optional
 import threading
+from call_context import get_call_context, get_call_value, start_call_context
 from logging_config import get_logger
+from fleet_metrics import get_worker_metrics
+from token_estimator import count_tokens, response_text
 
 logger = get_logger('cost_tracker')
 
@@ -282,16 +285,19 @@ class CostTracker:
 # Per-call cost tracker instances
 _call_cost_trackers = {}
 _cost_tracker_lock = threading.Lock()
-_local = threading.local()
 
 def set_call_context(call_id: str):
-    """Set the current call context for this thread."""
-    _local.call_id = call_id
+    """Set the call the current task and the tasks it creates belong to."""
+    context = get_call_context()
+    if context is None or context.call_id not in (None, call_id):
+        # Never relabel a context another call's tasks may still share
+        context = start_call_context()
+    context.call_id = call_id
     logger.debug(f"Set call context to: {call_id}")
 
 def get_current_call_id() -> Optional[str]:
-    """Get the current call ID for this thread."""
-    return getattr(_local, 'call_id', None)
+    """Get the call ID of the current task."""
+    return get_call_value('call_id')
 
 def get_cost_tracker(call_id: Optional[str] = None) -> CostTracker:
     """Get the cost tracker instance for a specific call."""
@@ -341,6 +347,23 @@ def add_supervisor_usage(input_tokens: int, output_tokens: int, model_name: str
 def add_websearch_usage(input_tokens: int, output_tokens: int, model_name: str = "gpt-4o"):
     """Add web search token usage to current call's tracker."""
     get_cost_tracker().add_websearch_usage(input_tokens, output_tokens, model_name)
+    get_worker_metrics().add_llm_tokens(model_name, input_tokens, output_tokens)
+
+def add_websearch_response_usage(prompt: str, response, model_name: str = "gpt-4o"):
+    """
+    Add a Responses API web search's usage to current call's tracker,
+    counting tokens of the prompt and output when the response has no usage.
+    """
+    usage = getattr(response, 'usage', None)
+    if usage:
+        # Responses API reports input_tokens/output_tokens, not prompt_tokens/completion_tokens
+        input_tokens = getattr(usage, 'input_tokens', 0)
+        output_tokens = getattr(usage, 'output_tokens', 0)
+    else:
+        input_tokens = count_tokens(prompt, model_name)
+        output_tokens = count_tokens(response_text(response), model_name)
+        logger.info(f"No usage in web search response, counted tokens - input: {input_tokens}, output: {output_tokens}")
+    add_websearch_usage(input_tokens, output_tokens, model_name)
 
 def add_stt_usage(audio_seconds: float, provider: str = "deepgram", model: str = "nova-3-phonecall"):
     """Add STT usage to current call's tracker."""
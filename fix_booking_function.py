@@ -189,7 +189,7 @@ Requirements:
 - Practical advice based on the weather conditions
 - Keep response to exactly two lines
                         """
-                        weather = await search_web_manual(prompt)
+                        weather = await search_web_manual(prompt) or weather
                         logger.debug(f"🌤️ [BOOK_TRIPS] Weather: {weather}")
                     except Exception as e:
                         logger.warning(f"⚠️ [BOOK_TRIPS] Weather lookup failed: {e}")
@@ -0,0 +1,406 @@
+"""
+Live metrics of the voice worker fleet.
+
+Each worker process keeps a WorkerMetrics registry (active calls, event-loop
+lag and blocked-loop count from its LoopMonitor, backend request latency
+histograms per endpoint, cache hits, LLM tokens and call cost) and a
+background thread writes it every
+FLEET_METRICS_INTERVAL seconds as a JSON snapshot to
+FLEET_METRICS_DIR/worker-<pid>.json. LiveKit runs each job in its own
+process, so the snapshots are the only view across the fleet.
+
+The FastAPI app (app/api/routes/metrics.py) reads the snapshots with
+read_fleet_metrics() and serves them as JSON and Prometheus text. Gauges
+(active calls, lag, per-minute rates) come from snapshots updated within
+FLEET_METRICS_STALE_SECONDS; counters and histograms are summed over every
+snapshot, and snapshots of workers gone for FLEET_METRICS_RETIRE_SECONDS are
+folded into retired.json so the fleet totals never go backwards.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from cost_rollups import LATENCY_BUCKETS_MS, bucket_label, histogram_percentile
+from logging_config import get_logger
+from loop_monitor import LOOP_LAG_INTERVAL, LoopMonitor
+
+logger = get_logger('fleet_metrics')
+
+FLEET_METRICS_DIR = os.getenv("FLEET_METRICS_DIR", os.path.join("logs", "fleet_metrics"))
+FLEET_METRICS_INTERVAL = float(os.getenv("FLEET_METRICS_INTERVAL", "5"))
+FLEET_METRICS_STALE_SECONDS = float(os.getenv("FLEET_METRICS_STALE_SECONDS", "30"))
+FLEET_METRICS_RETIRE_SECONDS = float(os.getenv("FLEET_METRICS_RETIRE_SECONDS", "3600"))
+
+# Window of the per-minute rates
+RATE_WINDOW_SECONDS = 60
+# Endpoints tracked per worker; requests to further endpoints are counted as "other"
+MAX_ENDPOINTS = 200
+
+RETIRED_FILE = "retired.json"
+COUNTER_FIELDS = ("calls_started", "calls_completed", "cost_usd", "loop_blocked")
+
+
+def _new_histogram() -> Dict[str, Any]:
+    return {"count": 0, "sum_ms": 0.0, "buckets": {}}
+
+
+class WorkerMetrics:
+    """Metrics of one worker process."""
+
+    def __init__(self, metrics_dir: str = FLEET_METRICS_DIR, interval: float = FLEET_METRICS_INTERVAL):
+        self.metrics_dir = metrics_dir
+        self.interval = interval
+        self.path = os.path.join(metrics_dir, f"worker-{os.getpid()}.json")
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.active_calls = 0
+        self.calls_started = 0
+        self.calls_completed = 0
+        self.cost_usd = 0.0
+        self.backend: Dict[str, Dict[str, Any]] = {}
+        self.llm_tokens: Dict[str, Dict[str, int]] = {}
+        # (time, tokens, cost) events within the rate window
+        self._recent: deque = deque()
+        self.loop_lag_ms = 0.0
+        self.loop_lag_max_ms = 0.0
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.loop_monitor: Optional[LoopMonitor] = None
+
+    # Recording
+
+    def call_started(self) -> None:
+        with self._lock:
+            self.active_calls += 1
+            self.calls_started += 1
+        self.start()
+
+    def call_ended(self) -> None:
+        with self._lock:
+            self.active_calls = max(0, self.active_calls - 1)
+            self.calls_completed += 1
+
+    def add_cost(self, cost_usd: float) -> None:
+        """Add the cost of a finished call."""
+        with self._lock:
+            self.cost_usd += cost_usd
+            self._recent.append((time.time(), 0, cost_usd))
+
+    def add_llm_tokens(self, model: str, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            tokens = self.llm_tokens.setdefault(model, {"input": 0, "output": 0})
+            tokens["input"] += input_tokens
+            tokens["output"] += output_tokens
+            self._recent.append((time.time(), input_tokens + output_tokens, 0.0))
+
+    def observe_backend(self, endpoint: str, duration_ms: float) -> None:
+        """Add a backend request's latency to its endpoint's histogram."""
+        with self._lock:
+            if endpoint not in self.backend and len(self.backend) >= MAX_ENDPOINTS:
+                endpoint = "other"
+            histogram = self.backend.setdefault(endpoint, _new_histogram())
+            histogram["count"] += 1
+            histogram["sum_ms"] += duration_ms
+            label = bucket_label(duration_ms)
+            histogram["buckets"][label] = histogram["buckets"].get(label, 0) + 1
+
+    def record_loop_lag(self, lag_ms: float) -> None:
+        with self._lock:
+            self.loop_lag_ms = lag_ms
+            self.loop_lag_max_ms = max(self.loop_lag_max_ms, lag_ms)
+
+    def start_loop_lag_probe(self) -> None:
+        """Start the running event loop's lag monitor (once per process)."""
+        if self.loop_monitor is None:
+            self.loop_monitor = LoopMonitor(interval=LOOP_LAG_INTERVAL, on_sample=self.record_loop_lag)
+        self.loop_monitor.start()
+
+    # Snapshots
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The worker's current metrics; resets the max loop lag."""
+        from cache_core import get_cache_stats
+
+        now = time.time()
+        lag = self.loop_monitor.percentiles() if self.loop_monitor is not None else {}
+        blocked = self.loop_monitor.blocked if self.loop_monitor is not None else 0
+        with self._lock:
+            while self._recent and self._recent[0][0] < now - RATE_WINDOW_SECONDS:
+                self._recent.popleft()
+            snapshot = {
+                "pid": os.getpid(),
+                "updated": now,
+                "gauges": {
+                    "active_calls": self.active_calls,
+                    "loop_lag_ms": round(self.loop_lag_ms, 2),
+                    "loop_lag_max_ms": round(self.loop_lag_max_ms, 2),
+                    "loop_lag_p50_ms": lag.get("p50", 0.0),
+                    "loop_lag_p99_ms": lag.get("p99", 0.0),
+                    "llm_tokens_per_minute": sum(event[1] for event in self._recent),
+                    "cost_usd_per_minute": round(sum(event[2] for event in self._recent), 6),
+                },
+                "counters": {
+                    "calls_started": self.calls_started,
+                    "calls_completed": self.calls_completed,
+                    "cost_usd": round(self.cost_usd, 6),
+                    "loop_blocked": blocked,
+                },
+                "llm_tokens": {model: dict(tokens) for model, tokens in self.llm_tokens.items()},
+                "backend": {endpoint: {"count": h["count"], "sum_ms": round(h["sum_ms"], 2), "buckets": dict(h["buckets"])}
+                            for endpoint, h in self.backend.items()},
+            }
+            self.loop_lag_max_ms = self.loop_lag_ms
+        snapshot["cache"] = {namespace: {"hits": stats["hits"], "misses": stats["misses"]}
+                             for namespace, stats in get_cache_stats().items()}
+        return snapshot
+
+    def write_snapshot(self) -> None:
+        """Atomically replace this worker's snapshot file."""
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with self._write_lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+
+    def start(self) -> None:
+        """Start the snapshot thread if it isn't running yet."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="fleet-metrics", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not write worker metrics snapshot: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def close(self) -> None:
+        """Stop the snapshot thread after a final snapshot."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(self.interval)
+        self._thread = None
+        try:
+            self.write_snapshot()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not write final worker metrics snapshot: {e}")
+
+
+_worker_metrics = None
+_worker_metrics_lock = threading.Lock()
+
+
+def get_worker_metrics() -> WorkerMetrics:
+    """Get this process's worker metrics."""
+    global _worker_metrics
+    if _worker_metrics is None:
+        with _worker_metrics_lock:
+            if _worker_metrics is None:
+                _worker_metrics = WorkerMetrics()
+                atexit.register(_worker_metrics.close)
+    return _worker_metrics
+
+
+# Fleet view (read by the FastAPI app)
+
+def _add_totals(total: Dict[str, Any], snapshot: Dict[str, Any]) -> None:
+    """Add a snapshot's counters, token counts, cache counts and histograms to the running total."""
+    for field in COUNTER_FIELDS:
+        total["counters"][field] = total["counters"].get(field, 0) + snapshot.get("counters", {}).get(field, 0)
+    for model, tokens in snapshot.get("llm_tokens", {}).items():
+        target = total["llm_tokens"].setdefault(model, {"input": 0, "output": 0})
+        target["input"] += tokens.get("input", 0)
+        target["output"] += tokens.get("output", 0)
+    for namespace, counts in snapshot.get("cache", {}).items():
+        target = total["cache"].setdefault(namespace, {"hits": 0, "misses": 0})
+        target["hits"] += counts.get("hits", 0)
+        target["misses"] += counts.get("misses", 0)
+    for endpoint, histogram in snapshot.get("backend", {}).items():
+        target = total["backend"].setdefault(endpoint, _new_histogram())
+        target["count"] += histogram.get("count", 0)
+        target["sum_ms"] += histogram.get("sum_ms", 0)
+        for label, count in histogram.get("buckets", {}).items():
+            target["buckets"][label] = target["buckets"].get(label, 0) + count
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"counters": {}, "llm_tokens": {}, "cache": {}, "backend": {}}
+
+
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _retire(metrics_dir: str, paths: List[str]) -> None:
+    """Fold long-gone workers' snapshots into retired.json and delete them."""
+    lock_path = os.path.join(metrics_dir, ".retire.lock")
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            retired_path = os.path.join(metrics_dir, RETIRED_FILE)
+            retired = _load(retired_path) or _empty_totals()
+            folded = []
+            for path in paths:
+                snapshot = _load(path)
+                if snapshot is not None:
+                    _add_totals(retired, snapshot)
+                    folded.append(path)
+            tmp = f"{retired_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(retired, f, separators=(",", ":"))
+            os.replace(tmp, retired_path)
+            for path in folded:
+                os.remove(path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_fleet_metrics(metrics_dir: str = FLEET_METRICS_DIR,
+                       stale_seconds: float = FLEET_METRICS_STALE_SECONDS,
+                       retire_seconds: float = FLEET_METRICS_RETIRE_SECONDS) -> Dict[str, Any]:
+    """
+    Combine the worker snapshots into a fleet view.
+
+    Returns:
+        Dict with live gauges, fleet-wide totals, cache hit ratios and backend
+        latency histograms with percentile estimates
+    """
+    now = time.time()
+    totals = _empty_totals()
+    live: List[Dict[str, Any]] = []
+    to_retire = []
+
+    try:
+        names = sorted(os.listdir(metrics_dir))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        if not (name.startswith("worker-") and name.endswith(".json")):
+            continue
+        path = os.path.join(metrics_dir, name)
+        snapshot = _load(path)
+        if snapshot is None:
+            continue
+        age = now - snapshot.get("updated", 0)
+        if age > retire_seconds:
+            to_retire.append(path)
+        elif age <= stale_seconds:
+            live.append(snapshot)
+        _add_totals(totals, snapshot)
+
+    retired = _load(os.path.join(metrics_dir, RETIRED_FILE))
+    if retired is not None:
+        _add_totals(totals, retired)
+    if to_retire:
+        try:
+            _retire(metrics_dir, to_retire)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not retire old worker metrics: {e}")
+
+    gauges = [snapshot.get("gauges", {}) for snapshot in live]
+    backend = {}
+    for endpoint, histogram in sorted(totals["backend"].items()):
+        count = histogram["count"]
+        backend[endpoint] = {
+            "count": count,
+            "sum_ms": round(histogram["sum_ms"], 2),
+            "mean_ms": round(histogram["sum_ms"] / count, 1) if count else None,
+            "p50_ms": histogram_percentile(histogram["buckets"], 50),
+            "p90_ms": histogram_percentile(histogram["buckets"], 90),
+            "p99_ms": histogram_percentile(histogram["buckets"], 99),
+            "buckets": histogram["buckets"],
+        }
+    cache = {}
+    for namespace, counts in sorted(totals["cache"].items()):
+        lookups = counts["hits"] + counts["misses"]
+        cache[namespace] = dict(counts, hit_ratio=round(counts["hits"] / lookups, 4) if lookups else None)
+
+    return {
+        "updated": now,
+        "workers": len(live),
+        "active_calls": sum(g.get("active_calls", 0) for g in gauges),
+        "loop_lag_ms": {
+            "max": max((g.get("loop_lag_max_ms", 0) for g in gauges), default=0.0),
+            "mean": round(sum(g.get("loop_lag_ms", 0) for g in gauges) / len(gauges), 2) if gauges else 0.0,
+            "p99": max((g.get("loop_lag_p99_ms", 0) for g in gauges), default=0.0),
+        },
+        "llm_tokens_per_minute": sum(g.get("llm_tokens_per_minute", 0) for g in gauges),
+        "cost_usd_per_minute": round(sum(g.get("cost_usd_per_minute", 0) for g in gauges), 6),
+        "totals": dict(totals["counters"], llm_tokens=totals["llm_tokens"]),
+        "cache": cache,
+        "backend_latency": backend,
+    }
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(fleet: Dict[str, Any]) -> str:
+    """Render a fleet view in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = "{" + ",".join(f'{k}="{_label(v)}"' for k, v in labels.items()) + "}" if labels else ""
+            lines.append(f"{name}{label_text} {value}")
+
+    totals = fleet["totals"]
+    metric("ivr_workers", "gauge", "Worker processes with a fresh metrics snapshot", [({}, fleet["workers"])])
+    metric("ivr_active_calls", "gauge", "Calls in progress", [({}, fleet["active_calls"])])
+    metric("ivr_event_loop_lag_max_seconds", "gauge", "Worst event-loop lag across workers since the last snapshot",
+           [({}, fleet["loop_lag_ms"]["max"] / 1000)])
+    metric("ivr_event_loop_lag_p99_seconds", "gauge", "Highest per-worker p99 event-loop lag over recent samples",
+           [({}, fleet["loop_lag_ms"]["p99"] / 1000)])
+    metric("ivr_event_loop_blocked_total", "counter", "Times an event loop was blocked past the lag threshold",
+           [({}, totals.get("loop_blocked", 0))])
+    metric("ivr_calls_started_total", "counter", "Calls started", [({}, totals.get("calls_started", 0))])
+    metric("ivr_calls_completed_total", "counter", "Calls completed", [({}, totals.get("calls_completed", 0))])
+    metric("ivr_cost_usd_total", "counter", "Cost of completed calls in USD", [({}, totals.get("cost_usd", 0))])
+    metric("ivr_cost_usd_per_minute", "gauge", "Cost of calls completed in the last minute in USD",
+           [({}, fleet["cost_usd_per_minute"])])
+    metric("ivr_llm_tokens_total", "counter", "LLM tokens",
+           [({"model": model, "direction": direction}, count)
+            for model, tokens in sorted(totals.get("llm_tokens", {}).items())
+            for direction, count in sorted(tokens.items())])
+    metric("ivr_llm_tokens_per_minute", "gauge", "LLM tokens used in the last minute",
+           [({}, fleet["llm_tokens_per_minute"])])
+    metric("ivr_cache_hits_total", "counter", "Cache hits",
+           [({"cache": ns}, stats["hits"]) for ns, stats in fleet["cache"].items()])
+    metric("ivr_cache_misses_total", "counter", "Cache misses",
+           [({"cache": ns}, stats["misses"]) for ns, stats in fleet["cache"].items()])
+
+    lines.append("# HELP ivr_backend_request_duration_seconds Backend request latency by endpoint")
+    lines.append("# TYPE ivr_backend_request_duration_seconds histogram")
+    for endpoint, histogram in fleet["backend_latency"].items():
+        endpoint_label = f'endpoint="{_label(endpoint)}"'
+        cumulative = 0
+        for bound in LATENCY_BUCKETS_MS:
+            cumulative += histogram["buckets"].get(f"le_{bound}", 0)
+            lines.append(f'ivr_backend_request_duration_seconds_bucket{{{endpoint_label},le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'ivr_backend_request_duration_seconds_bucket{{{endpoint_label},le="+Inf"}} {histogram["count"]}')
+        lines.append(f'ivr_backend_request_duration_seconds_sum{{{endpoint_label}}} {histogram["sum_ms"] / 1000}')
+        lines.append(f'ivr_backend_request_duration_seconds_count{{{endpoint_label}}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
@@ -13,18 +13,22 @@ from typing import Annotated
 from timezone_utils import now_eastern, format_eastern_timestamp, format_eastern_datetime_iso, parse_eastern_datetime
 import aiohttp
 from aiohttp import BasicAuth
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 from livekit.agents import Agent, function_tool
 from livekit.agents.voice import Agent, AgentSession, RunContext
-from livekit.protocol.sip import TransferSIPParticipantRequest
 from livekit import api
 from livekit.rtc import SipDTMF
 from side_functions import *
+import cache_manager
 from pydantic import Field, BaseModel
 from models import ReturnTripPayload, MainTripPayload, RiderVerificationParams, ClientNameParams, DistanceFareParams, AccountParams
 from logging_config import get_logger, set_session_id
 from InitAssistant import InitAssistant
+from artifact_writer import write_artifact, TRIP_PAYLOAD_ARTIFACT, TRANSFER_PAYLOAD_ARTIFACT
+from trip_payloads import new_trip_payload, build_default_transfer_payload
+from transfer_engine import get_transfer_engine, asterisk_target, DISPATCHER_EXTENSION, DISCONNECT_EXTENSION
+from tracing import traced, http_trace_config, httpx_trace_hooks, TOOL_SPAN
 
 # Load variables from .env file
 load_dotenv()
@@ -39,7 +43,8 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_CLIENT = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"),
+                            http_client=DefaultAsyncHttpxClient(event_hooks=httpx_trace_hooks()))
 
 
 def extract_x_call_id(participant_attributes):
@@ -66,7 +71,7 @@ def extract_x_call_id(participant_attributes):
             
         ]
         
-        logger.debug(f"Searching for X-Call-ID in participant attributes: {participant_attributes}")
+        logger.debug("Searching for X-Call-ID in participant attributes: %s", participant_attributes)
         
         for key in possible_keys:
             if key in participant_attributes:
@@ -128,6 +133,7 @@ class Assistant(Agent):
             super().__init__(instructions=instructions)
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def compute_return_time_after_main(self, hours_after: int, payload: MainTripPayload, buffer_minutes: int = 0) -> str:
         """
         Compute return pickup time as: main pickup time + main travel duration + hours_after (+ optional buffer).
@@ -153,7 +159,7 @@ class Assistant(Agent):
                 'AppType': 'FCSTService'
             }
 
-            logger.debug(f"Payload sent for distance and duration retrieval: {params}")
+            logger.debug("Payload sent for distance and duration retrieval: %s", params)
 
             auth = BasicAuth(os.getenv("GET_DIRECTION_USER"), os.getenv("GET_DIRECTION_PASSWORD"))
             headers = {
@@ -165,11 +171,11 @@ class Assistant(Agent):
 
             # Fetch actual travel duration
             duration_minutes = 0
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.get(url, params=params, headers=headers, auth=auth) as response:
                     if response.status == 200:
                         data = await response.json()
-                        logger.debug(f"Response for distance and duration retrieval: {data}")
+                        logger.debug("Response for distance and duration retrieval: %s", data)
                         distance = int(data["routes"][0]["legs"][0]["distance"]["value"])
                         duration = int(data["routes"][0]["legs"][0]["duration"]["value"])
                         
@@ -256,6 +262,51 @@ class Assistant(Agent):
     def update_affliate_id_and_family(self,affiliate_id,family_id):
         self.affiliate_id=affiliate_id
         self.family_id=family_id
+
+    def _patch_client_cache(self, patch):
+        """Apply a patch to this caller's cached rider profiles (see cache_manager.patch_client_in_cache)"""
+        family_id = getattr(self, "family_id", None)
+        if not self.rider_phone or self.affiliate_id is None or family_id is None:
+            return
+        try:
+            cache_manager.patch_client_in_cache(self.rider_phone, self.affiliate_id, family_id, patch)
+        except Exception as e:
+            logger.warning(f"Could not update cached rider profiles: {e}")
+
+    def _sync_client_cache(self, client_ids, trips=None):
+        """
+        Reconcile the cached rider profiles with a fresh profile lookup: update
+        existing trips (count and list together), or drop the entry if the set
+        of profiles changed.
+
+        Args:
+            client_ids: Client IDs of the profiles found
+            trips: Optional client ID -> (number_of_existing_trips, trips_data)
+        """
+        client_ids = {str(client_id) for client_id in client_ids}
+        trips = {str(client_id): rider_trips for client_id, rider_trips in (trips or {}).items()}
+
+        def patch(data):
+            riders = [rider for name, rider in data.items() if name.startswith("rider_")]
+            if {str(rider.get("client_id")) for rider in riders} != client_ids:
+                return False
+            for rider in riders:
+                rider_trips = trips.get(str(rider.get("client_id")))
+                if rider_trips is not None:
+                    rider["number_of_existing_trips"], rider["trips_data"] = rider_trips
+            return True
+
+        self._patch_client_cache(patch)
+
+    def _invalidate_client_cache(self):
+        """Drop this caller's cached rider profiles, e.g. after a booking changed their trips"""
+        family_id = getattr(self, "family_id", None)
+        if not self.rider_phone or self.affiliate_id is None or family_id is None:
+            return
+        try:
+            cache_manager.invalidate_client_in_cache(self.rider_phone, self.affiliate_id, family_id)
+        except Exception as e:
+            logger.warning(f"Could not invalidate cached rider profiles: {e}")
     
     # Old messy conversation history methods removed - now using clean InitAssistant approach
     
@@ -295,7 +346,7 @@ class Assistant(Agent):
                 'User-Agent': 'IVR-Bot-Context-Transfer/1.0'
             }
             
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(transfer_api_url, json=api_payload, headers=headers, timeout=10) as response:
                     if response.status == 200:
                         logger.info(f"✅ Context successfully sent to transfer API")
@@ -370,6 +421,7 @@ class Assistant(Agent):
             return "Failed to stop background audio."
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def Close_Call(self) -> str:
         """Function to end Twilio call and disconnect from the LiveKit room.
         Whenever conversation ends with a Bye or Thankyou, call this function."""
@@ -417,6 +469,7 @@ class Assistant(Agent):
         # return f"{call_closed_msg} {room_closed_msg}"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_client_name(self
                               ):
         """Function to get rider profiles including their active or existing rides. And their home address
@@ -450,16 +503,16 @@ class Assistant(Agent):
                 "iATSPID": int(self.affiliate_id),
                 "iDTSPID": int(family_id)
             }
-            logger.debug(f"Payload before sending: {payload}")
+            logger.debug("Payload before sending: %s", payload)
             # Define the headers
             headers = {
                 "Content-Type": "application/json",
             }
 
-            logger.debug(f"Payload sent by LLM: {payload}")
+            logger.debug("Payload sent by LLM: %s", payload)
 
             # Step 3: Send the data to the API
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers=headers) as response:
                     response = await response.json()
 
@@ -473,7 +526,7 @@ class Assistant(Agent):
         try:
             if response["responseCode"] == 200:
                 client_object = response["responseJSON"]
-                logger.debug(f"Client Object: {client_object}")
+                logger.debug("Client Object: %s", client_object)
                 client_list = json.loads(client_object)
                 for i, client in enumerate(client_list, 1):
                     name = (client['FirstName'] + ' ' + client['LastName']).strip()
@@ -502,6 +555,10 @@ class Assistant(Agent):
                     result[f"rider_{i}"] = rider_data
                     rider_count += 1
                 # result["number_of_riders"] = rider_count
+                self._sync_client_cache(
+                    [rider["client_id"] for rider in result.values()],
+                    {rider["client_id"]: (rider["number_of_existing_trips"], rider["trips_data"])
+                     for rider in result.values()})
             else:
                 logger.warning("Request failed!")
                 result["number_of_riders"] = 1
@@ -519,7 +576,7 @@ class Assistant(Agent):
             logger.error(f"Error occurred in getting client Name: {e}")
             result["number_of_riders"] = rider_count
 
-        logger.debug(f"Result: {result}")
+        logger.debug("Result: %s", result)
 
         # await asyncio.sleep(2)
         # await self.Stop_Music()
@@ -540,6 +597,7 @@ class Assistant(Agent):
         return data
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def select_rider_profile(self, profile_name: str, profile_number: int = 0) -> str:
         """
         Function to select a specific rider profile when multiple profiles are found and user provides profile name or profile number.
@@ -578,13 +636,14 @@ class Assistant(Agent):
             }
             
             # Send the data to the API
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers=headers) as response:
                     response = await response.json()
             
             if response["responseCode"] == 200:
                 client_object = response["responseJSON"]
                 client_list = json.loads(client_object)
+                self._sync_client_cache([client.get('Id', 0) for client in client_list])
                 selected_client = None
                 # Check if profile_name matches any existing profile
                 if profile_name:
@@ -664,6 +723,7 @@ class Assistant(Agent):
             return f"Error selecting profile: {str(e)}. Please try again."
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_ETA(self) -> str:
         """
         Function to get CURRENT/ACTIVE/EXISTING rides and trips:
@@ -718,10 +778,10 @@ class Assistant(Agent):
             "Content-Type": "application/json"
         }
 
-        logger.debug(f"Payload Sent for Existing Trips: {payload}")
+        logger.debug("Payload Sent for Existing Trips: %s", payload)
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers=headers) as resp:
                     text = await resp.text()
                     # await asyncio.sleep(2)
@@ -736,7 +796,7 @@ class Assistant(Agent):
                     if response.get("responseCode") == 200:
                         try:
                             data = json.loads(response.get("responseJSON", "{}"))
-                            logger.debug(f"Response: {data}")
+                            logger.debug("Response: %s", data)
                             existing_trips_data = json.dumps(data, indent=4)
                             if data:
                                 latest_trip = max(data, key=lambda x: x['iRefId'])
@@ -752,7 +812,7 @@ class Assistant(Agent):
 
                                 existing_trips_data = json.dumps(result, indent=4)
 
-                            logger.debug(f"ETA Response: {existing_trips_data}")
+                            logger.debug("ETA Response: %s", existing_trips_data)
                             return existing_trips_data
                         except json.JSONDecodeError:
                             logger.error("Failed to decode nested responseJSON")
@@ -769,6 +829,7 @@ class Assistant(Agent):
             return "No data found for ETA!"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def search_web(
         self,
         prompt: Annotated[str, Field(description="Prompt for web search. Keep it as precise and to the point as possible at max 3-4 lines.")]
@@ -783,7 +844,7 @@ class Assistant(Agent):
         logger.info("Called search_web function")
         # _ = asyncio.create_task(self.Play_Music())
         # await asyncio.sleep(2)
-        logger.debug(f"web search payload: {prompt}")
+        logger.debug("web search payload: %s", prompt)
 
         try:
             # Use the OpenAI API client to make the call
@@ -803,41 +864,8 @@ class Assistant(Agent):
             
             # Track token usage for cost calculation
             try:
-                from cost_tracker import add_websearch_usage
-                logger.debug(f"Response object type: {type(response)}")
-                
-                if hasattr(response, 'usage') and response.usage:
-                    logger.debug(f"Usage object: {response.usage}")
-                    # For OpenAI responses API, tokens are in input_tokens/output_tokens, not prompt_tokens/completion_tokens
-                    input_tokens = getattr(response.usage, 'input_tokens', 0)
-                    output_tokens = getattr(response.usage, 'output_tokens', 0)
-                    logger.debug(f"Extracted token values - input: {input_tokens}, output: {output_tokens}")
-                    add_websearch_usage(input_tokens, output_tokens, "gpt-4o")
-                    logger.debug(f"Web search usage: {input_tokens} input, {output_tokens} output tokens")
-                else:
-                    logger.warning(f"No usage information available in response. Response type: {type(response)}")
-                    # Estimate tokens based on text length as fallback
-                    estimated_input = len(prompt.split()) * 1.3  # Rough estimate
-                    
-                    # Extract text from the response structure for estimation
-                    text_content = ""
-                    if hasattr(response, 'output') and response.output:
-                        for item in response.output:
-                            if hasattr(item, 'type') and item.type == 'message':
-                                if hasattr(item, 'content') and item.content:
-                                    for content_item in item.content:
-                                        if hasattr(content_item, 'type') and content_item.type == 'output_text':
-                                            text_content = content_item.text
-                                            break
-                                if text_content:
-                                    break
-                        # Fallback if structure parsing fails
-                        if not text_content:
-                            text_content = str(response.output)
-                    
-                    estimated_output = len(text_content.split()) * 1.3 if text_content else 0
-                    logger.info(f"Using estimated tokens - input: {estimated_input:.0f}, output: {estimated_output:.0f}")
-                    add_websearch_usage(int(estimated_input), int(estimated_output), "gpt-4o")
+                from cost_tracker import add_websearch_response_usage
+                add_websearch_response_usage(prompt, response, "gpt-4o")
             except Exception as usage_error:
                 logger.warning(f"Failed to track web search usage: {usage_error}")
 
@@ -869,6 +897,7 @@ class Assistant(Agent):
             return "Web search failed!"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_valid_addresses(
         self,
         address: Annotated[str, Field(description="Complete Address confirmed by the rider to be validated.")]
@@ -889,7 +918,7 @@ class Assistant(Agent):
 
         try:
             result = await verify_address(address)
-            logger.debug(f"Valid Addresses Result from Web Search: {result}")
+            logger.debug("Valid Addresses Result from Web Search: %s", result)
             if result["valid"]:
                 # Extract latitude and longitude
                 lat = result["latitude"]
@@ -916,34 +945,46 @@ class Assistant(Agent):
         result = {}
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, params={'address': address}) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        locations = data['results']
-                        for i, location in enumerate(locations):
-                            # Initialize the dictionary for each location
-                            result[f"Location_{i + 1}"] = {}
-                            result[f"Location_{i + 1}"]["Address"] = location["formatted_address"]
-                            result[f"Location_{i + 1}"]["Coordinates"] = location['geometry']['location']
-
-                            # Extract latitude and longitude
-                            lat = location['geometry']['location']['lat']
-                            lng = location['geometry']['location']['lng']
-                            is_within_service_area = await self.check_bounds(lat, lng)
-                            result[f"Location_{i + 1}"]["isWithinServiceArea"] = is_within_service_area
+            # Geocode results are cached per address; the service-area check
+            # depends on the affiliate and is always recomputed
+            geocode_key = f"itc:{cache_manager.normalize_address(address)}"
+            locations = cache_manager.get_cached(cache_manager.GEOCODE_NAMESPACE, geocode_key)
+            if locations is None:
+                async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
+                    async with session.get(url, headers=headers, params={'address': address}) as resp:
+                        if resp.status == 200:
+                            data = await resp.json()
+                            locations = [
+                                {"formatted_address": location["formatted_address"],
+                                 "geometry": {"location": location['geometry']['location']}}
+                                for location in data['results']
+                            ]
+                            if locations:
+                                cache_manager.store_cached(cache_manager.GEOCODE_NAMESPACE, geocode_key, locations)
+                        else:
+                            logger.error(f"ITC location error: status {resp.status}")
 
-                    else:
-                        logger.error(f"ITC location error: status {resp.status}")
+            for i, location in enumerate(locations or []):
+                # Initialize the dictionary for each location
+                result[f"Location_{i + 1}"] = {}
+                result[f"Location_{i + 1}"]["Address"] = location["formatted_address"]
+                result[f"Location_{i + 1}"]["Coordinates"] = location['geometry']['location']
+
+                # Extract latitude and longitude
+                lat = location['geometry']['location']['lat']
+                lng = location['geometry']['location']['lng']
+                is_within_service_area = await self.check_bounds(lat, lng)
+                result[f"Location_{i + 1}"]["isWithinServiceArea"] = is_within_service_area
         except Exception as e:
             logger.error(f"ITC location exception: {e}")
 
         # await asyncio.sleep(2)
         # await self.Stop_Music()
-        logger.debug(f"Valid Addresses from ITC MAP API: {result}")
+        logger.debug("Valid Addresses from ITC MAP API: %s", result)
         return str(result)
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def check_bounds(
         self,
         latitude: Annotated[str, Field(description="Latitude of the location to be checked.")],
@@ -963,7 +1004,7 @@ class Assistant(Agent):
 
         bounds, _, _ = await fetch_affiliate_details(self.affiliate_id)
 
-        logger.debug(f"Bounds: {bounds}")
+        logger.debug("Bounds: %s", bounds)
 
         try:
             # Convert bounds to float for accurate comparison
@@ -997,6 +1038,7 @@ class Assistant(Agent):
             return True
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_IDs(
         self,
         params: Annotated[AccountParams, Field(description="Parameters for account and payment method")]
@@ -1058,10 +1100,10 @@ class Assistant(Agent):
             ## Take care of spelling mistakes by STT as well. For example 'Vomata' refers to 'WMATA'.
             ## Do not add backticks or 'json'. I am parsing the response with json.loads(). Make it compatible.
             """
-            logger.debug(f"Prompt sent for matching funding sources: {prompt}")
+            logger.debug("Prompt sent for matching funding sources: %s", prompt)
 
             response = await get_match_source(prompt)
-            logger.debug(f"Matching Response: {response}")
+            logger.debug("Matching Response: %s", response)
 
             _, _, copay_fs_list = await fetch_affiliate_details(self.affiliate_id)
 
@@ -1080,7 +1122,7 @@ class Assistant(Agent):
 
                 logger.debug(f"Got Program Id: {program_id}")
                 logger.debug(f"Got Funding Source Id: {funding_id}")
-                logger.debug(f"Funding Source List: {copay_fs_list}")
+                logger.debug("Funding Source List: %s", copay_fs_list)
                 logger.debug(f"Selected Account Name: {account_name}")
 
                 try:
@@ -1098,64 +1140,49 @@ class Assistant(Agent):
                     logger.error(f"Error in getting copay status: {e}")
 
                 try:
-                    url = os.getenv("GET_PAYMENT_TPYE_AFFILIATE_API")
-
-                    # Define the payload
-                    data = {
-                        "iaffiliateid": str(self.affiliate_id)
-                    }
-
-                    logger.debug(f"Payload Sent for Payment Type Selection: {data}")
-
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(url, json=data) as response:
-                            # Check for a successful response
-                            if response.status == 200:
-                                # If it's not JSON, handle it as plain text
-                                response_text = await response.text()
+                    response_dict = await fetch_payment_types(self.affiliate_id)
+                    if response_dict is not None:
+                        try:
+                            paymenttype_prompt = f"""
+                            You are given a list of dictionaries enclosed in triple backticks: ```{response_dict}```
 
-                                try:
-                                    response_dict = json.loads(response_text)
-                                    paymenttype_prompt = f"""
-                                    You are given a list of dictionaries enclosed in triple backticks: ```{response_dict}```
+                            Your task is to find the dictionary whose 'PaymentType Name' value closely matches
+                             the account enclosed in double quotes: ``{payment_method}``
 
-                                    Your task is to find the dictionary whose 'PaymentType Name' value closely matches
-                                     the account enclosed in double quotes: ``{payment_method}``
+                            Return the matching dictionary in JSON format with the following fields:
 
-                                    Return the matching dictionary in JSON format with the following fields:
+                            {{
+                                "PaymentType ID": Payment Type ID Value,
+                                "PaymentType Name": "Payment Type Name",
+                                "Affiliate ID": Affiliate ID Value
+                            }}
 
-                                    {{
-                                        "PaymentType ID": Payment Type ID Value,
-                                        "PaymentType Name": "Payment Type Name",
-                                        "Affiliate ID": Affiliate ID Value
-                                    }}
+                            Instructions:
+                            1. If a match is found, return the corresponding dictionary in the specified JSON format.
+                            2. If no match is found, return the following JSON:
 
-                                    Instructions:
-                                    1. If a match is found, return the corresponding dictionary in the specified JSON format.
-                                    2. If no match is found, return the following JSON:
-                                        
-                                    {{
-                                        "PaymentType ID": 1,
-                                        "PaymentType Name": "None",
-                                        "Affiliate ID": -1
-                                    }}
+                            {{
+                                "PaymentType ID": 1,
+                                "PaymentType Name": "None",
+                                "Affiliate ID": -1
+                            }}
 
-                                    # Instructions
-                                    ## Make sure the response contains only the JSON output, with nothing else.
-                                    ## Take care of spelling mistakes by STT as well. For example 'Vomata' refers to 'WMATA'.
-                                    ## Do not add backticks or 'json'. I am parsing the response with json.loads(). Make it compatible.
-                                    """
-                                    logger.debug(f"Prompt sent for matching funding sources: {paymenttype_prompt}")
+                            # Instructions
+                            ## Make sure the response contains only the JSON output, with nothing else.
+                            ## Take care of spelling mistakes by STT as well. For example 'Vomata' refers to 'WMATA'.
+                            ## Do not add backticks or 'json'. I am parsing the response with json.loads(). Make it compatible.
+                            """
+                            logger.debug("Prompt sent for matching funding sources: %s", paymenttype_prompt)
 
-                                    paymenttype_response = await get_match_source(paymenttype_prompt)
-                                    logger.debug(f"Matching Response: {paymenttype_response}")
+                            paymenttype_response = await get_match_source(paymenttype_prompt)
+                            logger.debug("Matching Response: %s", paymenttype_response)
 
-                                    paymenttype_response = json.loads(paymenttype_response)
+                            paymenttype_response = json.loads(paymenttype_response)
 
-                                    paymenttype_id = paymenttype_response.get("PaymentType ID", None)
+                            paymenttype_id = paymenttype_response.get("PaymentType ID", None)
 
-                                except Exception as e:
-                                    logger.error(f"Failed to decode JSON from string: {e}")
+                        except Exception as e:
+                            logger.error(f"Failed to decode JSON from string: {e}")
 
                 except Exception as e:
                     logger.error(f"Error in getting payment type id: {e}")
@@ -1185,6 +1212,7 @@ class Assistant(Agent):
                 f" Require Copay Status is: {copay_status}, Program Id is {program_id}")
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_copay_ids(
         self,
         copay_account_name: Annotated[str, Field(description="Copay Account Name provided by the rider")]
@@ -1232,10 +1260,10 @@ class Assistant(Agent):
         ## Take care of spelling mistakes by STT as well. For example 'Vomata' refers to 'WMATA'.
         ## Do not add backticks or 'json'. I am parsing the response with json.loads(). Make it compatible.
         """
-        logger.debug(f"Prompt sent for matching funding sources: {prompt}")
+        logger.debug("Prompt sent for matching funding sources: %s", prompt)
 
         response = await get_match_source(prompt)
-        logger.debug(f"Matching Response: {response}")
+        logger.debug("Matching Response: %s", response)
 
         try:
             parsed_response = json.loads(response)
@@ -1256,24 +1284,8 @@ class Assistant(Agent):
         except:
             pass
 
-        url = os.getenv("GET_PAYMENT_TPYE_AFFILIATE_API")
-        payload = {
-            "iaffiliateid": str(self.affiliate_id)  # Make sure affiliate_id is sent as a string
-        }
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                # Check for a successful response
-                if response.status == 200:
-                    # If it's not JSON, handle it as plain text
-                    response_text = await response.text()
-
-                    try:
-                        # Try to convert the string to a dictionary
-                        response_dict = json.loads(response_text)
-                        logger.debug(f"Response dict: {response_dict}")
-                    except Exception as e:
-                        logger.error(f"Failed to decode JSON from string: {e}")
+        response_dict = await fetch_payment_types(self.affiliate_id)
+        logger.debug("Response dict: %s", response_dict)
 
         prompt = f"""
         You are given a list of dictionaries enclosed in triple backticks: ```{response_dict}```
@@ -1303,10 +1315,10 @@ class Assistant(Agent):
         Do not add backticks or 'json'. I am parsing the response with json.loads(). Make it compatible.
         In case of multiple matching accounts, return the first one.
         """
-        logger.debug(f"Prompt sent for matching funding sources: {prompt}")
+        logger.debug("Prompt sent for matching funding sources: %s", prompt)
 
         response = await get_match_source(prompt)
-        logger.debug(f"Matching Response: {response}")
+        logger.debug("Matching Response: %s", response)
 
         try:
             parsed_response = json.loads(response)
@@ -1325,6 +1337,7 @@ class Assistant(Agent):
             f" Copay Payment Type Id: {payment_type_id}")
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def verify_rider(
         self,
         params: Annotated[RiderVerificationParams, Field(description="Parameters for rider verification")]
@@ -1362,7 +1375,7 @@ class Assistant(Agent):
         rider_status = True
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload) as response:
                     # Check for a successful response
                     if response.status == 200:
@@ -1385,13 +1398,13 @@ class Assistant(Agent):
                     "Content-Type": "application/json"
                 }
 
-                async with aiohttp.ClientSession() as session:
+                async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                     async with session.post(get_name_url, json=payload, headers=headers) as response:
                         if response.status == 200:
                             # If it's not JSON, handle it as plain text
                             response_text = await response.text()
 
-                            logger.debug(f"Rider Name Retrieval Result: {response_text}")
+                            logger.debug("Rider Name Retrieval Result: %s", response_text)
 
                             try:
                                 # Try to convert the string to a dictionary
@@ -1418,6 +1431,7 @@ class Assistant(Agent):
                 return f"Rider is Verified! Verified Rider Name is {verified_rider_name}"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_Trip_Stats(self) -> str:
         """Function to get detailed statistics and analytics about trips:
         - Trip performance metrics
@@ -1467,20 +1481,20 @@ class Assistant(Agent):
             "Content-Type": "application/json"
         }
 
-        logger.debug(f"Payload Sent for trip stats: {payload}")
+        logger.debug("Payload Sent for trip stats: %s", payload)
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers=headers) as resp:
                     logger.debug(f"Status: {resp.status}")
-                    logger.debug(f"Headers: {resp.headers}")
+                    logger.debug("Headers: %s", resp.headers)
 
                     # Read text response and try to parse as JSON manually
                     text = await resp.text()
 
                     try:
                         data = json.loads(text)
-                        logger.debug(f"Response: {data}")
+                        logger.debug("Response: %s", data)
                         # await asyncio.sleep(2)
                         # await self.Stop_Music()
                         return json.dumps(data, indent=4)
@@ -1497,6 +1511,7 @@ class Assistant(Agent):
             return "No data found!"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_historic_rides(self) -> str:
         """Function to get COMPLETED/PAST/HISTORICAL rides and trips:
         - Previously completed trips
@@ -1549,13 +1564,13 @@ class Assistant(Agent):
         }
 
         historic_trips_data = ""
-        logger.debug(f"Payload sent to get frequent addresses: {payload}")
+        logger.debug("Payload sent to get frequent addresses: %s", payload)
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers=headers) as response:
                     response_text = await response.text()
-                    logger.debug(f"Response from FrequentDataAPI: {response_text}")
+                    logger.debug("Response from FrequentDataAPI: %s", response_text)
                     try:
                         response_json = json.loads(response_text)
                         historic_trips = json.loads(response_json["responseJSON"])  # this is the list
@@ -1586,12 +1601,13 @@ class Assistant(Agent):
 
         historic_trips_data_result = f"""Rider Historic/Past/Completed Trips are: ``{historic_trips_data}``\n
         """
-        logger.debug(f"Historic Rides: {historic_trips_data}")
+        logger.debug("Historic Rides: %s", historic_trips_data)
         # await asyncio.sleep(2)
         # await self.Stop_Music()
         return historic_trips_data_result
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_frequnt_addresses(self) -> str:
         """Function to get Rider Frequently Used Addresses
         
@@ -1639,13 +1655,13 @@ class Assistant(Agent):
         }
 
         frequent_addresses = ""
-        logger.debug(f"Payload sent to get frequent addresses: {payload}")
+        logger.debug("Payload sent to get frequent addresses: %s", payload)
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers=headers) as response:
                     response_text = await response.text()
-                    logger.debug(f"Response from FrequentDataAPI: {response_text}")
+                    logger.debug("Response from FrequentDataAPI: %s", response_text)
                     try:
                         response_json = json.loads(response_text)
                         if response_json.get("responseCode") == 200:
@@ -1676,6 +1692,7 @@ class Assistant(Agent):
         return frequent_addresses_result
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_distance_duration_fare(self,
         params: Annotated[DistanceFareParams, Field(description="Parameters for distance and fare calculation")]
     ) -> str:
@@ -1741,7 +1758,7 @@ class Assistant(Agent):
                 'AppType': 'FCSTService'
             }
 
-            logger.debug(f"Payload Sent for distance and duration retrieval: {params}")
+            logger.debug("Payload Sent for distance and duration retrieval: %s", params)
 
             # Define your Basic Authentication credentials
             auth = BasicAuth(os.getenv("GET_DIRECTION_USER"),
@@ -1756,11 +1773,11 @@ class Assistant(Agent):
             }
 
             # Make the request
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.get(url, params=params, headers=headers, auth=auth) as response:
                     if response.status == 200:
                         data = await response.json()
-                        logger.debug(f"Response for distance and duration retrieval: {data}")
+                        logger.debug("Response for distance and duration retrieval: %s", data)
                         distance = int(data["routes"][0]["legs"][0]["distance"]["value"])
                         duration = int(data["routes"][0]["legs"][0]["duration"]["value"])
                         logger.debug(f"Distance: {distance}")
@@ -1792,7 +1809,7 @@ class Assistant(Agent):
                             "httpResponseCode": 100
                         }
 
-                        logger.debug(f"Payload for fare estimation: {data}")
+                        logger.debug("Payload for fare estimation: %s", data)
 
                         # Headers to be used in the request
                         headers = {
@@ -1801,11 +1818,11 @@ class Assistant(Agent):
                         }
 
                         # Making the POST request
-                        async with aiohttp.ClientSession() as session:
+                        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                             async with session.post(url, json=data, headers=headers) as response:
                                 if response.status == 200:
                                     response_data = await response.json()
-                                    logger.debug(f"Response for fare estimation: {response_data}")
+                                    logger.debug("Response for fare estimation: %s", response_data)
                                     total_cost = response_data["totalCost"]
                                     copay_cost = response_data["copay"]
                                     logger.debug(f"Total Cost: {total_cost}")
@@ -1834,6 +1851,7 @@ class Assistant(Agent):
     #     return "Paused for a while"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_client_id(self):
         """
         Function that is used to get the client id.
@@ -1843,6 +1861,7 @@ class Assistant(Agent):
         return self.client_id
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_customer_phone_number(self):
         """
         Function that is used to get the customer phone number.
@@ -1852,6 +1871,7 @@ class Assistant(Agent):
         return self.rider_phone
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def collect_main_trip_payload(self, payload: MainTripPayload) -> str:
         """
         Function that is used to collect the payload for the main trip.
@@ -1956,7 +1976,7 @@ class Assistant(Agent):
                 'AppType': 'FCSTService'
             }
 
-            logger.debug(f"Payload Sent for distance and duration retrieval: {params}")
+            logger.debug("Payload Sent for distance and duration retrieval: %s", params)
 
             # Define your Basic Authentication credentials
             auth = BasicAuth(os.getenv("GET_DIRECTION_USER"),
@@ -1971,11 +1991,11 @@ class Assistant(Agent):
             }
 
             # Make the request
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.get(url, params=params, headers=headers, auth=auth) as response:
                     if response.status == 200:
                         data = await response.json()
-                        logger.debug(f"Response for distance and duration retrieval: {data}")
+                        logger.debug("Response for distance and duration retrieval: %s", data)
                         distance = int(data["routes"][0]["legs"][0]["distance"]["value"])
                         duration = int(data["routes"][0]["legs"][0]["duration"]["value"])
                         logger.debug(f"Distance: {distance}")
@@ -2006,7 +2026,7 @@ class Assistant(Agent):
                             "httpResponseCode": 100
                         }
 
-                        logger.debug(f"Payload for fare estimation: {data}")
+                        logger.debug("Payload for fare estimation: %s", data)
 
                         # Headers to be used in the request
                         headers = {
@@ -2015,11 +2035,11 @@ class Assistant(Agent):
                         }
 
                         # Making the POST request
-                        async with aiohttp.ClientSession() as session:
+                        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                             async with session.post(url, json=data, headers=headers) as response:
                                 if response.status == 200:
                                     response_data = await response.json()
-                                    logger.debug(f"Response for fare estimation: {response_data}")
+                                    logger.debug("Response for fare estimation: %s", response_data)
                                     total_cost = response_data["totalCost"]
                                     copay_cost = response_data["copay"]
                                     logger.debug(f"Total Cost: {total_cost}")
@@ -2051,10 +2071,8 @@ class Assistant(Agent):
 
         try:
 
-            payload_path = os.path.join(App_Directory, "trip_book_payload.json")
-            # Step 1: Read the JSON file
-            with open(payload_path, 'r') as file:
-                data = json.load(file)
+            # Step 1: Start from a fresh copy of the preloaded template
+            data = new_trip_payload()
 
             logger.debug(f"Phone number by LLM: {phone_number}")
             phone_number = await format_phone_number(phone_number)
@@ -2174,7 +2192,7 @@ class Assistant(Agent):
             # elif self.return_leg is None:
             #     self.return_leg = data
 
-            logger.debug(f"Payload collected: {data}")
+            logger.debug("Payload collected: %s", data)
 
             return f"Payload for main trip has been collected! Ask the rider if they would like to book a return trip."
 
@@ -2183,6 +2201,7 @@ class Assistant(Agent):
             return f"error: {e}"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def return_trip_started(self) -> str:
         """
         Call this function when user expresses intent to book a return trip,
@@ -2203,6 +2222,7 @@ class Assistant(Agent):
         return "Return trip process started! Transfers enabled for user assistance during information collection."
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def collect_return_trip_payload(self, payload: ReturnTripPayload) -> str:
         """
         Function that is used to collect return trip payload.
@@ -2299,7 +2319,7 @@ class Assistant(Agent):
                 'AppType': 'FCSTService'
             }
 
-            logger.debug(f"Payload Sent for distance and duration retrieval: {params}")
+            logger.debug("Payload Sent for distance and duration retrieval: %s", params)
 
             # Define your Basic Authentication credentials
             auth = BasicAuth(os.getenv("GET_DIRECTION_USER"),
@@ -2314,11 +2334,11 @@ class Assistant(Agent):
             }
 
             # Make the request
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.get(url, params=params, headers=headers, auth=auth) as response:
                     if response.status == 200:
                         data = await response.json()
-                        logger.debug(f"Response for distance and duration retrieval: {data}")
+                        logger.debug("Response for distance and duration retrieval: %s", data)
                         distance = int(data["routes"][0]["legs"][0]["distance"]["value"])
                         duration = int(data["routes"][0]["legs"][0]["duration"]["value"])
                         logger.debug(f"Distance: {distance}")
@@ -2349,7 +2369,7 @@ class Assistant(Agent):
                             "httpResponseCode": 100
                         }
 
-                        logger.debug(f"Payload for fare estimation: {data}")
+                        logger.debug("Payload for fare estimation: %s", data)
 
                         # Headers to be used in the request
                         headers = {
@@ -2358,11 +2378,11 @@ class Assistant(Agent):
                         }
 
                         # Making the POST request
-                        async with aiohttp.ClientSession() as session:
+                        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                             async with session.post(url, json=data, headers=headers) as response:
                                 if response.status == 200:
                                     response_data = await response.json()
-                                    logger.debug(f"Response for fare estimation: {response_data}")
+                                    logger.debug("Response for fare estimation: %s", response_data)
                                     total_cost = response_data["totalCost"]
                                     copay_cost = response_data["copay"]
                                     logger.debug(f"Total Cost: {total_cost}")
@@ -2394,10 +2414,8 @@ class Assistant(Agent):
 
         try:
 
-            payload_path = os.path.join(App_Directory, "trip_book_payload.json")
-            # Step 1: Read the JSON file
-            with open(payload_path, 'r') as file:
-                data = json.load(file)
+            # Step 1: Start from a fresh copy of the preloaded template
+            data = new_trip_payload()
 
             logger.debug(f"Phone number by LLM: {phone_number}")
             phone_number = await format_phone_number(phone_number)
@@ -2517,8 +2535,8 @@ class Assistant(Agent):
             # if self.return_leg is None:
             self.return_leg = data
 
-            logger.debug(f"Return trip Payload collected: {data}")
-            logger.debug(f"return trip payload: {data}")
+            logger.debug("Return trip Payload collected: %s", data)
+            logger.debug("return trip payload: %s", data)
 
             return f"Payload for return trip has been collected!"
 
@@ -2527,6 +2545,7 @@ class Assistant(Agent):
             return f"error: {e}"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def book_trips(self) -> str:
         """
         The function books the trip(s) by calling the booking APIs that use the agent's main_leg and return_leg parameters.
@@ -2589,13 +2608,12 @@ class Assistant(Agent):
             url = os.getenv("TRIP_BOOKING_API")
 
             # Properly log the payload
-            logger.debug(f"Payload Sent for booking: {payload}")
+            logger.debug("Payload Sent for booking: %s", payload)
             payload_call_id = self.call_sid
-            with open(f"logs/trip_book_payload/final_payload_{payload_call_id}.txt","w") as f:
-                f.write(json.dumps(payload, indent=4))
+            write_artifact(TRIP_PAYLOAD_ARTIFACT, f"final_payload_{payload_call_id}.txt", json.dumps(payload, indent=4))
 
             # Step 3: Send the data to the API with proper error handling
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=payload, headers={"Content-Type": "application/json"}) as response:
                     # Check if response status is OK before trying to parse JSON
                     if response.status != 200:
@@ -2658,7 +2676,7 @@ class Assistant(Agent):
                                 - Practical advice based on the weather conditions
                                 - Keep response to exactly two lines
                                 """
-                            weather = await search_web_manual(prompt)
+                            weather = await search_web_manual(prompt) or "not available at this time"
                             logger.debug(f"Weather: {weather}")
 
                             try:
@@ -2681,6 +2699,8 @@ class Assistant(Agent):
                             booking_type = "return_trip_only"
                         
                         logger.info(f"Booking completed for: {booking_type}")
+                        # The cached trip list lacks the new trips; the next call fetches fresh profiles
+                        self._invalidate_client_cache()
                         
                         self.main_leg = None
                         self.return_leg = None
@@ -2735,6 +2755,7 @@ class Assistant(Agent):
             return f"error in booking:{e}"
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def asterisk_call_disconnect(
         self,
         participant_identity: Annotated[str | None, Field(description="Participant identity to disconnect")] = None,
@@ -2748,31 +2769,14 @@ class Assistant(Agent):
         Returns:
             None
         """
-        try:
-            logger.info("Asterisk call disconnect function called...")
-            async with api.LiveKitAPI() as livekit_api:
-                asterisk_ip = os.getenv("ASTERISK_SERVER_IP")
-                transfer_to = f"sip:6000@{str(asterisk_ip)}"
-                # transfer_to = "sip:6000@139.64.158.216"
-                participant_identity = list(self.room.remote_participants.values())[0].identity
-                logger.info(f"participant: {participant_identity}")
-                # Create transfer request
-                transfer_request = TransferSIPParticipantRequest(
-                    participant_identity=participant_identity,
-                    room_name=self.room.name,
-                    transfer_to=transfer_to,
-                    play_dialtone=False,
-                    # wait_until_answered=True,
-                )
-                logger.debug(f"Transfer request: {transfer_request}")
-
-                # Transfer caller
-                await livekit_api.sip.transfer_sip_participant(transfer_request)
-
-                
-                logger.info(f"Call disconnected ...")
-        except Exception as e:
-            logger.info(e)
+        logger.info("Asterisk call disconnect function called...")
+        result = await get_transfer_engine().transfer(
+            room=self.room,
+            transfer_to=asterisk_target(DISCONNECT_EXTENSION),
+            call_sid=self.call_sid,
+        )
+        if result.success:
+            logger.info(f"Call disconnected ...")
 
     # @function_tool()
     # async def send_dtmf_code(self, code: int, context: RunContext):
@@ -2780,6 +2784,7 @@ class Assistant(Agent):
     #     await room.local_participant.publish_dtmf(code=code, digit=str(code))
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def transfer_call(self) -> str:
         """
         Function to transfer the call to a live agent using LiveKit and Asterisk SIP transfer.
@@ -2789,183 +2794,138 @@ class Assistant(Agent):
             str: Success message or error message if transfer fails.
         """
         logger.info("transfer_call_voice function called...")
-        
-        # Step 0: Context generation is now handled cleanly by InitAssistant
         logger.info(f"🔍 Starting transfer for call {self.call_sid}")
-        logger.info(f"   - InitAssistant will handle conversation context generation")
         logger.info(f"   - Active conversations: {InitAssistant.get_active_calls()}")
+
+        # The SIP transfer is issued right away; the context payload is built and
+        # sent to the transfer API concurrently and retried in the background
+        result = await get_transfer_engine().transfer(
+            room=self.room,
+            transfer_to=asterisk_target(DISPATCHER_EXTENSION),
+            build_context=self._build_transfer_payload,
+            send_context=self._send_context_to_transfer_api,
+            call_sid=self.call_sid,
+        )
+
+        if result.success:
+            return "Call successfully transferred to human agent"
+        return "Issue with call transfer"
+
+    async def _build_transfer_payload(self) -> dict:
+        """
+        Build the payload for the transfer API: the booking payload collected so far
+        (or the default payload for the current rider) with the conversation context.
         
-        # Step 1: Send complete booking payload with context to transfer API if available
-        try:
-            context_data = self.get_conversation_context()
-            logger.info(f"🔍 Transfer context debug:")
-            logger.info(f"   - context_data type: {type(context_data)}")
-            logger.info(f"   - context_data keys: {list(context_data.keys()) if context_data else 'None'}")
-            logger.info(f"   - context_data has values: {any(context_data.values()) if context_data else False}")
-            
-            # Prepare the complete booking payload (same as book_trips function)
-            complete_transfer_payload = None
-            
-            # Check for main_leg and return_leg separately
-            main_leg = getattr(self, 'main_leg', None)
-            return_leg = getattr(self, 'return_leg', None)
-            
-            logger.debug(f"Checking for booking payload:")
-            logger.debug(f"  main_leg exists: {main_leg is not None}")
-            logger.debug(f"  return_leg exists: {return_leg is not None}")
-            
-            if return_leg and main_leg:
-                complete_transfer_payload = await combine_payload(main_leg, return_leg)
-                logger.debug("  Using combined payload (main + return)")
-            elif main_leg:
-                complete_transfer_payload = main_leg
-                logger.debug("  Using main_leg payload")
-            elif return_leg:
-                complete_transfer_payload = return_leg
-                logger.debug("  Using return_leg payload")
-            
-            # Log transfer condition check
-            logger.info(f"Transfer payload check: complete_payload={complete_transfer_payload is not None}, context_data={context_data is not None}, main_leg={main_leg is not None}, return_leg={return_leg is not None}")
+        Returns:
+            dict: Transfer payload
+        """
+        # Context generation calls OpenAI synchronously; keep it off the event loop
+        context_data = await asyncio.to_thread(self.get_conversation_context)
+        logger.info(f"🔍 Transfer context debug:")
+        logger.info(f"   - context_data type: {type(context_data)}")
+        logger.info(f"   - context_data keys: {list(context_data.keys()) if context_data else 'None'}")
+        logger.info(f"   - context_data has values: {any(context_data.values()) if context_data else False}")
+        
+        # Prepare the complete booking payload (same as book_trips function)
+        complete_transfer_payload = None
+        
+        # Check for main_leg and return_leg separately
+        main_leg = getattr(self, 'main_leg', None)
+        return_leg = getattr(self, 'return_leg', None)
+        
+        logger.debug(f"Checking for booking payload:")
+        logger.debug(f"  main_leg exists: {main_leg is not None}")
+        logger.debug(f"  return_leg exists: {return_leg is not None}")
+        
+        if return_leg and main_leg:
+            complete_transfer_payload = await combine_payload(main_leg, return_leg)
+            logger.debug("  Using combined payload (main + return)")
+        elif main_leg:
+            complete_transfer_payload = main_leg
+            logger.debug("  Using main_leg payload")
+        elif return_leg:
+            complete_transfer_payload = return_leg
+            logger.debug("  Using return_leg payload")
+        
+        # Log transfer condition check
+        logger.info(f"Transfer payload check: complete_payload={complete_transfer_payload is not None}, context_data={context_data is not None}, main_leg={main_leg is not None}, return_leg={return_leg is not None}")
+        
+        # Always try to add context information if we have context data
+        if complete_transfer_payload and context_data and any(context_data.values()):
+            logger.info("✅ Adding context information to existing booking payload")
+            # Add context information to the complete booking payload
+            for trip in complete_transfer_payload.get('addressInfo', {}).get('Trips', []):
+                for detail in trip.get('Details', []):
+                    if 'tripInfo' in detail:
+                        # Add context parameters to tripInfo (TRANSFER SCENARIOS ONLY)
+                        detail['tripInfo']['ContextCallTitle'] = context_data.get('ContextCallTitle', '')
+                        detail['tripInfo']['ContextCallSummary'] = context_data.get('ContextCallSummary', '')
+                        detail['tripInfo']['ContextCallDetail'] = context_data.get('ContextCallDetailJson', '')
+                        # detail['tripInfo']['ContextCallDetailHtml'] = context_data.get('ContextCallDetailHtml', '')
+                        logger.debug(f"Added context to {detail.get('StopType', 'unknown')} tripInfo in existing payload")
             
-            # Always try to add context information if we have context data
-            if complete_transfer_payload and context_data and any(context_data.values()):
-                logger.info("✅ Adding context information to existing booking payload")
-                # Add context information to the complete booking payload
-                for trip in complete_transfer_payload.get('addressInfo', {}).get('Trips', []):
-                    for detail in trip.get('Details', []):
-                        if 'tripInfo' in detail:
-                            # Add context parameters to tripInfo (TRANSFER SCENARIOS ONLY)
-                            detail['tripInfo']['ContextCallTitle'] = context_data.get('ContextCallTitle', '')
-                            detail['tripInfo']['ContextCallSummary'] = context_data.get('ContextCallSummary', '')
-                            detail['tripInfo']['ContextCallDetail'] = context_data.get('ContextCallDetailJson', '')
-                            # detail['tripInfo']['ContextCallDetailHtml'] = context_data.get('ContextCallDetailHtml', '')
-                            logger.debug(f"Added context to {detail.get('StopType', 'unknown')} tripInfo in existing payload")
+            # Log the complete transfer payload
+            logger.debug("Complete transfer payload with context: %s", complete_transfer_payload)
+        
+        # If no complete payload exists, load default and add context
+        if not complete_transfer_payload:
+            # Build the default payload from the preloaded template for the current rider
+            logger.info("Building default transfer payload from the preloaded template")
+            try:
+                rider_name = getattr(self, 'rider_name', '') or getattr(self, 'pickup_person', '') or "Customer"
+                default_payload = build_default_transfer_payload(
+                    rider_phone=getattr(self, 'rider_phone', None),
+                    client_id=getattr(self, 'client_id', None),
+                    rider_name=rider_name,
+                )
                 
-                # Log the complete transfer payload
-                logger.debug(f"Complete transfer payload with context: {complete_transfer_payload}")
-            
-            # If no complete payload exists, load default and add context
-            if not complete_transfer_payload:
-                # Load default payload from JSON file and update with current rider info
-                logger.info("Loading default payload from trip_book_payload.json and updating with current rider info")
-                try:
-                    # Load the default payload
-                    with open("/home/devlab/ivr-directory/temp/trip_book_payload.json", "r") as f:
-                        default_payload = json.load(f)
-                    
-                    # Update rider information with current values
-                    if hasattr(self, 'rider_phone') and self.rider_phone:
-                        default_payload['riderInfo']['PhoneNo'] = self.rider_phone
-                    
-                    if hasattr(self, 'client_id') and self.client_id:
-                        if self.client_id == "None":
-                            default_payload['riderInfo']['ID'] = "-1"
-                        else:
-                            default_payload['riderInfo']['ID'] = self.client_id
-                    
-                    # Update rider name in pickup person and dropoff name if available
-                    rider_name = getattr(self, 'rider_name', '') or getattr(self, 'pickup_person', '') or "Customer"
-                    default_payload['riderInfo']['PickupPerson'] = rider_name
-                    
-                    # Update names in trip details
+                # Add context information if available (TRANSFER ONLY)
+                logger.info(f"🔍 Transfer context check for default payload:")
+                logger.info(f"   - context_data exists: {context_data is not None}")
+                logger.info(f"   - context_data type: {type(context_data)}")
+                logger.info(f"   - context_data keys: {list(context_data.keys()) if context_data else 'None'}")
+                logger.info(f"   - context_data has values: {any(context_data.values()) if context_data else False}")
+                
+                if context_data and any(context_data.values()):
+                    logger.info("✅ Adding context information to default transfer payload")
+                    trips_updated = 0
                     for trip in default_payload.get('addressInfo', {}).get('Trips', []):
                         for detail in trip.get('Details', []):
-                            if detail.get('StopType') == 'pickup':
-                                detail['Name'] = rider_name
-                            elif detail.get('StopType') == 'dropoff':
-                                detail['Name'] = rider_name
-                    
-                    # Add context information if available (TRANSFER ONLY)
-                    logger.info(f"🔍 Transfer context check for default payload:")
-                    logger.info(f"   - context_data exists: {context_data is not None}")
-                    logger.info(f"   - context_data type: {type(context_data)}")
-                    logger.info(f"   - context_data keys: {list(context_data.keys()) if context_data else 'None'}")
-                    logger.info(f"   - context_data has values: {any(context_data.values()) if context_data else False}")
-                    
-                    if context_data and any(context_data.values()):
-                        logger.info("✅ Adding context information to default transfer payload")
-                        trips_updated = 0
-                        for trip in default_payload.get('addressInfo', {}).get('Trips', []):
-                            for detail in trip.get('Details', []):
-                                if 'tripInfo' in detail:
-                                    # Add context parameters to tripInfo (TRANSFER SCENARIOS ONLY)
-                                    detail['tripInfo']['ContextCallTitle'] = context_data.get('ContextCallTitle', '')
-                                    detail['tripInfo']['ContextCallSummary'] = context_data.get('ContextCallSummary', '')
-                                    detail['tripInfo']['ContextCallDetail'] = context_data.get('ContextCallDetailJson', '')
-                                    # detail['tripInfo']['ContextCallDetailHtml'] = context_data.get('ContextCallDetailHtml', '')
-                                    trips_updated += 1
-                                    logger.info(f"   ✅ Added context to {detail.get('StopType', 'unknown')} tripInfo")
-                        logger.info(f"✅ Successfully added context to {trips_updated} trip details")
+                            if 'tripInfo' in detail:
+                                # Add context parameters to tripInfo (TRANSFER SCENARIOS ONLY)
+                                detail['tripInfo']['ContextCallTitle'] = context_data.get('ContextCallTitle', '')
+                                detail['tripInfo']['ContextCallSummary'] = context_data.get('ContextCallSummary', '')
+                                detail['tripInfo']['ContextCallDetail'] = context_data.get('ContextCallDetailJson', '')
+                                # detail['tripInfo']['ContextCallDetailHtml'] = context_data.get('ContextCallDetailHtml', '')
+                                trips_updated += 1
+                                logger.info(f"   ✅ Added context to {detail.get('StopType', 'unknown')} tripInfo")
+                    logger.info(f"✅ Successfully added context to {trips_updated} trip details")
+                else:
+                    logger.warning("❌ No context data available for default transfer payload")
+                    if context_data:
+                        logger.warning(f"   - Context data exists but all values are empty: {context_data}")
                     else:
-                        logger.warning("❌ No context data available for default transfer payload")
-                        if context_data:
-                            logger.warning(f"   - Context data exists but all values are empty: {context_data}")
-                        else:
-                            logger.warning("   - Context data is None or empty")
-                    
-                    # Log the updated default payload
-                    complete_transfer_payload = default_payload
-                    logger.debug(f"Updated transfer payload: {complete_transfer_payload}")
-                except Exception as e:
-                    logger.error(f"Error loading or updating default payload: {e}")
-                    logger.info("No complete booking payload or conversation context available for transfer")
-            
-            payload_call_id = self.call_sid
-            try:
-                # Create directory if it doesn't exist
-                os.makedirs("logs/context_transfer_payload", exist_ok=True)
+                        logger.warning("   - Context data is None or empty")
                 
-                # Store the updated payload
-                with open(f"logs/context_transfer_payload/context_transfer_{payload_call_id}.txt", "w") as f:
-                    f.write(json.dumps(complete_transfer_payload, indent=4))
-                logger.info(f"📄 Updated transfer payload saved to logs/context_transfer_payload/context_transfer_{payload_call_id}.txt")
+                # Log the updated default payload
+                complete_transfer_payload = default_payload
+                logger.debug("Updated transfer payload: %s", complete_transfer_payload)
             except Exception as e:
-                logger.warning(f"Warning: Could not save updated transfer payload to file: {e}")
-            
-            # Send updated payload to transfer API (clean approach)
-            context_sent = await self._send_context_to_transfer_api(complete_transfer_payload)
-            if context_sent:
-                logger.info("✅ Updated booking payload with context sent to transfer API successfully")
-            else:
-                logger.warning("⚠️ Failed to send updated booking payload to transfer API")
-
-        except Exception as e:
-            logger.error(f"⚠️ Error sending context to transfer API: {e}")
-            # Continue with transfer even if context sending fails
+                logger.error(f"Error loading or updating default payload: {e}")
+                logger.info("No complete booking payload or conversation context available for transfer")
         
-        # Step 2: Perform the actual SIP transfer
+        payload_call_id = self.call_sid
         try:
-            async with api.LiveKitAPI() as livekit_api:
-                asterisk_ip = os.getenv("ASTERISK_SERVER_IP")
-                transfer_to = f"sip:5000@{str(asterisk_ip)}"
-                logger.info(f"transfer sip: {transfer_to}")
-                # transfer_to = "sip:5000@139.64.158.216"
-                participant_identity = list(self.room.remote_participants.values())[0].identity
-                logger.info(f"participant_identity: {participant_identity}")
-                # Create transfer request
-                transfer_request = TransferSIPParticipantRequest(
-                    participant_identity=participant_identity,
-                    room_name=self.room.name,
-                    transfer_to=transfer_to,
-                    play_dialtone=False,
-                    # wait_until_answered=True,
-                )
-                logger.debug(f"Transfer request: {transfer_request}")
-
-                # Transfer caller
-                await livekit_api.sip.transfer_sip_participant(transfer_request)
-                logger.info(f"Successfully transferred participant {participant_identity} to {transfer_to}")
-                
-                # Clean up conversation tracker after successful transfer
-                self.cleanup_conversation()
-                
-                return "Call successfully transferred to human agent"
-                
+            # Store the updated payload
+            write_artifact(TRANSFER_PAYLOAD_ARTIFACT, f"context_transfer_{payload_call_id}.txt", json.dumps(complete_transfer_payload, indent=4))
+            logger.info(f"📄 Updated transfer payload queued for logs/context_transfer_payload/context_transfer_{payload_call_id}.txt")
         except Exception as e:
-            logger.error(f"Error during SIP transfer: {e}")
-            return "Issue with call transfer"
+            logger.warning(f"Warning: Could not save updated transfer payload to file: {e}")
+        
+        return complete_transfer_payload
 
     @function_tool()
+    @traced(TOOL_SPAN)
     async def get_current_date_and_time(self) -> str:
         """
         Get the current date and time for immediate ride booking.
@@ -1,53 +1,216 @@
 """
 Centralized logging configuration for IVR Directory Bot.
 Provides per-call logging with unique session IDs and structured logging.
+
+Records are handed to a listener thread through a bounded queue
+(LOG_ASYNC=true), so file and console writes never run on the event loop.
+The calling thread only tags the record with its call context and resolves
+the message once (truncated to LOG_MAX_MESSAGE_CHARS) instead of once per
+handler. The per-logger rate limit applies to the shared outputs (ivr-bot.log
+and the console); per-call files keep every record. Pass large structures as
+%-style arguments so they are not formatted at all when their level is
+disabled (LOG_LEVEL=INFO).
+
+Job processes end with os._exit, so atexit never runs there; call
+flush_logs() at the end of a call.
 """
 
+import atexit
+import copy
 import logging
 import os
+import queue
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Optional
-import threading
+from typing import Any, Dict, Optional
 from timezone_utils import now_eastern, format_file_timestamp
+from call_context import ensure_call_context, get_call_value
+from structured_logs import LOG_CALL_JSONL, JsonlCallLogHandler
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Seconds a control marker (call file cleanup) waits for room in a full queue
+LOG_CONTROL_TIMEOUT = float(os.getenv("LOG_CONTROL_TIMEOUT", "2"))
+# Messages longer than this are truncated; 0 disables truncation
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4000"))
+# Records per second each logger may emit below WARNING; 0 disables the limit
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "200"))
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "400"))
+# Per-call log files kept open at once, and seconds before an idle one is closed
+LOG_CALL_MAX_OPEN_FILES = int(os.getenv("LOG_CALL_MAX_OPEN_FILES", "128"))
+LOG_CALL_IDLE_TIMEOUT = float(os.getenv("LOG_CALL_IDLE_TIMEOUT", "300"))
+# Size at which ivr-bot.log / ivr-bot-error.log roll over, and rolled files kept
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(100 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+
+def truncate_message(message: str, limit: int = LOG_MAX_MESSAGE_CHARS) -> str:
+    """Cut a log message to `limit` characters, noting how much was dropped."""
+    if limit <= 0 or len(message) <= limit:
+        return message
+    return f"{message[:limit]}... [truncated {len(message) - limit} chars]"
+
 
-# Thread-local storage for session context
-_local = threading.local()
+def resolve_message(record: logging.LogRecord) -> str:
+    """The record's message, truncated to LOG_MAX_MESSAGE_CHARS."""
+    message = truncate_message(record.getMessage())
+    return message
+
+
+def with_suppressed_note(message: str, record: logging.LogRecord) -> str:
+    """Append the count of records RateLimitFilter dropped before this one, if any."""
+    suppressed = getattr(record, 'suppressed', 0)
+    if suppressed:
+        message += f" [{suppressed} earlier message(s) from this logger suppressed]"
+    return message
 
 class SessionContextFilter(logging.Filter):
     """Filter to add session context to log records."""
     
     def filter(self, record):
-        # Add session_id to the log record if available
-        session_id = getattr(_local, 'session_id', 'no-session')
-        record.session_id = session_id
-        
-        # Add call_sid to the log record if available
-        call_sid = getattr(_local, 'call_sid', None)
-        record.call_sid = call_sid
-        
-        # Add x_call_id to the log record if available
-        x_call_id = getattr(_local, 'x_call_id', None)
-        record.x_call_id = x_call_id
-        
-        # Add transfer_status to the log record if available
-        transfer_status = getattr(_local, 'transfer_status', None)
-        record.transfer_status = transfer_status
+        # Context of the call the logging task belongs to (see call_context)
+        record.session_id = get_call_value('session_id', 'no-session')
+        record.call_sid = get_call_value('call_sid')
+        record.x_call_id = get_call_value('x_call_id')
+        record.transfer_status = get_call_value('transfer_status')
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-logger token bucket for records below WARNING. Records over the limit
+    are dropped; the next record let through notes how many were suppressed.
+
+    Attached to the shared outputs only (ivr-bot.log and the console), so the
+    per-call files keep every record. The verdict is stored on the record, so
+    each record takes one token however many handlers carry the filter.
+    """
+
+    def __init__(self, rate: float = LOG_RATE_LIMIT, burst: int = LOG_RATE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.suppressed = 0
+        self._buckets: Dict[str, list] = {}  # logger name -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        verdict = getattr(record, 'rate_limit_passed', None)
+        if verdict is not None:
+            return verdict
+        record.rate_limit_passed = self._take(record)
+        return record.rate_limit_passed
+
+    def _take(self, record) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now, 0]
+            tokens = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] = tokens - 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
         return True
 
+class _CallCleanup:
+    """Queue marker: close a call's log file once its earlier records are written."""
+
+    def __init__(self, call_sid):
+        self.call_sid = call_sid
+
+class _Flush:
+    """Queue marker: signals once every record queued before it is written."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+class LogQueueHandler(QueueHandler):
+    """QueueHandler that resolves messages cheaply and never blocks the caller."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Snapshot the message now so later changes to its arguments don't show;
+        # exc_info is kept and formatted by the listener thread
+        record = copy.copy(record)
+        record.msg = resolve_message(record)
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogListener(QueueListener):
+    """Listener thread writing queued records to the real handlers."""
+
+    def __init__(self, log_queue, call_handler, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.call_handler = call_handler
+
+    def handle(self, record):
+        if isinstance(record, _CallCleanup):
+            self.call_handler.cleanup_call(record.call_sid)
+            self.flush_handlers()
+        elif isinstance(record, _Flush):
+            self.flush_handlers()
+            record.done.set()
+        else:
+            super().handle(record)
+
+    def flush_handlers(self):
+        for handler in self.handlers:
+            handler.flush()
+
 class CallSpecificHandler(logging.Handler):
-    """Handler that automatically routes logs to call-specific files based on call_sid in log records."""
+    """
+    Handler that automatically routes logs to call-specific files based on call_sid in log records.
+
+    At most `max_open` call files are open at once: the least recently used is
+    closed when another call needs a handle, and handles idle for
+    `idle_timeout` seconds are closed (calls that crash before cleanup no
+    longer leak descriptors). A call whose handle was closed gets its file
+    reopened in append mode on its next record.
+    """
     
-    def __init__(self, logs_dir):
+    def __init__(self, logs_dir, max_open: int = LOG_CALL_MAX_OPEN_FILES, idle_timeout: float = LOG_CALL_IDLE_TIMEOUT):
         super().__init__()
         self.logs_dir = Path(logs_dir)
         self.calls_dir = self.logs_dir / "calls"
         self.calls_dir.mkdir(parents=True, exist_ok=True)  # Ensure calls directory exists
-        self.call_handlers = {}
+        self.max_open = max(1, max_open)
+        self.idle_timeout = idle_timeout
+        # Open handles, least recently used first
+        self.call_handlers: "OrderedDict[str, logging.FileHandler]" = OrderedDict()
+        self.call_files: Dict[str, Path] = {}
         self.call_start_times = {}
+        self.call_last_used: Dict[str, float] = {}
+        self._last_sweep = time.monotonic()
         self.setLevel(logging.DEBUG)
         
+        # Statistics
+        self.reopened = 0
+        self.evicted = 0
+        self.idle_closed = 0
+        
         # Create formatter for call logs
         formatter = logging.Formatter(
             '%(asctime)s - %(levelname)s - %(message)s',
@@ -55,6 +218,39 @@ class CallSpecificHandler(logging.Handler):
         )
         self.setFormatter(formatter)
     
+    def _open_handler(self, call_sid: str, mode: str) -> logging.FileHandler:
+        """Open the call's file, closing the least recently used handles over the limit."""
+        while len(self.call_handlers) >= self.max_open:
+            _, oldest = self.call_handlers.popitem(last=False)
+            self._close_handler(oldest)
+            self.evicted += 1
+        handler = logging.FileHandler(self.call_files[call_sid], mode=mode)
+        handler.setLevel(logging.DEBUG)
+        handler.setFormatter(self.formatter)
+        self.call_handlers[call_sid] = handler
+        return handler
+    
+    @staticmethod
+    def _close_handler(handler: logging.FileHandler):
+        handler.flush()
+        handler.close()
+    
+    def _sweep_idle(self, now: float):
+        """Close handles idle longer than idle_timeout and forget calls idle ten times as long."""
+        if self.idle_timeout <= 0 or now - self._last_sweep < min(self.idle_timeout, 60):
+            return
+        self._last_sweep = now
+        for call_sid, last_used in list(self.call_last_used.items()):
+            idle = now - last_used
+            if idle >= self.idle_timeout and call_sid in self.call_handlers:
+                self._close_handler(self.call_handlers.pop(call_sid))
+                self.idle_closed += 1
+            if idle >= self.idle_timeout * 10:
+                # Never cleaned up; a late record starts a new file
+                self.call_files.pop(call_sid, None)
+                self.call_start_times.pop(call_sid, None)
+                del self.call_last_used[call_sid]
+    
     def emit(self, record):
         """Emit a record to the appropriate call-specific file based on call_sid."""
         # Get call_sid from the record
@@ -63,24 +259,30 @@ class CallSpecificHandler(logging.Handler):
         # Only create call-specific logs if call_sid is present
         if call_sid is None:
             return
+        
+        now = time.monotonic()
+        self._sweep_idle(now)
+        self.call_last_used[call_sid] = now
             
-        # Create or get handler for this call
-        if call_sid not in self.call_handlers:
+        handler = self.call_handlers.get(call_sid)
+        if handler is not None:
+            self.call_handlers.move_to_end(call_sid)
+        elif call_sid in self.call_files:
+            # Closed for idleness or to make room: continue the same file
+            handler = self._open_handler(call_sid, mode='a')
+            self.reopened += 1
+        else:
             timestamp = format_file_timestamp()
             
             # Try to get X-Call-ID for better file naming
             x_call_id = getattr(record, 'x_call_id', None)
             if x_call_id:
                 # Include both call_sid and x_call_id in filename
-                call_log_file = self.calls_dir / f'call_{call_sid}_{x_call_id}_{timestamp}.log'
+                self.call_files[call_sid] = self.calls_dir / f'call_{call_sid}_{x_call_id}_{timestamp}.log'
             else:
-                call_log_file = self.calls_dir / f'call_{call_sid}_{timestamp}.log'
-            
-            handler = logging.FileHandler(call_log_file, mode='w')
-            handler.setLevel(logging.DEBUG)
-            handler.setFormatter(self.formatter)
+                self.call_files[call_sid] = self.calls_dir / f'call_{call_sid}_{timestamp}.log'
             
-            self.call_handlers[call_sid] = handler
+            handler = self._open_handler(call_sid, mode='w')
             self.call_start_times[call_sid] = now_eastern()
             
             # Log call start
@@ -109,12 +311,17 @@ class CallSpecificHandler(logging.Handler):
                 handler.emit(xcall_record)
         
         # Emit the record to the call-specific handler
-        self.call_handlers[call_sid].emit(record)
+        handler.emit(record)
     
     def cleanup_call(self, call_sid):
         """Clean up handler for a specific call."""
-        if call_sid in self.call_handlers:
-            handler = self.call_handlers[call_sid]
+        with self.lock:
+            if call_sid not in self.call_files:
+                return
+            handler = self.call_handlers.pop(call_sid, None)
+            if handler is None:
+                handler = logging.FileHandler(self.call_files[call_sid], mode='a')
+                handler.setFormatter(self.formatter)
             
             # Calculate call duration
             start_time = self.call_start_times.get(call_sid, now_eastern())
@@ -132,25 +339,51 @@ class CallSpecificHandler(logging.Handler):
             )
             handler.emit(end_record)
             
-            handler.close()
-            del self.call_handlers[call_sid]
-            if call_sid in self.call_start_times:
-                del self.call_start_times[call_sid]
+            self._close_handler(handler)
+            del self.call_files[call_sid]
+            self.call_start_times.pop(call_sid, None)
+            self.call_last_used.pop(call_sid, None)
+    
+    def close(self):
+        """Flush and close every open call file."""
+        with self.lock:
+            while self.call_handlers:
+                _, handler = self.call_handlers.popitem(last=False)
+                self._close_handler(handler)
+        super().close()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Gauges and counters of per-call file handles."""
+        return {
+            "open_handles": len(self.call_handlers),
+            "max_open_handles": self.max_open,
+            "active_calls": len(self.call_files),
+            "reopened": self.reopened,
+            "evicted": self.evicted,
+            "idle_closed": self.idle_closed,
+        }
 
 class IVRLogger:
     """Centralized logger for IVR Directory Bot with per-call logging support."""
     
-    def __init__(self):
-        self.logs_dir = Path("logs")
+    def __init__(self, logs_dir: str = "logs", async_logging: bool = LOG_ASYNC, level: str = LOG_LEVEL,
+                 structured_call_logs: bool = LOG_CALL_JSONL):
+        self.logs_dir = Path(logs_dir)
         self.logs_dir.mkdir(exist_ok=True)
         self._loggers = {}
+        self.async_logging = async_logging
+        self.level = level
+        self.structured_call_logs = structured_call_logs
+        self.jsonl_handler: Optional[JsonlCallLogHandler] = None
+        self.queue_handler: Optional[LogQueueHandler] = None
+        self.listener: Optional[LogListener] = None
         self._setup_main_logger()
     
     def _setup_main_logger(self):
         """Set up the main application logger."""
         # Create main logger
         self.main_logger = logging.getLogger('ivr_bot')
-        self.main_logger.setLevel(logging.DEBUG)
+        self.main_logger.setLevel(self.level)
         
         # Clear any existing handlers
         self.main_logger.handlers.clear()
@@ -169,31 +402,38 @@ class IVRLogger:
             else:
                 transfer_part = ""
             
-            return f"{record.asctime} - {record.name} - {record.levelname} - [{record.session_id}]{call_sid_part}{x_call_id_part}{transfer_part} - {record.getMessage()}"
+            return f"{record.asctime} - {record.name} - {record.levelname} - [{record.session_id}]{call_sid_part}{x_call_id_part}{transfer_part} - {with_suppressed_note(record.getMessage(), record)}"
         
         class CustomFormatter(logging.Formatter):
             def format(self, record):
                 record.asctime = self.formatTime(record, self.datefmt)
                 return format_with_context(record)
         
+        class SharedFormatter(logging.Formatter):
+            def formatMessage(self, record):
+                return with_suppressed_note(super().formatMessage(record), record)
+        
         formatter = CustomFormatter(datefmt='%Y-%m-%d %H:%M:%S')
         
         # Create simple formatter without session_id for main logs
-        simple_formatter = logging.Formatter(
+        simple_formatter = SharedFormatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
         # Add session context filter
         session_filter = SessionContextFilter()
+        self.rate_limit_filter = RateLimitFilter()
         
         # Main log file handler (without session filter to capture all logs)
-        main_handler = logging.FileHandler(self.logs_dir / 'ivr-bot.log', mode='a')
+        main_handler = RotatingFileHandler(self.logs_dir / 'ivr-bot.log', mode='a',
+                                           maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS)
         main_handler.setLevel(logging.DEBUG)
         main_handler.setFormatter(simple_formatter)
         
         # Error log file handler (without session filter to capture all errors)
-        error_handler = logging.FileHandler(self.logs_dir / 'ivr-bot-error.log', mode='a')
+        error_handler = RotatingFileHandler(self.logs_dir / 'ivr-bot-error.log', mode='a',
+                                            maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS)
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(simple_formatter)
         
@@ -201,17 +441,34 @@ class IVRLogger:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(formatter)
-        console_handler.addFilter(session_filter)
         
         # Call-specific handler
         self.call_handler = CallSpecificHandler(self.logs_dir)
-        self.call_handler.addFilter(session_filter)  # Add session filter to get call_sid
         
-        # Add handlers to logger
-        self.main_logger.addHandler(main_handler)
-        self.main_logger.addHandler(error_handler)
-        self.main_logger.addHandler(console_handler)
-        self.main_logger.addHandler(self.call_handler)
+        self.handlers = [main_handler, error_handler, console_handler, self.call_handler]
+        if self.structured_call_logs:
+            # Compressed, indexed JSONL copy of every call's records (see structured_logs)
+            self.jsonl_handler = JsonlCallLogHandler(os.getenv("LOG_JSONL_DIR") or self.logs_dir / "calls_jsonl")
+            self.handlers.append(self.jsonl_handler)
+        # Chatty loggers are rate-limited in the shared outputs; the per-call files keep everything
+        main_handler.addFilter(self.rate_limit_filter)
+        console_handler.addFilter(self.rate_limit_filter)
+        if self.async_logging:
+            # The call context lives on the logging task, so it is attached before
+            # the record crosses to the listener thread
+            self.queue_handler = LogQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+            self.queue_handler.addFilter(session_filter)
+            self.main_logger.addHandler(self.queue_handler)
+            self.listener = LogListener(self.queue_handler.queue, self.call_handler, *self.handlers)
+            self.listener.start()
+            atexit.register(self.close)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork)
+        else:
+            console_handler.addFilter(session_filter)
+            self.call_handler.addFilter(session_filter)  # Add session filter to get call_sid
+            for handler in self.handlers:
+                self.main_logger.addHandler(handler)
         
         # Suppress noisy third-party loggers
         logging.getLogger('pymongo').setLevel(logging.WARNING)
@@ -219,46 +476,99 @@ class IVRLogger:
         logging.getLogger('requests').setLevel(logging.WARNING)
     
     def set_session_id(self, session_id: Optional[str] = None):
-        """Set the session ID for the current thread."""
+        """Set the session ID for the current call."""
         if session_id is None:
             session_id = str(uuid.uuid4())[:8]  # Short UUID for readability
-        _local.session_id = session_id
+        ensure_call_context().session_id = session_id
         return session_id
     
     def get_session_id(self) -> str:
         """Get the current session ID."""
-        return getattr(_local, 'session_id', 'no-session')
+        return get_call_value('session_id', 'no-session')
     
     def set_call_sid(self, call_sid: Optional[str] = None):
-        """Set the call_sid for the current thread."""
-        _local.call_sid = call_sid
+        """Set the call_sid for the current call."""
+        ensure_call_context().call_sid = call_sid
         return call_sid
     
     def get_call_sid(self) -> Optional[str]:
         """Get the current call_sid."""
-        return getattr(_local, 'call_sid', None)
+        return get_call_value('call_sid')
     
     def set_x_call_id(self, x_call_id: Optional[str] = None):
-        """Set the X-Call-ID for the current thread."""
-        _local.x_call_id = x_call_id
+        """Set the X-Call-ID for the current call."""
+        ensure_call_context().x_call_id = x_call_id
         return x_call_id
     
     def get_x_call_id(self) -> Optional[str]:
         """Get the current X-Call-ID."""
-        return getattr(_local, 'x_call_id', None)
+        return get_call_value('x_call_id')
     
     def set_transfer_status(self, status: Optional[str] = None):
-        """Set the transfer status for the current thread."""
-        _local.transfer_status = status
+        """Set the transfer status for the current call."""
+        ensure_call_context().transfer_status = status
         return status
     
     def get_transfer_status(self) -> Optional[str]:
         """Get the current transfer status."""
-        return getattr(_local, 'transfer_status', None)
+        return get_call_value('transfer_status')
     
     def cleanup_call_logs(self, call_sid: str):
-        """Clean up call-specific log files for a call."""
-        self.call_handler.cleanup_call(call_sid)
+        """
+        Clean up call-specific log files for a call. With a full queue this
+        waits up to LOG_CONTROL_TIMEOUT for room; call it off the event loop.
+        """
+        if self.listener is not None:
+            # Close the file after the call's queued records are written; unlike
+            # records, the marker waits for room rather than being dropped
+            try:
+                self.queue_handler.queue.put(_CallCleanup(call_sid), timeout=LOG_CONTROL_TIMEOUT)
+            except queue.Full:
+                # The listener is stuck; the idle sweep closes the file eventually
+                self.queue_handler.dropped += 1
+        else:
+            self.call_handler.cleanup_call(call_sid)
+            if self.jsonl_handler is not None:
+                self.jsonl_handler.flush()
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every record logged so far is written. Returns False on timeout."""
+        if self.listener is None:
+            return True
+        marker = _Flush()
+        try:
+            self.queue_handler.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+    
+    def _after_fork(self):
+        """Forked job processes inherit no threads: give the child its own queue and listener."""
+        if self.listener is None:
+            return
+        self.queue_handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.listener = LogListener(self.queue_handler.queue, self.call_handler, *self.handlers)
+        self.listener.start()
+    
+    def close(self):
+        """Write queued records, stop the listener thread and close the handlers."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.main_logger.removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            self.main_logger.removeHandler(handler)
+            handler.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get logging pipeline statistics."""
+        return {
+            "queued": self.queue_handler.queue.qsize() if self.queue_handler else 0,
+            "dropped": self.queue_handler.dropped if self.queue_handler else 0,
+            "rate_limited": self.rate_limit_filter.suppressed,
+            "call_files": self.call_handler.get_stats(),
+            "structured_call_logs": self.jsonl_handler.get_stats() if self.jsonl_handler else None,
+        }
     
     def get_logger(self, name: str = 'ivr_bot') -> logging.Logger:
         """Get a logger instance."""
@@ -267,7 +577,8 @@ class IVRLogger:
         
         # Create child logger that inherits from main logger
         logger = logging.getLogger(f'ivr_bot.{name}')
-        logger.setLevel(logging.DEBUG)
+        # Inherit the main logger's level (LOG_LEVEL)
+        logger.setLevel(logging.NOTSET)
         
         # Set parent to main logger so all logs go to main files
         logger.parent = self.main_logger
@@ -325,3 +636,11 @@ def get_transfer_status() -> Optional[str]:
 def cleanup_call_logs(call_sid: str):
     """Convenience function to cleanup call-specific logs."""
     get_logger_instance().cleanup_call_logs(call_sid)
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Convenience function to get logging pipeline statistics."""
+    return get_logger_instance().get_stats()
+
+def flush_logs(timeout: float = 5.0) -> bool:
+    """Convenience function to wait until queued log records are written."""
+    return get_logger_instance().flush(timeout)
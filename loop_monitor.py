@@ -0,0 +1,215 @@
+"""
+Event-loop lag monitor with blocking-call detection.
+
+A heartbeat task on the event loop records how late the loop wakes it
+(the loop lag) every LOOP_LAG_INTERVAL seconds. A watchdog thread watches
+the heartbeat: when the loop has not run for longer than
+LOOP_LAG_THRESHOLD_MS it captures the stack of the loop thread while it is
+still blocked, so the event names the code that blocks (a synchronous
+pymongo call, a sync OpenAI request, glob, pickle...) rather than whatever
+runs after it. The name of the task running at the time is recorded with it.
+
+Each worker's WorkerMetrics (fleet_metrics) owns one monitor; its lag
+percentiles and blocking count are part of the fleet metrics. With
+LOOP_MONITOR_DEBUG=true (or strict=True) every blocking event is logged as
+an error and check() raises BlockingCallDetected; tests run a simulated call
+under detect_blocking() to fail when a code path blocks the loop:
+
+    async with detect_blocking(threshold_ms=50):
+        await simulated_call()
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from logging_config import get_logger
+
+logger = get_logger('loop_monitor')
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "false").lower() == "true"
+
+# Lag samples kept for percentiles, and blocking events kept for inspection
+MAX_SAMPLES = 1000
+MAX_EVENTS = 20
+# Frames kept from the blocked thread's stack
+STACK_LIMIT = 25
+
+
+class BlockingCallDetected(AssertionError):
+    """Raised in debug mode when the event loop was blocked past the threshold."""
+
+
+@dataclass
+class BlockingEvent:
+    """One stretch of time the event loop did not run."""
+    at: float  # Unix time the block was detected
+    lag_ms: float  # Lag once the loop ran again (or so far, if it never did)
+    task: Optional[str]
+    stack: str
+
+    def describe(self) -> str:
+        return f"Event loop blocked for {self.lag_ms:.0f} ms in task {self.task or '-'}:\n{self.stack}"
+
+
+class LoopMonitor:
+    """Samples one event loop's lag and captures the stack of whatever blocks it."""
+
+    def __init__(self,
+                 threshold_ms: float = LOOP_LAG_THRESHOLD_MS,
+                 interval: float = LOOP_LAG_INTERVAL,
+                 strict: bool = LOOP_MONITOR_DEBUG,
+                 on_sample: Optional[Callable[[float], None]] = None):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.strict = strict
+        self.on_sample = on_sample
+
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=MAX_SAMPLES)
+        self.events: Deque[BlockingEvent] = deque(maxlen=MAX_EVENTS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # perf_counter time the heartbeat expects to run next
+        self._due = 0.0
+        self._pending_event: Optional[BlockingEvent] = None
+
+        # Statistics
+        self.blocked = 0
+        self.max_lag_ms = 0.0
+
+    def start(self) -> None:
+        """Start monitoring the running event loop. Call from a coroutine on that loop."""
+        if self._heartbeat_task is not None and not self._heartbeat_task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._due = time.perf_counter() + self.interval
+        self._stop.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeat and the watchdog."""
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if self._watchdog is not None and self._watchdog is not threading.current_thread():
+            self._watchdog.join(1.0)
+        self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                lag_ms = (now - self._due) * 1000
+                self._due = now + self.interval
+            self.record_lag(lag_ms)
+
+    def record_lag(self, lag_ms: float) -> None:
+        """Record one lag sample, closing the blocking event it ends."""
+        lag_ms = max(0.0, lag_ms)
+        with self._lock:
+            self._samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            event, self._pending_event = self._pending_event, None
+        if self.on_sample is not None:
+            self.on_sample(lag_ms)
+        if event is not None:
+            event.lag_ms = max(event.lag_ms, lag_ms)
+            self._report(event)
+
+    def _watch(self) -> None:
+        """Watchdog thread: capture the loop thread's stack while it is blocked."""
+        poll = max(0.005, min(self.interval, self.threshold_ms / 1000) / 4)
+        while not self._stop.wait(poll):
+            with self._lock:
+                overdue_ms = (time.perf_counter() - self._due) * 1000
+                if overdue_ms < self.threshold_ms:
+                    continue
+                if self._pending_event is not None:
+                    self._pending_event.lag_ms = overdue_ms
+                    continue
+                # Captured under the lock so the heartbeat cannot close the block meanwhile
+                self._pending_event = self._capture(overdue_ms)
+
+    def _capture(self, overdue_ms: float) -> Optional[BlockingEvent]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        return BlockingEvent(time.time(), overdue_ms, task.get_name() if task is not None else None, stack)
+
+    def _report(self, event: BlockingEvent) -> None:
+        with self._lock:
+            self.events.append(event)
+            self.blocked += 1
+        if self.strict:
+            logger.error(f"❌ {event.describe()}")
+        else:
+            logger.warning(f"⚠️ Event loop blocked for {event.lag_ms:.0f} ms in task {event.task or '-'}")
+            logger.debug("Blocking stack:\n%s", event.stack)
+
+    def check(self) -> None:
+        """In strict mode, raise BlockingCallDetected if the loop was blocked (including right now)."""
+        with self._lock:
+            pending = self._pending_event
+            events = list(self.events) + ([pending] if pending is not None else [])
+        if self.strict and events:
+            raise BlockingCallDetected("\n\n".join(event.describe() for event in events))
+
+    def percentiles(self) -> Dict[str, float]:
+        """Lag percentiles (ms) over the recent samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+        pick = lambda p: round(samples[min(len(samples) - 1, int(len(samples) * p / 100))], 2)
+        return {"p50": pick(50), "p90": pick(90), "p99": pick(99), "max": round(samples[-1], 2)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lag percentiles and blocking counts."""
+        stats: Dict[str, Any] = {f"lag_{k}_ms": v for k, v in self.percentiles().items()}
+        with self._lock:
+            stats["samples"] = len(self._samples)
+            stats["blocked"] = self.blocked
+            stats["last_blocked_task"] = self.events[-1].task if self.events else None
+        return stats
+
+    def recent_events(self) -> List[Dict[str, Any]]:
+        """The most recent blocking events."""
+        with self._lock:
+            return [{"at": e.at, "lag_ms": round(e.lag_ms, 1), "task": e.task, "stack": e.stack} for e in self.events]
+
+
+@asynccontextmanager
+async def detect_blocking(threshold_ms: float = 50, interval: float = 0.01):
+    """
+    Fail with BlockingCallDetected if the event loop is blocked past
+    threshold_ms while the enclosed block runs. Meant for tests.
+    """
+    monitor = LoopMonitor(threshold_ms=threshold_ms, interval=interval, strict=True)
+    monitor.start()
+    try:
+        yield monitor
+        # Give the heartbeat a chance to close an event the block ended with
+        await asyncio.sleep(interval * 2)
+    finally:
+        monitor.stop()
+    monitor.check()
@@ -29,13 +29,23 @@ from livekit import rtc
 from livekit.protocol.sip import TransferSIPParticipantRequest
 from livekit.plugins.turn_detector.english import EnglishModel
 from helper_functions import *
-from cost_tracker import get_cost_tracker, reset_cost_tracker, add_agent_usage, add_supervisor_usage, add_stt_usage, add_tts_usage, set_call_context, cleanup_call_tracker
+from cost_tracker import get_cost_tracker, reset_cost_tracker, set_call_context, cleanup_call_tracker
+from call_context import bind_call_context, start_call_context
+from tracing import span, get_call_trace, record_metrics, export_call_trace, http_trace_config, BOOTSTRAP_SPAN
+from artifact_writer import get_artifact_writer
+from cost_log_sink import get_cost_log_sink
+from cost_rollups import get_cost_rollups
+from fleet_metrics import get_worker_metrics
 import copy
+from functools import partial
 from supervisor import Supervisor
 from universal_stt_detector import detect_any_stt_error
 import cache_manager
-from logging_config import get_logger, set_session_id, set_x_call_id, set_call_sid, cleanup_call_logs
+from cache_warmup import prewarm as prewarm_cache
+from logging_config import get_logger, set_session_id, set_x_call_id, set_call_sid, cleanup_call_logs, flush_logs
 from recordings.recording_utils import generate_reording_path
+from prompt_archive import archive_prompt, load_prompt_template
+from transfer_engine import get_transfer_engine, asterisk_target, DISPATCHER_EXTENSION, DRIVER_EXTENSION
 load_dotenv()
 
 # Initialize logger using our centralized logging system
@@ -43,9 +53,12 @@ logger = get_logger('main')
 
 # MongoDB connection
 MONGODB_URI = os.getenv("MONGODB_URI")
-mongo_client = pymongo.MongoClient(MONGODB_URI)
+# Fail fast when Mongo is unreachable; the cost-log sink retries and spools to disk
+mongo_client = pymongo.MongoClient(MONGODB_URI, serverSelectionTimeoutMS=int(os.getenv("MONGODB_TIMEOUT_MS", "5000")))
 db = mongo_client.costlogger
 costlogs_collection = db.costlogs
+cost_log_sink = get_cost_log_sink(costlogs_collection)
+cost_rollups = get_cost_rollups(db.cost_rollups)
 
 # Default user ID - replace with actual user ID when available
 DEFAULT_USER_ID = os.getenv("DEFAULT_USER_ID")
@@ -60,52 +73,22 @@ load_dotenv(dotenv_path=".env")
 
 
 async def transfer_call_dtmf(participant, room, participant_identity: str = None, room_name: str = None) -> None:
-    try:
-        logger.info("In call transfer dtmf function....")
-        async with api.LiveKitAPI() as livekit_api:
-            asterisk_ip = os.getenv("ASTERISK_SERVER_IP")
-            transfer_to = f"sip:5000@{str(asterisk_ip)}"
-            # transfer_to = "sip:5000@139.64.158.216"
-            participant_identity = list(participant.remote_participants.values())[0].identity
-            # Create transfer request
-            transfer_request = TransferSIPParticipantRequest(
-                participant_identity=participant_identity,
-                room_name=room,
-                transfer_to=transfer_to,
-                play_dialtone=False,
-                # wait_until_answered=True,
-            )
-            logger.debug(f"Transfer request: {transfer_request}")
-
-            # Transfer caller
-            await livekit_api.sip.transfer_sip_participant(transfer_request)
-            logger.info(f"User Pressed 0 and Call transferred to: {transfer_to}")
-    except Exception as e:
-        logger.info(e)
+    logger.info("In call transfer dtmf function....")
+    result = await get_transfer_engine().transfer(
+        room=participant,
+        transfer_to=asterisk_target(DISPATCHER_EXTENSION),
+    )
+    if result.success:
+        logger.info(f"User Pressed 0 and Call transferred to: {result.transfer_to}")
 
 
 async def transfer_call_dtmf_driver(participant, room, participant_identity: str = None, room_name: str = None) -> None:
-    try:
-        async with api.LiveKitAPI() as livekit_api:
-            asterisk_ip = os.getenv("ASTERISK_SERVER_IP")
-            transfer_to = f"sip:5001@{str(asterisk_ip)}"
-            # transfer_to = "sip:5001@139.64.158.216"
-            participant_identity = list(participant.remote_participants.values())[0].identity
-            # Create transfer request
-            transfer_request = TransferSIPParticipantRequest(
-                participant_identity=participant_identity,
-                room_name=room,
-                transfer_to=transfer_to,
-                play_dialtone=False,
-                # wait_until_answered=True,
-            )
-            logger.debug(f"Transfer request: {transfer_request}")
-
-            # Transfer caller
-            await livekit_api.sip.transfer_sip_participant(transfer_request)
-            logger.info(f"Successfully transferred  to {transfer_to}")
-    except Exception as e:
-        logger.info(e)
+    result = await get_transfer_engine().transfer(
+        room=participant,
+        transfer_to=asterisk_target(DRIVER_EXTENSION),
+    )
+    if result.success:
+        logger.info(f"Successfully transferred  to {result.transfer_to}")
 
 class PhoneNumberCollector:
     """Handle phone number collection via voice and DTMF"""
@@ -229,6 +212,49 @@ def setup_room_dtmf_handler(room: rtc.Room, session, phone_collector, agent):
             logger.info(f"[ASTERISK DTMF] Digit '{digit}' ignored - not in phone collection mode")
             # Don't process DTMF if not collecting phone numbers
 
+async def flush_call_outputs(call_sid: str) -> None:
+    """
+    Write out what the worker-wide background writers still hold for a finished call.
+
+    LiveKit runs each job in its own process and ends it with os._exit, which
+    skips atexit hooks, so anything still queued when cleanup returns is lost.
+    Each flush runs in a thread to keep the event loop free.
+    """
+    # Cost document; a timed-out flush spools what is left to disk
+    try:
+        if not await asyncio.to_thread(cost_log_sink.flush):
+            logger.warning(f"⚠️ Cost-log flush timed out for call {call_sid}; unwritten documents were spooled")
+    except Exception as e:
+        logger.error(f"❌ Cost-log flush failed for call {call_sid}: {e}")
+
+    # Per-affiliate/model/day rollups; the periodic flush thread would not get to run
+    try:
+        if not await asyncio.to_thread(cost_rollups.flush):
+            logger.warning(f"⚠️ Cost rollups for call {call_sid} could not be written")
+    except Exception as e:
+        logger.error(f"❌ Cost rollup flush failed for call {call_sid}: {e}")
+
+    # Latency trace, prompt and payload artifacts
+    try:
+        if not await asyncio.to_thread(get_artifact_writer().flush):
+            logger.warning(f"⚠️ Artifact flush timed out for call {call_sid}")
+    except Exception as e:
+        logger.error(f"❌ Artifact flush failed for call {call_sid}: {e}")
+
+    # Worker snapshot, so the fleet totals include this call's cost and completion
+    try:
+        await asyncio.to_thread(get_worker_metrics().write_snapshot)
+    except Exception as e:
+        logger.error(f"❌ Worker metrics snapshot failed for call {call_sid}: {e}")
+
+    # Last, so the records above and the call file's closing lines are on disk too
+    try:
+        if not await asyncio.to_thread(flush_logs):
+            logger.warning(f"⚠️ Log flush timed out for call {call_sid}")
+    except Exception as e:
+        logger.error(f"❌ Log flush failed for call {call_sid}: {e}")
+
+
 async def entrypoint(ctx: agents.JobContext):
     """
     Main entry point for the IT Curves Bot application.
@@ -241,10 +267,17 @@ async def entrypoint(ctx: agents.JobContext):
     # Store active tasks to prevent garbage collection
     _active_tasks = set()
 
-    await ctx.connect()
+    # Bind this job's call context before connecting, so the room's event
+    # handlers and every task created from here on attribute costs and logs
+    # to this call even when other jobs share the thread
+    call_context = start_call_context()
+
+    with span("connect", BOOTSTRAP_SPAN):
+        await ctx.connect()
 
     # Wait for the first participant to connect
-    participant = await ctx.wait_for_participant()
+    with span("wait_for_participant", BOOTSTRAP_SPAN):
+        participant = await ctx.wait_for_participant()
 
     # # Twilio code commented
     # call_sid = participant.attributes.get("sip.twilio.callSid", "Unknown")
@@ -254,6 +287,12 @@ async def entrypoint(ctx: agents.JobContext):
     
     # Set call context for cost tracking (must be done after call_sid is generated)
     set_call_context(call_sid)
+    # Register the call's trace (holding the spans above) under its call_sid
+    get_call_trace(call_sid)
+
+    worker_metrics = get_worker_metrics()
+    worker_metrics.call_started()
+    worker_metrics.start_loop_lag_probe()
     
     # Reset cost tracker for new call
     reset_cost_tracker(call_sid)
@@ -263,7 +302,7 @@ async def entrypoint(ctx: agents.JobContext):
     session_id = set_session_id(call_sid)
     set_call_sid(call_sid)  # Set call_sid for automatic per-call logging
     
-    logger.info(f"📞 CALL STARTED - Call SID: {call_sid}")
+    logger.info(f"📞 CALL STARTED - Call SID: {call_sid}", extra={"phase": "call_start"})
     logger.info(f"📞 Session ID: {session_id}")
     logger.info(f"📞 Room: {ctx.room.name}")
     logger.info(f"📞 Participant: {participant.identity if participant else 'Unknown'}")
@@ -311,14 +350,15 @@ async def entrypoint(ctx: agents.JobContext):
     # Use the existing background audio player created earlier
     logger.info("Using pre-configured background audio player for typing sounds")
     
-    await session.start(
-        room=ctx.room,
-        agent=initial_agent,
-        room_input_options=RoomInputOptions(
-            text_enabled=True
+    with span("session_start", BOOTSTRAP_SPAN):
+        await session.start(
+            room=ctx.room,
+            agent=initial_agent,
+            room_input_options=RoomInputOptions(
+                text_enabled=True
+            )
+            # allow_interruptions is set on the session object, not the start method
         )
-        # allow_interruptions is set on the session object, not the start method
-    )
     
     # Conversation history is now managed by InitAssistant - no local list needed
     def setup_conversation_listeners(current_session):
@@ -340,16 +380,11 @@ async def entrypoint(ctx: agents.JobContext):
                     logger.info(f"User transcript received: {event.item.text_content}")
                     
                     # Universal STT Error Detection - handles ANY possible transcription error
-                    # Get conversation history from InitAssistant for STT validation
-                    current_history = InitAssistant.get_conversation_history(call_sid)
-                    recent_context = [item['transcription'] for item in current_history[-6:]]
-                    
+                    # Get recent context from InitAssistant for STT validation (tail view, no full copy)
+                    recent_context = InitAssistant.get_recent_transcriptions(call_sid, 6)
+
                     # Get the most recent bot response for analysis
-                    recent_bot_response = ""
-                    for item in reversed(current_history):
-                        if item.get('speaker') == 'Agent':
-                            recent_bot_response = item.get('transcription', '')
-                            break
+                    recent_bot_response = InitAssistant.get_last_agent_message(call_sid)
                     
                     # Universal STT validation
                     universal_validation = detect_any_stt_error(
@@ -448,7 +483,8 @@ async def entrypoint(ctx: agents.JobContext):
             
         try:
             # Call the API function
-            result = await api_func(*args, **kwargs)
+            with span(api_func.__name__, BOOTSTRAP_SPAN):
+                result = await api_func(*args, **kwargs)
             return result
         finally:
             # Always stop the typing sound
@@ -554,7 +590,9 @@ async def entrypoint(ctx: agents.JobContext):
             logger.info(f"📞 Caller: {caller}")
             logger.info(f"📞 Recipient: {recipient}")
             # Try to get affiliate from cache
-            cached_affiliate = cache_manager.get_affiliate_from_cache(recipient)
+            # (a recently expired entry is served at once and refreshed in the background)
+            cached_affiliate = cache_manager.get_affiliate_from_cache(
+                recipient, refresh=lambda: recognize_affiliate(recipient))
             logger.debug(f"cached_affiliate: {cached_affiliate}")
             if cached_affiliate:
                 affiliate = cached_affiliate
@@ -562,8 +600,9 @@ async def entrypoint(ctx: agents.JobContext):
             else:
                 # If not in cache, call the original function with logging
                 affiliate = await with_typing_during_api(recognize_affiliate, recipient)
-                # Store result in cache for future use
-                cache_manager.store_affiliate_in_cache(recipient, affiliate)
+                # Store result in cache for future use (failures come back as strings)
+                if isinstance(affiliate, dict):
+                    cache_manager.store_affiliate_in_cache(recipient, affiliate)
                 
             success = True
             ivr = True
@@ -575,18 +614,21 @@ async def entrypoint(ctx: agents.JobContext):
             logger.info(f"Phone Number Extracted: {phone_number}")
             initial_agent.update_rider_phone(phone_number)
             
-            # Try to get client info from cache
-            # cached_client = cache_manager.get_client_from_cache(phone_number, affiliate_id, family_id)
-            # if cached_client:
-            #     all_riders_info = cached_client
-            #     logger.info(f"Using cached client info for {phone_number}")
-            # else:
+            # Try to get client info from cache (bookings and profile lookups keep it current)
+            cached_client = cache_manager.get_client_from_cache(
+                phone_number, affiliate_id, family_id,
+                refresh=partial(fetch_cacheable_client_info, phone_number, affiliate_id, family_id))
+            if cached_client:
+                all_riders_info = copy.deepcopy(cached_client)
+                logger.info(f"Using cached client info for {phone_number}")
+            else:
                 # If not in cache, call the original function with logging
-            all_riders_info = await with_typing_during_api(get_client_name_voice, phone_number, affiliate_id, family_id)
-            logger.debug(f"All Riders Info: {all_riders_info}")
-            logger.info(f"[RIDER DETECTION] After API call - Number of riders: {all_riders_info.get('number_of_riders', 'MISSING')}")
+                all_riders_info = await with_typing_during_api(get_client_name_voice, phone_number, affiliate_id, family_id)
+                logger.debug(f"All Riders Info: {all_riders_info}")
+                logger.info(f"[RIDER DETECTION] After API call - Number of riders: {all_riders_info.get('number_of_riders', 'MISSING')}")
                 # Store result in cache for future use
-            # cache_manager.store_client_in_cache(phone_number, affiliate_id, family_id, all_riders_info)
+                if cache_manager.is_cacheable_client_info(all_riders_info):
+                    cache_manager.store_client_in_cache(phone_number, affiliate_id, family_id, copy.deepcopy(all_riders_info))
 
         except Exception as e:
             logger.error(f"Error in recognizing affiliate from number: {e}")
@@ -598,7 +640,8 @@ async def entrypoint(ctx: agents.JobContext):
                 
                 # Try to get affiliate from cache using IDs
                 cache_key = f"ids:{family_id}:{affiliate_id}"
-                cached_affiliate = cache_manager.get_affiliate_from_cache(cache_key)
+                cached_affiliate = cache_manager.get_affiliate_from_cache(
+                    cache_key, refresh=lambda: recognize_affiliate_by_ids(family_id, affiliate_id))
                 logger.debug(f"cached_affiliate: {cached_affiliate}")
                 if cached_affiliate:
                     affiliate = cached_affiliate
@@ -606,8 +649,9 @@ async def entrypoint(ctx: agents.JobContext):
                 else:
                     # If not in cache, call the original function with logging
                     affiliate = await with_typing_during_api(recognize_affiliate_by_ids, family_id, affiliate_id)
-                    # Store result in cache for future use
-                    cache_manager.store_affiliate_in_cache(cache_key, affiliate)
+                    # Store result in cache for future use (failures come back as strings)
+                    if isinstance(affiliate, dict):
+                        cache_manager.store_affiliate_in_cache(cache_key, affiliate)
                 
                 logger.debug(f"AFFILIATE: {affiliate}")
                 phone_number = metadata['phoneNo']
@@ -616,16 +660,19 @@ async def entrypoint(ctx: agents.JobContext):
                     logger.info(f"Phone Number Extracted: {phone_number}")
                     
                     # Try to get client info from cache
-                    # cached_client = cache_manager.get_client_from_cache(phone_number, affiliate_id, family_id)
-                    # if cached_client:
-                    #     all_riders_info = cached_client
-                    #     logger.info(f"Using cached client info for {phone_number}")
-                    # else:
+                    cached_client = cache_manager.get_client_from_cache(
+                        phone_number, affiliate_id, family_id,
+                        refresh=partial(fetch_cacheable_client_info, phone_number, affiliate_id, family_id))
+                    if cached_client:
+                        all_riders_info = copy.deepcopy(cached_client)
+                        logger.info(f"Using cached client info for {phone_number}")
+                    else:
                         # If not in cache, call the original function with logging
-                    all_riders_info = await with_typing_during_api(get_client_name_voice, phone_number, affiliate_id, family_id)
-                    logger.info(f"[RIDER DETECTION] After API call - Number of riders: {all_riders_info.get('number_of_riders', 'MISSING')}")
+                        all_riders_info = await with_typing_during_api(get_client_name_voice, phone_number, affiliate_id, family_id)
+                        logger.info(f"[RIDER DETECTION] After API call - Number of riders: {all_riders_info.get('number_of_riders', 'MISSING')}")
                         # Store result in cache for future use
-                        # cache_manager.store_client_in_cache(phone_number, affiliate_id, family_id, all_riders_info)
+                        if cache_manager.is_cacheable_client_info(all_riders_info):
+                            cache_manager.store_client_in_cache(phone_number, affiliate_id, family_id, copy.deepcopy(all_riders_info))
                 else:
                     all_riders_info["number_of_riders"] = 1
                     all_riders_info["rider_1"] = unknow_rider
@@ -683,8 +730,7 @@ async def entrypoint(ctx: agents.JobContext):
         logger.error("Error in Selecting Flow")
         prompt_file = os.path.join(Agent_Directory, "prompts", "prompt_new_rider.txt")
 
-    with open(prompt_file, encoding="utf-8") as file:
-        system_prompt = file.read()
+    system_prompt = load_prompt_template(prompt_file)
     try:
         if all_riders_info["number_of_riders"] == 1:
             rider_info = all_riders_info["rider_1"]
@@ -745,15 +791,11 @@ async def entrypoint(ctx: agents.JobContext):
     Servica_Area = ""
     try:
         bounds, _, _ = await with_typing_during_api(fetch_affiliate_details, affiliate_id)
-        counties_prompt = f"""What are the counties that lies within these coordinates {bounds}. Only return names of the counties separated by commas. 
-        Do not add name of the states. Do not add any other line or comment. I just need the name of the counties
-        Sample response would be 'county_1, county_2, ......, county_n'
-        DO NOT RETURN MORE THAN 10 COUNTY NAMES
-        """
-        Servica_Area = await with_typing_during_api(search_web_manual, counties_prompt)
-        prompt = f"""{prompt}\n\n
-        ``Agency Operate in the following counties: {Servica_Area}``\n\n
-        """
+        Servica_Area = await with_typing_during_api(get_service_area_counties, affiliate_id, bounds)
+        if Servica_Area:
+            prompt = f"""{prompt}\n\n
+            ``Agency Operate in the following counties: {Servica_Area}``\n\n
+            """
     except Exception as e:
         logger.error(f"Error in getting greetings: {e}")
 
@@ -850,8 +892,7 @@ async def entrypoint(ctx: agents.JobContext):
             agent.update_affliate_id_and_family(affiliate_id, family_id)
             session.update_agent(agent)
 
-            with open(f"logs/prompt/final_prompt_{call_sid}.txt","w") as f:
-                f.write(final_prompt)
+            archive_prompt(call_sid, final_prompt, system_prompt, os.path.basename(prompt_file))
                 
             logger.info("Successfully updated initial_agent with enhanced context")
             
@@ -859,14 +900,12 @@ async def entrypoint(ctx: agents.JobContext):
             logger.error(f"Error updating agent instructions: {e}")
             agent = Assistant(call_sid=call_sid, context=ctx, room=ctx.room, instructions=prompt, affiliate_id=affiliate_id, rider_phone=phone_number, client_id=client_id, x_call_id=x_call_id)
             session.update_agent(agent) 
-            with open(f"logs/prompt/final_prompt_{call_sid}.txt","w") as f:
-                f.write(final_prompt)       
+            archive_prompt(call_sid, prompt, system_prompt, os.path.basename(prompt_file))
     except Exception as e:
         agent = Assistant(call_sid=call_sid, context=ctx, room=ctx.room, instructions=prompt, affiliate_id=affiliate_id, rider_phone=phone_number, client_id=client_id, x_call_id=x_call_id)
         session.update_agent(agent)
         logger.info("Updated initial_agent with basic prompt as fallback")
-        with open(f"logs/prompt/final_prompt_{call_sid}.txt","w") as f:
-            f.write(final_prompt)
+        archive_prompt(call_sid, prompt, system_prompt, os.path.basename(prompt_file))
     # Conversation listeners are now defined earlier in the code
     
     # Add additional listeners for debugging interruptions
@@ -977,6 +1016,9 @@ async def entrypoint(ctx: agents.JobContext):
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         usage_collector.collect(ev.metrics)
+        record_metrics(ev.metrics, call_sid)
+        if ev.metrics.type == "llm_metrics":
+            worker_metrics.add_llm_tokens("gpt-4.1-mini", ev.metrics.prompt_tokens, ev.metrics.completion_tokens)
 
     @ctx.room.on("sip_dtmf_received")
     def handle_dtmf(dtmf: SipDTMF):
@@ -1096,10 +1138,12 @@ async def entrypoint(ctx: agents.JobContext):
         stt_audio_seconds = int(agent_summary.stt_audio_duration)
         tts_characters = int(agent_summary.tts_characters_count)
         
-        # Add agent usage to cost tracker
-        add_agent_usage(agent_input_tokens, agent_output_tokens, "gpt-4.1-mini")
-        add_stt_usage(stt_audio_seconds, "deepgram", deepgram_stt_model)
-        add_tts_usage(tts_characters, "deepgram", deepgram_tts_model)
+        # Add agent usage to this call's tracker (named explicitly: this runs
+        # from a shutdown callback, outside the call's tasks)
+        cost_tracker = get_cost_tracker(call_sid)
+        cost_tracker.add_agent_usage(agent_input_tokens, agent_output_tokens, "gpt-4.1-mini")
+        cost_tracker.add_stt_usage(stt_audio_seconds, "deepgram", deepgram_stt_model)
+        cost_tracker.add_tts_usage(tts_characters, "deepgram", deepgram_tts_model)
         
         # Get supervisor usage from supervisor's usage collector
         supervisor_summary = supervisor.usage_collector.get_summary()
@@ -1107,10 +1151,9 @@ async def entrypoint(ctx: agents.JobContext):
         supervisor_output_tokens = int(supervisor_summary.llm_completion_tokens)
         
         # Add supervisor usage to cost tracker
-        add_supervisor_usage(supervisor_input_tokens, supervisor_output_tokens, "gpt-4.1-mini")
+        cost_tracker.add_supervisor_usage(supervisor_input_tokens, supervisor_output_tokens, "gpt-4.1-mini")
         
         # Get comprehensive cost breakdown from cost tracker
-        cost_tracker = get_cost_tracker()
         cost_breakdown = cost_tracker.calculate_total_costs()
         cost_summary = cost_tracker.get_summary_dict()
         
@@ -1168,6 +1211,8 @@ async def entrypoint(ctx: agents.JobContext):
             })
         logger.debug(f'supervisor score history: {supervisor.score_history}, length: {len(formatted_history)}')
         total_cost = cost_breakdown.agent_cost + cost_breakdown.supervisor_cost + cost_breakdown.websearch_cost + cost_breakdown.stt_cost + cost_breakdown.tts_cost
+        # Globbing the recordings share can stall the event loop; check it in a thread
+        recording_path = await asyncio.to_thread(generate_reording_path, x_call_id, phone_number, recipient) if x_call_id else None
         # Create MongoDB document
         mongo_doc = {
             "user": ObjectId(DEFAULT_USER_ID),
@@ -1176,7 +1221,8 @@ async def entrypoint(ctx: agents.JobContext):
             "recipient": recipient,
             "call_sid_new": call_sid,
             "x_call_id": x_call_id,  # SIP X-Call-ID for correlation with external systems
-            "recording_path": generate_reording_path(x_call_id, phone_number, recipient) if x_call_id else None,
+            "affiliate_id": str(affiliate["AffiliateID"]) if isinstance(affiliate, dict) else None,
+            "recording_path": recording_path,
             "start_time": parse_eastern_datetime(starting_time),
             "end_time": parse_eastern_datetime(ending_time),
             "duration_seconds": elapsed_time,
@@ -1222,24 +1268,23 @@ async def entrypoint(ctx: agents.JobContext):
                 "total_cost": total_cost,
                 "detailed_breakdown": cost_summary
             },
+            "latency": get_call_trace(call_sid).percentiles(),
+            "supervisor": supervisor.get_stats(),
             "conversation_history": formatted_history,
             "createdAt": now_eastern()
         }
         logger.info(f"📊 Preparing to insert MongoDB document for call: {call_sid}")
-        logger.debug(f"MongoDB Document: {mongo_doc}")
+        logger.debug("MongoDB Document: %s", mongo_doc)
         
-        # Insert document to MongoDB
-        try:
-            logger.info("📊 Attempting MongoDB insert operation...")
-            result = costlogs_collection.insert_one(mongo_doc)
-            logger.info(f"✅ Database operation successful! Inserted ID: {result.inserted_id}")
-            logger.info(f"✅ MongoDB document created for call: {call_sid}")
-        except Exception as e:
-            logger.error(f"❌ Database operation failed for call {call_sid}: {e}")
-            logger.error(f"❌ MongoDB connection string: {MONGODB_URI}")
-            logger.error(f"❌ Collection: {costlogs_collection}")
-            import traceback
-            logger.error(f"❌ Full traceback: {traceback.format_exc()}")
+        # Hand the document to the batched sink; it is written off the event loop
+        if cost_log_sink.submit(mongo_doc):
+            logger.info(f"✅ MongoDB document queued for call: {call_sid} (ID: {mongo_doc['_id']})")
+        else:
+            logger.warning(f"⚠️ MongoDB document for call {call_sid} spooled to disk (ID: {mongo_doc['_id']})")
+
+        # Fold the call into the per-affiliate/model/day rollups
+        cost_rollups.record_call(mongo_doc, get_call_trace(call_sid))
+        worker_metrics.add_cost(total_cost)
 
         # Also send to existing API for backward compatibility
         data = {
@@ -1247,15 +1292,15 @@ async def entrypoint(ctx: agents.JobContext):
             "end_time": ending_time,
             "call_sid": call_sid,
             "cost": total_cost,
-            "conversation_history": InitAssistant.get_conversation_history(call_sid)
+            "conversation_history": conversation_history
         }
-        logger.debug(f"Payload Sent: {data}")
+        logger.debug("Payload Sent: %s", data)
 
         url = os.getenv("PYTHON_ANYWHERE_COST_LOGGING")
 
         # Send the POST request with JSON data using async HTTP
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
                 async with session.post(url, json=data) as response:
                     if response.status == 201:
                         response_data = await response.json()
@@ -1274,7 +1319,10 @@ async def entrypoint(ctx: agents.JobContext):
             logger.info("Cleanup already called, skipping duplicate cleanup")
             return
         cleanup_called = True
-        logger.info("🧹 Starting cleanup and logging process")
+        # LiveKit runs shutdown callbacks from the job runner's task, which
+        # never saw the context bound above; without it costs and logs lose the call
+        bind_call_context(call_context)
+        logger.info("🧹 Starting cleanup and logging process", extra={"phase": "call_end"})
         logger.info(f"🧹 Call SID: {call_sid}")
         logger.info(f"🧹 Caller: {caller}")
         logger.info(f"🧹 X-Call-ID: {x_call_id if x_call_id else 'Not available'}")
@@ -1302,7 +1350,17 @@ async def entrypoint(ctx: agents.JobContext):
         # Clean up call-specific cost tracker
         cleanup_call_tracker(call_sid)
         logger.info(f"Cleaned up cost tracker for call: {call_sid}")
+        worker_metrics.call_ended()
+
+        # Write the call's latency timeline (and OTLP line if configured)
+        try:
+            await asyncio.to_thread(export_call_trace, call_sid)
+        except Exception as e:
+            logger.warning(f"Warning during trace export: {e}")
         
+        # Let a background context upload from a transfer finish before its history is dropped
+        await get_transfer_engine().drain()
+
         # Clean up conversation history AFTER MongoDB document is created
         InitAssistant.clear_conversation(call_sid)
         logger.info(f"🧹 Cleaned up conversation history for call {call_sid}")
@@ -1312,12 +1370,15 @@ async def entrypoint(ctx: agents.JobContext):
             duration = now_eastern() - parse_eastern_datetime(starting_time)
             logger.info(f"📞 CALL ENDED - Total duration: {duration}")
             logger.info(f"📞 Final cleanup completed")
-            cleanup_call_logs(call_sid)
+            # Waits for room when the log queue is full, so keep it off the loop
+            await asyncio.to_thread(cleanup_call_logs, call_sid)
             logger.info(f"Cleaned up call-specific logs for: {call_sid}")
         except Exception as e:
             logger.warning(f"Warning during call end logging: {e}")
+
+        await flush_call_outputs(call_sid)
     
     ctx.add_shutdown_callback(cleanup_and_log)
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, port=int(os.getenv("PORT"))))
+    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm_cache, port=int(os.getenv("PORT"))))
@@ -0,0 +1,169 @@
+"""
+Content-addressed prompt archive.
+
+Most of every call's final prompt is one of the static templates in prompts/.
+Instead of writing the whole prompt per call, the template is stored once
+under its SHA-256 hash and each call stores only the dynamic text around it:
+
+    logs/prompt_templates/<sha256>.txt        shared template
+    logs/prompt/final_prompt_<call_sid>.json  {"template_sha256", "prefix", "suffix", ...}
+
+Usage (reconstruct a call's full prompt):
+    python prompt_archive.py <call_sid> [--base-dir logs]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tarfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from artifact_writer import write_artifact, ARTIFACT_BASE_DIR, PROMPT_ARTIFACT, PROMPT_TEMPLATE_ARTIFACT
+from logging_config import get_logger
+
+logger = get_logger('prompt_archive')
+
+# path -> (mtime_ns, text, sha256)
+_template_cache: Dict[str, Tuple[int, str, str]] = {}
+# Template hashes already queued for writing by this worker
+_stored_templates = set()
+_lock = threading.Lock()
+
+
+def template_hash(text: str) -> str:
+    """Return the content hash used to address a template."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_prompt_template(path: str) -> str:
+    """
+    Read a prompt template, caching it until the file changes on disk.
+
+    Args:
+        path: Path to the template file
+
+    Returns:
+        str: Template text
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _template_cache.get(path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+    _template_cache[path] = (mtime_ns, text, template_hash(text))
+    return text
+
+
+def _hash_for(template: str) -> str:
+    """Hash a template, reusing the hash computed when it was loaded."""
+    for _, text, digest in _template_cache.values():
+        if text is template:
+            return digest
+    return template_hash(template)
+
+
+def archive_prompt(call_sid: str, final_prompt: str, template: Optional[str] = None,
+                   template_name: Optional[str] = None) -> bool:
+    """
+    Queue a call's final prompt as a template reference plus its dynamic text.
+
+    Args:
+        call_sid: Call identifier
+        final_prompt: Full prompt given to the agent
+        template: Static template contained in the prompt
+        template_name: Template file name, recorded for readability
+
+    Returns:
+        bool: False if the artifact was dropped
+    """
+    record = {"call_sid": call_sid, "template_sha256": None, "template_name": template_name}
+
+    index = final_prompt.find(template) if template else -1
+    if index >= 0:
+        digest = _hash_for(template)
+        with _lock:
+            stored = digest in _stored_templates
+        # Only reference a template whose write was accepted; a dropped write is retried next call
+        if not stored and write_artifact(PROMPT_TEMPLATE_ARTIFACT, f"{digest}.txt", template):
+            with _lock:
+                _stored_templates.add(digest)
+            stored = True
+        if not stored:
+            index = -1
+    if index >= 0:
+        record["template_sha256"] = digest
+        record["prefix"] = final_prompt[:index]
+        record["suffix"] = final_prompt[index + len(template):]
+    else:
+        # Template not found verbatim (or not stored); keep the whole prompt
+        record["prefix"] = final_prompt
+        record["suffix"] = ""
+
+    return write_artifact(PROMPT_ARTIFACT, f"final_prompt_{call_sid}.json", json.dumps(record))
+
+
+def _read_member(base_dir: str, kind: str, filename: str) -> Optional[str]:
+    """Read an artifact, looking in the daily archives if it was rolled."""
+    path = os.path.join(base_dir, kind, filename)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+    archive_dir = os.path.join(base_dir, "archive", kind)
+    if os.path.isdir(archive_dir):
+        for archive in sorted(os.listdir(archive_dir), reverse=True):
+            with tarfile.open(os.path.join(archive_dir, archive), "r:gz") as tar:
+                try:
+                    member = tar.extractfile(filename)
+                except KeyError:
+                    continue
+                if member is not None:
+                    return member.read().decode("utf-8")
+    return None
+
+
+def reconstruct_prompt(call_sid: str, base_dir: str = ARTIFACT_BASE_DIR) -> Optional[str]:
+    """
+    Rebuild the full final prompt of a call.
+
+    Falls back to the legacy full-text final_prompt_<call_sid>.txt artifact.
+
+    Returns:
+        str: Full prompt, or None if no artifact exists for the call
+    """
+    raw = _read_member(base_dir, PROMPT_ARTIFACT, f"final_prompt_{call_sid}.json")
+    if raw is None:
+        return _read_member(base_dir, PROMPT_ARTIFACT, f"final_prompt_{call_sid}.txt")
+
+    record = json.loads(raw)
+    digest = record.get("template_sha256")
+    if not digest:
+        return record["prefix"] + record["suffix"]
+
+    template = _read_member(base_dir, PROMPT_TEMPLATE_ARTIFACT, f"{digest}.txt")
+    if template is None:
+        raise FileNotFoundError(f"Prompt template {digest} not found under {base_dir}")
+    return record["prefix"] + template + record["suffix"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reconstruct the final prompt of a call")
+    parser.add_argument("call_sid", help="Call SID")
+    parser.add_argument("--base-dir", default=ARTIFACT_BASE_DIR, help="Artifact base directory")
+    args = parser.parse_args()
+
+    prompt = reconstruct_prompt(args.call_sid, args.base_dir)
+    if prompt is None:
+        print(f"No prompt artifact found for call {args.call_sid}", file=sys.stderr)
+        return 1
+    sys.stdout.write(prompt)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Local similarity engine for spotting a bot stuck repeating itself.
+
+Each bot turn is turned into a hashed n-gram vector: word unigrams and
+bigrams plus character trigrams inside words (after crude suffix stripping),
+hashed with a stable CRC32 into REPETITION_DIMS signed buckets and
+L2-normalised. Paraphrases that share wording ("Where would you like to be
+picked up?" / "Where should we pick you up?") land close together without
+any LLM call. Filler words carry little weight, so two unrelated questions
+are not similar just because both start with "can you tell me".
+
+The detector keeps the last `window` vectors as rows of a NumPy matrix and
+their cosine similarities as a matrix updated per turn with one
+matrix-vector product. Word features are cached, so adding a turn and
+checking for a loop takes tens of microseconds (bench_repetition.py). A
+loop is `min_repeats` turns in the window that are all at least
+`threshold` similar to each other.
+"""
+
+import math
+import os
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+REPETITION_DIMS = int(os.getenv("REPETITION_DIMS", "4096"))
+REPETITION_WINDOW = int(os.getenv("REPETITION_WINDOW", "4"))
+REPETITION_SIMILARITY = float(os.getenv("REPETITION_SIMILARITY", "0.5"))
+REPETITION_MIN_REPEATS = int(os.getenv("REPETITION_MIN_REPEATS", "3"))
+
+# Weight of a filler word's unigram and character features relative to content words
+FILLER_WEIGHT = 0.2
+# Weight of a character trigram relative to its word's unigram
+CHAR_WEIGHT = 0.5
+FILLER_WORDS = frozenset("""
+a am an and any are as at be been can could did do does for from have how i i'd i'll i'm if in is it
+just know let like me my need of on or please provide say should so tell than that the then there
+this to today us was we what when where which will with would you you'd your
+""".split())
+_SUFFIXES = ("ing", "ed", "s")
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+
+def _expand_negations(text: str) -> str:
+    """Spell out negations (couldn't -> could not) so both spellings share features."""
+    text = text.replace("can't", "can not").replace("won't", "will not")
+    return text.replace("n't", " not")
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so "picked"/"pick" and "rides"/"ride" share features."""
+    if len(word) > 4:
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix):
+                return word[:-len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dims: int):
+    """Bucket index (hash modulo dims) and sign (top hash bit) of a feature."""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dims, 1.0 if h & 0x80000000 else -1.0
+
+
+@lru_cache(maxsize=16384)
+def _word_features(word: str, dims: int) -> Tuple[Tuple[int, float], ...]:
+    """(bucket, value) pairs of a word's unigram and character trigrams; call vocabularies are small."""
+    weight = FILLER_WEIGHT if word in FILLER_WORDS else 1.0
+    padded = f"<{word}>"
+    features = [("w:" + word, weight)] + [("c:" + padded[j:j + 3], CHAR_WEIGHT * weight)
+                                          for j in range(len(padded) - 2)]
+    values = {}
+    for feature, value in features:
+        index, sign = _bucket(feature, dims)
+        values[index] = values.get(index, 0.0) + sign * value
+    return tuple(values.items())
+
+
+class RepetitionDetector:
+    """Rolling window of bot turns as hashed n-gram vectors with their pairwise cosine similarities."""
+
+    def __init__(self,
+                 window: int = REPETITION_WINDOW,
+                 dims: int = REPETITION_DIMS,
+                 threshold: float = REPETITION_SIMILARITY,
+                 min_repeats: int = REPETITION_MIN_REPEATS):
+        self.window = window
+        self.dims = dims
+        self.threshold = threshold
+        self.min_repeats = min_repeats
+        self.reset()
+
+    def reset(self) -> None:
+        self._vectors = np.zeros((self.window, self.dims), dtype=np.float32)
+        self._similarity = np.zeros((self.window, self.window), dtype=np.float32)
+        self._texts: List[Optional[str]] = [None] * self.window
+        self._count = 0
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """Hashed, L2-normalised n-gram vector of a text."""
+        words = [_stem(word) for word in _WORDS.findall(_expand_negations(text.lower()))]
+        buckets = {}
+        for i, word in enumerate(words):
+            for index, value in _word_features(word, self.dims):
+                buckets[index] = buckets.get(index, 0.0) + value
+            if i:
+                previous = words[i - 1]
+                if word not in FILLER_WORDS and previous not in FILLER_WORDS:
+                    index, sign = _bucket(f"b:{previous} {word}", self.dims)
+                    buckets[index] = buckets.get(index, 0.0) + sign
+
+        vector = np.zeros(self.dims, dtype=np.float32)
+        norm = math.sqrt(sum(value * value for value in buckets.values()))
+        if norm:
+            vector[list(buckets)] = [value / norm for value in buckets.values()]
+        return vector
+
+    def add(self, text: str) -> float:
+        """Add a bot turn; returns its highest similarity to the earlier turns in the window."""
+        slot = self._count % self.window
+        vector = self.vectorize(text)
+        self._vectors[slot] = vector
+        self._texts[slot] = text
+        # One matrix-vector product updates the new turn's row and column
+        similarities = self._vectors @ vector
+        self._similarity[slot, :] = similarities
+        self._similarity[:, slot] = similarities
+        self._count += 1
+        return self.last_similarity()
+
+    def __len__(self) -> int:
+        return min(self._count, self.window)
+
+    def _order(self) -> List[int]:
+        """Slots of the turns in the window, oldest first."""
+        n = len(self)
+        return [(self._count - n + i) % self.window for i in range(n)]
+
+    def similarities(self) -> np.ndarray:
+        """Similarities of the latest turn to the earlier turns in the window, oldest first."""
+        order = self._order()
+        if len(order) < 2:
+            return np.zeros(0, dtype=np.float32)
+        return self._similarity[order[-1], order[:-1]]
+
+    def last_similarity(self) -> float:
+        """Highest similarity of the latest turn to an earlier one in the window."""
+        similarities = self.similarities()
+        return float(similarities.max()) if similarities.size else 0.0
+
+    def is_repetitive(self) -> bool:
+        """True when the latest turn and min_repeats - 1 earlier ones are all mutually similar."""
+        order = self._order()
+        if len(order) < self.min_repeats:
+            return False
+        latest = order[-1]
+        similar = [slot for slot in order[:-1] if self._similarity[latest, slot] >= self.threshold]
+        if len(similar) < self.min_repeats - 1:
+            return False
+        # Greedily grow a group of mutually similar turns, most similar to the latest first
+        group = [latest]
+        for slot in sorted(similar, key=lambda s: -self._similarity[latest, s]):
+            if all(self._similarity[slot, member] >= self.threshold for member in group):
+                group.append(slot)
+                if len(group) >= self.min_repeats:
+                    return True
+        return False
+
+    def recent_texts(self) -> List[str]:
+        """The turns in the window, oldest first."""
+        return [self._texts[slot] for slot in self._order()]
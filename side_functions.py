@@ -13,11 +13,14 @@ from pathlib import Path
 import json
 import requests
 # from typing import Annotated
+from typing import Optional
 import aiohttp
 # from aiohttp import BasicAuth
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 from logging_config import get_logger
+from tracing import http_trace_config, httpx_trace_hooks
+import cache_manager
 # from livekit.agents import Agent, function_tool
 
 # Initialize logger
@@ -36,7 +39,8 @@ TWILIO_CLIENT = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
 MUSIC_PATH = os.path.join(App_Directory, "music.wav")
 
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"),
+                            http_client=DefaultAsyncHttpxClient(event_hooks=httpx_trace_hooks()))
 
 
 async def check_address_validity(latitude: str, longitude: str, address_type: str):
@@ -82,11 +86,19 @@ Ensure your response contains ONLY the JSON object with no additional text, expl
 
 async def verify_address(address):
     """Verify an address and parse the JSON response."""
+    cache_key = cache_manager.normalize_address(address)
+    cached_result = cache_manager.get_cached(cache_manager.GEOCODE_NAMESPACE, f"verify:{cache_key}")
+    if cached_result is not None:
+        return copy.deepcopy(cached_result)
+
     prompt = await create_address_verification_prompt(address)
     
     try:
         # Get the response from the web search function
         response = await search_web_manual(prompt)
+        if response is None:
+            return {"valid": False, "confidence": 0, "normalized_address": "",
+                    "latitude": None, "longitude": None, "error": "Web search failed"}
         
         # Extract the JSON object from the response
         # This handles cases where the response might contain extra text
@@ -103,6 +115,9 @@ async def verify_address(address):
                 except (ValueError, TypeError):
                     # If coordinates can't be converted to float, leave as is
                     pass
+            # Only successful verifications are cached; failures are retried
+            if result.get("valid"):
+                cache_manager.store_cached(cache_manager.GEOCODE_NAMESPACE, f"verify:{cache_key}", copy.deepcopy(result))
             return result
         else:
             return {"valid": False, "confidence": 0, "normalized_address": "", 
@@ -128,12 +143,12 @@ async def recognize_affiliate_by_ids(family_id, affiliate_id):
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             async with session.post(url) as response:
                 if response.status == 200:
                     raw_text = await response.text()
                     data = json.loads(raw_text)  # manual parse
-                    logger.debug(f"Affiliate data: {data}")
+                    logger.debug("Affiliate data: %s", data)
                     for affiliate_data in data:
                         if str(affiliate_data["AffiliateFamilyID"]) == family_id and str(affiliate_data["AffiliateID"]) == affiliate_id:
                             recognized_affiliate = affiliate_data
@@ -163,8 +178,9 @@ async def seconds_to_minutes(seconds):
         return seconds
 
 
-async def search_web_manual(prompt: str):
-    from cost_tracker import add_websearch_usage
+async def search_web_manual(prompt: str) -> Optional[str]:
+    """Answer a prompt with the web search tool; None when the search fails or returns no text."""
+    from cost_tracker import add_websearch_response_usage
 
     logger.info(f"Called search_web_manual function with prompt: {prompt}")
 
@@ -177,53 +193,7 @@ async def search_web_manual(prompt: str):
         )
         
         # Track token usage for cost calculation
-        logger.debug(f"Response object type: {type(response)}")
-        logger.debug(f"Response attributes: {dir(response)}")
-        
-        # Debug the text/output structure
-        if hasattr(response, 'text'):
-            logger.debug(f"Response.text type: {type(response.text)}")
-            logger.debug(f"Response.text attributes: {dir(response.text)}")
-        if hasattr(response, 'output'):
-            logger.debug(f"Response.output type: {type(response.output)}")
-            logger.debug(f"Response.output: {response.output}")
-        
-        if hasattr(response, 'usage') and response.usage:
-            logger.debug(f"Usage object: {response.usage}")
-            # For OpenAI responses API, tokens are in input_tokens/output_tokens, not prompt_tokens/completion_tokens
-            input_tokens = getattr(response.usage, 'input_tokens', 0)
-            output_tokens = getattr(response.usage, 'output_tokens', 0)
-            logger.debug(f"Extracted token values - input: {input_tokens}, output: {output_tokens}")
-            add_websearch_usage(input_tokens, output_tokens, "gpt-4o")
-            logger.debug(f"Web search usage: {input_tokens} input, {output_tokens} output tokens")
-        else:
-            logger.warning(f"No usage information available in response. Response type: {type(response)}")
-            # For now, estimate tokens based on text length as fallback
-            estimated_input = len(prompt.split()) * 1.3  # Rough estimate
-            # Try to get text content for estimation
-            text_content = ""
-            if hasattr(response, 'output') and response.output:
-                # Extract text from the response structure for estimation
-                for item in response.output:
-                    if hasattr(item, 'type') and item.type == 'message':
-                        if hasattr(item, 'content') and item.content:
-                            for content_item in item.content:
-                                if hasattr(content_item, 'type') and content_item.type == 'output_text':
-                                    text_content = content_item.text
-                                    break
-                        if text_content:
-                            break
-                # Fallback if structure parsing fails
-                if not text_content:
-                    text_content = str(response.output)
-            elif hasattr(response, 'text') and hasattr(response.text, 'content'):
-                text_content = response.text.content
-            elif hasattr(response, 'text'):
-                text_content = str(response.text)
-            
-            estimated_output = len(text_content.split()) * 1.3 if text_content else 0
-            logger.info(f"Using estimated tokens - input: {estimated_input:.0f}, output: {estimated_output:.0f}")
-            add_websearch_usage(int(estimated_input), int(estimated_output), "gpt-4o")
+        add_websearch_response_usage(prompt, response, "gpt-4o")
     
         # Extract text from the response structure
         if hasattr(response, 'output') and response.output:
@@ -236,19 +206,19 @@ async def search_web_manual(prompt: str):
                             if hasattr(content_item, 'type') and content_item.type == 'output_text':
                                 # This is ResponseOutputText with the actual text
                                 return content_item.text
-            # Fallback to string representation if structure parsing fails
-            return str(response.output)
+            logger.error("Web search response has no output text")
+            return None
         elif hasattr(response, 'text') and hasattr(response.text, 'content'):
             return response.text.content
         elif hasattr(response, 'text'):
             return str(response.text)
         else:
             logger.error(f"Could not extract text from response. Available attributes: {dir(response)}")
-            return "Unable to extract response text"
+            return None
     
     except Exception as e:
         logger.error(f"Error in search web: {e}")
-        return "Web search failed!"
+        return None
 
 
 async def get_frequnt_addresses_manual(client_id, affiliate_id):
@@ -269,12 +239,12 @@ async def get_frequnt_addresses_manual(client_id, affiliate_id):
     }
 
     frequent_addresses = ""
-    logger.debug(f"Payload sent to get frequent addresses: {payload}")
+    logger.debug("Payload sent to get frequent addresses: %s", payload)
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
         async with session.post(url, json=payload, headers=headers) as response:
             response_text = await response.text()
-            logger.debug(f"Response from FrequentDataAPI: {response_text}")
+            logger.debug("Response from FrequentDataAPI: %s", response_text)
             try:
                 response_json = json.loads(response_text)
                 address_data = response_json.get("responseJSON", "[]")
@@ -344,6 +314,11 @@ async def format_phone_number(phone_number):
 
 
 async def fetch_affiliate_details(affiliate_id):
+    cached_details = cache_manager.get_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, affiliate_id)
+    if cached_details is not None:
+        logger.debug(f"Using cached affiliate details for {affiliate_id}")
+        return copy.deepcopy(cached_details)
+
     url = os.getenv("ALL_AFFILIATE_DETAILS_API")
 
     # Define the payload
@@ -351,7 +326,7 @@ async def fetch_affiliate_details(affiliate_id):
         "iaffiliateid": int(affiliate_id)  # Example payload, adjust as needed
     }
 
-    logger.debug(f"Payload Sent for Affiliate Information: {data}")
+    logger.debug("Payload Sent for Affiliate Information: %s", data)
 
     bounds = {
         "x1": 0,
@@ -363,7 +338,7 @@ async def fetch_affiliate_details(affiliate_id):
     funding_sources = []
     copay_fs_list = []
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
         async with session.post(url, json=data) as response:
             # Check for a successful response
             if response.status == 200:
@@ -401,7 +376,9 @@ async def fetch_affiliate_details(affiliate_id):
                         copay_fs_list = [str(item).strip() for item in copay_fs_list]
                     except:
                         pass
-                    
+
+                    cache_manager.store_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, affiliate_id,
+                                               copy.deepcopy((bounds, funding_sources, copay_fs_list)))
                     return bounds, funding_sources, copay_fs_list
                 except Exception as e:
                     logger.error(f"Failed to decode JSON from string: {e}")
@@ -409,6 +386,71 @@ async def fetch_affiliate_details(affiliate_id):
     return bounds, funding_sources, copay_fs_list
 
 
+async def fetch_affiliates():
+    """Fetch every affiliate configured for the IVR. Returns an empty list on failure."""
+    url = os.getenv("GET_AFFILIATE_API")
+    try:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
+            async with session.post(url, headers={"Accept": "application/json"}) as response:
+                if response.status != 200:
+                    logger.error(f"GetIVRAIAffiliate API failed with status: {response.status}")
+                    return []
+                data = json.loads(await response.text())
+        # The API returns the list JSON-encoded inside a JSON string
+        if isinstance(data, str):
+            data = json.loads(data)
+        return data if isinstance(data, list) else []
+    except Exception as e:
+        logger.error(f"Error in getting response from GetIVRAIAffiliate API: {e}")
+        return []
+
+
+async def fetch_payment_types(affiliate_id):
+    """Payment types configured for an affiliate (cached), or None on failure."""
+    cached_types = cache_manager.get_cached(cache_manager.PAYMENT_TYPES_NAMESPACE, affiliate_id)
+    if cached_types is not None:
+        return copy.deepcopy(cached_types)
+
+    url = os.getenv("GET_PAYMENT_TPYE_AFFILIATE_API")
+    data = {
+        "iaffiliateid": str(affiliate_id)
+    }
+    logger.debug("Payload Sent for Payment Type Selection: %s", data)
+
+    try:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
+            async with session.post(url, json=data) as response:
+                if response.status != 200:
+                    logger.error(f"Payment type API failed with status: {response.status}")
+                    return None
+                payment_types = json.loads(await response.text())
+    except Exception as e:
+        logger.error(f"Failed to get payment types: {e}")
+        return None
+
+    cache_manager.store_cached(cache_manager.PAYMENT_TYPES_NAMESPACE, affiliate_id, copy.deepcopy(payment_types))
+    return payment_types
+
+
+async def get_service_area_counties(affiliate_id, bounds):
+    """Counties within an affiliate's bounds, via web search (cached per affiliate and bounds); None on failure."""
+    service_area_key = f"{affiliate_id}:{bounds['x1']},{bounds['y1']},{bounds['x2']},{bounds['y2']}"
+    counties = cache_manager.get_cached(cache_manager.SERVICE_AREA_NAMESPACE, service_area_key)
+    if counties is not None:
+        return counties
+
+    counties_prompt = f"""What are the counties that lies within these coordinates {bounds}. Only return names of the counties separated by commas. 
+    Do not add name of the states. Do not add any other line or comment. I just need the name of the counties
+    Sample response would be 'county_1, county_2, ......, county_n'
+    DO NOT RETURN MORE THAN 10 COUNTY NAMES
+    """
+    counties = await search_web_manual(counties_prompt)
+    # Failed searches return None and are retried on the next call
+    if counties:
+        cache_manager.store_cached(cache_manager.SERVICE_AREA_NAMESPACE, service_area_key, counties)
+    return counties
+
+
 async def recognize_affiliate(receiver):
     receiver = str(receiver)
     match = re.search(r'sip:(\+\d+)@', receiver)
@@ -424,7 +466,7 @@ async def recognize_affiliate(receiver):
     url = os.getenv("GET_AFFILIATE_API")
     headers = {"Accept": "application/json"}
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             async with session.post(url, headers=headers) as response:
                 response_data = await response.json()
         # Response data is already loaded via await response.json()
@@ -493,7 +535,7 @@ async def get_client_name_voice(caller_number, affiliate_id, family_id):
     rider_count = 0
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             async with session.post(url, json=payload, headers=headers) as resp:
                 response = await resp.json()
 
@@ -552,6 +594,14 @@ async def get_client_name_voice(caller_number, affiliate_id, family_id):
     return result
 
 
+async def fetch_cacheable_client_info(caller_number, affiliate_id, family_id):
+    """Fetch rider profiles for a cache refresh; raises if the lookup failed."""
+    result = await get_client_name_voice(caller_number, affiliate_id, family_id)
+    if not cache_manager.is_cacheable_client_info(result):
+        raise ValueError("client lookup returned no usable profiles")
+    return result
+
+
 def calculate_cost(llm_input_tokens, llm_output_tokens, stt_audio_seconds, tts_characters, model_name="gpt-4.1-mini"):
     # Model pricing per 1M tokens
     model_pricing = {
@@ -763,10 +813,10 @@ async def get_Existing_Trips_Number(client_id : str, affiliate_id: str):
     len_existing_trips = 0
     trips_data = None
 
-    logger.debug(f"Payload Sent for existing trips: {payload}")
+    logger.debug("Payload Sent for existing trips: %s", payload)
 
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             async with session.post(url, json=payload, headers=headers) as resp:
                 text = await resp.text()
 
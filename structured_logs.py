@@ -0,0 +1,297 @@
+"""
+Compressed structured JSONL call logs.
+
+When LOG_CALL_JSONL=true, every record logged inside a call is also written
+as one JSON object per line (timestamp, level, logger, call_sid, x_call_id,
+phase, latency_ms, message) to rolling segment files under
+logs/calls_jsonl/. Records are buffered and written as independent
+compressed frames (gzip members or zstd frames), so a segment is a valid
+.gz/.zst stream that standard tools can read.
+
+Each segment has a small sidecar index mapping call_sid to its x_call_id and
+the byte ranges of the frames holding its records. call_log_query.py reads
+only the indexes and the frames of the call asked for, never whole segments.
+
+Segments rotate by size (LOG_JSONL_MAX_BYTES) or age (LOG_JSONL_MAX_AGE) and
+are deleted after LOG_JSONL_RETENTION_DAYS. Phase and latency are taken from
+the record's extra fields, e.g.
+logger.info("Transferred", extra={"phase": "transfer", "latency_ms": 120}).
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is used without it
+    zstandard = None
+
+LOG_CALL_JSONL = os.getenv("LOG_CALL_JSONL", "false").lower() == "true"
+LOG_JSONL_DIR = os.getenv("LOG_JSONL_DIR", os.path.join("logs", "calls_jsonl"))
+LOG_JSONL_COMPRESSION = os.getenv("LOG_JSONL_COMPRESSION", "gzip").lower()
+LOG_JSONL_MAX_BYTES = int(os.getenv("LOG_JSONL_MAX_BYTES", str(64 * 1024 * 1024)))
+LOG_JSONL_MAX_AGE = float(os.getenv("LOG_JSONL_MAX_AGE", "3600"))
+LOG_JSONL_RETENTION_DAYS = float(os.getenv("LOG_JSONL_RETENTION_DAYS", "30"))
+# Buffered bytes / seconds before a frame is written
+LOG_JSONL_FRAME_BYTES = int(os.getenv("LOG_JSONL_FRAME_BYTES", str(256 * 1024)))
+LOG_JSONL_FRAME_INTERVAL = float(os.getenv("LOG_JSONL_FRAME_INTERVAL", "2"))
+
+SEGMENT_EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+INDEX_SUFFIX = ".idx.json"
+
+# Extra record attributes copied into the JSON line when present
+STRUCTURED_FIELDS = ("phase", "latency_ms")
+
+
+def resolve_compression(compression: str) -> str:
+    """The codec to use: zstd only when the zstandard package is installed."""
+    if compression == "zstd" and zstandard is None:
+        logging.getLogger('ivr_bot.structured_logs').warning(
+            "zstandard is not installed, writing gzip call logs instead")
+        return "gzip"
+    return compression if compression in SEGMENT_EXTENSIONS else "gzip"
+
+
+def compress_frame(data: bytes, compression: str) -> bytes:
+    """Compress one self-contained frame."""
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress_frame(data: bytes, compression: str) -> bytes:
+    """Decompress one frame written by compress_frame."""
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst call logs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, wbits=31)
+
+
+def segment_compression(path: Path) -> str:
+    return "zstd" if path.name.endswith(SEGMENT_EXTENSIONS["zstd"]) else "gzip"
+
+
+class JsonlCallLogHandler(logging.Handler):
+    """Writes records of calls to compressed, indexed, rotating JSONL segments."""
+
+    def __init__(self,
+                 log_dir: str = LOG_JSONL_DIR,
+                 compression: str = LOG_JSONL_COMPRESSION,
+                 max_bytes: int = LOG_JSONL_MAX_BYTES,
+                 max_age: float = LOG_JSONL_MAX_AGE,
+                 retention_days: float = LOG_JSONL_RETENTION_DAYS,
+                 frame_bytes: int = LOG_JSONL_FRAME_BYTES,
+                 frame_interval: float = LOG_JSONL_FRAME_INTERVAL):
+        super().__init__(logging.DEBUG)
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.compression = resolve_compression(compression)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retention_days = retention_days
+        self.frame_bytes = frame_bytes
+        self.frame_interval = frame_interval
+
+        self._segment: Optional[Path] = None
+        self._segment_file = None
+        self._segment_size = 0
+        self._segment_opened = 0.0
+        self._index: Dict[str, Dict] = {}
+        self._buffer: List[bytes] = []
+        self._buffer_size = 0
+        self._buffer_calls: Dict[str, Optional[str]] = {}  # call_sid -> x_call_id
+        self._buffer_started = 0.0
+
+        # Statistics
+        self.frames = 0
+        self.segments = 0
+        self.records = 0
+
+    def emit(self, record):
+        call_sid = getattr(record, 'call_sid', None)
+        if call_sid is None:
+            return
+        try:
+            entry = {
+                "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+                "level": record.levelname,
+                "logger": record.name,
+                "call_sid": call_sid,
+                "x_call_id": getattr(record, 'x_call_id', None),
+                "message": record.getMessage(),
+            }
+            for field in STRUCTURED_FIELDS:
+                value = getattr(record, field, None)
+                if value is not None:
+                    entry[field] = value
+            if record.exc_info:
+                entry["exc"] = logging.Formatter().formatException(record.exc_info)
+            line = (json.dumps(entry, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+
+            if not self._buffer:
+                self._buffer_started = time.monotonic()
+            self._buffer.append(line)
+            self._buffer_size += len(line)
+            self.records += 1
+            if entry["x_call_id"] or call_sid not in self._buffer_calls:
+                self._buffer_calls[call_sid] = entry["x_call_id"]
+
+            if (self._buffer_size >= self.frame_bytes
+                    or time.monotonic() - self._buffer_started >= self.frame_interval):
+                self._write_frame()
+        except Exception:
+            self.handleError(record)
+
+    def _open_segment(self):
+        """Start a new segment file and prune segments past retention."""
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        extension = SEGMENT_EXTENSIONS[self.compression]
+        # The sequence keeps a process's segments in order when sorted by name
+        sequence = self.segments
+        path = self.log_dir / f"calls-{timestamp}-{os.getpid()}-{sequence:04d}{extension}"
+        while path.exists():
+            sequence += 1
+            path = self.log_dir / f"calls-{timestamp}-{os.getpid()}-{sequence:04d}{extension}"
+        self._segment = path
+        self._segment_file = open(path, "ab")
+        self._segment_size = 0
+        self._segment_opened = time.monotonic()
+        self._index = {}
+        self.segments += 1
+        self._prune()
+
+    def _close_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+            self._segment = None
+
+    def _write_frame(self):
+        """Compress the buffered lines as one frame and record its range in the index."""
+        if not self._buffer:
+            return
+        if self._segment_file is not None and (self._segment_size >= self.max_bytes
+                                               or time.monotonic() - self._segment_opened >= self.max_age):
+            self._close_segment()
+        if self._segment_file is None:
+            self._open_segment()
+
+        frame = compress_frame(b"".join(self._buffer), self.compression)
+        offset = self._segment_size
+        self._segment_file.write(frame)
+        self._segment_file.flush()
+        self._segment_size += len(frame)
+        for call_sid, x_call_id in self._buffer_calls.items():
+            info = self._index.setdefault(call_sid, {"x_call_id": x_call_id, "frames": []})
+            info["x_call_id"] = info["x_call_id"] or x_call_id
+            info["frames"].append([offset, len(frame)])
+        self._write_index()
+
+        self.frames += 1
+        self._buffer = []
+        self._buffer_size = 0
+        self._buffer_calls = {}
+
+    def _write_index(self):
+        path = Path(str(self._segment) + INDEX_SUFFIX)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segment": self._segment.name, "calls": self._index}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def _prune(self):
+        """Delete segments and their indexes older than the retention period."""
+        if self.retention_days <= 0:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for path in self.log_dir.glob("calls-*.jsonl.*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        with self.lock:
+            try:
+                self._write_frame()
+            except Exception as e:
+                logging.getLogger('ivr_bot.structured_logs').error(f"❌ Could not write call log frame: {e}")
+
+    def close(self):
+        with self.lock:
+            self._write_frame()
+            self._close_segment()
+        super().close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get writer statistics."""
+        return {"records": self.records, "frames": self.frames, "segments": self.segments,
+                "buffered_bytes": self._buffer_size}
+
+
+def load_indexes(log_dir: str = LOG_JSONL_DIR) -> List[Tuple[Path, Dict]]:
+    """Read every segment index in the directory, oldest segment first."""
+    indexes = []
+    for path in sorted(Path(log_dir).glob(f"calls-*{INDEX_SUFFIX}")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            continue
+        indexes.append((path.parent / index["segment"], index["calls"]))
+    return indexes
+
+
+def find_call(call_id: str, log_dir: str = LOG_JSONL_DIR) -> List[Tuple[Path, str, List[List[int]]]]:
+    """
+    Locate a call by call_sid or X-Call-ID using only the indexes.
+
+    Returns:
+        List of (segment path, call_sid, frame ranges) holding the call's records
+    """
+    matches = []
+    for segment, calls in load_indexes(log_dir):
+        for call_sid, info in calls.items():
+            if call_id in (call_sid, info.get("x_call_id")):
+                matches.append((segment, call_sid, info["frames"]))
+    return matches
+
+
+def iter_call_records(call_id: str, log_dir: str = LOG_JSONL_DIR, stats: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Yield a call's records in order, decompressing only the frames that hold them.
+
+    Args:
+        call_id: call_sid or X-Call-ID
+        log_dir: Directory of the JSONL segments
+        stats: Optional dict that receives frames_read and bytes_read counts
+    """
+    if stats is not None:
+        stats.setdefault("frames_read", 0)
+        stats.setdefault("bytes_read", 0)
+    for segment, call_sid, frames in find_call(call_id, log_dir):
+        compression = segment_compression(segment)
+        try:
+            f = open(segment, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            for offset, length in frames:
+                f.seek(offset)
+                data = decompress_frame(f.read(length), compression)
+                if stats is not None:
+                    stats["frames_read"] += 1
+                    stats["bytes_read"] += length
+                for line in data.splitlines():
+                    record = json.loads(line)
+                    if record.get("call_sid") == call_sid:
+                        yield record
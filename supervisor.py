@@ -1,15 +1,17 @@
 import os
 import json
+import random
 import asyncio
+from contextvars import ContextVar
 from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
 from logging_config import get_logger
-
-# Initialize logger
-logger = get_logger('supervisor')
+from transfer_engine import get_transfer_engine, asterisk_target, DISPATCHER_EXTENSION
+from tracing import traced, SUPERVISOR_SPAN
+from fleet_metrics import get_worker_metrics
+from repetition_detector import RepetitionDetector
 from pydantic import BaseModel, Field
 from universal_stt_detector import detect_any_stt_error
-from livekit import api
-from livekit.protocol.sip import TransferSIPParticipantRequest
 from livekit.agents.llm import ChatContext, ChatMessage
 from livekit.plugins import openai
 from livekit.agents import (
@@ -20,6 +22,42 @@ from livekit.agents import (
     MetricsCollectedEvent
 )
 
+# Initialize logger
+logger = get_logger('supervisor')
+
+# Two-tier scoring: local signals run on every assistant turn and the LLM
+# scorer only runs when their risk reaches SUPERVISOR_RISK_THRESHOLD, or for
+# a sample of the remaining turns. The sample rate halves after each clean
+# LLM score (down to SUPERVISOR_MIN_SAMPLE_RATE) and resets otherwise.
+SUPERVISOR_GATING = os.getenv("SUPERVISOR_GATING", "true").lower() == "true"
+SUPERVISOR_RISK_THRESHOLD = float(os.getenv("SUPERVISOR_RISK_THRESHOLD", "0.5"))
+SUPERVISOR_SAMPLE_RATE = float(os.getenv("SUPERVISOR_SAMPLE_RATE", "0.25"))
+SUPERVISOR_MIN_SAMPLE_RATE = float(os.getenv("SUPERVISOR_MIN_SAMPLE_RATE", "0.05"))
+# Quiet time after an assistant turn before it is scored; a newer turn within
+# it (or while the score is in flight) replaces the pending score
+SUPERVISOR_SCORE_DEBOUNCE = float(os.getenv("SUPERVISOR_SCORE_DEBOUNCE", "0.5"))
+
+# Weight of the universal STT detector's error likelihood; it reports 0.7 for
+# many well-understood turns, so alone it only crosses the threshold near 1.0
+STT_RISK_WEIGHT = 0.6
+# Similarity of the last bot turn to a recent one from which it counts as a near-repeat
+BOT_SIMILARITY_RISK = 0.6
+# Average LLM score above which the next turns are sampled less
+CLEAN_SCORE = 0.8
+
+# Whether the current scoring task has added its turn's score_history entry
+_score_recorded: ContextVar[bool] = ContextVar('supervisor_score_recorded', default=False)
+
+USER_FRUSTRATION_MARKERS = [
+    "you keep", "already told", "already said", "i just said", "same thing",
+    "not what i", "that's wrong", "that is wrong", "not listening", "stop repeating",
+]
+BOT_CONFUSION_MARKERS = [
+    "sorry, i didn't", "sorry, i did not", "i didn't catch", "i did not catch",
+    "could you repeat", "can you repeat", "i'm not sure i understand", "i don't understand",
+    "unable to", "something went wrong", "i apologize",
+]
+
 
 class SupervisorScore(BaseModel):
     """Supervisor scores"""
@@ -37,7 +75,10 @@ class Supervisor:
                  llm = None,
                  history_window: int = 6,
                  min_turns_for_repetition: int = 6,
-                 repetition_threshold: int = 3) -> None:  # Changed default from 2 to 3
+                 repetition_threshold: int = 3,  # Changed default from 2 to 3
+                 gating: bool = SUPERVISOR_GATING,
+                 sample_seed: Optional[int] = None,
+                 score_debounce: float = SUPERVISOR_SCORE_DEBOUNCE) -> None:
         self.session = session
         self.llm = llm if llm else openai.LLM(model="gpt-4o-mini")
         self.room = room
@@ -58,9 +99,22 @@ class Supervisor:
         self.repetition_flag = False
         self.transfer_reason = ""
         self.status_messages = []
+        self.status_streak = 0  # Consecutive status messages without a substantive answer
         self.last_bot_responses = []  # Track recent bot responses
+        self.repetition_detector = RepetitionDetector()  # Similarity of recent bot responses
         self.off_topic_count = 0  # Track off-topic requests
 
+        # LLM scoring gate
+        self.gating = gating
+        self.sample_rate = SUPERVISOR_SAMPLE_RATE
+        self._rng = random.Random(sample_seed)
+        self.gate_stats = {"turns": 0, "llm_calls": 0, "llm_saved": 0, "status_skipped": 0,
+                           "risk_triggered": 0, "sampled": 0, "superseded": 0}
+
+        # Single scoring slot: at most one pending or in-flight score per call
+        self.score_debounce = score_debounce
+        self._scoring_task: Optional[asyncio.Task] = None
+
     async def start(self):
         def on_close_wrapper(ev):
             asyncio.create_task(self._on_close(ev))
@@ -72,6 +126,7 @@ class Supervisor:
         @self.llm.on("metrics_collected")
         def on_metrics_collected(ev: MetricsCollectedEvent):
             self.usage_collector.collect(ev)
+            get_worker_metrics().add_llm_tokens(self.llm.model, ev.prompt_tokens, ev.completion_tokens)
 
     def extract_text(self, item) -> str:
         """Extract text content from conversation item."""
@@ -83,10 +138,13 @@ class Supervisor:
         return ""
 
     def _is_status_message(self, text: str) -> bool:
-        """Detect if a message is a status/wait message."""
+        """Detect if a message is a status/wait message (a question never is)."""
+        if "?" in text:
+            return False
         status_indicators = [
-            "please wait", "moment", "checking", "looking", "fetching",
-            "getting", "retrieving", "let me", "one second", "just a moment"
+            "please wait", "one moment", "a moment", "one second", "just a second",
+            "let me check", "let me look", "let me see", "let me pull", "let me find", "let me get",
+            "checking", "looking that up", "looking up", "fetching", "retrieving"
         ]
         text_lower = text.lower()
         return any(indicator in text_lower for indicator in status_indicators)
@@ -107,7 +165,10 @@ class Supervisor:
         # Track status messages separately
         if role == "assistant" and self._is_status_message(text):
             self.status_messages.append(text)
+            self.status_streak += 1
             logger.debug(f"Detected status message: {text[:50]}...")
+        elif role == "assistant":
+            self.status_streak = 0
         
         # Track off-topic requests
         if role == "user" and self._is_off_topic_request(text):
@@ -119,6 +180,8 @@ class Supervisor:
             self.last_bot_responses.append(text)
             if len(self.last_bot_responses) > 3:  # Changed from 2 to 3
                 self.last_bot_responses.pop(0)
+            # Status messages stay in: a bot that only ever says "one moment" is stalling
+            self.repetition_detector.add(text)
         
         # Add each message as a separate turn (no merging)
         self.restricted_history.append({"role": role, "text": text})
@@ -139,24 +202,100 @@ class Supervisor:
         return "\n".join(formatted)
 
     def _check_semantic_repetition(self) -> bool:
-        """Check if bot responses are semantically repetitive."""
-        if len(self.last_bot_responses) < 3:  # Changed from 2 to 3
-            return False
-            
-        # Simple heuristic: check if responses contain similar key phrases
-        key_phrases = [
-            "help with your ride", "trip service", "booking rides", 
-            "assist you with", "tam transit", "how can i help"
-        ]
-        
-        matches = 0
-        for response in self.last_bot_responses:
-            response_lower = response.lower()
-            if any(phrase in response_lower for phrase in key_phrases):
-                matches += 1
-                
-        # If all 3 recent responses contain key phrases, consider it repetitive
-        return matches >= 3  # Changed from 2 to 3
+        """Check if recent bot responses are paraphrases of each other."""
+        if self.repetition_detector.is_repetitive():
+            logger.debug(f"Repetitive bot responses: {self.repetition_detector.recent_texts()}")
+            return True
+        return False
+
+    def _bot_similarity(self) -> float:
+        """Highest similarity between the last bot turn and the ones before it."""
+        return self.repetition_detector.last_similarity()
+
+    def _local_risk(self, last_user: str, last_bot: str, stt_result: Optional[Dict[str, Any]]) -> Tuple[float, List[str]]:
+        """Risk (0-1) that the last turn needs an LLM score, from cheap local signals."""
+        signals = {}
+        # An open low-score or repetition streak can only be ended (or escalated) by the LLM
+        if self.nth_issue or self.repetition_count:
+            signals["open_streak"] = 1.0
+        if stt_result and stt_result['is_likely_stt_error']:
+            signals["stt_error"] = STT_RISK_WEIGHT * stt_result['confidence_score']
+        # One status message is normal; more in a row means the answer never came
+        if self.status_streak >= 2:
+            signals["status_stall"] = 1.0
+        if self.off_topic_count:
+            signals["off_topic"] = min(1.0, 0.35 * self.off_topic_count)
+        # Templated turns that still make progress ("pickup address" / "drop-off
+        # address") look like loops too, so the detector only sends them to the LLM
+        if self._check_semantic_repetition():
+            signals["bot_loop"] = 1.0
+        similarity = self._bot_similarity()
+        if similarity >= BOT_SIMILARITY_RISK:
+            signals["bot_similarity"] = similarity
+        user_lower, bot_lower = last_user.lower(), last_bot.lower()
+        if any(marker in user_lower for marker in USER_FRUSTRATION_MARKERS):
+            signals["user_frustration"] = 0.8
+        if any(marker in bot_lower for marker in BOT_CONFUSION_MARKERS):
+            signals["bot_confusion"] = 0.6
+        risk = max(signals.values(), default=0.0)
+        return risk, sorted(signals, key=signals.get, reverse=True)
+
+    def _should_score_with_llm(self, last_user: str, last_bot: str, stt_result: Optional[Dict[str, Any]]) -> bool:
+        """
+        Tier 1 of scoring: decide from local signals whether the LLM scores
+        this turn. Skipped turns get a placeholder in score_history so the
+        scores stay aligned with the agent turns they belong to.
+        """
+        self.gate_stats["turns"] += 1
+        if not self.gating:
+            self.gate_stats["llm_calls"] += 1
+            return True
+
+        if self._is_status_message(last_bot) and self.status_streak < 2 and not (self.nth_issue or self.repetition_count):
+            reason = "status"
+            self.gate_stats["status_skipped"] += 1
+        else:
+            risk, signals = self._local_risk(last_user, last_bot, stt_result)
+            if risk >= SUPERVISOR_RISK_THRESHOLD:
+                logger.debug(f"[SUPERVISOR GATE] LLM scoring (risk {risk:.2f}: {', '.join(signals)})")
+                self.gate_stats["risk_triggered"] += 1
+                self.gate_stats["llm_calls"] += 1
+                return True
+            if self._rng.random() < self.sample_rate:
+                logger.debug(f"[SUPERVISOR GATE] LLM scoring (sampled at {self.sample_rate:.2f}, risk {risk:.2f})")
+                self.gate_stats["sampled"] += 1
+                self.gate_stats["llm_calls"] += 1
+                return True
+            reason = "low_risk"
+
+        self.gate_stats["llm_saved"] += 1
+        logger.debug(f"[SUPERVISOR GATE] Skipped LLM scoring ({reason})")
+        self._record_skipped_score(reason)
+        return False
+
+    def _append_score(self, entry: Dict[str, Any]) -> None:
+        """Add the score_history entry of the agent turn the current task scores."""
+        self.score_history.append(entry)
+        _score_recorded.set(True)
+
+    def _record_skipped_score(self, reason: str) -> None:
+        """Placeholder score for an agent turn that was not scored."""
+        self._append_score({"relevance": "N/A", "completeness": "N/A", "groundedness": "N/A",
+                            "average": "N/A", "repetition_detected": False, "skipped": reason})
+
+    def _adapt_sample_rate(self, avg_score: float, repetition_detected: bool) -> None:
+        """Sample fewer turns while the LLM keeps finding them clean."""
+        if avg_score > CLEAN_SCORE and not repetition_detected:
+            self.sample_rate = max(SUPERVISOR_MIN_SAMPLE_RATE, self.sample_rate / 2)
+        else:
+            self.sample_rate = SUPERVISOR_SAMPLE_RATE
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Scoring gate statistics and the escalation outcome of the call."""
+        return dict(self.gate_stats,
+                    sample_rate=round(self.sample_rate, 4),
+                    escalated=self.escalated_to_live_agent,
+                    transfer_reason=self.transfer_reason or None)
 
     def _on_added(self, ev: ConversationItemAddedEvent):
         if self.escalated_to_live_agent:
@@ -178,12 +317,43 @@ class Supervisor:
 
         if ev.item.role == "assistant":
             self._update_restricted_history("assistant", item_text)
-            asyncio.create_task(self._score_response_and_act())
-
+            self._schedule_scoring()
+
+    def _schedule_scoring(self):
+        """
+        Score the latest assistant turn in the scoring slot. A pending or
+        in-flight score is cancelled: it would judge an outdated history.
+        """
+        previous = self._scoring_task
+        if previous is not None and not previous.done():
+            previous.cancel()
+        self._scoring_task = asyncio.create_task(self._debounced_score(previous))
+
+    async def _debounced_score(self, previous: Optional[asyncio.Task]):
+        # Per task: the cancelled predecessor may add its placeholder while this one waits
+        _score_recorded.set(False)
+        try:
+            if previous is not None:
+                # Let the cancelled score unwind so only one supervisor request is open
+                await asyncio.wait({previous})
+            await asyncio.sleep(self.score_debounce)
+            await self._score_response_and_act()
+        except asyncio.CancelledError:
+            if not _score_recorded.get():
+                self.gate_stats["superseded"] += 1
+                logger.debug("[SUPERVISOR] Score superseded by a newer assistant turn")
+                self._record_skipped_score("superseded")
+            raise
+
+    @traced(SUPERVISOR_SPAN, name="score_response")
     async def _score_response_and_act(self):
-        """Score the response and check for transfer conditions."""
+        """
+        Score the response and check for transfer conditions. Every path adds
+        one score_history entry, so the scores stay aligned with the agent turns.
+        """
         
         if len(self.restricted_history) < 2:
+            self._record_skipped_score("too_early")
             return
         
         check_repetition = len(self.restricted_history) >= self.min_turns_for_repetition
@@ -231,6 +401,7 @@ class Supervisor:
                 if last_three[0] == last_three[1] == last_three[2]:
                     logger.warning(f"[DIRECT REPETITION] Bot repeated identical message 3 times: '{last_three[0][:50]}...'")
                     self.transfer_reason = "Bot stuck in loop - giving identical responses repeatedly"
+                    self._record_skipped_score("escalated")
                     await self._escalate_with_reason(self.transfer_reason)
                     return
         
@@ -238,16 +409,14 @@ class Supervisor:
         if self.off_topic_count >= 3:  # Changed from 2 to 3
             logger.warning(f"[OFF-TOPIC LOOP] User asked about off-topic topics {self.off_topic_count} times")
             self.transfer_reason = f"User repeatedly asking about off-topic topics ({self.off_topic_count} times) - transferring to live agent"
+            self._record_skipped_score("escalated")
             await self._escalate_with_reason(self.transfer_reason)
             return
         
-        # SEMANTIC REPETITION CHECK: If bot gives semantically similar responses
-        if self._check_semantic_repetition():
-            logger.warning(f"[SEMANTIC REPETITION] Bot giving semantically similar responses")
-            self.transfer_reason = "Bot stuck in conversational loop - giving similar responses repeatedly"
-            await self._escalate_with_reason(self.transfer_reason)
+        # Tier 1: skip the LLM scorer when the cheap signals are clean
+        if not self._should_score_with_llm(last_user, last_bot, universal_stt_result):
             return
-        
+
         history_context = self._format_history_for_prompt()
         
         if check_repetition:
@@ -313,6 +482,13 @@ class Supervisor:
             - If intent mismatch is due to STT error, don't penalize the bot's response
             - Focus on whether bot response would be appropriate for the CORRECTED input, not the original"""
 
+        loop_context = ""
+        if self._check_semantic_repetition():
+            loop_context = """
+            NOTE: The bot's recent responses are worded alike. Treat this as repetition only if the
+            conversation is not progressing, not when similar questions cover different items
+            (e.g. pickup, then drop-off, then return address)."""
+
         prompt = f"""You are a supervisor scoring a chatbot's response. Return ONLY valid JSON, no other text.
 
             CONVERSATION HISTORY (last {self.history_window} turns):
@@ -322,6 +498,7 @@ class Supervisor:
             User: {last_user}
             Bot: {last_bot}
             {stt_context}
+            {loop_context}
 
             SCORING (0.00 to 1.00, two decimals):
             1. Relevance: Does bot address user's request or ask focused clarifying question?
@@ -340,14 +517,7 @@ class Supervisor:
             Return ONLY this JSON (no markdown, no extra text):
             {{"relevance": 0.xx, "completeness": 0.xx, "groundedness": 0.xx, "repetition_detected": false}}"""
 
-        chat_ctx = ChatContext([ChatMessage(role="system", content=[prompt])])
-
-        result = ""
-        async with self.llm.chat(chat_ctx=chat_ctx) as stream:
-            async for chunk in stream:
-                d = getattr(chunk, "delta", None)
-                if d and d.content:
-                    result += d.content
+        result = await self._llm_score(prompt)
 
         try:
             result_cleaned = result.strip()
@@ -363,7 +533,7 @@ class Supervisor:
                 logger.debug(f"Forced repetition_detected to False (insufficient history: {len(self.restricted_history)} turns, need {self.min_turns_for_repetition})")
                 
         except Exception as e:
-            logger.debug(f"[supervisor llm response] {result}")
+            logger.debug("[supervisor llm response] %s", result)
             logger.error(f"[supervisor score parse error] {e}")
             
             if len(self.restricted_history) >= 6:  # Need at least 3 bot responses
@@ -377,21 +547,25 @@ class Supervisor:
                         repetition_detected=check_repetition
                     )
                 else:
+                    self._record_skipped_score("parse_error")
                     return
             else:
+                self._record_skipped_score("parse_error")
                 return
 
         avg_score = (score.relevance + score.completeness + score.groundedness) / 3
+        self._adapt_sample_rate(float(avg_score), score.repetition_detected)
         
         if float(avg_score) == 0.0 and float(score.relevance) == 0.0 and float(score.completeness) == 0.0:
             logger.warning(f"All scores returned as 0.0 - likely LLM parsing error. Skipping this evaluation.")
             logger.debug(f"LLM raw response was: {result[:200]}")
+            self._record_skipped_score("invalid_score")
             return
         
         logger.info(f"[supervisor score] Relevance: {score.relevance}, Completeness: {score.completeness}, Groundedness: {score.groundedness}, Average: {avg_score}")
         logger.info(f"[repetition flag] {score.repetition_detected} (history turns: {len(self.restricted_history)}, check_enabled: {check_repetition}, threshold: {self.min_turns_for_repetition})")
 
-        self.score_history.append({
+        self._append_score({
             "relevance": str(float(score.relevance)),
             "completeness": str(float(score.completeness)),
             "groundedness": str(float(score.groundedness)),
@@ -431,6 +605,18 @@ class Supervisor:
             self.transfer_reason = f"Bot unable to assist effectively ({self.nth_issue} consecutive low-quality responses)"
             await self._escalate_with_reason(self.transfer_reason)
 
+    async def _llm_score(self, prompt: str) -> str:
+        """Tier 2 of scoring: stream the scoring prompt through the supervisor LLM."""
+        chat_ctx = ChatContext([ChatMessage(role="system", content=[prompt])])
+
+        result = ""
+        async with self.llm.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                d = getattr(chunk, "delta", None)
+                if d and d.content:
+                    result += d.content
+        return result
+
     async def _escalate_with_reason(self, reason: str):
         """Escalate to live agent with clear reason."""
         if self.escalated_to_live_agent:
@@ -460,24 +646,13 @@ class Supervisor:
         logger.info("_basic_transfer function called...")
         logger.info(f"Transfer Reason: {self.transfer_reason}")
         
-        try:
-            async with api.LiveKitAPI() as livekit_api:
-                asterisk_ip = os.getenv("ASTERISK_SERVER_IP")
-                transfer_to = f"sip:5000@{str(asterisk_ip)}"
-                participant_identity = list(self.room.remote_participants.values())[0].identity
-                
-                transfer_request = TransferSIPParticipantRequest(
-                    participant_identity=participant_identity,
-                    room_name=self.room.name,
-                    transfer_to=transfer_to,
-                    play_dialtone=False,
-                )
-
-                await livekit_api.sip.transfer_sip_participant(transfer_request)
-                logger.info(f"Call transferred successfully. Reason: {self.transfer_reason}")
-                
-        except Exception as e:
-            logger.error(f"Error during call transfer: {e}")
+        result = await get_transfer_engine().transfer(
+            room=self.room,
+            transfer_to=asterisk_target(DISPATCHER_EXTENSION),
+        )
+        if result.success:
+            logger.info(f"Call transferred successfully. Reason: {self.transfer_reason}")
+        else:
             return "Issue with call transfer"
 
     async def _on_close(self, _: CloseEvent):
@@ -486,15 +661,19 @@ class Supervisor:
     async def stop(self):
         """Cleanup method for supervisor shutdown."""
         logger.info("Supervisor stopping...")
+        if self._scoring_task is not None and not self._scoring_task.done():
+            self._scoring_task.cancel()
         
         if self.transfer_reason:
             logger.info(f"Session ended with transfer. Reason: {self.transfer_reason}")
         
-        logger.info(f"Total responses scored: {len(self.score_history)}")
-        if self.score_history:
+        scored = [s for s in self.score_history if "skipped" not in s]
+        logger.info(f"Total responses scored: {len(scored)} (LLM calls saved by gating: {self.gate_stats['llm_saved']}"
+                    f" of {self.gate_stats['turns']} turns)")
+        if scored:
             avg_scores = {
-                "relevance": sum(float(s["relevance"]) for s in self.score_history) / len(self.score_history),
-                "completeness": sum(float(s["completeness"]) for s in self.score_history) / len(self.score_history),
-                "groundedness": sum(float(s["groundedness"]) for s in self.score_history) / len(self.score_history),
+                "relevance": sum(float(s["relevance"]) for s in scored) / len(scored),
+                "completeness": sum(float(s["completeness"]) for s in scored) / len(scored),
+                "groundedness": sum(float(s["groundedness"]) for s in scored) / len(scored),
             }
             logger.info(f"Average scores - Relevance: {avg_scores['relevance']:.2f}, Completeness: {avg_scores['completeness']:.2f}, Groundedness: {avg_scores['groundedness']:.2f}")
\ No newline at end of file
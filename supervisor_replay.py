@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Replay recorded calls through the supervisor with and without LLM gating.
+
+Reads call documents exported from the call log collection (mongoexport
+JSONL, or a JSON list of documents) and feeds each conversation_history
+through two supervisors: a baseline that sends every turn to the LLM scorer
+and a gated one (see SUPERVISOR_GATING in supervisor.py). The LLM scores
+are the ones recorded with each agent turn, so the replay makes no LLM
+requests; replay calls recorded with SUPERVISOR_GATING=false, since turns
+recorded without a score replay as unparseable LLM output.
+
+Reports LLM calls per mode, the calls saved, and escalation recall: of the
+calls the baseline escalates, how many the gated supervisor still escalates
+and how many turns later. Documents with a boolean "escalated" label (or
+supervisor.escalated) also get recall against that label. Sampling is
+random, so the gated replay runs --runs times with consecutive seeds.
+
+Usage:
+    python supervisor_replay.py calls.jsonl [more.jsonl] [--runs 5] [--seed 0]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+import supervisor as supervisor_module
+import universal_stt_detector
+from supervisor import Supervisor
+
+
+class ReplaySupervisor(Supervisor):
+    """Supervisor that scores with recorded scores and records escalations instead of transferring."""
+
+    def __init__(self, gating: bool, sample_seed: Optional[int] = None):
+        super().__init__(session=None, room=None, llm=object(), gating=gating, sample_seed=sample_seed)
+        self.turn = 0
+        self.escalated_at: Optional[int] = None
+        self.recorded_score: Optional[Dict[str, Any]] = None
+        self._scoring_scheduled = False
+
+    def _schedule_scoring(self):
+        self._scoring_scheduled = True
+
+    async def _llm_score(self, prompt: str) -> str:
+        if self.recorded_score is None:
+            return ""
+        return json.dumps(self.recorded_score)
+
+    async def _escalate_with_reason(self, reason: str):
+        if self.escalated_to_live_agent:
+            return
+        self.escalated_to_live_agent = True
+        self.transfer_reason = reason
+        self.escalated_at = self.turn
+
+
+def recorded_score(score: Any) -> Optional[Dict[str, Any]]:
+    """The LLM score recorded with a turn, or None when the turn was not scored."""
+    if not isinstance(score, dict):
+        return None
+    try:
+        return {
+            "relevance": float(score["relevance"]),
+            "completeness": float(score["completeness"]),
+            "groundedness": float(score["groundedness"]),
+            "repetition_detected": bool(score.get("repetition_detected", False)),
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def replay_call(history: List[Dict[str, Any]], gating: bool, sample_seed: Optional[int] = None) -> Dict[str, Any]:
+    """Feed one call's conversation_history through a supervisor."""
+    supervisor = ReplaySupervisor(gating, sample_seed)
+    for turn, entry in enumerate(history):
+        role = "assistant" if entry.get("speaker") == "Agent" else "user"
+        supervisor.turn = turn
+        supervisor.recorded_score = recorded_score(entry.get("score"))
+        supervisor._on_added(SimpleNamespace(item=SimpleNamespace(role=role, content=[entry.get("transcription", "")])))
+        if supervisor._scoring_scheduled:
+            supervisor._scoring_scheduled = False
+            await supervisor._score_response_and_act()
+        if supervisor.escalated_to_live_agent:
+            break
+    return {"llm_calls": supervisor.gate_stats["llm_calls"], "turns": supervisor.gate_stats["turns"],
+            "escalated_at": supervisor.escalated_at, "reason": supervisor.transfer_reason or None}
+
+
+def load_calls(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Call documents with a conversation_history from JSON or JSONL files."""
+    calls = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        try:
+            data = json.loads(text)
+            docs = data if isinstance(data, list) else [data]
+        except ValueError:
+            docs = [json.loads(line) for line in text.splitlines() if line.strip()]
+        calls.extend(doc for doc in docs if doc.get("conversation_history"))
+    return calls
+
+
+def _label(doc: Dict[str, Any]) -> Optional[bool]:
+    label = doc.get("escalated", (doc.get("supervisor") or {}).get("escalated"))
+    return label if isinstance(label, bool) else None
+
+
+def compare(calls: List[Dict[str, Any]], runs: int = 5, seed: int = 0) -> Dict[str, Any]:
+    """Replay every call ungated once and gated `runs` times; summarize calls saved and recall."""
+    baseline = [asyncio.run(replay_call(doc["conversation_history"], gating=False)) for doc in calls]
+    baseline_calls = sum(r["llm_calls"] for r in baseline)
+    escalated = [i for i, r in enumerate(baseline) if r["escalated_at"] is not None]
+    labeled = [(i, label) for i, label in ((i, _label(doc)) for i, doc in enumerate(calls)) if label is not None]
+    positives = [i for i, label in labeled if label]
+
+    gated_runs = []
+    for run in range(runs):
+        gated = [asyncio.run(replay_call(doc["conversation_history"], gating=True, sample_seed=seed + run * len(calls) + i))
+                 for i, doc in enumerate(calls)]
+        kept = [i for i in escalated if gated[i]["escalated_at"] is not None]
+        gated_runs.append({
+            "llm_calls": sum(r["llm_calls"] for r in gated),
+            "recall": len(kept) / len(escalated) if escalated else None,
+            "delay_turns": [gated[i]["escalated_at"] - baseline[i]["escalated_at"] for i in kept],
+            "escalations": sum(1 for r in gated if r["escalated_at"] is not None),
+            "false_escalations": sum(1 for i, r in enumerate(gated)
+                                     if r["escalated_at"] is not None and i not in escalated),
+            "label_recall": (sum(1 for i in positives if gated[i]["escalated_at"] is not None) / len(positives)
+                             if positives else None),
+        })
+
+    gated_calls = sum(r["llm_calls"] for r in gated_runs) / runs if runs else 0.0
+    recalls = [r["recall"] for r in gated_runs if r["recall"] is not None]
+    delays = [d for r in gated_runs for d in r["delay_turns"]]
+    label_recalls = [r["label_recall"] for r in gated_runs if r["label_recall"] is not None]
+    return {
+        "calls": len(calls),
+        "scored_turns": sum(r["turns"] for r in baseline),
+        "llm_calls": {"baseline": baseline_calls, "gated": round(gated_calls, 1)},
+        "llm_calls_saved": round(baseline_calls - gated_calls, 1),
+        "llm_calls_saved_pct": round(100 * (1 - gated_calls / baseline_calls), 1) if baseline_calls else None,
+        "escalations": {"baseline": len(escalated),
+                        "gated": round(sum(r["escalations"] for r in gated_runs) / runs, 1) if runs else 0},
+        "recall": {"mean": round(sum(recalls) / len(recalls), 3) if recalls else None,
+                   "min": round(min(recalls), 3) if recalls else None},
+        "mean_delay_turns": round(sum(delays) / len(delays), 2) if delays else None,
+        "false_escalations": round(sum(r["false_escalations"] for r in gated_runs) / runs, 1) if runs else 0,
+        "label_recall": {
+            "labeled": len(labeled),
+            "baseline": (sum(1 for i in positives if baseline[i]["escalated_at"] is not None) / len(positives)
+                         if positives else None),
+            "gated": round(sum(label_recalls) / len(label_recalls), 3) if label_recalls else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded calls through the gated and ungated supervisor")
+    parser.add_argument("paths", nargs="+", help="JSON or JSONL files of call documents")
+    parser.add_argument("--runs", type=int, default=5, help="Gated replays with different sampling seeds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Per-turn supervisor and STT detector logs would drown the report
+    supervisor_module.logger.setLevel(logging.WARNING)
+    universal_stt_detector.logger.setLevel(logging.ERROR)
+
+    report = compare(load_calls(args.paths), runs=args.runs, seed=args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
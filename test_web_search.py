@@ -29,6 +29,9 @@ async def test_search():
             
             try:
                 result = await search_web_manual(query)
+                if result is None:
+                    print(f"⚠️ Search failed")
+                    continue
                 print(f"✅ Result: {result[:200]}...")
                 
                 if "timed out" in result.lower() or "unavailable" in result.lower() or "failed" in result.lower():
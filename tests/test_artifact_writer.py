@@ -0,0 +1,129 @@
+"""
+Test Suite for the background artifact writer
+
+Covers non-blocking queued writes, batching, drops on a full queue and
+daily archiving of previous days' artifacts.
+"""
+
+import os
+import tarfile
+import threading
+import time
+from datetime import date, timedelta
+
+from artifact_writer import ArtifactWriter, PROMPT_ARTIFACT, TRIP_PAYLOAD_ARTIFACT
+
+
+class TestArtifactWriter:
+    """Test the artifact writer"""
+
+    def test_write_and_flush(self, tmp_path):
+        """Test that queued artifacts land on disk after a flush"""
+        writer = ArtifactWriter(base_dir=str(tmp_path), archive=False)
+        try:
+            assert writer.write(PROMPT_ARTIFACT, "final_prompt_CA1.txt", "prompt text")
+            assert writer.write(TRIP_PAYLOAD_ARTIFACT, "final_payload_CA1.txt", "{}")
+            assert writer.flush()
+
+            assert (tmp_path / "prompt" / "final_prompt_CA1.txt").read_text() == "prompt text"
+            assert (tmp_path / "trip_book_payload" / "final_payload_CA1.txt").read_text() == "{}"
+            assert writer.get_stats()["written"] == 2
+        finally:
+            writer.close()
+
+    def test_last_write_wins_within_batch(self, tmp_path):
+        """Test that repeated writes to one file keep the latest content"""
+        writer = ArtifactWriter(base_dir=str(tmp_path), archive=False)
+        try:
+            for i in range(20):
+                writer.write(PROMPT_ARTIFACT, "final_prompt_CA2.txt", f"version {i}")
+            writer.flush()
+            assert (tmp_path / "prompt" / "final_prompt_CA2.txt").read_text() == "version 19"
+        finally:
+            writer.close()
+
+    def test_full_queue_drops_without_blocking(self, tmp_path):
+        """Test that a stalled disk drops artifacts instead of blocking callers"""
+        writer = ArtifactWriter(base_dir=str(tmp_path), max_queue=2, batch_size=1, archive=False)
+        release = threading.Event()
+        original = writer._write_batch
+
+        def slow_batch(batch):
+            release.wait(5)
+            original(batch)
+
+        writer._write_batch = slow_batch
+        try:
+            started = time.perf_counter()
+            results = [writer.write(PROMPT_ARTIFACT, f"p{i}.txt", "x") for i in range(10)]
+            elapsed = time.perf_counter() - started
+
+            assert elapsed < 0.5
+            assert results.count(False) >= 7
+            assert writer.get_stats()["dropped"] == results.count(False)
+        finally:
+            release.set()
+            writer.close()
+
+    def test_archive_old_artifacts(self, tmp_path):
+        """Test that previous days' artifacts are rolled into a daily archive"""
+        writer = ArtifactWriter(base_dir=str(tmp_path), archive=False)
+        prompt_dir = tmp_path / "prompt"
+        prompt_dir.mkdir()
+        old_file = prompt_dir / "final_prompt_old.txt"
+        new_file = prompt_dir / "final_prompt_new.txt"
+        old_file.write_text("old")
+        new_file.write_text("new")
+
+        yesterday = date.today() - timedelta(days=1)
+        old_time = time.mktime(yesterday.timetuple()) + 3600
+        os.utime(old_file, (old_time, old_time))
+
+        assert writer.archive_old_artifacts() == 1
+        assert not old_file.exists()
+        assert new_file.exists()
+
+        archive_path = tmp_path / "archive" / "prompt" / f"{yesterday.isoformat()}.tar.gz"
+        with tarfile.open(archive_path, "r:gz") as tar:
+            assert tar.getnames() == ["final_prompt_old.txt"]
+            assert tar.extractfile("final_prompt_old.txt").read() == b"old"
+
+    def test_archive_does_not_overwrite(self, tmp_path):
+        """Test that a second archive for the same day gets its own file"""
+        writer = ArtifactWriter(base_dir=str(tmp_path), archive=False)
+        prompt_dir = tmp_path / "prompt"
+        prompt_dir.mkdir()
+        yesterday = date.today() - timedelta(days=1)
+        old_time = time.mktime(yesterday.timetuple()) + 3600
+
+        for name in ("a.txt", "b.txt"):
+            path = prompt_dir / name
+            path.write_text(name)
+            os.utime(path, (old_time, old_time))
+            writer.archive_old_artifacts()
+
+        archives = sorted(os.listdir(tmp_path / "archive" / "prompt"))
+        assert archives == [f"{yesterday.isoformat()}.1.tar.gz", f"{yesterday.isoformat()}.tar.gz"]
+
+    def test_concurrent_archiving_is_serialized(self, tmp_path):
+        """Test that workers archiving the same directory at once produce one archive"""
+        writers = [ArtifactWriter(base_dir=str(tmp_path), archive=False) for _ in range(4)]
+        prompt_dir = tmp_path / "prompt"
+        prompt_dir.mkdir()
+        yesterday = date.today() - timedelta(days=1)
+        old_time = time.mktime(yesterday.timetuple()) + 3600
+        for i in range(50):
+            path = prompt_dir / f"p{i}.txt"
+            path.write_text(str(i))
+            os.utime(path, (old_time, old_time))
+
+        results = []
+        threads = [threading.Thread(target=lambda w=w: results.append(w.archive_old_artifacts())) for w in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(results) == [0, 0, 0, 50]
+        assert os.listdir(tmp_path / "archive" / "prompt") == [f"{yesterday.isoformat()}.tar.gz"]
+        assert os.listdir(prompt_dir) == []
@@ -0,0 +1,223 @@
+"""
+Test Suite for the persistent cache backends
+
+Covers newer-wins writes and version-bounded deletes of the SQLite store,
+sharing it across processes, and the Redis backend against a local
+Redis-protocol stand-in server.
+"""
+
+import fnmatch
+import pickle
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from cache_backends import RedisCacheStore, create_cache_store
+from cache_store import CacheBackend, SQLiteCacheStore
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """Serves the handful of commands RedisCacheStore uses"""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        data = self.server.data
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            self.server.commands.append(command)
+            if command in (b"PING", b"AUTH", b"SELECT"):
+                reply = b"+OK\r\n"
+            elif command == b"GET":
+                reply = self._bulk(data.get(args[1]))
+            elif command == b"SET":
+                data[args[1]] = args[2]
+                reply = b"+OK\r\n"
+            elif command == b"DEL":
+                removed = sum(1 for key in args[1:] if data.pop(key, None) is not None)
+                reply = b":%d\r\n" % removed
+            elif command == b"MGET":
+                reply = b"*%d\r\n" % (len(args) - 1) + b"".join(self._bulk(data.get(key)) for key in args[1:])
+            elif command == b"SCAN":
+                pattern = args[args.index(b"MATCH") + 1].decode()
+                keys = [key for key in data if fnmatch.fnmatchcase(key.decode(), pattern)]
+                reply = b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(self._bulk(key) for key in keys)
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class _PlantedPayload:
+    """Records whether it was ever unpickled"""
+
+    loaded = False
+
+    def __reduce__(self):
+        return (setattr, (_PlantedPayload, "loaded", True))
+
+
+class _RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+@pytest.fixture
+def resp_server():
+    """A local Redis-protocol stand-in server"""
+    server = _RespServer(("127.0.0.1", 0), _RespHandler)
+    server.data = {}
+    server.commands = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def store(request, tmp_path):
+    """Each backend, empty"""
+    if request.param == "sqlite":
+        backend = SQLiteCacheStore(str(tmp_path / "cache.db"))
+    else:
+        server = request.getfixturevalue("resp_server")
+        backend = RedisCacheStore(f"redis://127.0.0.1:{server.server_address[1]}/0")
+    yield backend
+    backend.close()
+
+
+class TestCacheBackends:
+    """Test the CacheBackend contract on every backend"""
+
+    def test_round_trip(self, store):
+        """Test writes, single gets and namespace loads"""
+        now = time.time()
+        store.write_batch([("affiliate", "301", {"AffiliateID": 62}, now), ("client", "301:62:8", [1], now)], [])
+        assert store.get("affiliate", "301") == ({"AffiliateID": 62}, now)
+        assert store.get("affiliate", "302") is None
+        assert store.load("client") == {"301:62:8": ([1], now)}
+        assert store.count() == 2
+
+    def test_newer_wins(self, store):
+        """Test that an older write never replaces a newer entry"""
+        now = time.time()
+        store.write_batch([("affiliate", "301", "new", now)], [])
+        store.write_batch([("affiliate", "301", "old", now - 10)], [])
+        assert store.get("affiliate", "301")[0] == "new"
+
+    def test_bounded_delete(self, store):
+        """Test that a delete bounded by a version keeps newer rows"""
+        now = time.time()
+        store.write_batch([("affiliate", "301", "a", now), ("affiliate", "302", "b", now - 10)], [])
+        store.write_batch([], [("affiliate", "301", now - 5), ("affiliate", "302", now - 5)])
+        assert store.get("affiliate", "301") is not None
+        assert store.get("affiliate", "302") is None
+
+        store.write_batch([], [("affiliate", "301")])
+        assert store.count() == 0
+
+    def test_clear(self, store):
+        """Test that clearing removes every entry"""
+        store.write_batch([("geocode", "1 main st", [], time.time())], [])
+        store.clear()
+        assert store.count() == 0
+
+
+    def test_incomplete_backend_rejected(self):
+        """Test that a backend missing interface methods fails when instantiated"""
+        class PartialStore(CacheBackend):
+            def get(self, namespace, key):
+                return None
+
+        with pytest.raises(TypeError):
+            PartialStore()
+
+class TestSharedSQLiteStore:
+    """Test the SQLite store shared between processes"""
+
+    def test_entries_visible_across_processes(self, tmp_path):
+        """Test that an entry written by another process is read here"""
+        db_file = str(tmp_path / "cache.db")
+        store = SQLiteCacheStore(db_file)
+        script = (
+            "import time\n"
+            "from cache_store import SQLiteCacheStore\n"
+            f"SQLiteCacheStore({db_file!r}).write_batch([('affiliate', '301', {{'AffiliateID': 62}}, time.time())], [])\n"
+        )
+        subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, check=True, timeout=60)
+        assert store.get("affiliate", "301")[0] == {"AffiliateID": 62}
+
+
+class TestRedisBackend:
+    """Test Redis-specific behaviour"""
+
+    def test_keys_expire_server_side(self, resp_server):
+        """Test that entries are written with a server-side expiry and a prefix"""
+        store = RedisCacheStore(f"redis://127.0.0.1:{resp_server.server_address[1]}/0", key_ttl=60)
+        store.write_batch([("affiliate", "301", "a", time.time())], [])
+        assert list(resp_server.data) == [b"ivr_cache:affiliate:301"]
+        store.close()
+
+    def test_reconnects_after_disconnect(self, resp_server):
+        """Test that a dropped connection is re-established transparently"""
+        store = RedisCacheStore(f"redis://127.0.0.1:{resp_server.server_address[1]}/0")
+        store.write_batch([("affiliate", "301", "a", time.time())], [])
+        store.conn._sock.close()
+        assert store.get("affiliate", "301")[0] == "a"
+        store.close()
+
+    def test_entries_stored_as_json(self, resp_server):
+        """Test that entries are written as JSON and tuples come back as lists"""
+        store = RedisCacheStore(f"redis://127.0.0.1:{resp_server.server_address[1]}/0")
+        now = time.time()
+        store.write_batch([("affiliate_details", "62", ({"min": 1}, ["A"], []), now)], [])
+        assert resp_server.data[b"ivr_cache:affiliate_details:62"].startswith(b'[[{"min":1}')
+        assert store.get("affiliate_details", "62") == ([{"min": 1}, ["A"], []], now)
+        store.close()
+
+    def test_pickled_entry_not_loaded(self, resp_server):
+        """Test that a pickled payload planted in Redis is skipped without being unpickled"""
+        resp_server.data[b"ivr_cache:affiliate:301"] = pickle.dumps((_PlantedPayload(), time.time()))
+        store = RedisCacheStore(f"redis://127.0.0.1:{resp_server.server_address[1]}/0")
+        assert store.get("affiliate", "301") is None
+        assert store.load("affiliate") == {}
+        assert _PlantedPayload.loaded is False
+        store.close()
+
+    def test_unserializable_value_skipped(self, resp_server):
+        """Test that a value JSON cannot encode is left out without failing the batch"""
+        store = RedisCacheStore(f"redis://127.0.0.1:{resp_server.server_address[1]}/0")
+        store.write_batch([("affiliate", "301", object(), time.time()), ("affiliate", "302", "b", time.time())], [])
+        assert list(resp_server.data) == [b"ivr_cache:affiliate:302"]
+        store.close()
+
+    def test_create_cache_store(self, resp_server, tmp_path):
+        """Test backend selection"""
+        assert isinstance(create_cache_store("sqlite", db_file=str(tmp_path / "c.db")), SQLiteCacheStore)
+        redis_store = create_cache_store("redis", redis_url=f"redis://127.0.0.1:{resp_server.server_address[1]}/0")
+        assert isinstance(redis_store, RedisCacheStore)
+        redis_store.close()
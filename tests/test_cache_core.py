@@ -0,0 +1,93 @@
+"""
+Test Suite for cache_core
+
+Covers TTL expiry, LRU eviction by entry count and byte size, removal
+callbacks and statistics of TTLCache.
+"""
+
+import time
+
+from cache_core import TTLCache, REMOVED_EVICTED, REMOVED_EXPIRED, REMOVED_DELETED
+
+
+class TestTTLCache:
+    """Test TTLCache behaviour"""
+
+    def test_get_and_set(self):
+        """Test basic storage and misses"""
+        cache = TTLCache("t")
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert "a" in cache and len(cache) == 1
+
+    def test_lazy_expiry(self):
+        """Test that an expired entry is removed when accessed"""
+        removed = []
+        cache = TTLCache("t", ttl=10, on_remove=lambda key, entry, reason: removed.append((key, reason)))
+        cache.set("a", 1, stored_at=time.time() - 11)
+        assert "a" in cache
+        assert cache.get("a") is None
+        assert "a" not in cache
+        assert removed == [("a", REMOVED_EXPIRED)]
+
+    def test_shorter_lookup_ttl_keeps_entry(self):
+        """Test that a stricter per-lookup TTL misses without removing the entry"""
+        cache = TTLCache("t", ttl=100)
+        cache.set("a", 1, stored_at=time.time() - 20)
+        assert cache.get("a", ttl=10) is None
+        assert cache.get("a") == 1
+
+    def test_lru_eviction_by_count(self):
+        """Test that the least recently used entry is evicted first"""
+        removed = []
+        cache = TTLCache("t", max_entries=2, on_remove=lambda key, entry, reason: removed.append((key, reason)))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.keys() == ["a", "c"]
+        assert removed == [("b", REMOVED_EVICTED)]
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_eviction_by_bytes(self):
+        """Test that the byte cap evicts until the total fits"""
+        cache = TTLCache("t", max_bytes=10, sizeof=len)
+        cache.set("a", "xxxx")
+        cache.set("b", "xxxx")
+        cache.set("c", "xxxx")
+        assert cache.keys() == ["b", "c"]
+        assert cache.get_stats()["bytes"] == 8
+
+    def test_oversized_value_not_cached(self):
+        """Test that a value larger than the byte cap is rejected"""
+        cache = TTLCache("t", max_bytes=3, sizeof=len)
+        cache.set("a", "xxxx")
+        assert len(cache) == 0
+
+    def test_purge_and_delete(self):
+        """Test explicit removal paths and their callbacks"""
+        removed = []
+        cache = TTLCache("t", ttl=10, on_remove=lambda key, entry, reason: removed.append((key, reason)))
+        cache.set("old", 1, stored_at=time.time() - 11)
+        cache.set("new", 2)
+        assert cache.purge_expired() == ["old"]
+        assert cache.delete("new") is True
+        assert cache.delete("new") is False
+        assert removed == [("old", REMOVED_EXPIRED), ("new", REMOVED_DELETED)]
+
+    def test_load_respects_limits(self):
+        """Test that bulk loading keeps the newest entries within the limits"""
+        now = time.time()
+        cache = TTLCache("t", max_entries=2)
+        cache.load({"a": (1, now - 3), "b": (2, now - 2), "c": (3, now - 1)})
+        assert cache.keys() == ["b", "c"]
+
+    def test_stats(self):
+        """Test hit rate accounting"""
+        cache = TTLCache("t")
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
@@ -0,0 +1,417 @@
+"""
+Test Suite for cache_manager
+
+Covers exact and normalized phone lookups for the affiliate and client
+caches, the ids: namespace, index maintenance, size limits, the generic
+namespaces and write-behind persistence.
+"""
+
+import asyncio
+import os
+import pickle
+import sqlite3
+import time
+
+import pytest
+
+import cache_manager
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Run each test against empty caches persisted to a temporary directory"""
+    monkeypatch.setattr(cache_manager, "AFFILIATE_CACHE_FILE", str(tmp_path / "affiliate_cache.pkl"))
+    monkeypatch.setattr(cache_manager, "CLIENT_CACHE_FILE", str(tmp_path / "client_cache.pkl"))
+    saved = {namespace: cache.entries() for namespace, cache in cache_manager._caches.items()}
+    cache_manager.init_persistence(str(tmp_path / "cache.db"))
+    for cache in cache_manager._caches.values():
+        cache.clear()
+    cache_manager.rebuild_indexes()
+    yield
+    cache_manager.init_persistence(cache_manager.CACHE_DB_FILE)
+    for namespace, cache in cache_manager._caches.items():
+        cache.clear()
+        cache.load({key: (entry.value, entry.stored_at) for key, entry in saved[namespace]})
+    cache_manager.rebuild_indexes()
+
+
+def expire(cache, key):
+    """Backdate an entry past its retention, including any stale grace window"""
+    entry = cache.peek(key)
+    cache.set(key, entry.value, stored_at=time.time() - cache.ttl - 1)
+
+
+def make_stale(cache, key):
+    """Backdate an entry past the default TTL but within the stale grace window"""
+    entry = cache.peek(key)
+    cache.set(key, entry.value, stored_at=time.time() - cache_manager.DEFAULT_CACHE_TTL - 1)
+
+
+class TestAffiliateCache:
+    """Test affiliate cache lookups"""
+
+    def test_exact_hit(self):
+        """Test lookup with the stored key"""
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        assert cache_manager.get_affiliate_from_cache("3015550123") == {"AffiliateID": 62}
+
+    @pytest.mark.parametrize("query", ["+13015550123", "(301) 555-0123", "1-301-555-0123", " 301.555.0123 "])
+    def test_normalized_hit(self, query):
+        """Test that differently formatted numbers hit the same entry"""
+        cache_manager.store_affiliate_in_cache("+1 (301) 555-0123", {"AffiliateID": 62})
+        assert cache_manager.get_affiliate_from_cache(query) == {"AffiliateID": 62}
+
+    def test_miss_and_expiry(self):
+        """Test misses and expired normalized matches"""
+        cache_manager.store_affiliate_in_cache("+13015550123", {"AffiliateID": 62})
+        assert cache_manager.get_affiliate_from_cache("3015559999") is None
+        assert cache_manager.get_affiliate_from_cache("") is None
+
+        expire(cache_manager.affiliate_cache, "+13015550123")
+        assert cache_manager.get_affiliate_from_cache("3015550123") is None
+
+    def test_ids_keys_are_exact_only(self):
+        """Test that ids: keys are neither normalized nor matched by digits"""
+        cache_manager.store_affiliate_in_cache("ids:1:21", {"AffiliateID": 21})
+        assert cache_manager.get_affiliate_from_cache("ids:1:21") == {"AffiliateID": 21}
+        assert cache_manager.get_affiliate_from_cache("121") is None
+        assert cache_manager.get_affiliate_from_cache("ids:01:21") is None
+        assert cache_manager.affiliate_phone_index == {}
+
+    def test_store_keeps_one_entry(self):
+        """Test that storing no longer duplicates entries under a digits-only key"""
+        cache_manager.store_affiliate_in_cache("+1 (301) 555-0123", {"AffiliateID": 62})
+        assert cache_manager.affiliate_cache.keys() == ["+1 (301) 555-0123"]
+
+    def test_index_rebuilt_on_load(self):
+        """Test that persisted caches are indexed when loaded"""
+        cache_manager.store_affiliate_in_cache("+13015550123", {"AffiliateID": 62})
+        cache_manager.save_caches()
+        cache_manager.affiliate_phone_index.clear()
+        cache_manager.load_caches()
+        assert cache_manager.get_affiliate_from_cache("3015550123") == {"AffiliateID": 62}
+
+
+class TestClientCache:
+    """Test client cache lookups"""
+
+    def test_normalized_hit_requires_matching_ids(self):
+        """Test that phone normalization applies only within the same affiliate and family"""
+        cache_manager.store_client_in_cache("+13015550123", 62, 8, {"number_of_riders": 1})
+
+        assert cache_manager.get_client_from_cache("3015550123", "62", "8") == {"number_of_riders": 1}
+        assert cache_manager.get_client_from_cache("(301) 555-0123", 62, 8) == {"number_of_riders": 1}
+        assert cache_manager.get_client_from_cache("3015550123", 63, 8) is None
+        assert cache_manager.get_client_from_cache("3015550123", 62, 9) is None
+
+    def test_expired_entries_leave_index(self):
+        """Test that cleaning expired entries drops their index entries"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, {"number_of_riders": 1})
+        key = "3015550123:62:8"
+        expire(cache_manager.client_info_cache, key)
+
+        cache_manager.clean_expired_entries()
+        assert cache_manager.client_phone_index == {}
+        assert cache_manager.get_client_from_cache("+13015550123", 62, 8) is None
+
+
+class TestCacheLimits:
+    """Test eviction and the generic namespaces"""
+
+    def test_eviction_is_local_only(self, monkeypatch):
+        """Test that an evicted entry leaves the phone index but stays in the shared store"""
+        monkeypatch.setattr(cache_manager.affiliate_cache, "max_entries", 2)
+        cache_manager.store_affiliate_in_cache("3015550001", {"AffiliateID": 1})
+        cache_manager.store_affiliate_in_cache("3015550002", {"AffiliateID": 2})
+        cache_manager.save_caches()
+
+        cache_manager.get_affiliate_from_cache("3015550001")
+        cache_manager.store_affiliate_in_cache("3015550003", {"AffiliateID": 3})
+        cache_manager.save_caches()
+
+        assert cache_manager.affiliate_cache.keys() == ["3015550001", "3015550003"]
+        assert "3015550002" not in cache_manager.affiliate_phone_index
+        assert len(cache_manager._store.load(cache_manager.AFFILIATE_NAMESPACE)) == 3
+
+    def test_expired_lookup_is_removed(self):
+        """Test that an expired entry is dropped when it is looked up"""
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        expire(cache_manager.affiliate_cache, "3015550123")
+        assert cache_manager.get_affiliate_from_cache("3015550123") is None
+        assert "3015550123" not in cache_manager.affiliate_cache
+        assert cache_manager.affiliate_phone_index == {}
+
+    def test_generic_namespace_round_trip(self):
+        """Test get_cached/store_cached and their persistence"""
+        assert cache_manager.get_cached(cache_manager.GEOCODE_NAMESPACE, "1 main st") is None
+        cache_manager.store_cached(cache_manager.GEOCODE_NAMESPACE, "1 main st", [{"lat": 1.0}])
+        cache_manager.save_caches()
+
+        cache_manager.geocode_cache.clear()
+        cache_manager.load_caches()
+        assert cache_manager.get_cached(cache_manager.GEOCODE_NAMESPACE, "1 main st") == [{"lat": 1.0}]
+
+    def test_stats(self):
+        """Test that statistics are reported per namespace"""
+        cache_manager.store_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, 62, ("bounds", [], []))
+        cache_manager.get_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, 62)
+        cache_manager.get_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, 63)
+
+        stats = cache_manager.get_stats()
+        assert stats[cache_manager.AFFILIATE_DETAILS_NAMESPACE]["hits"] >= 1
+        assert stats[cache_manager.AFFILIATE_DETAILS_NAMESPACE]["entries"] == 1
+        assert stats["persistence"]["pending"] == 1
+
+
+class TestStaleWhileRevalidate:
+    """Test serving stale entries while they are refreshed in the background"""
+
+    def test_stale_entry_served_and_refreshed(self):
+        """Test that a stale hit returns at once and the refresh replaces the entry"""
+        cache_manager.store_affiliate_in_cache("+13015550123", {"AffiliateID": 62})
+        make_stale(cache_manager.affiliate_cache, "+13015550123")
+        calls = []
+
+        async def refresh():
+            calls.append(1)
+            return {"AffiliateID": 63}
+
+        async def scenario():
+            first = cache_manager.get_affiliate_from_cache("3015550123", refresh=refresh)
+            second = cache_manager.get_affiliate_from_cache("3015550123", refresh=refresh)
+            await asyncio.gather(*cache_manager._refresh_tasks)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first == second == {"AffiliateID": 62}
+        assert calls == [1]
+        assert cache_manager.get_affiliate_from_cache("3015550123") == {"AffiliateID": 63}
+        assert cache_manager.affiliate_cache.keys() == ["+13015550123"]
+
+    def test_refresh_failure_keeps_stale_entry(self):
+        """Test that failed or error-string refreshes are counted and do not overwrite"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, {"number_of_riders": 1})
+        make_stale(cache_manager.client_info_cache, "3015550123:62:8")
+        failures = cache_manager.get_stats()["stale_while_revalidate"]["refresh_failures"]
+
+        async def refresh():
+            return "GetIVRAIAffiliate API failed!"
+
+        async def scenario():
+            data = cache_manager.get_client_from_cache("3015550123", 62, 8, refresh=refresh)
+            await asyncio.gather(*cache_manager._refresh_tasks)
+            return data
+
+        assert asyncio.run(scenario()) == {"number_of_riders": 1}
+        stats = cache_manager.get_stats()["stale_while_revalidate"]
+        assert stats["refresh_failures"] == failures + 1
+        assert stats["in_flight"] == 0
+        assert cache_manager.client_info_cache.peek("3015550123:62:8").value == {"number_of_riders": 1}
+
+    def test_no_stale_serve_without_refresh_or_past_grace(self):
+        """Test that stale entries need a refresh function and must be within the grace window"""
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        make_stale(cache_manager.affiliate_cache, "3015550123")
+
+        async def refresh():
+            return {"AffiliateID": 63}
+
+        async def lookups():
+            without_refresh = cache_manager.get_affiliate_from_cache("3015550123")
+            expire(cache_manager.affiliate_cache, "3015550123")
+            past_grace = cache_manager.get_affiliate_from_cache("3015550123", refresh=refresh)
+            return without_refresh, past_grace
+
+        assert asyncio.run(lookups()) == (None, None)
+
+
+class TestClientInvalidation:
+    """Test event-driven invalidation and patching of client entries"""
+
+    RIDERS = {"number_of_riders": 1, "rider_1": {"client_id": 7, "number_of_existing_trips": 2}}
+
+    def test_patch_updates_entry(self):
+        """Test that a patch is applied to a copy and found by normalized phone"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, self.RIDERS)
+
+        def patch(data):
+            data["rider_1"]["number_of_existing_trips"] += 1
+
+        assert cache_manager.patch_client_in_cache("+1 301 555 0123", 62, 8, patch) is True
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8)["rider_1"]["number_of_existing_trips"] == 3
+        assert self.RIDERS["rider_1"]["number_of_existing_trips"] == 2
+
+    def test_failed_patch_invalidates(self):
+        """Test that a patch returning False drops the entry everywhere"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, self.RIDERS)
+        cache_manager.save_caches()
+
+        assert cache_manager.patch_client_in_cache("3015550123", 62, 8, lambda data: False) is False
+        cache_manager.save_caches()
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) is None
+        assert cache_manager._store.count() == 0
+
+    def test_invalidation_seen_by_other_workers(self):
+        """Test that a local hit is dropped once another worker invalidated the shared row"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, self.RIDERS)
+        cache_manager.save_caches()
+
+        # Another worker deletes the shared row
+        cache_manager._store.write_batch([], [(cache_manager.CLIENT_NAMESPACE, "3015550123:62:8")])
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) is None
+        assert "3015550123:62:8" not in cache_manager.client_info_cache
+
+    def test_newer_shared_version_wins(self):
+        """Test that a local hit picks up a version patched by another worker"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, self.RIDERS)
+        cache_manager.save_caches()
+
+        patched = {"number_of_riders": 1, "rider_1": {"client_id": 7, "number_of_existing_trips": 5}}
+        cache_manager._store.write_batch(
+            [(cache_manager.CLIENT_NAMESPACE, "3015550123:62:8", patched, time.time() + 1)], [])
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) == patched
+
+    def test_kept_open_reader_sees_other_workers(self):
+        """Test that repeated hits on the kept-open read connection still see another worker's changes"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, self.RIDERS)
+        cache_manager.save_caches()
+        for _ in range(3):
+            assert cache_manager.get_client_from_cache("3015550123", 62, 8) == self.RIDERS
+
+        # Another worker (its own store on the same file) patches, then invalidates the entry
+        other = cache_manager.create_cache_store("sqlite", db_file=cache_manager._store.path)
+        patched = {"number_of_riders": 1, "rider_1": {"client_id": 7, "number_of_existing_trips": 5}}
+        other.write_batch([(cache_manager.CLIENT_NAMESPACE, "3015550123:62:8", patched, time.time() + 1)], [])
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) == patched
+        other.write_batch([], [(cache_manager.CLIENT_NAMESPACE, "3015550123:62:8")])
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) is None
+        other.close()
+
+    def test_remote_store_rechecked_by_interval(self, monkeypatch):
+        """Test that a remote store is re-checked at most every CACHE_SYNC_INTERVAL per key"""
+        cache_manager.store_client_in_cache("3015550123", 62, 8, self.RIDERS)
+        cache_manager.save_caches()
+        monkeypatch.setattr(cache_manager._store, "remote", True)
+        monkeypatch.setattr(cache_manager, "CACHE_SYNC_INTERVAL", 0.05)
+
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) == self.RIDERS
+        cache_manager._store.write_batch([], [(cache_manager.CLIENT_NAMESPACE, "3015550123:62:8")])
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) == self.RIDERS
+        time.sleep(0.06)
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) is None
+
+    def test_is_cacheable_client_info(self):
+        """Test that failed lookups are not cached"""
+        assert cache_manager.is_cacheable_client_info(self.RIDERS)
+        assert not cache_manager.is_cacheable_client_info({"number_of_riders": 0})
+        assert not cache_manager.is_cacheable_client_info(
+            {"number_of_riders": 1, "rider_1": {"name": "new_rider", "client_id": -1}})
+        assert not cache_manager.is_cacheable_client_info("Request failed")
+
+
+class TestSharedStore:
+    """Test sharing the persistent store between worker processes"""
+
+    def test_read_through_on_local_miss(self):
+        """Test that an entry stored by another worker is served and cached locally"""
+        cache_manager._store.write_batch(
+            [(cache_manager.AFFILIATE_NAMESPACE, "+13015550123", {"AffiliateID": 62}, time.time())], [])
+
+        assert cache_manager.get_affiliate_from_cache("+13015550123") == {"AffiliateID": 62}
+        assert "+13015550123" in cache_manager.affiliate_cache
+        assert cache_manager.get_affiliate_from_cache("3015550123") == {"AffiliateID": 62}
+        assert cache_manager.get_stats()["persistence"]["shared_hits"] >= 1
+
+    def test_read_through_ignores_stale_rows(self):
+        """Test that expired shared entries are not served"""
+        cache_manager._store.write_batch(
+            [(cache_manager.CLIENT_NAMESPACE, "3015550123:62:8", {"n": 1}, time.time() - cache_manager.DEFAULT_CACHE_TTL - 1)], [])
+        assert cache_manager.get_client_from_cache("3015550123", 62, 8) is None
+
+    def test_local_expiry_keeps_newer_shared_entry(self):
+        """Test that expiring an old local copy does not delete a newer row from another worker"""
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        cache_manager.save_caches()
+        expire(cache_manager.affiliate_cache, "3015550123")
+        cache_manager.save_caches()
+        assert cache_manager._store.get(cache_manager.AFFILIATE_NAMESPACE, "3015550123")[0] == {"AffiliateID": 62}
+
+
+class TestCachePersistence:
+    """Test write-behind persistence of the caches"""
+
+    def test_store_defers_disk_writes(self, tmp_path):
+        """Test that a store only marks the entry dirty until the flush"""
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        assert cache_manager._persister.pending() == 1
+        assert cache_manager._store.count() == 0
+
+        cache_manager.save_caches()
+        assert cache_manager._persister.pending() == 0
+        assert cache_manager._store.count() == 1
+
+    def test_flush_writes_only_dirty_entries(self):
+        """Test that a flush writes the changed entries, not the whole cache"""
+        for i in range(50):
+            cache_manager.store_client_in_cache(f"30155500{i:02d}", 62, 8, {"i": i})
+        cache_manager.save_caches()
+
+        cache_manager.store_client_in_cache("3015550001", 62, 8, {"i": "updated"})
+        assert cache_manager._persister.flush() == 1
+        assert cache_manager._store.load(cache_manager.CLIENT_NAMESPACE)["3015550001:62:8"][0] == {"i": "updated"}
+
+    def test_background_flush(self):
+        """Test that the debounced background flusher persists stores"""
+        cache_manager._persister.delay = 0.05
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+
+        deadline = time.time() + 5
+        while cache_manager._store.count() == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        assert cache_manager._store.count() == 1
+
+    def test_reload_from_store(self):
+        """Test that flushed entries survive a reload and stay indexed"""
+        cache_manager.store_affiliate_in_cache("+13015550123", {"AffiliateID": 62})
+        cache_manager.store_client_in_cache("3015550123", 62, 8, {"number_of_riders": 1})
+        cache_manager.save_caches()
+
+        cache_manager.affiliate_cache.clear()
+        cache_manager.client_info_cache.clear()
+        cache_manager.load_caches()
+        assert cache_manager.get_affiliate_from_cache("3015550123") == {"AffiliateID": 62}
+        assert cache_manager.get_client_from_cache("+1 301 555 0123", 62, 8) == {"number_of_riders": 1}
+
+    def test_expired_entries_are_deleted_from_store(self, monkeypatch):
+        """Test that expiry cleanup removes persisted rows on the next flush"""
+        monkeypatch.setattr(cache_manager.affiliate_cache, "ttl", 0.05)
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        cache_manager.save_caches()
+
+        time.sleep(0.1)
+        cache_manager.save_caches()
+        assert cache_manager._store.count() == 0
+
+    def test_legacy_pickle_migration(self, tmp_path):
+        """Test that legacy pickle caches are migrated once into the store"""
+        legacy = {"3015550123": ({"AffiliateID": 62}, time.time())}
+        with open(cache_manager.AFFILIATE_CACHE_FILE, "wb") as f:
+            pickle.dump(legacy, f)
+
+        cache_manager.load_caches()
+        assert cache_manager.get_affiliate_from_cache("+13015550123") == {"AffiliateID": 62}
+        assert not os.path.exists(cache_manager.AFFILIATE_CACHE_FILE)
+        assert os.path.exists(cache_manager.AFFILIATE_CACHE_FILE + ".migrated")
+        assert cache_manager._store.count() == 1
+
+    def test_clear_cache(self, tmp_path):
+        """Test that clearing drops memory, pending changes and persisted rows"""
+        cache_manager.store_affiliate_in_cache("3015550123", {"AffiliateID": 62})
+        cache_manager.save_caches()
+        cache_manager.store_affiliate_in_cache("3015550124", {"AffiliateID": 63})
+
+        cache_manager.clear_cache()
+        assert len(cache_manager.affiliate_cache) == 0
+        assert cache_manager._persister.pending() == 0
+        with sqlite3.connect(str(tmp_path / "cache.db")) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] == 0
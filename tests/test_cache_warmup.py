@@ -0,0 +1,162 @@
+"""
+Test Suite for cache_warmup
+
+Covers populating the affiliate caches, bounded prefetch concurrency,
+failure accounting and the prewarm skip when the shared cache is warm.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import cache_manager
+import cache_warmup
+import side_functions
+
+AFFILIATES = [
+    {"AffiliateID": 62, "AffiliateFamilyID": 8, "TwillioPhoneNumber": "3015550123", "AffiliateName": "A"},
+    {"AffiliateID": 63, "AffiliateFamilyID": 8, "TwillioPhoneNumber": "3015550124", "AffiliateName": "B"},
+    {"AffiliateID": 64, "AffiliateFamilyID": 9, "TwillioPhoneNumber": "", "AffiliateName": "C"},
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Run each test against empty caches persisted to a temporary directory"""
+    saved = {namespace: cache.entries() for namespace, cache in cache_manager._caches.items()}
+    cache_manager.init_persistence(str(tmp_path / "cache.db"))
+    for cache in cache_manager._caches.values():
+        cache.clear()
+    cache_manager.rebuild_indexes()
+    yield
+    cache_manager.init_persistence(cache_manager.CACHE_DB_FILE)
+    for namespace, cache in cache_manager._caches.items():
+        cache.clear()
+        cache.load({key: (entry.value, entry.stored_at) for key, entry in saved[namespace]})
+    cache_manager.rebuild_indexes()
+
+
+@pytest.fixture
+def fake_apis(monkeypatch):
+    """Replace the affiliate API calls with in-memory fakes that populate the cache like the real ones"""
+    state = {"active": 0, "peak": 0, "fail": set()}
+
+    async def fetch_affiliates():
+        return [dict(affiliate) for affiliate in AFFILIATES]
+
+    async def fetch_affiliate_details(affiliate_id):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        bounds = {"x1": 1, "y1": 2, "x2": 3, "y2": 4}
+        if affiliate_id not in state["fail"]:
+            cache_manager.store_cached(cache_manager.AFFILIATE_DETAILS_NAMESPACE, affiliate_id, (bounds, [], []))
+        return bounds, [], []
+
+    async def fetch_payment_types(affiliate_id):
+        cache_manager.store_cached(cache_manager.PAYMENT_TYPES_NAMESPACE, affiliate_id, [{"PaymentType ID": 1}])
+        return [{"PaymentType ID": 1}]
+
+    monkeypatch.setattr(cache_warmup, "fetch_affiliates", fetch_affiliates)
+    monkeypatch.setattr(cache_warmup, "fetch_affiliate_details", fetch_affiliate_details)
+    monkeypatch.setattr(cache_warmup, "fetch_payment_types", fetch_payment_types)
+    return state
+
+
+class TestWarmCache:
+    """Test the warmup routine"""
+
+    def test_populates_caches(self, fake_apis):
+        """Test that affiliates are cached by trunk number and ids: key, with their details"""
+        report = asyncio.run(cache_warmup.warm_cache(concurrency=4))
+
+        assert report.affiliates == 3
+        assert report.entries == {"affiliate": 5, "affiliate_details": 3, "payment_types": 3}
+        assert report.total_entries == 11
+        assert report.failures == 0
+        assert cache_manager.get_affiliate_from_cache("+13015550124")["AffiliateName"] == "B"
+        assert cache_manager.get_affiliate_from_cache("ids:9:64")["AffiliateName"] == "C"
+        assert cache_manager._store.count() >= 11
+
+    def test_bounded_concurrency(self, fake_apis):
+        """Test that no more than `concurrency` affiliates are prefetched at once"""
+        asyncio.run(cache_warmup.warm_cache(concurrency=2))
+        assert fake_apis["peak"] == 2
+
+    def test_failures_counted(self, fake_apis):
+        """Test that affiliates whose details could not be cached are reported"""
+        fake_apis["fail"].add(63)
+        report = asyncio.run(cache_warmup.warm_cache())
+        assert report.failures == 1
+        assert report.entries["affiliate_details"] == 2
+
+
+    def test_failed_service_area_search_not_cached(self, fake_apis, monkeypatch):
+        """Test that a failed counties search is neither cached nor counted, and a later success is"""
+        results = [None, "Montgomery, Frederick"]
+
+        async def search_web_manual(prompt):
+            return results.pop(0)
+
+        monkeypatch.setattr(side_functions, "search_web_manual", search_web_manual)
+        bounds = {"x1": 1, "y1": 2, "x2": 3, "y2": 4}
+
+        assert asyncio.run(side_functions.get_service_area_counties(62, bounds)) is None
+        assert len(cache_manager._caches[cache_manager.SERVICE_AREA_NAMESPACE]) == 0
+        assert asyncio.run(side_functions.get_service_area_counties(62, bounds)) == "Montgomery, Frederick"
+        assert asyncio.run(side_functions.get_service_area_counties(62, bounds)) == "Montgomery, Frederick"
+        assert results == []
+
+    def test_failed_affiliate_fetch_clears_marker(self, fake_apis, monkeypatch):
+        """Test that a failed affiliate fetch leaves no marker, so the next worker retries"""
+        async def failing_fetch_affiliates():
+            return []
+
+        monkeypatch.setattr(cache_warmup, "fetch_affiliates", failing_fetch_affiliates)
+        report = asyncio.run(cache_warmup.warm_cache())
+        assert report.affiliates == 0
+        assert cache_manager.get_cached(cache_manager.WARMUP_NAMESPACE, "last_run") is None
+        assert cache_manager._store.get(cache_manager.WARMUP_NAMESPACE, "last_run") is None
+
+class TestPrewarm:
+    """Test the worker start hook"""
+
+    def test_prewarm_runs_once(self, fake_apis, monkeypatch):
+        """Test that prewarm warms the cache and later workers skip it"""
+        monkeypatch.setattr(cache_warmup, "WARMUP_ON_START", True)
+        calls = []
+        original = cache_warmup.warm_cache
+
+        async def counting_warm_cache(**kwargs):
+            calls.append(1)
+            return await original(**kwargs)
+
+        monkeypatch.setattr(cache_warmup, "warm_cache", counting_warm_cache)
+        cache_warmup.prewarm()
+        cache_warmup.prewarm()
+        assert calls == [1]
+        assert cache_manager.get_cached(cache_manager.WARMUP_NAMESPACE, "last_run")["status"] == "done"
+
+    def test_prewarm_disabled(self, fake_apis, monkeypatch):
+        """Test that CACHE_WARMUP_ON_START=false skips warmup"""
+        monkeypatch.setattr(cache_warmup, "WARMUP_ON_START", False)
+        cache_warmup.prewarm()
+        assert len(cache_manager.affiliate_cache) == 0
+
+    def test_abandoned_running_marker_ignored(self, fake_apis, monkeypatch):
+        """Test that a "running" marker from a warmup that died does not block warmup"""
+        monkeypatch.setattr(cache_warmup, "WARMUP_ON_START", True)
+        cache_manager.store_cached(cache_manager.WARMUP_NAMESPACE, "last_run",
+                                   {"status": "running", "started_at": time.time() - cache_warmup.WARMUP_RUNNING_TTL - 1})
+        cache_warmup.prewarm()
+        assert cache_manager.get_cached(cache_manager.WARMUP_NAMESPACE, "last_run")["status"] == "done"
+
+    def test_recent_running_marker_respected(self, fake_apis, monkeypatch):
+        """Test that a warmup still running in another worker is not started again"""
+        monkeypatch.setattr(cache_warmup, "WARMUP_ON_START", True)
+        cache_manager.store_cached(cache_manager.WARMUP_NAMESPACE, "last_run",
+                                   {"status": "running", "started_at": time.time()})
+        cache_warmup.prewarm()
+        assert cache_manager.get_cached(cache_manager.WARMUP_NAMESPACE, "last_run")["status"] == "running"
@@ -0,0 +1,154 @@
+"""
+Test Suite for per-call context
+
+Runs many simulated calls concurrently on one event loop and checks that
+cost usage and log records are attributed to the call that produced them,
+including from tasks spawned by tools and threads started with to_thread,
+and from shutdown callbacks run by the task that started the job.
+"""
+
+import asyncio
+import contextvars
+import logging
+import random
+
+import pytest
+
+import cost_tracker
+from call_context import bind_call_context, get_call_context, start_call_context
+from logging_config import (SessionContextFilter, get_logger_instance, set_call_sid, set_session_id,
+                            set_transfer_status, get_call_sid)
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured_logs(monkeypatch):
+    """Collect context-tagged records without writing per-call log files"""
+    monkeypatch.setattr(get_logger_instance().call_handler, "emit", lambda record: None)
+    handler = _ListHandler()
+    handler.addFilter(SessionContextFilter())
+    logger = logging.getLogger("test_call_context")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    yield logger, handler.records
+    logger.removeHandler(handler)
+
+
+async def _simulated_call(index, logger):
+    call_id = f"call-{index}"
+    start_call_context()
+    cost_tracker.set_call_context(call_id)
+    set_session_id(call_id)
+    set_call_sid(call_id)
+
+    async def tool(turn):
+        await asyncio.sleep(random.random() / 1000)
+        cost_tracker.add_agent_usage(index, 1)
+        logger.info(f"{call_id} tool {turn}")
+        if turn == 2:
+            set_transfer_status("ENABLED")
+
+    def blocking_tool():
+        cost_tracker.add_websearch_usage(1, index)
+        logger.info(f"{call_id} thread")
+
+    for turn in range(4):
+        await asyncio.create_task(tool(turn))
+        await asyncio.sleep(0)
+    await asyncio.to_thread(blocking_tool)
+    logger.info(f"{call_id} done")
+    return cost_tracker.get_cost_tracker(call_id).breakdown
+
+
+class TestCallContext:
+    """Test per-call attribution across concurrent calls on one loop"""
+
+    def test_concurrent_calls_attribution(self, captured_logs):
+        """Test that each call's usage and logs carry its own call id"""
+        logger, records = captured_logs
+        calls = 50
+
+        async def run():
+            return await asyncio.gather(*(_simulated_call(index, logger) for index in range(calls)))
+
+        try:
+            breakdowns = asyncio.run(run())
+            for index, breakdown in enumerate(breakdowns):
+                assert breakdown.agent_tokens.input_tokens == 4 * index
+                assert breakdown.agent_tokens.output_tokens == 4
+                assert breakdown.websearch_tokens.output_tokens == index
+        finally:
+            for index in range(calls):
+                cost_tracker.cleanup_call_tracker(f"call-{index}")
+
+        assert len(records) == calls * 6
+        for record in records:
+            call_id = record.getMessage().split()[0]
+            assert record.call_sid == call_id
+            assert record.session_id == call_id
+        # The transfer status set inside a tool task is seen by the rest of the call
+        done = [record for record in records if record.getMessage().endswith("done")]
+        assert all(record.transfer_status == "ENABLED" for record in done)
+
+    def test_set_call_context_does_not_relabel_other_calls(self):
+        """Test that switching calls in a task leaves the previous call's context intact"""
+        async def run():
+            start_call_context()
+            cost_tracker.set_call_context("first")
+            first = get_call_context()
+            cost_tracker.set_call_context("second")
+            return first, get_call_context()
+
+        first, second = asyncio.run(run())
+        assert first.call_id == "first"
+        assert second.call_id == "second"
+
+    def test_no_context_outside_calls(self):
+        """Test the defaults outside any call"""
+        def read():
+            return cost_tracker.get_current_call_id(), get_call_sid()
+
+        assert contextvars.Context().run(read) == (None, None)
+
+    def test_shutdown_callback_rebinds_call(self, captured_logs):
+        """Test that a shutdown callback run from the job runner's task books usage and logs to its call"""
+        logger, records = captured_logs
+        callbacks = []
+
+        async def entrypoint():
+            context = start_call_context()
+            cost_tracker.set_call_context("CA-shutdown")
+            set_call_sid("CA-shutdown")
+            cost_tracker.reset_cost_tracker("CA-shutdown")
+
+            async def cleanup():
+                unbound = cost_tracker.get_current_call_id()
+                bind_call_context(context)
+                cost_tracker.add_agent_usage(100, 10)
+                logger.info("call ended")
+                return unbound
+
+            callbacks.append(cleanup)
+
+        async def run_job():
+            # Like LiveKit's job runner: the entrypoint runs as a child task and
+            # the shutdown callbacks run in the runner's own task afterwards
+            await asyncio.create_task(entrypoint())
+            return await asyncio.create_task(callbacks[0]())
+
+        unbound = asyncio.run(run_job())
+        try:
+            assert unbound is None
+            assert cost_tracker.get_cost_tracker("CA-shutdown").breakdown.agent_tokens.input_tokens == 100
+            assert [record.call_sid for record in records] == ["CA-shutdown"]
+        finally:
+            cost_tracker.cleanup_call_tracker("CA-shutdown")
@@ -0,0 +1,131 @@
+"""
+Test Suite for the end-of-call flush
+
+LiveKit job processes exit with os._exit, so atexit hooks never run there.
+Covers flush_call_outputs writing the cost document, the cost rollups, the
+call's artifacts and the worker metrics snapshot before cleanup returns,
+using in-memory stand-ins for the collections.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+import artifact_writer
+import fleet_metrics
+import main
+import tracing
+from artifact_writer import ArtifactWriter
+from cost_log_sink import CostLogSink
+from cost_rollups import CostRollupAggregator
+from fleet_metrics import WorkerMetrics
+
+
+class FakeCostLogs:
+    """In-memory stand-in for the costlogs collection"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            self.docs[doc["_id"]] = doc
+
+
+class FakeRollups:
+    """In-memory stand-in for the cost_rollups collection"""
+
+    def __init__(self):
+        self.operations = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+def make_call_doc():
+    return {"call_sid_new": "CA-end", "affiliate_id": "62", "start_time": datetime(2026, 1, 1, 12, 0, 0),
+            "duration_seconds": 30,
+            "tokens": {"agent": {"input_tokens": 100, "output_tokens": 20, "model": "gpt-4.1-mini"}},
+            "cost": {"agent_cost": 0.01, "total_cost": 0.01}}
+
+
+@pytest.fixture
+def sinks(tmp_path, monkeypatch):
+    """Point main at sinks whose background writers would not run before the process exits"""
+    costlogs = FakeCostLogs()
+    rollups = FakeRollups()
+    sink = CostLogSink(costlogs, spool_dir=str(tmp_path), flush_interval=3600)
+    aggregator = CostRollupAggregator(rollups, flush_interval=3600)
+    monkeypatch.setattr(main, "cost_log_sink", sink)
+    monkeypatch.setattr(main, "cost_rollups", aggregator)
+    writer = ArtifactWriter(base_dir=str(tmp_path), archive=False)
+    monkeypatch.setattr(artifact_writer, "_artifact_writer", writer)
+    monkeypatch.setattr(fleet_metrics, "_worker_metrics", WorkerMetrics(metrics_dir=str(tmp_path / "fleet")))
+    yield costlogs, rollups, sink, aggregator
+    sink.close()
+    aggregator.close()
+    writer.close()
+
+
+class TestFlushCallOutputs:
+    """Test the end-of-call flush"""
+
+    def test_cost_document_and_rollups_written(self, sinks):
+        """Test that the call's cost document and rollups are written before cleanup returns"""
+        costlogs, rollups, sink, aggregator = sinks
+        doc = make_call_doc()
+        sink.submit(doc)
+        aggregator.record_call(doc)
+        assert aggregator.get_stats()["pending"] > 0
+
+        asyncio.run(main.flush_call_outputs("CA-end"))
+
+        assert doc["_id"] in costlogs.docs
+        assert aggregator.get_stats()["pending"] == 0
+        assert rollups.operations
+
+    def test_failed_rollup_flush_does_not_stop_cleanup(self, sinks, monkeypatch):
+        """Test that a failing flush is logged and the other flushes still run"""
+        costlogs, rollups, sink, aggregator = sinks
+        monkeypatch.setattr(rollups, "bulk_write", lambda operations, ordered=True: 1 / 0)
+        doc = make_call_doc()
+        aggregator.record_call(doc)
+        sink.submit(doc)
+
+        asyncio.run(main.flush_call_outputs("CA-end"))
+        assert doc["_id"] in costlogs.docs
+
+    def test_trace_artifact_written(self, sinks, tmp_path, monkeypatch):
+        """Test that the call's latency trace is on disk before cleanup returns"""
+        writer = artifact_writer._artifact_writer
+        original = writer._write_batch
+
+        def slow_write_batch(batch):
+            # A slow disk: without the flush the artifact is still queued when the process exits
+            time.sleep(0.2)
+            original(batch)
+
+        monkeypatch.setattr(writer, "_write_batch", slow_write_batch)
+        tracing.record_span("llm_turn", "llm", 5.0, call_id="CA-end")
+        assert tracing.export_call_trace("CA-end", otlp_file=None) is not None
+        asyncio.run(main.flush_call_outputs("CA-end"))
+
+        assert (tmp_path / "call_trace" / "trace_CA-end.json").exists()
+
+    def test_worker_snapshot_includes_finished_call(self, sinks):
+        """Test that the worker snapshot counts the call as completed before cleanup returns"""
+        metrics = fleet_metrics.get_worker_metrics()
+        metrics.call_started()
+        metrics.add_cost(0.01)
+        metrics.call_ended()
+
+        asyncio.run(main.flush_call_outputs("CA-end"))
+
+        with open(metrics.path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        assert snapshot["counters"]["calls_completed"] == 1
+        assert snapshot["counters"]["cost_usd"] == 0.01
+        assert snapshot["gauges"]["active_calls"] == 0
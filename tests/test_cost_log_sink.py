@@ -0,0 +1,199 @@
+"""
+Test Suite for the batched cost-log sink
+
+Covers non-blocking submission, batched insert_many writes, retries with
+backoff, spooling while Mongo is unreachable and replaying the spool, using
+an in-memory stand-in for the pymongo collection.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from cost_log_sink import CostLogSink
+
+
+class FakeCollection:
+    """In-memory stand-in for a pymongo collection"""
+
+    def __init__(self):
+        self.docs = {}
+        self.calls = []
+        self.fail_next = 0
+        self.delay = 0.0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls.append(len(docs))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_next:
+            self.fail_next -= 1
+            raise AutoReconnect("connection refused")
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["_id"] in self.docs:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["_id"]] = dict(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(docs) - len(errors)})
+
+
+def make_doc(i):
+    return {"call_sid_new": f"chat-{i}", "user": ObjectId(), "start_time": datetime(2026, 1, 1, 12, 0, i % 60),
+            "cost": {"total_cost": i / 1000}}
+
+
+class TestCostLogSink:
+    """Test the cost-log sink"""
+
+    def test_batched_writes(self, tmp_path):
+        """Test that submitted documents are written with insert_many in batches"""
+        collection = FakeCollection()
+        sink = CostLogSink(collection, spool_dir=str(tmp_path), batch_size=10)
+        collection.delay = 0.05
+        try:
+            for i in range(25):
+                assert sink.submit(make_doc(i))
+            assert sink.flush()
+            assert len(collection.docs) == 25
+            assert max(collection.calls) <= 10
+            assert len(collection.calls) < 25
+            assert sink.get_stats()["written"] == 25
+        finally:
+            sink.close()
+
+    def test_submit_does_not_block_on_slow_mongo(self, tmp_path):
+        """Test that a slow insert never delays the caller"""
+        collection = FakeCollection()
+        collection.delay = 0.5
+        sink = CostLogSink(collection, spool_dir=str(tmp_path))
+        try:
+            started = time.perf_counter()
+            for i in range(5):
+                sink.submit(make_doc(i))
+            assert time.perf_counter() - started < 0.1
+            assert sink.flush()
+            assert len(collection.docs) == 5
+        finally:
+            sink.close()
+
+    def test_retry_with_backoff(self, tmp_path):
+        """Test that transient failures are retried without duplicating documents"""
+        collection = FakeCollection()
+        collection.fail_next = 2
+        sink = CostLogSink(collection, spool_dir=str(tmp_path), max_retries=3, retry_backoff=0.01)
+        try:
+            sink.submit(make_doc(1))
+            assert sink.flush()
+            assert len(collection.docs) == 1
+            assert sink.get_stats()["retries"] == 2
+            assert sink.spooled_count() == 0
+        finally:
+            sink.close()
+
+    def test_spool_and_replay(self, tmp_path):
+        """Test that documents are spooled while Mongo is down and replayed once it recovers"""
+        collection = FakeCollection()
+        collection.fail_next = 100
+        sink = CostLogSink(collection, spool_dir=str(tmp_path), max_retries=1, retry_backoff=0.01)
+        try:
+            docs = [make_doc(i) for i in range(3)]
+            for doc in docs:
+                sink.submit(doc)
+            assert sink.flush()
+            assert sink.spooled_count() == 3
+            assert collection.docs == {}
+
+            collection.fail_next = 0
+            sink.submit(make_doc(99))
+            assert sink.flush()
+            assert len(collection.docs) == 4
+            assert sink.spooled_count() == 0
+            assert sink.get_stats()["replayed"] == 3
+            # Types survive the spool round trip
+            replayed = collection.docs[docs[0]["_id"]]
+            assert isinstance(replayed["user"], ObjectId)
+            assert replayed["start_time"] == docs[0]["start_time"]
+        finally:
+            sink.close()
+
+    def test_replays_spool_left_by_exited_process(self, tmp_path):
+        """Test that a spool file from a process that has exited is replayed on start"""
+        collection = FakeCollection()
+        collection.fail_next = 100
+        crashed = CostLogSink(collection, spool_dir=str(tmp_path), max_retries=0)
+        crashed.spool_file = str(tmp_path / "costlogs.999999999.jsonl")
+        crashed._spool([make_doc(1), make_doc(2)])
+
+        collection.fail_next = 0
+        sink = CostLogSink(collection, spool_dir=str(tmp_path))
+        try:
+            sink.start()
+            deadline = time.monotonic() + 5
+            while len(collection.docs) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(collection.docs) == 2
+            assert sink.spooled_count() == 0
+        finally:
+            sink.close()
+
+    def test_full_queue_spools(self, tmp_path):
+        """Test that a full queue spools documents to disk instead of dropping them"""
+        collection = FakeCollection()
+        release = threading.Event()
+        original = collection.insert_many
+
+        def stalled(docs, ordered=True):
+            release.wait(5)
+            return original(docs, ordered=ordered)
+
+        collection.insert_many = stalled
+        sink = CostLogSink(collection, spool_dir=str(tmp_path), max_queue=1, batch_size=1)
+        try:
+            results = [sink.submit(make_doc(i)) for i in range(5)]
+            assert results.count(False) >= 3
+            release.set()
+            assert sink.flush()
+            assert len(collection.docs) + sink.spooled_count() == 5
+        finally:
+            sink.close()
+
+    def test_flush_timeout_spools_unwritten(self, tmp_path):
+        """Test that a flush that times out spools queued and in-flight documents before the process exits"""
+        collection = FakeCollection()
+        release = threading.Event()
+        original = collection.insert_many
+
+        def stalled(docs, ordered=True):
+            release.wait(5)
+            return original(docs, ordered=ordered)
+
+        collection.insert_many = stalled
+        sink = CostLogSink(collection, spool_dir=str(tmp_path), batch_size=1)
+        try:
+            docs = [make_doc(i) for i in range(3)]
+            for doc in docs:
+                sink.submit(doc)
+            assert not sink.flush(timeout=0.1)
+            assert sink.spooled_count() == 3
+
+        finally:
+            release.set()
+            sink.close()
+
+        # The stalled insert completed; the next worker replays the spool, skipping it as a duplicate
+        collection.insert_many = original
+        replayer = CostLogSink(collection, spool_dir=str(tmp_path))
+        try:
+            replayer.start()
+            deadline = time.monotonic() + 5
+            while replayer.spooled_count() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert replayer.spooled_count() == 0
+            assert sorted(collection.docs) == sorted(doc["_id"] for doc in docs)
+        finally:
+            replayer.close()
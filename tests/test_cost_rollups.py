@@ -0,0 +1,220 @@
+"""
+Test Suite for cost and latency rollups
+
+Covers folding call cost documents into per-affiliate, per-model, per-day
+totals and latency histograms, periodic $inc flushes (kept on failure),
+the query functions and the rollup API route, using an in-memory stand-in
+for the pymongo collection.
+"""
+
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import AutoReconnect
+
+import cost_rollups
+from app.api.routes import rollups as rollups_route
+from app.main import app
+from cost_rollups import CostRollupAggregator, call_deltas, histogram_percentile, query_rollups
+from tracing import CallTrace, Span
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeRollupCollection:
+    """In-memory stand-in for the cost_rollups collection"""
+
+    def __init__(self):
+        self.docs = {}
+        self.fail_next = 0
+
+    def bulk_write(self, operations, ordered=True):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise AutoReconnect("connection refused")
+        for op in operations:
+            doc = self.docs.setdefault(op._filter["_id"], {"_id": op._filter["_id"], **op._doc["$setOnInsert"]})
+            doc.update(op._doc["$set"])
+            for path, value in op._doc["$inc"].items():
+                target = doc
+                *parents, leaf = path.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = target.get(leaf, 0) + value
+
+    def find(self, query):
+        def matches(doc):
+            for field, condition in query.items():
+                if isinstance(condition, dict):
+                    if "$gte" in condition and doc[field] < condition["$gte"]:
+                        return False
+                    if "$lte" in condition and doc[field] > condition["$lte"]:
+                        return False
+                elif doc[field] != condition:
+                    return False
+            return True
+        return FakeCursor([dict(d) for d in self.docs.values() if matches(d)])
+
+
+def make_doc(affiliate_id="65", day=1, total_cost=0.10, agent_tokens=(1000, 100), websearch_tokens=(0, 0)):
+    return {
+        "affiliate_id": affiliate_id,
+        "start_time": datetime(2026, 10, day, 9, 30),
+        "duration_seconds": 120.0,
+        "tokens": {
+            "agent": {"input_tokens": agent_tokens[0], "output_tokens": agent_tokens[1], "model": "gpt-4.1-mini"},
+            "supervisor": {"input_tokens": 500, "output_tokens": 50, "model": "gpt-4.1-mini"},
+            "websearch": {"input_tokens": websearch_tokens[0], "output_tokens": websearch_tokens[1], "model": "gpt-4o"},
+            "total": {"input_tokens": agent_tokens[0] + 500 + websearch_tokens[0],
+                      "output_tokens": agent_tokens[1] + 50 + websearch_tokens[1]},
+        },
+        "audio_usage": {"stt": {"audio_seconds": 60}, "tts": {"characters": 800}},
+        "cost": {"agent_cost": 0.05, "supervisor_cost": 0.02, "websearch_cost": 0.0, "stt_cost": 0.02,
+                 "tts_cost": 0.01, "total_cost": total_cost},
+    }
+
+
+def make_trace(*durations, kind="llm"):
+    trace = CallTrace("CA1")
+    for ms in durations:
+        trace.add(Span("llm_turn", kind, 0.0, ms))
+    return trace
+
+
+class TestCallDeltas:
+    """Test what one call contributes"""
+
+    def test_totals_and_model_rows(self):
+        """Test the per-call totals row and one row per LLM model used"""
+        deltas = call_deltas(make_doc(websearch_tokens=(300, 30)), make_trace(80, 400))
+        assert set(deltas) == {("2026-10-01", "65", "all"), ("2026-10-01", "65", "gpt-4.1-mini"),
+                               ("2026-10-01", "65", "gpt-4o")}
+        totals = deltas[("2026-10-01", "65", "all")]
+        assert totals["calls"] == 1 and totals["cost.total"] == 0.10 and totals["stt_seconds"] == 60
+        assert totals["latency.llm.count"] == 2
+        assert totals["latency.llm.buckets.le_100"] == 1 and totals["latency.llm.buckets.le_500"] == 1
+
+        # Agent and supervisor share a model: one row with both components' usage
+        mini = deltas[("2026-10-01", "65", "gpt-4.1-mini")]
+        assert mini == {"calls": 1, "tokens.input": 1500, "tokens.output": 150, "cost.total": pytest.approx(0.07)}
+
+    def test_unused_models_skipped(self):
+        """Test that a model with no tokens in the call gets no row"""
+        assert ("2026-10-01", "65", "gpt-4o") not in call_deltas(make_doc())
+
+    def test_histogram_percentile(self):
+        """Test percentile estimates from bucket counts"""
+        buckets = {"le_100": 50, "le_250": 40, "le_1000": 10}
+        assert histogram_percentile(buckets, 50) == 100.0
+        assert histogram_percentile(buckets, 90) == 250.0
+        assert histogram_percentile(buckets, 99) == 1000.0
+        assert histogram_percentile({"le_inf": 3}, 50) == 10000.0
+        assert histogram_percentile({}, 50) is None
+
+
+class TestCostRollupAggregator:
+    """Test the in-process aggregator"""
+
+    def test_running_totals_and_query(self):
+        """Test that calls accumulate per affiliate and day and can be filtered"""
+        aggregator = CostRollupAggregator()
+        aggregator.record_call(make_doc(day=1), make_trace(80))
+        aggregator.record_call(make_doc(day=1), make_trace(400))
+        aggregator.record_call(make_doc(day=2))
+        aggregator.record_call(make_doc(affiliate_id="12", day=1))
+
+        records = aggregator.query(affiliate_id="65", model="all")
+        assert [(r["day"], r["calls"]) for r in records] == [("2026-10-01", 2), ("2026-10-02", 1)]
+        assert records[0]["cost"]["total"] == pytest.approx(0.20)
+        assert records[0]["latency"]["llm"]["count"] == 2 and records[0]["latency"]["llm"]["p90_ms"] == 500.0
+        assert [r["affiliate_id"] for r in aggregator.query(start_day="2026-10-01", end_day="2026-10-01",
+                                                            model="all")] == ["12", "65"]
+
+    def test_flush_increments_and_clears_pending(self):
+        """Test that a flush upserts $inc deltas and later flushes only send new calls"""
+        collection = FakeRollupCollection()
+        aggregator = CostRollupAggregator(collection, flush_interval=3600)
+        try:
+            aggregator.record_call(make_doc())
+            assert aggregator.flush()
+            aggregator.record_call(make_doc())
+            assert aggregator.flush()
+            assert aggregator.get_stats()["pending"] == 0
+            record = collection.docs["2026-10-01|65|all"]
+            assert record["calls"] == 2 and record["affiliate_id"] == "65" and record["model"] == "all"
+            assert collection.docs["2026-10-01|65|gpt-4.1-mini"]["tokens"]["input"] == 3000
+        finally:
+            aggregator.close()
+
+    def test_failed_flush_kept(self):
+        """Test that deltas of a failed flush are merged into the next one"""
+        collection = FakeRollupCollection()
+        collection.fail_next = 1
+        aggregator = CostRollupAggregator(collection, flush_interval=3600)
+        try:
+            aggregator.record_call(make_doc())
+            assert not aggregator.flush()
+            aggregator.record_call(make_doc())
+            assert aggregator.flush()
+            assert collection.docs["2026-10-01|65|all"]["calls"] == 2
+            assert aggregator.get_stats()["flush_errors"] == 1
+        finally:
+            aggregator.close()
+
+    def test_query_rollups(self):
+        """Test reading flushed records with filters and percentile estimates"""
+        collection = FakeRollupCollection()
+        aggregator = CostRollupAggregator(collection, flush_interval=3600)
+        for day in (1, 2, 3):
+            aggregator.record_call(make_doc(day=day), make_trace(30, 30, 3000))
+        aggregator.close()
+
+        records = query_rollups(collection, affiliate_id="65", model="all", start_day="2026-10-02")
+        assert [r["day"] for r in records] == ["2026-10-02", "2026-10-03"]
+        assert records[0]["latency"]["llm"]["p50_ms"] == 50.0
+        assert records[0]["latency"]["llm"]["p99_ms"] == 5000.0
+
+
+class TestRollupRoute:
+    """Test the rollup API route"""
+
+    def test_get_rollups(self, monkeypatch):
+        """Test that the route serves flushed rollups"""
+        collection = FakeRollupCollection()
+        aggregator = CostRollupAggregator(collection, flush_interval=3600)
+        aggregator.record_call(make_doc())
+        aggregator.close()
+        monkeypatch.setattr(rollups_route, "_collection", collection)
+
+        response = TestClient(app).get("/api/rollups", params={"affiliate_id": "65", "model": "all"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 1 and data["rollups"][0]["calls"] == 1
+
+    def test_rejects_bad_day(self, monkeypatch):
+        """Test that malformed days are rejected"""
+        monkeypatch.setattr(rollups_route, "_collection", FakeRollupCollection())
+        assert TestClient(app).get("/api/rollups", params={"start": "Oct 1"}).status_code == 422
+
+    def test_store_unavailable(self, monkeypatch):
+        """Test that an unreachable store is reported as 503"""
+        def unavailable():
+            raise AutoReconnect("connection refused")
+        monkeypatch.setattr(rollups_route, "get_rollup_collection", unavailable)
+        assert TestClient(app).get("/api/rollups").status_code == 503
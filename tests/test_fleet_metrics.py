@@ -0,0 +1,155 @@
+"""
+Test Suite for the fleet metrics surface
+
+Covers per-worker recording and snapshots, combining snapshots of several
+workers (live gauges, summed counters, retirement of gone workers without
+losing totals), the Prometheus rendering and the /metrics routes.
+"""
+
+import asyncio
+import json
+import os
+import time
+from functools import partial
+
+from fastapi.testclient import TestClient
+
+from app.api.routes import metrics as metrics_route
+from app.main import app
+from fleet_metrics import WorkerMetrics, read_fleet_metrics, render_prometheus
+
+
+def write_worker(metrics_dir, pid, updated, active_calls=1, calls_completed=0, cost=0.0, backend=None):
+    snapshot = {
+        "pid": pid,
+        "updated": updated,
+        "gauges": {"active_calls": active_calls, "loop_lag_ms": 2.0, "loop_lag_max_ms": 40.0,
+                   "llm_tokens_per_minute": 1000, "cost_usd_per_minute": 0.05},
+        "counters": {"calls_started": calls_completed + active_calls, "calls_completed": calls_completed,
+                     "cost_usd": cost},
+        "llm_tokens": {"gpt-4.1-mini": {"input": 900, "output": 100}},
+        "backend": backend or {"api.example.com/GetClient": {"count": 2, "sum_ms": 300.0,
+                                                             "buckets": {"le_100": 1, "le_250": 1}}},
+        "cache": {"client": {"hits": 3, "misses": 1}},
+    }
+    with open(os.path.join(metrics_dir, f"worker-{pid}.json"), "w") as f:
+        json.dump(snapshot, f)
+
+
+class TestWorkerMetrics:
+    """Test one worker's registry"""
+
+    def test_snapshot(self, tmp_path):
+        """Test that recorded calls, tokens, cost and requests appear in the snapshot file"""
+        worker = WorkerMetrics(metrics_dir=str(tmp_path))
+        worker.call_started()
+        worker.call_started()
+        worker.call_ended()
+        worker.add_cost(0.12)
+        worker.add_llm_tokens("gpt-4.1-mini", 800, 50)
+        worker.observe_backend("api.example.com/GetClient", 120.0)
+        worker.observe_backend("api.example.com/GetClient", 30.0)
+        worker.write_snapshot()
+        worker.close()
+
+        snapshot = json.loads((tmp_path / f"worker-{os.getpid()}.json").read_text())
+        assert snapshot["gauges"]["active_calls"] == 1
+        assert snapshot["gauges"]["llm_tokens_per_minute"] == 850
+        assert snapshot["gauges"]["cost_usd_per_minute"] == 0.12
+        assert snapshot["counters"] == {"calls_started": 2, "calls_completed": 1, "cost_usd": 0.12, "loop_blocked": 0}
+        assert snapshot["backend"]["api.example.com/GetClient"]["buckets"] == {"le_250": 1, "le_50": 1}
+
+    def test_rate_window(self, tmp_path):
+        """Test that per-minute rates only count the last minute"""
+        worker = WorkerMetrics(metrics_dir=str(tmp_path))
+        worker.add_llm_tokens("gpt-4.1-mini", 100, 0)
+        worker._recent[0] = (time.time() - 61, 100, 0.0)
+        worker.add_llm_tokens("gpt-4.1-mini", 10, 0)
+        assert worker.snapshot()["gauges"]["llm_tokens_per_minute"] == 10
+        assert worker.snapshot()["llm_tokens"]["gpt-4.1-mini"]["input"] == 110
+
+    def test_loop_lag_probe(self, tmp_path, monkeypatch):
+        """Test that the probe records lag caused by a blocking call"""
+        monkeypatch.setattr("fleet_metrics.LOOP_LAG_INTERVAL", 0.01)
+        worker = WorkerMetrics(metrics_dir=str(tmp_path))
+
+        async def run():
+            worker.start_loop_lag_probe()
+            await asyncio.sleep(0.02)
+            time.sleep(0.1)  # block the loop
+            await asyncio.sleep(0.03)
+            worker.loop_monitor.stop()
+
+        asyncio.run(run())
+        assert worker.loop_lag_max_ms >= 50
+
+
+class TestFleetView:
+    """Test combining worker snapshots"""
+
+    def test_live_gauges_and_summed_counters(self, tmp_path):
+        """Test that gauges come from live workers and counters from every snapshot"""
+        now = time.time()
+        write_worker(tmp_path, 1, now, active_calls=1)
+        write_worker(tmp_path, 2, now, active_calls=2, calls_completed=3, cost=0.3)
+        write_worker(tmp_path, 3, now - 120, active_calls=1, calls_completed=5, cost=0.5)
+
+        fleet = read_fleet_metrics(str(tmp_path), stale_seconds=30, retire_seconds=3600)
+        assert fleet["workers"] == 2 and fleet["active_calls"] == 3
+        assert fleet["loop_lag_ms"]["max"] == 40.0
+        assert fleet["llm_tokens_per_minute"] == 2000
+        assert fleet["totals"]["calls_completed"] == 8 and fleet["totals"]["cost_usd"] == 0.8
+        assert fleet["cache"]["client"] == {"hits": 9, "misses": 3, "hit_ratio": 0.75}
+        latency = fleet["backend_latency"]["api.example.com/GetClient"]
+        assert latency["count"] == 6 and latency["p50_ms"] == 100.0 and latency["p99_ms"] == 250.0
+
+    def test_retired_workers_keep_totals(self, tmp_path):
+        """Test that long-gone workers are folded into retired.json without changing totals"""
+        now = time.time()
+        write_worker(tmp_path, 1, now, calls_completed=1)
+        write_worker(tmp_path, 2, now - 7200, active_calls=0, calls_completed=4)
+
+        first = read_fleet_metrics(str(tmp_path), retire_seconds=3600)
+        assert not (tmp_path / "worker-2.json").exists()
+        assert (tmp_path / "retired.json").exists()
+        second = read_fleet_metrics(str(tmp_path), retire_seconds=3600)
+        assert first["totals"] == second["totals"]
+        assert second["totals"]["calls_completed"] == 5
+
+    def test_empty_directory(self, tmp_path):
+        """Test a fleet view before any worker has written"""
+        fleet = read_fleet_metrics(str(tmp_path / "missing"))
+        assert fleet["workers"] == 0 and fleet["active_calls"] == 0 and fleet["backend_latency"] == {}
+
+    def test_prometheus_rendering(self, tmp_path):
+        """Test the text exposition: cumulative buckets, labels and sums in seconds"""
+        write_worker(tmp_path, 1, time.time(), backend={'api "x"/a': {"count": 3, "sum_ms": 1500.0,
+                                                                     "buckets": {"le_100": 1, "le_1000": 1,
+                                                                                 "le_inf": 1}}})
+        text = render_prometheus(read_fleet_metrics(str(tmp_path)))
+        assert "# TYPE ivr_active_calls gauge" in text
+        assert "ivr_active_calls 1" in text
+        assert 'ivr_llm_tokens_total{model="gpt-4.1-mini",direction="input"} 900' in text
+        assert "ivr_event_loop_blocked_total 0" in text
+        assert 'ivr_backend_request_duration_seconds_bucket{endpoint="api \\"x\\"/a",le="0.1"} 1' in text
+        assert 'ivr_backend_request_duration_seconds_bucket{endpoint="api \\"x\\"/a",le="5"} 2' in text
+        assert 'ivr_backend_request_duration_seconds_bucket{endpoint="api \\"x\\"/a",le="+Inf"} 3' in text
+        assert 'ivr_backend_request_duration_seconds_sum{endpoint="api \\"x\\"/a"} 1.5' in text
+
+
+class TestMetricsRoutes:
+    """Test the /metrics routes"""
+
+    def test_prometheus_and_json(self, tmp_path, monkeypatch):
+        """Test that both routes serve the workers' snapshots"""
+        write_worker(tmp_path, 1, time.time(), active_calls=2)
+        monkeypatch.setattr(metrics_route, "read_fleet_metrics", partial(read_fleet_metrics, str(tmp_path)))
+        client = TestClient(app)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "ivr_active_calls 2" in response.text
+
+        data = client.get("/metrics/json").json()
+        assert data["active_calls"] == 2 and data["workers"] == 1
@@ -0,0 +1,123 @@
+"""
+Test Suite for InitAssistant conversation storage
+
+Covers the per-call transcript buffers: tail views, the cached last agent
+message and the incrementally maintained HTML/JSON renderings.
+"""
+
+import json
+import threading
+
+import pytest
+
+from InitAssistant import InitAssistant, CallTranscript
+
+
+@pytest.fixture
+def call_sid():
+    """Provide a call SID and clear its history afterwards"""
+    sid = "test-call-transcript"
+    yield sid
+    InitAssistant.clear_conversation(sid)
+
+
+class TestCallTranscript:
+    """Test per-call transcript buffers"""
+
+    def test_recent_transcriptions_returns_tail(self, call_sid):
+        """Test that only the last N messages are returned, oldest first"""
+        for i in range(10):
+            InitAssistant.set_transcription(call_sid, "User" if i % 2 else "Agent", f"message {i}", "2025-01-01 10:00:00")
+
+        assert InitAssistant.get_recent_transcriptions(call_sid, 3) == ["message 7", "message 8", "message 9"]
+        assert InitAssistant.get_recent_transcriptions(call_sid, 0) == []
+        assert InitAssistant.get_recent_transcriptions("unknown-call", 6) == []
+
+    def test_last_agent_message_is_tracked(self, call_sid):
+        """Test that the last agent message pointer follows agent turns only"""
+        assert InitAssistant.get_last_agent_message(call_sid) == ""
+
+        InitAssistant.set_transcription(call_sid, "Agent", "How can I help?")
+        InitAssistant.set_transcription(call_sid, "User", "I need a ride")
+        assert InitAssistant.get_last_agent_message(call_sid) == "How can I help?"
+
+        InitAssistant.set_transcription(call_sid, "Agent", "Where are you going?")
+        assert InitAssistant.get_last_agent_message(call_sid) == "Where are you going?"
+
+    def test_incremental_html_matches_full_render(self, call_sid):
+        """Test that incremental HTML equals a full rebuild of the same history"""
+        InitAssistant.set_transcription(call_sid, "Agent", "Hello", "2025-01-01 10:00:00")
+        InitAssistant.set_transcription(call_sid, "User", "Hi there", "2025-01-01 10:00:05")
+
+        transcript = InitAssistant._conversations[call_sid]
+        history = InitAssistant.get_conversation_history(call_sid)
+        assert transcript.render_html() == InitAssistant._generate_detail_html(history)
+
+    def test_incremental_json_statistics(self, call_sid):
+        """Test that incremental JSON carries the same structure and statistics"""
+        InitAssistant.set_transcription(call_sid, "Agent", "Hello", "2025-01-01 10:00:00")
+        InitAssistant.set_transcription(call_sid, "User", "Book a ride", "2025-01-01 10:00:05")
+        InitAssistant.set_transcription(call_sid, "Agent", "Sure", "2025-01-01 10:00:09")
+
+        data = json.loads(InitAssistant._conversations[call_sid].render_json())
+        assert data["call_metadata"]["call_id"] == call_sid
+        assert data["call_metadata"]["total_messages"] == 3
+        assert sorted(data["call_metadata"]["participants"]) == ["agent", "user"]
+        assert [row["sequence"] for row in data["conversation"]] == [1, 2, 3]
+        assert data["conversation"][1] == {
+            "sequence": 2,
+            "role": "customer",
+            "content": "Book a ride",
+            "timestamp": "2025-01-01 10:00:05",
+            "character_count": 11
+        }
+        assert data["statistics"] == {
+            "agent_message_count": 2,
+            "customer_message_count": 1,
+            "total_agent_characters": 9,
+            "total_customer_characters": 11,
+            "conversation_turns": 3
+        }
+
+    def test_history_is_a_copy(self, call_sid):
+        """Test that callers cannot mutate the stored history"""
+        InitAssistant.set_transcription(call_sid, "Agent", "Hello")
+        history = InitAssistant.get_conversation_history(call_sid)
+        history.append({"speaker": "User", "transcription": "injected", "timestamp": ""})
+        assert len(InitAssistant.get_conversation_history(call_sid)) == 1
+
+    def test_calls_use_separate_transcripts(self, call_sid):
+        """Test that concurrent calls append to their own transcripts"""
+        other_sid = call_sid + "-other"
+        try:
+            def writer(sid):
+                for i in range(200):
+                    InitAssistant.set_transcription(sid, "User", f"{sid} {i}")
+
+            threads = [threading.Thread(target=writer, args=(sid,)) for sid in (call_sid, other_sid)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert len(InitAssistant.get_conversation_history(call_sid)) == 200
+            assert len(InitAssistant.get_conversation_history(other_sid)) == 200
+            assert InitAssistant._conversations[call_sid].lock is not InitAssistant._conversations[other_sid].lock
+        finally:
+            InitAssistant.clear_conversation(other_sid)
+
+    def test_clear_conversation(self, call_sid):
+        """Test that clearing removes the transcript from the registry"""
+        InitAssistant.set_transcription(call_sid, "Agent", "Hello")
+        assert call_sid in InitAssistant.get_active_calls()
+        InitAssistant.clear_conversation(call_sid)
+        assert call_sid not in InitAssistant.get_active_calls()
+        assert InitAssistant.get_conversation_history(call_sid) == []
+
+    def test_tail_on_standalone_transcript(self):
+        """Test tail views on a standalone transcript"""
+        transcript = CallTranscript("standalone")
+        for i in range(3):
+            transcript.append({"speaker": "Agent", "transcription": str(i), "timestamp": ""})
+        assert [m["transcription"] for m in transcript.tail(10)] == ["0", "1", "2"]
+        assert transcript.last_agent_message["transcription"] == "2"
@@ -0,0 +1,252 @@
+"""
+Test Suite for the queued logging pipeline
+
+Covers writes through the listener thread with the caller's call context,
+ordered per-call log cleanup, per-logger rate limits, message truncation,
+lazy formatting of disabled levels and bounded per-call file handles.
+"""
+
+import logging
+import threading
+import time
+
+import pytest
+
+import call_context
+import logging_config
+from call_context import start_call_context
+from logging_config import CallSpecificHandler, IVRLogger, RateLimitFilter, truncate_message
+
+
+@pytest.fixture(autouse=True)
+def isolated_call_context():
+    """Keep call contexts bound by a test from leaking into later tests"""
+    token = call_context._current_call.set(None)
+    yield
+    call_context._current_call.reset(token)
+
+
+@pytest.fixture
+def make_ivr_logger(tmp_path):
+    """Build IVRLoggers on a temporary directory, restoring the global logger's handlers afterwards"""
+    main_logger = logging.getLogger('ivr_bot')
+    saved_handlers, saved_level = list(main_logger.handlers), main_logger.level
+    created = []
+
+    def factory(**kwargs):
+        instance = IVRLogger(logs_dir=str(tmp_path), **kwargs)
+        instance.handlers[2].setLevel(logging.CRITICAL)
+        created.append(instance)
+        return instance
+
+    yield factory
+    for instance in created:
+        instance.close()
+    main_logger.handlers[:] = saved_handlers
+    main_logger.setLevel(saved_level)
+
+
+def call_log_text(tmp_path, call_sid):
+    files = list((tmp_path / "calls").glob(f"call_{call_sid}_*.log"))
+    assert len(files) == 1
+    return files[0].read_text()
+
+
+class TestLoggingPipeline:
+    """Test the queue-based logging pipeline"""
+
+    def test_records_written_with_call_context(self, make_ivr_logger, tmp_path):
+        """Test that queued records carry the logging task's call and reach the call file"""
+        instance = make_ivr_logger(async_logging=True)
+        logger = instance.get_logger('pipeline')
+        start_call_context().call_sid = "CA100"
+        logger.info("inside the call")
+        start_call_context()
+        logger.info("outside any call")
+        assert instance.flush()
+
+        assert "inside the call" in call_log_text(tmp_path, "CA100")
+        main_log = (tmp_path / "ivr-bot.log").read_text()
+        assert "inside the call" in main_log and "outside any call" in main_log
+
+    def test_cleanup_after_queued_records(self, make_ivr_logger, tmp_path):
+        """Test that cleanup closes the call file only after the call's earlier records"""
+        instance = make_ivr_logger(async_logging=True)
+        logger = instance.get_logger('pipeline')
+        start_call_context().call_sid = "CA200"
+        for i in range(200):
+            logger.info(f"turn {i}")
+        instance.cleanup_call_logs("CA200")
+        assert instance.flush()
+
+        text = call_log_text(tmp_path, "CA200")
+        assert "turn 199" in text
+        assert "ended at" in text.rstrip().splitlines()[-1]
+        assert "CA200" not in instance.call_handler.call_handlers
+
+    def test_snapshot_of_arguments(self, make_ivr_logger, tmp_path):
+        """Test that a payload changed after logging is written as it was when logged"""
+        instance = make_ivr_logger(async_logging=True)
+        logger = instance.get_logger('pipeline')
+        payload = {"status": "before"}
+        logger.debug("Payload: %s", payload)
+        payload["status"] = "after"
+        assert instance.flush()
+        assert "'status': 'before'" in (tmp_path / "ivr-bot.log").read_text()
+
+    def test_disabled_level_not_formatted(self, make_ivr_logger):
+        """Test that DEBUG arguments are never formatted when LOG_LEVEL is INFO"""
+        instance = make_ivr_logger(async_logging=True, level="INFO")
+        logger = instance.get_logger('pipeline')
+
+        class Exploding:
+            def __str__(self):
+                raise AssertionError("formatted a disabled record")
+
+        logger.debug("Payload: %s", Exploding())
+        assert instance.flush()
+
+    def test_full_queue(self, make_ivr_logger, tmp_path, monkeypatch):
+        """Test that flush times out and the call file cleanup waits for room when the queue is full"""
+        monkeypatch.setattr(logging_config, "LOG_QUEUE_SIZE", 2)
+        instance = make_ivr_logger(async_logging=True)
+        logger = instance.get_logger('pipeline')
+        start_call_context().call_sid = "CA500"
+        logger.info("before the stall")
+        assert instance.flush()
+
+        release = threading.Event()
+        emit = instance.call_handler.emit
+        monkeypatch.setattr(instance.call_handler, "emit", lambda record: release.wait(5) and emit(record))
+        for i in range(3):
+            logger.info(f"stalled {i}")
+        time.sleep(0.05)
+        assert not instance.flush(timeout=0.1)
+
+        threading.Timer(0.2, release.set).start()
+        instance.cleanup_call_logs("CA500")
+        assert instance.flush()
+        assert "ended at" in call_log_text(tmp_path, "CA500").rstrip().splitlines()[-1]
+        assert "CA500" not in instance.call_handler.call_handlers
+
+    def test_rate_limit_spares_call_files(self, make_ivr_logger, tmp_path):
+        """Test that rate-limited records are dropped from ivr-bot.log but kept in the call file"""
+        instance = make_ivr_logger(async_logging=True)
+        instance.rate_limit_filter.rate = 0.001
+        instance.rate_limit_filter.burst = 5
+        logger = instance.get_logger('pipeline')
+        start_call_context().call_sid = "CA400"
+        for i in range(20):
+            logger.info(f"chatty {i}")
+        assert instance.flush()
+        instance.rate_limit_filter._buckets["ivr_bot.pipeline"][0] = 1.0
+        logger.info("after the burst")
+        assert instance.flush()
+
+        main_log = (tmp_path / "ivr-bot.log").read_text()
+        assert "chatty 4" in main_log and "chatty 5" not in main_log
+        assert "after the burst [15 earlier message(s) from this logger suppressed]" in main_log
+        call_text = call_log_text(tmp_path, "CA400")
+        assert all(f"chatty {i}\n" in call_text for i in range(20))
+        assert "suppressed" not in call_text
+
+    def test_sync_mode(self, make_ivr_logger, tmp_path):
+        """Test that LOG_ASYNC=false writes inline"""
+        instance = make_ivr_logger(async_logging=False)
+        start_call_context().call_sid = "CA300"
+        instance.get_logger('pipeline').info("inline record")
+        assert "inline record" in call_log_text(tmp_path, "CA300")
+
+
+class TestRateLimitFilter:
+    """Test per-logger rate limits"""
+
+    def make_record(self, name, level=logging.INFO):
+        return logging.LogRecord(name, level, "", 0, "message", None, None)
+
+    def test_limits_each_logger_separately(self):
+        """Test that a chatty logger is limited without affecting others"""
+        limit = RateLimitFilter(rate=0.001, burst=5)
+        chatty = [limit.filter(self.make_record("ivr_bot.chatty")) for _ in range(20)]
+        assert chatty.count(True) == 5
+        assert limit.filter(self.make_record("ivr_bot.quiet"))
+        assert limit.suppressed == 15
+
+    def test_warnings_never_limited(self):
+        """Test that warnings and errors always pass"""
+        limit = RateLimitFilter(rate=0.001, burst=1)
+        assert all(limit.filter(self.make_record("ivr_bot.x", logging.WARNING)) for _ in range(10))
+
+    def test_reports_suppressed_count(self):
+        """Test that the next record let through notes the suppressed ones"""
+        limit = RateLimitFilter(rate=1, burst=1)
+        limit.filter(self.make_record("ivr_bot.x"))
+        assert not limit.filter(self.make_record("ivr_bot.x"))
+        limit._buckets["ivr_bot.x"][0] = 1.0
+        record = self.make_record("ivr_bot.x")
+        assert limit.filter(record)
+        assert record.suppressed == 1
+
+
+class TestTruncation:
+    """Test payload truncation"""
+
+    def test_truncate_message(self):
+        """Test that long messages are cut with a note of the dropped length"""
+        assert truncate_message("x" * 10, limit=20) == "x" * 10
+        assert truncate_message("x" * 30, limit=20) == "x" * 20 + "... [truncated 10 chars]"
+        assert truncate_message("x" * 30, limit=0) == "x" * 30
+
+
+class TestCallSpecificHandler:
+    """Test bounded per-call file handles"""
+
+    def emit(self, handler, call_sid, message):
+        record = logging.LogRecord("ivr_bot.test", logging.INFO, "", 0, message, None, None)
+        record.call_sid = call_sid
+        record.x_call_id = None
+        handler.handle(record)
+
+    def test_lru_eviction_and_append_reopen(self, tmp_path):
+        """Test that the open-handle cap closes the least recently used file and it reopens in append mode"""
+        handler = CallSpecificHandler(tmp_path, max_open=2)
+        try:
+            self.emit(handler, "CA1", "first line")
+            self.emit(handler, "CA2", "a")
+            self.emit(handler, "CA3", "b")
+            assert list(handler.call_handlers) == ["CA2", "CA3"]
+
+            self.emit(handler, "CA1", "second line")
+            stats = handler.get_stats()
+            assert stats["open_handles"] == 2
+            assert stats["evicted"] == 2 and stats["reopened"] == 1
+            handler.cleanup_call("CA1")
+            text = call_log_text(tmp_path, "CA1")
+            assert "started at" in text and "first line" in text and "second line" in text
+            assert "ended at" in text.rstrip().splitlines()[-1]
+        finally:
+            handler.close()
+
+    def test_idle_handles_closed(self, tmp_path):
+        """Test that handles idle past the timeout are closed and calls never cleaned up are forgotten"""
+        handler = CallSpecificHandler(tmp_path, idle_timeout=10)
+        try:
+            self.emit(handler, "CA1", "x")
+            self.emit(handler, "CA2", "y")
+            handler.call_last_used["CA1"] -= 11
+            handler.call_last_used["CA2"] -= 101
+            handler._last_sweep -= 60
+            self.emit(handler, "CA3", "z")
+            assert list(handler.call_handlers) == ["CA3"]
+            assert "CA1" in handler.call_files and "CA2" not in handler.call_files
+            assert handler.get_stats()["idle_closed"] == 2
+        finally:
+            handler.close()
+
+    def test_close_flushes_open_files(self, tmp_path):
+        """Test that closing the handler writes out and closes every call file"""
+        handler = CallSpecificHandler(tmp_path)
+        self.emit(handler, "CA1", "buffered line")
+        handler.close()
+        assert handler.get_stats()["open_handles"] == 0
+        assert "buffered line" in call_log_text(tmp_path, "CA1")
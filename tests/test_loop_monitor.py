@@ -0,0 +1,142 @@
+"""
+Test Suite for the event-loop lag monitor
+
+Covers lag sampling and percentiles, capturing the stack of a call that
+blocks the loop, and the debug mode that fails a simulated call when a
+code path blocks the loop, including the cache flush run at call end.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import cache_manager
+from loop_monitor import BlockingCallDetected, LoopMonitor, detect_blocking
+
+
+def load_recordings_index():
+    time.sleep(0.15)  # stands in for a synchronous call on the event loop
+
+
+async def simulated_call(blocking: bool):
+    await asyncio.sleep(0.02)
+    if blocking:
+        load_recordings_index()
+    else:
+        await asyncio.to_thread(load_recordings_index)
+    await asyncio.sleep(0.02)
+
+
+@pytest.fixture
+def slow_cache_store(tmp_path):
+    """Persist the caches to a temporary SQLite store whose writes take as long as a slow disk"""
+    saved = {namespace: cache.entries() for namespace, cache in cache_manager._caches.items()}
+    cache_manager.init_persistence(str(tmp_path / "cache.db"))
+    store = cache_manager._store
+    write_batch = store.write_batch
+
+    def slow_write_batch(upserts, deletes):
+        time.sleep(0.15)
+        write_batch(upserts, deletes)
+
+    store.write_batch = slow_write_batch
+    for i in range(50):
+        cache_manager.store_affiliate_in_cache(f"30155501{i:02d}", {"AffiliateID": i})
+    yield store
+    cache_manager.init_persistence(cache_manager.CACHE_DB_FILE)
+    for namespace, cache in cache_manager._caches.items():
+        cache.clear()
+        cache.load({key: (entry.value, entry.stored_at) for key, entry in saved[namespace]})
+    cache_manager.rebuild_indexes()
+
+
+class TestLoopMonitor:
+    """Test lag sampling and blocking detection"""
+
+    def test_blocking_call_stack_captured(self):
+        """Test that a blocking call is recorded once with its stack and task"""
+        monitor = LoopMonitor(threshold_ms=50, interval=0.01)
+
+        async def run():
+            monitor.start()
+            await asyncio.create_task(simulated_call(blocking=True), name="call-CA1")
+            await asyncio.sleep(0.03)
+            monitor.stop()
+
+        asyncio.run(run())
+        assert monitor.blocked == 1
+        event = monitor.events[0]
+        assert event.lag_ms >= 100 and event.task == "call-CA1"
+        assert "load_recordings_index" in event.stack
+        assert monitor.get_stats()["last_blocked_task"] == "call-CA1"
+
+    def test_percentiles(self):
+        """Test lag percentiles over recorded samples"""
+        monitor = LoopMonitor(threshold_ms=50)
+        assert monitor.percentiles() == {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+        for lag_ms in range(100):
+            monitor.record_lag(float(lag_ms))
+        assert monitor.percentiles() == {"p50": 50.0, "p90": 90.0, "p99": 99.0, "max": 99.0}
+        assert monitor.blocked == 0
+
+    def test_not_strict_does_not_raise(self):
+        """Test that check() only raises in debug mode"""
+        monitor = LoopMonitor(threshold_ms=50, interval=0.01)
+
+        async def run():
+            monitor.start()
+            await simulated_call(blocking=True)
+            await asyncio.sleep(0.03)
+            monitor.stop()
+
+        asyncio.run(run())
+        assert monitor.blocked == 1
+        monitor.check()
+
+
+class TestDetectBlocking:
+    """Test the debug mode used to fail tests on blocking calls"""
+
+    def test_blocking_call_fails(self):
+        """Test that a simulated call blocking the loop raises with the offending stack"""
+        async def run():
+            async with detect_blocking(threshold_ms=50):
+                await simulated_call(blocking=True)
+
+        with pytest.raises(BlockingCallDetected, match="load_recordings_index"):
+            asyncio.run(run())
+
+    def test_offloaded_call_passes(self):
+        """Test that the same work offloaded to a thread passes"""
+        async def run():
+            async with detect_blocking(threshold_ms=50) as monitor:
+                await simulated_call(blocking=False)
+            return monitor
+
+        monitor = asyncio.run(run())
+        assert monitor.blocked == 0 and monitor.get_stats()["samples"] > 0
+
+    def test_cache_flush_on_loop_detected(self, slow_cache_store):
+        """Test that the real cache flush path is caught when it runs on the event loop"""
+        async def run():
+            async with detect_blocking(threshold_ms=50):
+                await asyncio.sleep(0.02)
+                cache_manager.save_caches()
+                await asyncio.sleep(0.02)
+
+        with pytest.raises(BlockingCallDetected, match="save_caches"):
+            asyncio.run(run())
+
+    def test_cache_flush_in_thread_passes(self, slow_cache_store):
+        """Test that the cache flush offloaded to a thread keeps the loop responsive and still writes"""
+        async def run():
+            async with detect_blocking(threshold_ms=50) as monitor:
+                await asyncio.sleep(0.02)
+                await asyncio.to_thread(cache_manager.save_caches)
+                await asyncio.sleep(0.02)
+            return monitor
+
+        monitor = asyncio.run(run())
+        assert monitor.blocked == 0
+        assert slow_cache_store.count() == 50
@@ -0,0 +1,141 @@
+"""
+Test Suite for the content-addressed prompt archive
+
+Covers round-tripping prompts through template references, template
+de-duplication, cached template reads and reading from daily archives.
+"""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+import artifact_writer
+import prompt_archive
+from artifact_writer import ArtifactWriter
+from prompt_archive import archive_prompt, reconstruct_prompt, load_prompt_template, template_hash
+
+PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    """Route artifacts to a temporary directory"""
+    test_writer = ArtifactWriter(base_dir=str(tmp_path), archive=False)
+    monkeypatch.setattr(artifact_writer, "_artifact_writer", test_writer)
+    monkeypatch.setattr(prompt_archive, "_stored_templates", set())
+    yield test_writer
+    test_writer.close()
+
+
+def build_prompt(template: str, rider: str) -> str:
+    """Build a final prompt shaped like the entrypoint's"""
+    user_context = f"\n\nIMPORTANT RIDER INFORMATION:\nRider Name: {rider}\n"
+    return user_context + "\n\n" + f"""{template}\n\n
+            ``Today's date is 2025-01-01 and Current Time is 10:00 AM``\n\n
+            ``Rider's Profile: \n{{"name": "{rider}"}}\n\n``
+            """
+
+
+class TestPromptArchive:
+    """Test the prompt archive"""
+
+    def test_round_trip(self, writer, tmp_path):
+        """Test that the reconstructed prompt matches the original exactly"""
+        template = load_prompt_template(str(PROMPTS_DIR / "prompt_new_rider.txt"))
+        final_prompt = build_prompt(template, "Jane Doe")
+
+        assert archive_prompt("CA100", final_prompt, template, "prompt_new_rider.txt")
+        writer.flush()
+
+        assert reconstruct_prompt("CA100", str(tmp_path)) == final_prompt
+
+    def test_per_call_record_is_small(self, writer, tmp_path):
+        """Test that per-call records hold only the dynamic text"""
+        template = load_prompt_template(str(PROMPTS_DIR / "prompt_new_rider.txt"))
+        final_prompt = build_prompt(template, "Jane Doe")
+
+        archive_prompt("CA101", final_prompt, template)
+        writer.flush()
+
+        record_path = tmp_path / "prompt" / "final_prompt_CA101.json"
+        record = json.loads(record_path.read_text())
+        assert record["template_sha256"] == template_hash(template)
+        assert os.path.getsize(record_path) * 10 < len(final_prompt.encode("utf-8"))
+
+    def test_template_stored_once(self, writer, tmp_path):
+        """Test that many calls share one stored template"""
+        template = load_prompt_template(str(PROMPTS_DIR / "prompt_new_rider.txt"))
+        for i in range(5):
+            archive_prompt(f"CA2{i}", build_prompt(template, f"Rider {i}"), template)
+        writer.flush()
+
+        assert os.listdir(tmp_path / "prompt_templates") == [f"{template_hash(template)}.txt"]
+        assert len(os.listdir(tmp_path / "prompt")) == 5
+        assert reconstruct_prompt("CA23", str(tmp_path)).count("Rider 3") == 2
+
+    def test_dropped_template_write_is_retried(self, writer, tmp_path, monkeypatch):
+        """Test that a template dropped by a full queue is not referenced and is stored next call"""
+        template = load_prompt_template(str(PROMPTS_DIR / "prompt_new_rider.txt"))
+        real_write = writer.write
+        monkeypatch.setattr(writer, "write", lambda kind, *a: False if kind == "prompt_templates" else real_write(kind, *a))
+        archive_prompt("CA250", build_prompt(template, "Rider A"), template)
+        monkeypatch.setattr(writer, "write", real_write)
+        archive_prompt("CA251", build_prompt(template, "Rider B"), template)
+        writer.flush()
+
+        first = json.loads((tmp_path / "prompt" / "final_prompt_CA250.json").read_text())
+        assert first["template_sha256"] is None
+        assert reconstruct_prompt("CA250", str(tmp_path)) == build_prompt(template, "Rider A")
+        assert os.listdir(tmp_path / "prompt_templates") == [f"{template_hash(template)}.txt"]
+        assert reconstruct_prompt("CA251", str(tmp_path)) == build_prompt(template, "Rider B")
+
+    def test_prompt_without_template(self, writer, tmp_path):
+        """Test that a prompt not containing the template is stored whole"""
+        archive_prompt("CA300", "just a prompt", "missing template")
+        writer.flush()
+        assert reconstruct_prompt("CA300", str(tmp_path)) == "just a prompt"
+
+    def test_legacy_and_missing_artifacts(self, tmp_path):
+        """Test legacy full-text artifacts and unknown calls"""
+        (tmp_path / "prompt").mkdir()
+        (tmp_path / "prompt" / "final_prompt_CA400.txt").write_text("legacy prompt")
+        assert reconstruct_prompt("CA400", str(tmp_path)) == "legacy prompt"
+        assert reconstruct_prompt("CA-unknown", str(tmp_path)) is None
+
+    def test_reconstruct_from_daily_archive(self, writer, tmp_path):
+        """Test that prompts rolled into daily archives can still be rebuilt"""
+        template = load_prompt_template(str(PROMPTS_DIR / "prompt_new_rider.txt"))
+        final_prompt = build_prompt(template, "Archived Rider")
+        archive_prompt("CA500", final_prompt, template)
+        writer.flush()
+
+        record_path = tmp_path / "prompt" / "final_prompt_CA500.json"
+        old_time = time.mktime((date.today() - timedelta(days=1)).timetuple())
+        os.utime(record_path, (old_time, old_time))
+        writer.archive_old_artifacts()
+
+        assert not record_path.exists()
+        assert (tmp_path / "prompt_templates").exists()
+        assert reconstruct_prompt("CA500", str(tmp_path)) == final_prompt
+
+    def test_template_read_is_cached(self, tmp_path, monkeypatch):
+        """Test that templates are re-read only when the file changes"""
+        path = tmp_path / "template.txt"
+        path.write_text("version 1")
+        assert load_prompt_template(str(path)) == "version 1"
+
+        reads = []
+        real_open = open
+        monkeypatch.setattr("builtins.open", lambda *a, **k: reads.append(a[0]) or real_open(*a, **k))
+        assert load_prompt_template(str(path)) == "version 1"
+        assert reads == []
+
+        monkeypatch.undo()
+        path.write_text("version 2")
+        new_time = time.time() + 10
+        os.utime(path, (new_time, new_time))
+        assert load_prompt_template(str(path)) == "version 2"
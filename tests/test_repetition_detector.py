@@ -0,0 +1,152 @@
+"""
+Test Suite for the supervisor's repetition detector
+
+Covers the hashed n-gram vectors, the rolling similarity window, and
+labeled replays: conversations where the bot loops with paraphrased
+wording must be flagged, normal conversations must not, and templated
+booking turns that make progress must never transfer the call by
+themselves.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import supervisor as supervisor_module
+from repetition_detector import RepetitionDetector
+from supervisor_replay import replay_call
+
+GOOD = {"relevance": "0.90", "completeness": "0.90", "groundedness": "0.90", "average": "0.90"}
+
+# (bot turns, loops) pairs
+LABELED_CALLS = [
+    (["Where would you like to be picked up?",
+      "Where should we pick you up?",
+      "What is the pickup address for your ride?",
+      "Could you tell me where you'd like to be picked up?"], True),
+    (["I can only help with transportation. Do you need a ride?",
+      "I'm only able to help with transportation services. Would you like to book a ride?",
+      "Sorry, I can only assist with transportation. Do you need to book a ride?"], True),
+    (["Sorry, I couldn't find that address. Could you repeat it?",
+      "I could not find that address. Can you say the address again?",
+      "I'm sorry, that address wasn't found. Could you repeat the address?"], True),
+    (["Can you tell me your date of birth?",
+      "Can you tell me your pickup address?",
+      "What time is your appointment?",
+      "Your ride is booked for 10 AM tomorrow."], False),
+    (["What is your destination address?",
+      "What time would you like to be picked up?",
+      "Would you like to book a return trip?",
+      "Is there anything else I can help you with today?"], False),
+    (["Thank you, John. Can you confirm your phone number?",
+      "Thank you. Where would you like to go?",
+      "Your trip to Mercy Hospital is confirmed for 9:30 AM.",
+      "Would you like to book a return trip from Mercy Hospital?"], False),
+]
+
+# Booking flows whose bot turns share a template but move the booking on;
+# the detector may flag them, the supervisor must leave them to the LLM
+TEMPLATED_CALLS = [
+    [("I need a ride on Friday", "What is the street address of your pickup location?"),
+     ("12 Oak Street", "What is the street address of your drop-off location?"),
+     ("Mercy Hospital on Saint Paul Street", "What is the street address of your return pickup location?"),
+     ("the same hospital", "Thank you. Your trips are booked for Friday.")],
+    [("yes", "I found John Smith on your account. Is John Smith riding?"),
+     ("no, Mary is", "I found Mary Smith on your account. Is Mary Smith riding?"),
+     ("and Tom", "I found Tom Smith on your account. Is Tom Smith riding?"),
+     ("yes both of them", "Great, Mary and Tom are added to the trip.")],
+    [("read me my trips", "Trip 1 is on Monday at 9:00 AM from 12 Oak Street to Mercy Hospital."),
+     ("next", "Trip 2 is on Monday at 1:30 PM from Mercy Hospital to 12 Oak Street."),
+     ("next", "Trip 3 is on Wednesday at 9:00 AM from 12 Oak Street to Mercy Hospital."),
+     ("next", "Trip 4 is on Wednesday at 1:30 PM from Mercy Hospital to 12 Oak Street.")],
+]
+
+
+def replay_history(turns, score):
+    history = [{"speaker": "Agent", "transcription": "Hello, how can I help?", "score": None}]
+    for user, bot in turns:
+        history.append({"speaker": "User", "transcription": user, "score": None})
+        history.append({"speaker": "Agent", "transcription": bot, "score": score})
+    return history
+
+
+class TestVectors:
+    """Test the hashed n-gram vectors"""
+
+    def test_normalised_and_stable(self):
+        """Test that vectors are unit length and identical across detectors"""
+        a = RepetitionDetector().vectorize("Where would you like to be picked up?")
+        b = RepetitionDetector().vectorize("Where would you like to be picked up?")
+        assert np.isclose(np.linalg.norm(a), 1.0) and np.array_equal(a, b)
+        assert not RepetitionDetector().vectorize("?!").any()
+
+    def test_paraphrase_closer_than_unrelated(self):
+        """Test that a paraphrase is more similar than a question sharing only filler words"""
+        detector = RepetitionDetector()
+        base = detector.vectorize("Can you tell me your pickup address?")
+        assert base @ detector.vectorize("What address should we pick you up at?") > 0.5
+        assert base @ detector.vectorize("Can you tell me your date of birth?") < 0.2
+
+
+class TestWindow:
+    """Test the rolling similarity window"""
+
+    def test_incremental_matches_full_computation(self):
+        """Test that the per-turn updates equal recomputing every similarity"""
+        detector = RepetitionDetector(window=3)
+        texts = [bot for bots, _ in LABELED_CALLS for bot in bots][:7]
+        for text in texts:
+            detector.add(text)
+        window = detector.recent_texts()
+        assert window == texts[-3:]
+        expected = [float(detector.vectorize(window[-1]) @ detector.vectorize(t)) for t in window[:-1]]
+        assert detector.similarities() == pytest.approx(expected, abs=1e-5)
+
+    def test_identical_turns(self):
+        """Test that identical turns are a loop and the first turns never are"""
+        detector = RepetitionDetector()
+        assert detector.add("Please hold.") == 0.0
+        detector.add("Please hold.")
+        assert not detector.is_repetitive()
+        assert detector.add("Please hold.") == pytest.approx(1.0)
+        assert detector.is_repetitive()
+
+    def test_reset(self):
+        """Test that reset empties the window"""
+        detector = RepetitionDetector()
+        detector.add("Where should we pick you up?")
+        detector.reset()
+        assert len(detector) == 0 and detector.last_similarity() == 0.0
+
+
+class TestLabeledReplays:
+    """Test loop detection on labeled conversations"""
+
+    @pytest.mark.parametrize("bot_turns,loops", LABELED_CALLS)
+    def test_detector(self, bot_turns, loops):
+        """Test that paraphrased loops are flagged and progressing conversations are not"""
+        detector = RepetitionDetector()
+        flagged = False
+        for text in bot_turns:
+            detector.add(text)
+            flagged = flagged or detector.is_repetitive()
+        assert flagged == loops
+
+    @pytest.mark.parametrize("bot_turns,loops", LABELED_CALLS)
+    def test_supervisor_scores_loops(self, bot_turns, loops, monkeypatch):
+        """Test that a flagged loop is sent to the LLM scorer instead of transferring the call"""
+        monkeypatch.setattr(supervisor_module, "SUPERVISOR_SAMPLE_RATE", 0.0)
+        history = replay_history([("I need a ride", text) for text in bot_turns], GOOD)
+
+        result = asyncio.run(replay_call(history, gating=True, sample_seed=1))
+        assert result["escalated_at"] is None
+        if loops:
+            assert result["llm_calls"] >= 1
+
+    @pytest.mark.parametrize("turns", TEMPLATED_CALLS)
+    @pytest.mark.parametrize("gating", [True, False])
+    def test_templated_turns_not_transferred(self, turns, gating):
+        """Test that templated booking turns the LLM rates fine never transfer the call"""
+        result = asyncio.run(replay_call(replay_history(turns, GOOD), gating=gating, sample_seed=1))
+        assert result["escalated_at"] is None
@@ -0,0 +1,106 @@
+"""
+Test Suite for compressed structured call logs
+
+Covers JSONL records with phase and latency fields, independently
+compressed frames, size-based segment rotation and retention, and indexed
+lookups that decompress only the frames of the call asked for.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+
+import structured_logs
+from structured_logs import JsonlCallLogHandler, find_call, iter_call_records
+
+
+def emit(handler, call_sid, message, x_call_id=None, **extra):
+    record = logging.LogRecord("ivr_bot.test", logging.INFO, "", 0, message, None, None)
+    record.call_sid = call_sid
+    record.x_call_id = x_call_id
+    for key, value in extra.items():
+        setattr(record, key, value)
+    handler.handle(record)
+
+
+class TestJsonlCallLogHandler:
+    """Test the structured call log writer"""
+
+    def test_records_and_fields(self, tmp_path):
+        """Test that call records are written as JSON lines with structured fields"""
+        handler = JsonlCallLogHandler(str(tmp_path))
+        emit(handler, "CA1", "call started", x_call_id="X-1", phase="call_start")
+        emit(handler, "CA1", "transferred", phase="transfer", latency_ms=120.5)
+        emit(handler, None, "not part of a call")
+        handler.close()
+
+        records = list(iter_call_records("CA1", str(tmp_path)))
+        assert [r["message"] for r in records] == ["call started", "transferred"]
+        assert records[0]["x_call_id"] == "X-1" and records[0]["phase"] == "call_start"
+        assert records[1]["latency_ms"] == 120.5
+
+        # Segments are plain gzip streams
+        segment = next(tmp_path.glob("calls-*.jsonl.gz"))
+        with gzip.open(segment, "rt") as f:
+            assert len(f.readlines()) == 2
+
+    def test_lookup_by_x_call_id(self, tmp_path):
+        """Test that a call is found by its X-Call-ID through the index"""
+        handler = JsonlCallLogHandler(str(tmp_path))
+        emit(handler, "CA1", "hello", x_call_id="X-77")
+        handler.close()
+        assert [r["call_sid"] for r in iter_call_records("X-77", str(tmp_path))] == ["CA1"]
+
+    def test_reads_only_the_calls_frames(self, tmp_path):
+        """Test that a query decompresses only frames holding the call"""
+        handler = JsonlCallLogHandler(str(tmp_path), frame_bytes=1)
+        for i in range(50):
+            emit(handler, f"CA{i}", f"record of call {i}")
+        handler.close()
+
+        stats = {}
+        records = list(iter_call_records("CA7", str(tmp_path), stats=stats))
+        assert [r["message"] for r in records] == ["record of call 7"]
+        assert stats["frames_read"] == 1
+        assert stats["bytes_read"] < sum(p.stat().st_size for p in tmp_path.glob("calls-*.jsonl.gz"))
+
+    def test_rotation_by_size(self, tmp_path):
+        """Test that segments roll over past the size limit and calls spanning them are found in both"""
+        handler = JsonlCallLogHandler(str(tmp_path), frame_bytes=1, max_bytes=200)
+        for i in range(20):
+            emit(handler, "CA1", f"turn {i} " + "x" * 50)
+        handler.close()
+
+        assert len(list(tmp_path.glob("calls-*.jsonl.gz"))) > 1
+        assert len(find_call("CA1", str(tmp_path))) > 1
+        assert [r["message"].split()[1] for r in iter_call_records("CA1", str(tmp_path))] == [str(i) for i in range(20)]
+
+    def test_retention(self, tmp_path):
+        """Test that segments older than the retention period are deleted on rotation"""
+        old = tmp_path / "calls-20200101-000000-1.jsonl.gz"
+        old.write_bytes(gzip.compress(b"{}\n"))
+        os.utime(old, (time.time() - 40 * 86400,) * 2)
+        handler = JsonlCallLogHandler(str(tmp_path), retention_days=30)
+        emit(handler, "CA1", "x")
+        handler.close()
+        assert not old.exists()
+
+    def test_zstd_falls_back_to_gzip(self, tmp_path, monkeypatch):
+        """Test that zstd without the zstandard package writes gzip"""
+        monkeypatch.setattr(structured_logs, "zstandard", None)
+        handler = JsonlCallLogHandler(str(tmp_path), compression="zstd")
+        emit(handler, "CA1", "x")
+        handler.close()
+        assert handler.compression == "gzip"
+        assert list(tmp_path.glob("calls-*.jsonl.gz"))
+
+    def test_index_is_json(self, tmp_path):
+        """Test the sidecar index layout"""
+        handler = JsonlCallLogHandler(str(tmp_path))
+        emit(handler, "CA1", "x", x_call_id="X-1")
+        handler.close()
+        index = json.loads(next(tmp_path.glob("*.idx.json")).read_text())
+        assert index["calls"]["CA1"]["x_call_id"] == "X-1"
+        assert index["segment"].endswith(".jsonl.gz")
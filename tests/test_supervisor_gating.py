@@ -0,0 +1,166 @@
+"""
+Test Suite for two-tier supervisor scoring
+
+Covers the local risk signals that decide whether a turn goes to the LLM
+scorer, status-message filtering and stalls, adaptive sampling, and the replay tool
+that compares LLM calls and escalation recall of gated and ungated
+supervisors on recorded calls.
+"""
+
+import asyncio
+import json
+
+import supervisor as supervisor_module
+from supervisor import Supervisor
+from supervisor_replay import ReplaySupervisor, compare, load_calls, replay_call
+
+GOOD = {"relevance": "0.90", "completeness": "0.90", "groundedness": "0.90", "average": "0.90"}
+BAD = {"relevance": "0.30", "completeness": "0.30", "groundedness": "0.40", "average": "0.33"}
+
+
+def make_supervisor(sample_rate=0.0):
+    supervisor = ReplaySupervisor(gating=True, sample_seed=1)
+    supervisor.sample_rate = sample_rate
+    return supervisor
+
+
+def call(*turns):
+    """Conversation history alternating user and agent turns after a greeting."""
+    history = [{"speaker": "Agent", "transcription": "Hello, thank you for calling. How can I help?", "score": None}]
+    for user, agent, score in turns:
+        history.append({"speaker": "User", "transcription": user, "score": None})
+        history.append({"speaker": "Agent", "transcription": agent, "score": score})
+    return history
+
+
+CLEAN_CALL = call(
+    ("I need a ride tomorrow", "Sure, what time is your appointment?", GOOD),
+    ("at 10 in the morning", "Got it, and where are you going?", GOOD),
+    ("to the dialysis center", "Your ride is booked for 9:30 AM.", GOOD),
+    ("thanks", "You're welcome, have a great day.", GOOD),
+)
+FAILING_CALL = call(
+    ("I need a ride tomorrow", "Sure, what time is your appointment?", GOOD),
+    ("to Mercy hospital", "Sorry, I didn't catch that. Where are you going?", BAD),
+    ("Mercy hospital on Saint Paul street", "I apologize, I'm unable to find that address.", BAD),
+    ("you keep asking the same thing", "Sorry, I did not understand. Could you repeat the address?", BAD),
+    ("forget it", "Is there anything else I can help with?", GOOD),
+)
+
+# The bot keeps promising to check and never answers
+STALLING_CALL = call(
+    ("I need to check on my ride for today", "Let me check your trip for you, one moment.", BAD),
+    ("okay", "One moment, I'm still checking your trip.", BAD),
+    ("hello?", "Please wait, I'm checking on that trip now.", BAD),
+    ("is anyone there", "Just a moment while I look up your trip.", BAD),
+    ("this is ridiculous", "Thank you for waiting, I'm checking your trip.", BAD),
+)
+
+
+class TestScoringGate:
+    """Test the local tier deciding which turns the LLM scores"""
+
+    def test_clean_turn_skipped(self):
+        """Test that a low-risk turn is not sent to the LLM and keeps its place in the score history"""
+        supervisor = make_supervisor()
+        assert not supervisor._should_score_with_llm("at 10 in the morning", "Got it, and where are you going?", None)
+        assert supervisor.gate_stats["llm_saved"] == 1
+        assert supervisor.score_history[-1]["skipped"] == "low_risk"
+
+    def test_status_message_skipped(self):
+        """Test that status messages are never scored"""
+        supervisor = make_supervisor(sample_rate=1.0)
+        assert not supervisor._should_score_with_llm("book it", "Please wait while I check availability.", None)
+        assert supervisor.gate_stats["status_skipped"] == 1
+
+    def test_status_stall_scored(self):
+        """Test that a second status message in a row is scored and a question is never a status message"""
+        supervisor = make_supervisor()
+        supervisor._update_restricted_history("assistant", "Let me check your trip for you, one moment.")
+        assert not supervisor._should_score_with_llm("okay", "Let me check your trip for you, one moment.", None)
+        supervisor._update_restricted_history("assistant", "One moment, I'm still checking your trip.")
+        assert supervisor._should_score_with_llm("hello?", "One moment, I'm still checking your trip.", None)
+        assert supervisor._local_risk("hello?", "", None)[1][0] == "status_stall"
+
+        supervisor._update_restricted_history("assistant", "Your ride arrives at 10 AM.")
+        assert supervisor.status_streak == 0
+        assert not supervisor._is_status_message("Let me check, is that for tomorrow?")
+        assert not supervisor._is_status_message("Getting there takes about 20 minutes.")
+
+    def test_risky_turns_scored(self):
+        """Test that confusion, frustration, STT errors and open streaks send the turn to the LLM"""
+        supervisor = make_supervisor()
+        assert supervisor._should_score_with_llm("to Mercy", "Sorry, I didn't catch that.", None)
+        assert supervisor._should_score_with_llm("you keep saying that", "Where are you going?", None)
+        assert supervisor._should_score_with_llm("a bride", "Where to?", {"is_likely_stt_error": True,
+                                                                            "confidence_score": 0.95})
+        assert not supervisor._should_score_with_llm("ok", "Where to?", {"is_likely_stt_error": True,
+                                                                          "confidence_score": 0.7})
+        supervisor.nth_issue = 1
+        assert supervisor._should_score_with_llm("ok", "Please wait while I check.", None)
+        assert supervisor.gate_stats["risk_triggered"] == 4
+
+    def test_similar_bot_turns_scored(self):
+        """Test that near-identical recent bot turns raise the risk"""
+        supervisor = make_supervisor()
+        supervisor._update_restricted_history("assistant", "Where would you like to be picked up?")
+        supervisor._update_restricted_history("assistant", "Where should we pick you up today?")
+        risk, signals = supervisor._local_risk("my house", "Where should we pick you up today?", None)
+        assert risk >= supervisor_module.SUPERVISOR_RISK_THRESHOLD and signals == ["bot_similarity"]
+
+    def test_gating_disabled(self):
+        """Test that without gating every turn is scored"""
+        supervisor = ReplaySupervisor(gating=False)
+        assert supervisor._should_score_with_llm("thanks", "You're welcome.", None)
+        assert supervisor.get_stats()["llm_calls"] == 1
+
+    def test_adaptive_sample_rate(self):
+        """Test that clean scores halve the sample rate down to the floor and others reset it"""
+        supervisor = Supervisor(session=None, room=None, llm=object())
+        for _ in range(10):
+            supervisor._adapt_sample_rate(0.9, False)
+        assert supervisor.sample_rate == supervisor_module.SUPERVISOR_MIN_SAMPLE_RATE
+        supervisor._adapt_sample_rate(0.7, False)
+        assert supervisor.sample_rate == supervisor_module.SUPERVISOR_SAMPLE_RATE
+
+
+class TestReplay:
+    """Test replaying recorded calls"""
+
+    def test_clean_call_saves_llm_calls(self):
+        """Test that a clean call needs fewer LLM calls when gated"""
+        baseline = asyncio.run(replay_call(CLEAN_CALL, gating=False))
+        gated = asyncio.run(replay_call(CLEAN_CALL, gating=True, sample_seed=3))
+        assert baseline["llm_calls"] == 4 and baseline["escalated_at"] is None
+        assert gated["llm_calls"] < baseline["llm_calls"] and gated["escalated_at"] is None
+
+    def test_failing_call_still_escalates(self):
+        """Test that consecutive low scores escalate at the same turn when gated"""
+        baseline = asyncio.run(replay_call(FAILING_CALL, gating=False))
+        gated = asyncio.run(replay_call(FAILING_CALL, gating=True, sample_seed=3))
+        assert baseline["escalated_at"] == 8
+        assert gated["escalated_at"] == baseline["escalated_at"]
+
+    def test_stalling_call_escalates(self):
+        """Test that a bot answering only with status messages is scored and escalated when gated"""
+        baseline = asyncio.run(replay_call(STALLING_CALL, gating=False))
+        gated = asyncio.run(replay_call(STALLING_CALL, gating=True, sample_seed=3))
+        assert baseline["escalated_at"] is not None
+        # Only the first status message goes unscored, so escalation is at most one agent turn later
+        assert gated["escalated_at"] is not None and gated["escalated_at"] <= baseline["escalated_at"] + 2
+
+    def test_compare_report(self, tmp_path):
+        """Test the summary over a JSONL export with labels"""
+        path = tmp_path / "calls.jsonl"
+        docs = [{"conversation_history": CLEAN_CALL, "supervisor": {"escalated": False}},
+                {"conversation_history": FAILING_CALL, "supervisor": {"escalated": True}},
+                {"call_sid_new": "no history"}]
+        path.write_text("\n".join(json.dumps(doc) for doc in docs))
+
+        report = compare(load_calls([str(path)]), runs=3)
+        assert report["calls"] == 2
+        assert report["llm_calls"]["baseline"] == 8
+        assert report["llm_calls_saved"] > 0
+        assert report["escalations"] == {"baseline": 1, "gated": 1}
+        assert report["recall"] == {"mean": 1.0, "min": 1.0}
+        assert report["label_recall"] == {"labeled": 2, "baseline": 1.0, "gated": 1.0}
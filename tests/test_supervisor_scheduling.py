@@ -0,0 +1,153 @@
+"""
+Test Suite for the supervisor's single scoring slot
+
+Covers debouncing bursts of assistant turns, cancelling an in-flight score
+when a newer turn arrives, keeping at most one supervisor LLM request open
+per call, and one score history entry per agent turn.
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from supervisor import Supervisor
+
+GOOD = json.dumps({"relevance": 0.9, "completeness": 0.9, "groundedness": 0.9, "repetition_detected": False})
+
+
+class SlowScorer(Supervisor):
+    """Supervisor whose LLM scorer takes `latency` seconds and records what it scored"""
+
+    def __init__(self, latency=0.0, debounce=0.05, unwind_steps=0):
+        super().__init__(session=None, room=None, llm=object(), gating=False, score_debounce=debounce)
+        self.latency = latency
+        self.unwind_steps = unwind_steps
+        self.open_requests = 0
+        self.max_open_requests = 0
+        self.scored_turns = []
+
+    async def _llm_score(self, prompt):
+        self.open_requests += 1
+        self.max_open_requests = max(self.max_open_requests, self.open_requests)
+        try:
+            await asyncio.sleep(self.latency)
+            self.scored_turns.append(self.restricted_history[-1]["text"])
+            return GOOD
+        except asyncio.CancelledError:
+            # Closing a cancelled LLM stream takes a few loop iterations
+            for _ in range(self.unwind_steps):
+                await asyncio.sleep(0)
+            raise
+        finally:
+            self.open_requests -= 1
+
+
+def add(supervisor, role, text):
+    supervisor._on_added(SimpleNamespace(item=SimpleNamespace(role=role, content=[text])))
+
+
+async def start_call(supervisor):
+    add(supervisor, "assistant", "Hello, how can I help?")  # greeting is never scored
+    add(supervisor, "user", "I need to check my ride")
+
+
+class TestScoringSlot:
+    """Test debouncing and cancellation of supervisor scores"""
+
+    def test_burst_scored_once(self):
+        """Test that assistant turns arriving within the debounce are scored once, on the latest"""
+        supervisor = SlowScorer()
+
+        async def run():
+            await start_call(supervisor)
+            add(supervisor, "assistant", "Please wait while I check.")
+            await asyncio.sleep(0.01)
+            add(supervisor, "assistant", "Your ride is confirmed for 10 AM.")
+            await supervisor._scoring_task
+
+        asyncio.run(run())
+        assert supervisor.scored_turns == ["Your ride is confirmed for 10 AM."]
+        assert [s.get("skipped") for s in supervisor.score_history] == ["superseded", None]
+        assert supervisor.gate_stats["superseded"] == 1
+
+    def test_in_flight_score_cancelled(self):
+        """Test that a newer turn cancels an in-flight score and only one request is ever open"""
+        supervisor = SlowScorer(latency=0.2)
+
+        async def run():
+            await start_call(supervisor)
+            add(supervisor, "assistant", "Please wait while I check.")
+            await asyncio.sleep(0.1)  # past the debounce: the first score is in flight
+            assert supervisor.open_requests == 1
+            add(supervisor, "assistant", "Your ride is confirmed for 10 AM.")
+            await supervisor._scoring_task
+
+        asyncio.run(run())
+        assert supervisor.max_open_requests == 1
+        assert supervisor.scored_turns == ["Your ride is confirmed for 10 AM."]
+        assert supervisor.gate_stats["llm_calls"] == 2 and supervisor.gate_stats["superseded"] == 1
+
+    def test_slow_cancellation_keeps_history_aligned(self):
+        """Test that every agent turn gets one entry when a cancelled score takes a while to unwind"""
+        supervisor = SlowScorer(latency=0.2, unwind_steps=5)
+
+        async def run():
+            await start_call(supervisor)
+            add(supervisor, "assistant", "Please wait while I check.")
+            await asyncio.sleep(0.1)  # the first score is in flight
+            add(supervisor, "assistant", "I found your ride.")
+            await asyncio.sleep(0.01)  # the first score has unwound; the second is debouncing
+            add(supervisor, "assistant", "Your ride is confirmed for 10 AM.")
+            await supervisor._scoring_task
+
+        asyncio.run(run())
+        assert [s.get("skipped") for s in supervisor.score_history] == ["superseded", "superseded", None]
+        assert supervisor.gate_stats["superseded"] == 2
+
+    def test_unscored_paths_keep_history_aligned(self):
+        """Test that a turn ending without a usable score still gets a placeholder"""
+        supervisor = SlowScorer()
+
+        async def unparseable(prompt):
+            return "not json"
+
+        supervisor._llm_score = unparseable
+
+        async def run():
+            await start_call(supervisor)
+            add(supervisor, "assistant", "What time is your appointment?")
+            await supervisor._scoring_task
+
+        asyncio.run(run())
+        assert [s.get("skipped") for s in supervisor.score_history] == ["parse_error"]
+
+    def test_separate_turns_all_scored(self):
+        """Test that turns further apart than a score are each scored"""
+        supervisor = SlowScorer()
+
+        async def run():
+            await start_call(supervisor)
+            add(supervisor, "assistant", "What time is your appointment?")
+            await supervisor._scoring_task
+            add(supervisor, "user", "10 AM")
+            add(supervisor, "assistant", "Your ride is booked.")
+            await supervisor._scoring_task
+
+        asyncio.run(run())
+        assert supervisor.scored_turns == ["What time is your appointment?", "Your ride is booked."]
+        assert len(supervisor.score_history) == 2 and supervisor.gate_stats["superseded"] == 0
+
+    def test_stop_cancels_pending_score(self):
+        """Test that stopping the supervisor drops a pending score"""
+        supervisor = SlowScorer(debounce=1.0)
+
+        async def run():
+            await start_call(supervisor)
+            add(supervisor, "assistant", "Anything else?")
+            task = supervisor._scoring_task
+            await supervisor.stop()
+            await asyncio.wait({task})
+            return task
+
+        assert asyncio.run(run()).cancelled()
+        assert supervisor.scored_turns == []
@@ -0,0 +1,122 @@
+"""
+Test Suite for token counting of responses without usage
+
+Covers the offline estimator, the once-per-process encoding load, output
+text extraction from Responses API objects and the web search usage
+recorded on the call's cost tracker.
+"""
+
+import os
+from types import SimpleNamespace
+
+import token_estimator
+from call_context import start_call_context
+from cost_tracker import add_websearch_response_usage, get_cost_tracker
+from token_estimator import count_tokens, estimate_tokens, response_text
+
+
+def make_response(text, usage=None):
+    content = [SimpleNamespace(type="output_text", text=text)]
+    return SimpleNamespace(
+        usage=usage,
+        output=[SimpleNamespace(type="web_search_call"), SimpleNamespace(type="message", content=content)],
+    )
+
+
+class TestEstimateTokens:
+    """Test the offline estimator"""
+
+    def test_common_phrases(self):
+        """Test that common words and punctuation count one token each"""
+        assert estimate_tokens("Hello, how can I help you today?") == 9
+        assert estimate_tokens("I'm at 1600 Main Street.") == 8
+        assert estimate_tokens("") == 0
+
+    def test_long_words_and_numbers(self):
+        """Test that long words and digit runs count more than one token"""
+        assert estimate_tokens("pneumonoultramicroscopic") == 3
+        assert estimate_tokens("2025123") == 3
+
+    def test_closer_than_word_count(self):
+        """Test that punctuation-heavy text is not undercounted like a word count"""
+        text = "Pickup: 12/05/2025 @ 10:30 AM -- 4500 N. Charles St., Baltimore, MD 21210"
+        assert estimate_tokens(text) > len(text.split()) * 1.3
+
+
+class TestCountTokens:
+    """Test the encoding selection"""
+
+    def test_fallback_when_encoding_unavailable(self, tmp_path, monkeypatch):
+        """Test that a failed encoding load falls back to the estimator and is not retried"""
+        calls = []
+
+        def get_encoding(name):
+            calls.append(name)
+            raise OSError("no network")
+
+        monkeypatch.setattr(token_estimator, "tiktoken", SimpleNamespace(get_encoding=get_encoding))
+        monkeypatch.setattr(token_estimator, "_encodings", {})
+        (tmp_path / "o200k_base").write_text("")
+        monkeypatch.setattr(token_estimator, "encoding_cache_path", lambda name: str(tmp_path / name))
+        token_estimator._count_tokens.cache_clear()
+        try:
+            assert count_tokens("Hello, how can I help you today?", "gpt-4o") == 9
+            assert count_tokens("Where would you like to go?", "gpt-4o") == 7
+            assert calls == ["o200k_base"]
+        finally:
+            token_estimator._count_tokens.cache_clear()
+
+    def test_missing_encoding_file_not_downloaded(self, tmp_path, monkeypatch):
+        """Test that an encoding missing from the local cache is never fetched"""
+        calls = []
+        monkeypatch.setattr(token_estimator, "tiktoken", SimpleNamespace(get_encoding=calls.append))
+        monkeypatch.setattr(token_estimator, "_encodings", {})
+        monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+        token_estimator._count_tokens.cache_clear()
+        try:
+            assert count_tokens("Hello, how can I help you today?", "gpt-4o") == 9
+            assert calls == []
+
+            # Once the file is baked into the cache directory the encoding is loaded
+            monkeypatch.setattr(token_estimator, "_encodings", {})
+            (tmp_path / os.path.basename(token_estimator.encoding_cache_path("o200k_base"))).write_text("")
+            token_estimator.load_encodings()
+            assert calls == ["o200k_base"]
+        finally:
+            token_estimator._count_tokens.cache_clear()
+
+    def test_uses_encoding(self, monkeypatch):
+        """Test that a loaded encoding is used for its models"""
+        encoding = SimpleNamespace(encode=lambda text, disallowed_special=(): list(text))
+        monkeypatch.setattr(token_estimator, "_encodings", {"o200k_base": encoding})
+        monkeypatch.setattr(token_estimator, "tiktoken", SimpleNamespace())
+        token_estimator._count_tokens.cache_clear()
+        try:
+            assert count_tokens("abc", "gpt-4.1-mini") == 3
+            assert token_estimator.encoding_for_model("gpt-3.5-turbo") == "cl100k_base"
+        finally:
+            token_estimator._count_tokens.cache_clear()
+
+
+class TestWebsearchUsage:
+    """Test web search usage recording"""
+
+    def test_response_text(self):
+        """Test that only output_text content of message items is extracted"""
+        assert response_text(make_response("Open until 9 PM.")) == "Open until 9 PM."
+        assert response_text(SimpleNamespace()) == ""
+
+    def test_reported_usage_preferred(self):
+        """Test that usage reported by the API is recorded as is"""
+        start_call_context("CA-usage")
+        add_websearch_response_usage("hours of the pharmacy", make_response(
+            "Open until 9 PM.", SimpleNamespace(input_tokens=2100, output_tokens=40)))
+        tokens = get_cost_tracker().breakdown.websearch_tokens
+        assert (tokens.input_tokens, tokens.output_tokens) == (2100, 40)
+
+    def test_counted_when_usage_missing(self):
+        """Test that tokens are counted from prompt and output text without usage"""
+        start_call_context("CA-no-usage")
+        add_websearch_response_usage("Hello, how can I help you today?", make_response("Open until 9 PM."))
+        tokens = get_cost_tracker().breakdown.websearch_tokens
+        assert tokens.input_tokens == 9 and tokens.output_tokens == 5
@@ -0,0 +1,187 @@
+"""
+Test Suite for per-call latency tracing
+
+Covers span nesting across tasks, per-call isolation, traced tool
+functions, LiveKit metrics spans, aiohttp request spans, percentiles and
+the timeline and OTLP exports.
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import call_context
+import tracing
+from call_context import start_call_context
+from cost_tracker import set_call_context
+from tracing import (CallTrace, export_call_trace, get_call_trace, record_metrics, record_span, span, traced,
+                     http_trace_config)
+
+
+@pytest.fixture(autouse=True)
+def isolated_call_context():
+    """Keep call contexts and traces bound by a test from leaking into later tests"""
+    token = call_context._current_call.set(None)
+    yield
+    call_context._current_call.reset(token)
+    tracing._call_traces.clear()
+
+
+class TestSpans:
+    """Test span recording"""
+
+    def test_nested_spans(self):
+        """Test that spans opened inside a span are recorded as its children"""
+        start_call_context("CA1")
+        with span("outer", "bootstrap") as outer:
+            with span("inner", "http") as inner:
+                pass
+        spans = get_call_trace().spans
+        assert [s.name for s in spans] == ["inner", "outer"]
+        assert inner.parent_id == outer.span_id and outer.parent_id is None
+        assert outer.duration_ms >= inner.duration_ms
+
+    def test_error_recorded(self):
+        """Test that an exception inside a span marks it failed and propagates"""
+        start_call_context("CA1")
+        with pytest.raises(ValueError):
+            with span("lookup", "bootstrap"):
+                raise ValueError("no affiliate")
+        assert get_call_trace().spans[0].error == "ValueError: no affiliate"
+
+    def test_bootstrap_spans_kept_until_call_id_known(self):
+        """Test that spans recorded before the call_sid is set belong to the call's trace"""
+        start_call_context()
+        with span("connect", "bootstrap"):
+            pass
+        set_call_context("CA9")
+        assert [s.name for s in get_call_trace("CA9").spans] == ["connect"]
+
+    def test_concurrent_calls_isolated(self):
+        """Test that spans of concurrent calls land in their own traces"""
+        @traced("tool")
+        async def get_eta(index):
+            await asyncio.sleep(0.001 * (index % 3))
+            return index
+
+        async def call(index):
+            start_call_context(f"CA{index}")
+            get_call_trace(f"CA{index}")
+            for _ in range(3):
+                await asyncio.create_task(get_eta(index))
+
+        async def run():
+            await asyncio.gather(*(call(i) for i in range(20)))
+
+        asyncio.run(run())
+        for i in range(20):
+            trace = get_call_trace(f"CA{i}")
+            assert [s.name for s in trace.spans] == ["get_eta"] * 3
+
+    def test_traced_keeps_signature(self):
+        """Test that a traced function keeps the name and signature tools are built from"""
+        import inspect
+
+        async def get_ETA(self, phone: str, count: int = 1) -> str:
+            """Get the ETA."""
+            return phone
+
+        wrapped = traced("tool")(get_ETA)
+        assert wrapped.__name__ == "get_ETA" and wrapped.__doc__ == "Get the ETA."
+        assert list(inspect.signature(wrapped).parameters) == ["self", "phone", "count"]
+
+    def test_span_limit(self):
+        """Test that spans past the per-call limit are counted as dropped"""
+        trace = CallTrace("CA1", max_spans=2)
+        for _ in range(5):
+            trace.add(tracing.Span("x", "http", 0.0))
+        assert len(trace.spans) == 2 and trace.dropped == 3
+
+
+class TestMetricsAndHttp:
+    """Test spans from LiveKit metrics and aiohttp requests"""
+
+    def test_llm_metrics(self):
+        """Test that LLM metrics become an llm span ending at the metrics timestamp"""
+        start_call_context("CA1")
+        metrics = SimpleNamespace(type="llm_metrics", timestamp=1000.0, duration=0.8, ttft=0.25,
+                                  tokens_per_second=40.0, prompt_tokens=900, completion_tokens=32, speech_id="s1")
+        recorded = record_metrics(metrics, "CA1")
+        assert recorded.kind == "llm" and recorded.duration_ms == pytest.approx(800)
+        assert recorded.start == pytest.approx(999.2)
+        assert recorded.attrs["ttft_ms"] == 250.0
+
+    def test_unknown_metrics_ignored(self):
+        """Test that metrics types without latency are skipped"""
+        assert record_metrics(SimpleNamespace(type="vad_metrics")) is None
+
+    def test_http_trace_config(self):
+        """Test that aiohttp requests are recorded as http spans with their status"""
+        aiohttp = pytest.importorskip("aiohttp")
+        from aiohttp import web
+
+        async def run():
+            start_call_context("CA1")
+
+            async def ok(request):
+                return web.Response(text="ok")
+
+            app = web.Application()
+            app.router.add_get("/ok", ok)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
+                    async with session.get(f"http://127.0.0.1:{port}/ok") as response:
+                        await response.text()
+            finally:
+                await runner.cleanup()
+            return get_call_trace().spans
+
+        spans = asyncio.run(run())
+        assert [(s.name, s.kind, s.attrs["http.status"]) for s in spans] == [("GET 127.0.0.1/ok", "http", 200)]
+
+
+class TestExport:
+    """Test percentiles and exports"""
+
+    def test_percentiles(self):
+        """Test per-kind counts and percentiles"""
+        trace = CallTrace("CA1")
+        for ms in range(1, 101):
+            trace.add(tracing.Span("GET api", "http", 0.0, float(ms)))
+        trace.add(tracing.Span("get_ETA", "tool", 0.0, 5.0))
+        stats = trace.percentiles()
+        assert stats["http"] == {"count": 100, "p50": 51.0, "p90": 91.0, "p99": 100.0, "max": 100.0}
+        assert stats["tool"]["count"] == 1
+
+    def test_export_timeline_and_otlp(self, tmp_path, monkeypatch):
+        """Test that export writes the timeline artifact and an OTLP line, then forgets the trace"""
+        written = {}
+        monkeypatch.setattr(tracing, "write_artifact", lambda kind, name, content: written.update({name: content}))
+        start_call_context("CA1")
+        get_call_trace("CA1")
+        with span("session_start", "bootstrap") as session_start:
+            record_span("sip_transfer", "transfer", 120.0, start=session_start.start, target="sip:100@pbx")
+
+        otlp_file = tmp_path / "traces.jsonl"
+        timeline = export_call_trace("CA1", otlp_file=str(otlp_file))
+        assert [s["name"] for s in timeline["spans"]] == ["session_start", "sip_transfer"]
+        assert json.loads(written["trace_CA1.json"])["percentiles"]["transfer"]["count"] == 1
+
+        otlp = json.loads(otlp_file.read_text())
+        spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        parent = next(s for s in spans if s["name"] == "session_start")
+        child = next(s for s in spans if s["name"] == "sip_transfer")
+        assert child["parentSpanId"] == parent["spanId"] and child["kind"] == 3
+        assert len(parent["traceId"]) == 32 and len(parent["spanId"]) == 16
+
+        # Spans recorded after export do not resurrect the trace
+        record_span("late", "http", 1.0)
+        assert "CA1" not in tracing._call_traces
+        assert export_call_trace("CA1") is None
@@ -0,0 +1,149 @@
+"""
+Test Suite for the live-agent transfer engine
+
+Covers the worker-scoped LiveKit client, concurrent context upload with
+background retry, and latency/statistics reporting.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from transfer_engine import TransferEngine, asterisk_target, DISPATCHER_EXTENSION
+
+
+class FakeSip:
+    """Records SIP transfer requests"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.requests = []
+
+    async def transfer_sip_participant(self, request):
+        self.requests.append(request)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("sip failure")
+
+
+class FakeLiveKitAPI:
+    """Stand-in for livekit.api.LiveKitAPI"""
+
+    created = 0
+
+    def __init__(self, sip=None):
+        FakeLiveKitAPI.created += 1
+        self.sip = sip or FakeSip()
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+def make_room():
+    """Build a room with a single SIP participant"""
+    return SimpleNamespace(
+        name="room-1",
+        remote_participants={"sip_caller": SimpleNamespace(identity="sip_caller")},
+    )
+
+
+class TestTransferEngine:
+    """Test the transfer engine"""
+
+    def test_client_is_reused_across_transfers(self):
+        """Test that one LiveKit client serves every transfer on the loop"""
+        FakeLiveKitAPI.created = 0
+        engine = TransferEngine(api_factory=FakeLiveKitAPI)
+
+        async def run():
+            first = await engine.transfer(make_room(), "sip:5000@host")
+            second = await engine.transfer(make_room(), "sip:5001@host")
+            client = engine._client
+            await engine.aclose()
+            return first, second, client
+
+        first, second, client = asyncio.run(run())
+        assert first.success and second.success
+        assert FakeLiveKitAPI.created == 1
+        assert [r.transfer_to for r in client.sip.requests] == ["sip:5000@host", "sip:5001@host"]
+        assert client.sip.requests[0].participant_identity == "sip_caller"
+        assert client.sip.requests[0].room_name == "room-1"
+        assert client.closed
+
+    def test_transfer_does_not_wait_for_context_upload(self):
+        """Test that the SIP transfer completes while a slow upload is still running"""
+        engine = TransferEngine(api_factory=FakeLiveKitAPI)
+        sent = []
+
+        async def build_context():
+            return {"tripInfo": "context"}
+
+        async def send_context(payload):
+            await asyncio.sleep(0.3)
+            sent.append(payload)
+            return True
+
+        async def run():
+            result = await engine.transfer(make_room(), "sip:5000@host",
+                                           build_context=build_context, send_context=send_context)
+            pending_after_transfer = engine.get_stats()["pending_uploads"]
+            await engine.drain()
+            return result, pending_after_transfer
+
+        result, pending_after_transfer = asyncio.run(run())
+        assert result.success
+        assert result.latency_ms < 300
+        assert pending_after_transfer == 1
+        assert sent == [{"tripInfo": "context"}]
+        assert engine.get_stats()["uploads_succeeded"] == 1
+
+    def test_context_upload_is_retried(self):
+        """Test that a failed upload is retried with the same payload"""
+        engine = TransferEngine(api_factory=FakeLiveKitAPI, upload_attempts=3, upload_backoff=0.01)
+        built = []
+        attempts = []
+
+        async def build_context():
+            built.append(1)
+            return {"n": 1}
+
+        async def send_context(payload):
+            attempts.append(payload)
+            if len(attempts) == 1:
+                raise ConnectionError("reset")
+            return len(attempts) == 3
+
+        async def run():
+            await engine.transfer(make_room(), "sip:5000@host",
+                                  build_context=build_context, send_context=send_context)
+            await engine.drain()
+
+        asyncio.run(run())
+        assert len(built) == 1
+        assert len(attempts) == 3
+        assert engine.get_stats()["uploads_succeeded"] == 1
+        assert engine.get_stats()["uploads_failed"] == 0
+
+    def test_failed_transfer_is_reported(self):
+        """Test that a SIP error is returned as a failed result, not raised"""
+        engine = TransferEngine(api_factory=lambda: FakeLiveKitAPI(FakeSip(fail=True)))
+
+        result = asyncio.run(engine.transfer(make_room(), "sip:5000@host"))
+        assert not result.success
+        assert result.error == "sip failure"
+        assert engine.get_stats()["failed_transfers"] == 1
+        assert engine.get_stats()["transfers"] == 0
+
+    def test_missing_participant_fails_cleanly(self):
+        """Test that a room without participants yields a failed result"""
+        engine = TransferEngine(api_factory=FakeLiveKitAPI)
+        room = SimpleNamespace(name="empty", remote_participants={})
+
+        result = asyncio.run(engine.transfer(room, "sip:5000@host"))
+        assert not result.success
+
+    def test_asterisk_target(self, monkeypatch):
+        """Test SIP URI construction for Asterisk extensions"""
+        monkeypatch.setenv("ASTERISK_SERVER_IP", "10.0.0.5")
+        assert asterisk_target(DISPATCHER_EXTENSION) == "sip:5000@10.0.0.5"
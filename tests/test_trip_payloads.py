@@ -0,0 +1,64 @@
+"""
+Test Suite for trip payload templates
+
+Covers the preloaded template copies used for booking legs and the default
+transfer payload.
+"""
+
+import trip_payloads
+from trip_payloads import new_trip_payload, build_default_transfer_payload
+
+
+class TestTripPayloads:
+    """Test trip payload templates"""
+
+    def test_copies_are_independent(self):
+        """Test that mutating one payload does not leak into the next"""
+        first = new_trip_payload()
+        first['riderInfo']['PhoneNo'] = "3015551234"
+        first['addressInfo']['Trips'][0]['Details'][0]['Name'] = "Changed"
+
+        second = new_trip_payload()
+        assert second['riderInfo']['PhoneNo'] == ""
+        assert second['addressInfo']['Trips'][0]['Details'][0]['Name'] == ""
+
+    def test_template_is_not_reread(self, monkeypatch):
+        """Test that building payloads does not open the template file"""
+        new_trip_payload()
+
+        def fail_open(*args, **kwargs):
+            raise AssertionError("template read from disk")
+
+        monkeypatch.setattr("builtins.open", fail_open)
+        assert 'riderInfo' in new_trip_payload()
+
+    def test_default_transfer_payload_for_known_rider(self):
+        """Test that rider details are applied to the default payload"""
+        payload = build_default_transfer_payload(rider_phone="3015551234", client_id="12345", rider_name="Jane Doe")
+
+        assert payload['riderInfo']['PhoneNo'] == "3015551234"
+        assert payload['riderInfo']['ID'] == "12345"
+        assert payload['riderInfo']['PickupPerson'] == "Jane Doe"
+        for trip in payload['addressInfo']['Trips']:
+            for detail in trip['Details']:
+                assert detail['Name'] == "Jane Doe"
+                assert 'tripInfo' in detail
+
+    def test_default_transfer_payload_for_unknown_rider(self):
+        """Test that an unknown client ID maps to -1 and defaults are kept"""
+        payload = build_default_transfer_payload(client_id="None")
+        assert payload['riderInfo']['ID'] == "-1"
+        assert payload['riderInfo']['PickupPerson'] == "Customer"
+
+        payload = build_default_transfer_payload()
+        assert payload['riderInfo']['ID'] == new_trip_payload()['riderInfo']['ID']
+
+    def test_load_template_from_path(self, tmp_path):
+        """Test reloading the template from a different file"""
+        custom = tmp_path / "payload.json"
+        custom.write_text('{"riderInfo": {"PhoneNo": "1"}, "addressInfo": {"Trips": []}}')
+        try:
+            trip_payloads.load_template(str(custom))
+            assert new_trip_payload() == {"riderInfo": {"PhoneNo": "1"}, "addressInfo": {"Trips": []}}
+        finally:
+            trip_payloads.load_template()
@@ -0,0 +1,157 @@
+"""
+Token counts for LLM responses that come back without `usage`.
+
+count_tokens() uses the model's tiktoken encoding when tiktoken is installed
+and the encoding file is already in tiktoken's cache directory (bake it into
+the image and point TIKTOKEN_CACHE_DIR at it). tiktoken.get_encoding()
+downloads a missing file synchronously, so it is only called for files that
+exist locally. Encodings are loaded once per process, by load_encodings() in
+the LiveKit prewarm hook or on first use; otherwise counts come from an
+offline estimator that splits text the way the o200k/cl100k pre-tokenizers
+do and prices each piece by length (most English words are one token),
+which tracks the real count far more closely than a word count times 1.3 on
+addresses, numbers and punctuation.
+
+Nothing here touches the network: a missing or failed encoding is
+remembered and not retried.
+"""
+
+import hashlib
+import math
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Any, Optional
+
+import regex
+
+from logging_config import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # optional; the offline estimator is used without it
+    tiktoken = None
+
+logger = get_logger('token_estimator')
+
+TOKEN_ESTIMATOR_TIKTOKEN = os.getenv("TOKEN_ESTIMATOR_TIKTOKEN", "true").lower() == "true"
+
+# Models not listed use cl100k_base
+MODEL_ENCODINGS = {
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+    "gpt-4.1": "o200k_base",
+    "gpt-4.1-mini": "o200k_base",
+    "gpt-4.1-nano": "o200k_base",
+}
+DEFAULT_ENCODING = "cl100k_base"
+
+# Files tiktoken fetches for each encoding; it caches them under the sha1 of the URL
+ENCODING_URLS = {
+    "o200k_base": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+    "cl100k_base": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+}
+
+# Same split as the cl100k/o200k pre-tokenizers: contractions, words with an
+# optional leading space, 1-3 digit groups, punctuation runs, whitespace
+_PIECES = regex.compile(
+    r"""'(?i:[sdmt]|ll|ve|re)| ?\p{L}+| ?\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+# Characters per token within a piece; common words are one token
+_WORD_CHARS = 8
+_PUNCT_CHARS = 3
+
+_encodings_lock = threading.Lock()
+_encodings = {}
+
+
+def encoding_for_model(model: str) -> str:
+    """Name of the tiktoken encoding used by a model."""
+    return MODEL_ENCODINGS.get(model, DEFAULT_ENCODING)
+
+
+def encoding_cache_path(name: str) -> Optional[str]:
+    """Where tiktoken keeps the encoding's file, or None when tiktoken's cache is disabled."""
+    url = ENCODING_URLS.get(name)
+    if url is None:
+        return None
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    elif "DATA_GYM_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["DATA_GYM_CACHE_DIR"]
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest())
+
+
+def _get_encoding(name: str) -> Optional[Any]:
+    """The tiktoken encoding, loaded once per process; None when unavailable."""
+    if tiktoken is None or not TOKEN_ESTIMATOR_TIKTOKEN:
+        return None
+    if name not in _encodings:
+        with _encodings_lock:
+            if name not in _encodings:
+                path = encoding_cache_path(name)
+                if path is None or not os.path.exists(path):
+                    # get_encoding would download it on the calling thread
+                    logger.warning(f"⚠️ tiktoken encoding {name} not in the local cache, estimating token counts")
+                    _encodings[name] = None
+                else:
+                    try:
+                        _encodings[name] = tiktoken.get_encoding(name)
+                    except Exception as e:
+                        logger.warning(f"⚠️ tiktoken encoding {name} unavailable, estimating token counts: {e}")
+                        _encodings[name] = None
+    return _encodings[name]
+
+
+def load_encodings() -> None:
+    """Load every model's encoding now, so the first count does not parse the file on a call."""
+    for name in set(MODEL_ENCODINGS.values()) | {DEFAULT_ENCODING}:
+        _get_encoding(name)
+
+
+def estimate_tokens(text: str) -> int:
+    """Offline token estimate from the pre-tokenizer split."""
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        stripped = piece.strip()
+        if not stripped:
+            tokens += 1 if "\n" in piece or len(piece) > 1 else 0
+        elif stripped[0].isalpha():
+            tokens += math.ceil(len(stripped) / _WORD_CHARS)
+        elif stripped[0].isdigit():
+            tokens += 1
+        else:
+            tokens += math.ceil(len(stripped) / _PUNCT_CHARS)
+    return tokens
+
+
+@lru_cache(maxsize=512)
+def _count_tokens(text: str, encoding_name: str) -> int:
+    encoding = _get_encoding(encoding_name)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def count_tokens(text: Optional[str], model: str = "gpt-4o") -> int:
+    """Number of tokens `text` takes for `model`."""
+    if not text:
+        return 0
+    return _count_tokens(text, encoding_for_model(model))
+
+
+def response_text(response: Any) -> str:
+    """The output text of a Responses API response (empty when it has none)."""
+    parts = []
+    for item in getattr(response, "output", None) or []:
+        if getattr(item, "type", None) != "message":
+            continue
+        for content in getattr(item, "content", None) or []:
+            if getattr(content, "type", None) == "output_text":
+                parts.append(content.text)
+    return "".join(parts)
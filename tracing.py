@@ -0,0 +1,401 @@
+"""
+Per-call latency tracing.
+
+A lightweight span recorder: each call gets a CallTrace holding timed spans
+for the bootstrap phases, function tools, outbound HTTP and LLM requests,
+supervisor scoring, STT/LLM/TTS turn metrics and transfers. Spans nest
+through a contextvar, so a tool's HTTP requests appear under the tool.
+
+When the call ends the trace is written as a JSON timeline artifact
+(logs/call_trace/trace_<call_sid>.json) and, if TRACE_OTLP_FILE is set,
+appended to that file as one OTLP/JSON ExportTraceServiceRequest per line
+(the format read by the OpenTelemetry collector's otlpjsonfile receiver).
+Per-kind latency percentiles are added to the call's cost document.
+
+Usage:
+    with span("affiliate_lookup", kind="bootstrap"):
+        ...
+
+    @function_tool()
+    @traced("tool")
+    async def get_ETA(self) -> str: ...
+
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session: ...
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from artifact_writer import write_artifact, TRACE_ARTIFACT
+from call_context import ensure_call_context
+from fleet_metrics import get_worker_metrics
+from logging_config import get_logger
+
+logger = get_logger('tracing')
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_OTLP_FILE = os.getenv("TRACE_OTLP_FILE", "")
+# Spans kept per call; later spans are counted as dropped
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))
+
+# Span kinds
+BOOTSTRAP_SPAN = "bootstrap"
+TOOL_SPAN = "tool"
+HTTP_SPAN = "http"
+LLM_SPAN = "llm"
+STT_SPAN = "stt"
+TTS_SPAN = "tts"
+EOU_SPAN = "eou"
+SUPERVISOR_SPAN = "supervisor"
+TRANSFER_SPAN = "transfer"
+
+# Kinds recorded for requests leaving the process (OTLP SPAN_KIND_CLIENT)
+CLIENT_KINDS = (HTTP_SPAN, LLM_SPAN, TRANSFER_SPAN)
+
+PERCENTILES = (50, 90, 99)
+
+_span_ids = itertools.count(1)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """One timed operation within a call."""
+    name: str
+    kind: str
+    start: float  # Unix time in seconds
+    duration_ms: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    span_id: int = field(default_factory=lambda: next(_span_ids))
+    parent_id: Optional[int] = None
+
+
+class CallTrace:
+    """The spans recorded for one call."""
+
+    def __init__(self, call_id: Optional[str] = None, max_spans: int = TRACE_MAX_SPANS):
+        self.call_id = call_id
+        self.trace_id = os.urandom(16).hex()
+        self.started = time.time()
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.exported = False
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        """Record a finished span."""
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        """Latency percentiles (ms) and counts per span kind."""
+        with self._lock:
+            durations: Dict[str, List[float]] = {}
+            for span in self.spans:
+                durations.setdefault(span.kind, []).append(span.duration_ms)
+
+        summary = {}
+        for kind, values in durations.items():
+            values.sort()
+            stats = {"count": len(values)}
+            for p in PERCENTILES:
+                stats[f"p{p}"] = round(values[min(len(values) - 1, int(len(values) * p / 100))], 1)
+            stats["max"] = round(values[-1], 1)
+            summary[kind] = stats
+        return summary
+
+    def timeline(self) -> Dict[str, Any]:
+        """The call's spans in start order, offsets relative to the start of the trace."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: (s.start, s.span_id))
+            dropped = self.dropped
+        end = max((s.start + s.duration_ms / 1000 for s in spans), default=self.started)
+        return {
+            "call_id": self.call_id,
+            "trace_id": self.trace_id,
+            "started_at": self.started,
+            "duration_ms": round((end - self.started) * 1000, 1),
+            "spans": [{
+                "id": s.span_id,
+                "parent": s.parent_id,
+                "name": s.name,
+                "kind": s.kind,
+                "offset_ms": round((s.start - self.started) * 1000, 1),
+                "duration_ms": round(s.duration_ms, 1),
+                "error": s.error,
+                "attrs": s.attrs,
+            } for s in spans],
+            "dropped": dropped,
+            "percentiles": self.percentiles(),
+        }
+
+    def to_otlp(self, service_name: str = "ivr-bot") -> Dict[str, Any]:
+        """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+        with self._lock:
+            spans = list(self.spans)
+
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otlp_spans = []
+        for s in spans:
+            start_ns = int(s.start * 1e9)
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": f"{s.span_id:016x}",
+                "name": s.name,
+                "kind": 3 if s.kind in CLIENT_KINDS else 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int(s.duration_ms * 1e6)),
+                "attributes": [attribute("span.kind", s.kind), attribute("call.id", self.call_id or "")]
+                              + [attribute(k, v) for k, v in s.attrs.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id is not None:
+                otlp_span["parentSpanId"] = f"{s.parent_id:016x}"
+            otlp_spans.append(otlp_span)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", service_name)]},
+            "scopeSpans": [{"scope": {"name": "ivr_bot.tracing"}, "spans": otlp_spans}],
+        }]}
+
+
+# Traces of calls whose call_id is known, for lookups from outside the call's context
+_call_traces: Dict[str, CallTrace] = {}
+_call_traces_lock = threading.Lock()
+
+
+def get_call_trace(call_id: Optional[str] = None) -> CallTrace:
+    """
+    Get the trace of a call.
+
+    Without a call_id this is the current call context's trace, created on
+    first use so bootstrap spans are kept before the call_id is known. Once
+    the context has a call_id the trace is also registered under it.
+    """
+    context = ensure_call_context()
+    if call_id is None or context.call_id == call_id:
+        with _call_traces_lock:
+            if context.trace is None:
+                context.trace = _call_traces.get(context.call_id) or CallTrace(context.call_id)
+            trace = context.trace
+            if context.call_id is not None and not trace.exported:
+                trace.call_id = context.call_id
+                _call_traces.setdefault(context.call_id, trace)
+            return trace
+
+    with _call_traces_lock:
+        if call_id not in _call_traces:
+            _call_traces[call_id] = CallTrace(call_id)
+        return _call_traces[call_id]
+
+
+def record_span(name: str,
+                kind: str,
+                duration_ms: float,
+                start: Optional[float] = None,
+                error: Optional[str] = None,
+                call_id: Optional[str] = None,
+                **attrs) -> Optional[Span]:
+    """Record an already-timed operation; start defaults to now minus the duration."""
+    if not TRACE_ENABLED:
+        return None
+    if start is None:
+        start = time.time() - duration_ms / 1000
+    parent = _current_span.get()
+    recorded = Span(name, kind, start, duration_ms, attrs, error,
+                    parent_id=parent.span_id if parent is not None else None)
+    get_call_trace(call_id).add(recorded)
+    return recorded
+
+
+@contextmanager
+def span(name: str, kind: str, **attrs):
+    """Time the enclosed block as a span of the current call; spans opened inside it are its children."""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, kind, time.time(), attrs=attrs,
+                   parent_id=parent.span_id if parent is not None else None)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - started) * 1000
+        _current_span.reset(token)
+        get_call_trace().add(current)
+
+
+def traced(kind: str, name: Optional[str] = None):
+    """Decorator recording each call of a coroutine function as a span."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_metrics(metrics, call_id: Optional[str] = None) -> Optional[Span]:
+    """Record a LiveKit STT/LLM/TTS/EOU metrics event as a span."""
+    metrics_type = getattr(metrics, "type", None)
+    timestamp = getattr(metrics, "timestamp", None)
+    speech_id = getattr(metrics, "speech_id", None)
+    extra = {"speech_id": speech_id} if speech_id else {}
+
+    if metrics_type == "llm_metrics":
+        duration = metrics.duration
+        extra.update(ttft_ms=round(metrics.ttft * 1000, 1), tokens_per_second=round(metrics.tokens_per_second, 1),
+                     prompt_tokens=metrics.prompt_tokens, completion_tokens=metrics.completion_tokens)
+        name, kind = "llm_turn", LLM_SPAN
+    elif metrics_type == "tts_metrics":
+        duration = metrics.duration
+        extra.update(ttfb_ms=round(metrics.ttfb * 1000, 1), characters=metrics.characters_count)
+        name, kind = "tts_turn", TTS_SPAN
+    elif metrics_type == "stt_metrics":
+        duration = metrics.duration
+        extra.update(audio_seconds=round(metrics.audio_duration, 2))
+        name, kind = "stt_turn", STT_SPAN
+    elif metrics_type == "eou_metrics":
+        duration = metrics.end_of_utterance_delay
+        extra.update(transcription_delay_ms=round(metrics.transcription_delay * 1000, 1))
+        name, kind = "end_of_utterance", EOU_SPAN
+    else:
+        return None
+
+    # LiveKit timestamps mark when the metrics were emitted, i.e. the end of the turn
+    start = timestamp - duration if timestamp else None
+    return record_span(name, kind, duration * 1000, start=start, call_id=call_id, **extra)
+
+
+# aiohttp request tracing
+
+async def _on_request_start(session, trace_config_ctx, params):
+    trace_config_ctx.started = time.perf_counter()
+    trace_config_ctx.start = time.time()
+
+
+async def _on_request_end(session, trace_config_ctx, params):
+    _record_request(trace_config_ctx, params.method, params.url, status=params.response.status)
+
+
+async def _on_request_exception(session, trace_config_ctx, params):
+    _record_request(trace_config_ctx, params.method, params.url,
+                    error=f"{type(params.exception).__name__}: {params.exception}")
+
+
+def _record_request(trace_config_ctx, method, url, status=None, error=None):
+    started = getattr(trace_config_ctx, "started", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    get_worker_metrics().observe_backend(f"{url.host}{url.path}", duration_ms)
+    attrs = {"http.method": method, "http.host": url.host or ""}
+    if status is not None:
+        attrs["http.status"] = status
+    record_span(f"{method} {url.host}{url.path}", HTTP_SPAN, duration_ms,
+                start=trace_config_ctx.start, error=error or (f"HTTP {status}" if status and status >= 500 else None),
+                **attrs)
+
+
+_http_trace_config = None
+
+
+def http_trace_config():
+    """aiohttp TraceConfig recording every request of a session as an http span."""
+    global _http_trace_config
+    if _http_trace_config is None:
+        import aiohttp
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(_on_request_start)
+        trace_config.on_request_end.append(_on_request_end)
+        trace_config.on_request_exception.append(_on_request_exception)
+        _http_trace_config = trace_config
+    return _http_trace_config
+
+
+# httpx request tracing (OpenAI SDK clients)
+
+async def _on_httpx_request(request):
+    request.extensions["trace_started"] = time.perf_counter()
+    request.extensions["trace_start"] = time.time()
+
+
+async def _on_httpx_response(response):
+    request = response.request
+    started = request.extensions.get("trace_started")
+    if started is None:
+        return
+    # Recorded when the response headers arrive, which for non-streamed
+    # completions is when the model has finished
+    duration_ms = (time.perf_counter() - started) * 1000
+    get_worker_metrics().observe_backend(f"{request.url.host}{request.url.path}", duration_ms)
+    record_span(f"{request.method} {request.url.host}{request.url.path}", LLM_SPAN,
+                duration_ms, start=request.extensions["trace_start"],
+                error=f"HTTP {response.status_code}" if response.status_code >= 400 else None,
+                **{"http.method": request.method, "http.host": request.url.host, "http.status": response.status_code})
+
+
+def httpx_trace_hooks() -> Dict[str, list]:
+    """httpx event hooks recording each request as an llm span, e.g. for AsyncOpenAI's http_client."""
+    return {"request": [_on_httpx_request], "response": [_on_httpx_response]}
+
+
+# Export
+
+def export_call_trace(call_id: str, otlp_file: Optional[str] = TRACE_OTLP_FILE) -> Optional[Dict[str, Any]]:
+    """
+    Write a finished call's timeline artifact (and OTLP line) and forget its trace.
+
+    Returns:
+        The timeline, or None when the call has no trace
+    """
+    with _call_traces_lock:
+        trace = _call_traces.pop(call_id, None)
+    if trace is None:
+        return None
+    trace.exported = True
+
+    timeline = trace.timeline()
+    write_artifact(TRACE_ARTIFACT, f"trace_{call_id}.json", json.dumps(timeline, default=str))
+
+    if otlp_file:
+        try:
+            line = json.dumps(trace.to_otlp(), default=str)
+            with open(otlp_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.error(f"❌ Could not append trace of call {call_id} to {otlp_file}: {e}")
+
+    logger.info(f"⏱️ Trace of call {call_id}: {len(timeline['spans'])} spans over {timeline['duration_ms']:.0f} ms"
+                + (f", {timeline['dropped']} dropped" if timeline['dropped'] else ""))
+    return timeline
@@ -0,0 +1,212 @@
+"""
+Transfer engine for live-agent escalations.
+
+Keeps a single LiveKit API client per worker event loop instead of opening a
+new one per transfer, and issues the SIP transfer concurrently with the
+context upload to CONTEXT_TRANSFER_API. The upload is retried in the
+background so the caller is never held behind it.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from livekit import api
+from livekit.protocol.sip import TransferSIPParticipantRequest
+from logging_config import get_logger
+from tracing import record_span, TRANSFER_SPAN
+
+logger = get_logger('transfer_engine')
+
+# Asterisk extensions used for SIP transfers
+DISPATCHER_EXTENSION = "5000"
+DRIVER_EXTENSION = "5001"
+DISCONNECT_EXTENSION = "6000"
+
+# Background retry policy for the context upload
+CONTEXT_UPLOAD_ATTEMPTS = int(os.getenv("CONTEXT_UPLOAD_ATTEMPTS", "3"))
+CONTEXT_UPLOAD_BACKOFF_SECONDS = float(os.getenv("CONTEXT_UPLOAD_BACKOFF_SECONDS", "0.5"))
+
+
+def asterisk_target(extension: str) -> str:
+    """Build the SIP URI for an Asterisk extension."""
+    return f"sip:{extension}@{str(os.getenv('ASTERISK_SERVER_IP'))}"
+
+
+@dataclass
+class TransferResult:
+    """Outcome of a single SIP transfer."""
+    success: bool
+    transfer_to: str
+    participant_identity: Optional[str] = None
+    latency_ms: float = 0.0
+    error: Optional[str] = None
+
+
+class TransferEngine:
+    """Worker-scoped SIP transfer engine with a warm LiveKit API client."""
+
+    def __init__(self,
+                 api_factory: Optional[Callable[[], Any]] = None,
+                 upload_attempts: int = CONTEXT_UPLOAD_ATTEMPTS,
+                 upload_backoff: float = CONTEXT_UPLOAD_BACKOFF_SECONDS):
+        self._api_factory = api_factory or api.LiveKitAPI
+        self._client = None
+        self._client_loop = None
+        self.upload_attempts = max(1, upload_attempts)
+        self.upload_backoff = upload_backoff
+        self._background_tasks: Set[asyncio.Task] = set()
+
+        # Statistics
+        self.transfers = 0
+        self.failed_transfers = 0
+        self.last_latency_ms: Optional[float] = None
+        self.uploads_succeeded = 0
+        self.uploads_failed = 0
+
+    def _get_client(self):
+        """Return the LiveKit API client for the running loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # The client's aiohttp session is bound to the loop it was created on
+            self._client = self._api_factory()
+            self._client_loop = loop
+            logger.info("Created worker-scoped LiveKit API client for transfers")
+        return self._client
+
+    async def transfer(self,
+                       room,
+                       transfer_to: str,
+                       participant_identity: Optional[str] = None,
+                       build_context: Optional[Callable[[], Awaitable[Any]]] = None,
+                       send_context: Optional[Callable[[Any], Awaitable[bool]]] = None,
+                       call_sid: Optional[str] = None) -> TransferResult:
+        """
+        Transfer the SIP participant in `room` to `transfer_to`.
+
+        If `build_context` and `send_context` are given, the context payload is
+        built and uploaded concurrently with the SIP transfer and retried in the
+        background; the transfer itself never waits for the upload.
+
+        Args:
+            room: LiveKit room holding the SIP participant
+            transfer_to: SIP URI to transfer to
+            participant_identity: Participant to transfer (defaults to the first remote participant)
+            build_context: Coroutine function returning the context payload
+            send_context: Coroutine function sending the payload, returning True on success
+            call_sid: Call identifier used in log lines
+
+        Returns:
+            TransferResult with the outcome and end-to-end latency
+        """
+        started = time.perf_counter()
+        started_at = time.time()
+
+        if build_context is not None and send_context is not None:
+            self._spawn(self._upload_context(build_context, send_context, call_sid, started))
+
+        try:
+            if participant_identity is None:
+                participant_identity = list(room.remote_participants.values())[0].identity
+
+            transfer_request = TransferSIPParticipantRequest(
+                participant_identity=participant_identity,
+                room_name=room.name,
+                transfer_to=transfer_to,
+                play_dialtone=False,
+            )
+            logger.debug(f"Transfer request: {transfer_request}")
+
+            await self._get_client().sip.transfer_sip_participant(transfer_request)
+            latency_ms = (time.perf_counter() - started) * 1000
+
+            self.transfers += 1
+            self.last_latency_ms = latency_ms
+            logger.info(f"⏱️ [TRANSFER] Participant {participant_identity} transferred to {transfer_to} in {latency_ms:.0f} ms (call {call_sid})",
+                        extra={"phase": "transfer", "latency_ms": round(latency_ms, 1)})
+            record_span("sip_transfer", TRANSFER_SPAN, latency_ms, start=started_at, target=transfer_to)
+            return TransferResult(True, transfer_to, participant_identity, latency_ms)
+
+        except Exception as e:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.failed_transfers += 1
+            logger.error(f"❌ [TRANSFER] SIP transfer to {transfer_to} failed after {latency_ms:.0f} ms (call {call_sid}): {e}",
+                         extra={"phase": "transfer", "latency_ms": round(latency_ms, 1)})
+            record_span("sip_transfer", TRANSFER_SPAN, latency_ms, start=started_at, error=str(e), target=transfer_to)
+            return TransferResult(False, transfer_to, participant_identity, latency_ms, str(e))
+
+    async def _upload_context(self, build_context, send_context, call_sid, started: float) -> bool:
+        """Build the context payload once, then send it with retry and exponential backoff."""
+        try:
+            payload = await build_context()
+        except Exception as e:
+            self.uploads_failed += 1
+            logger.error(f"⚠️ [TRANSFER] Could not build context payload for call {call_sid}: {e}")
+            return False
+
+        for attempt in range(1, self.upload_attempts + 1):
+            try:
+                if await send_context(payload):
+                    self.uploads_succeeded += 1
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    logger.info(f"✅ [TRANSFER] Context uploaded for call {call_sid} on attempt {attempt} ({elapsed_ms:.0f} ms after transfer start)")
+                    return True
+                logger.warning(f"⚠️ [TRANSFER] Context upload attempt {attempt}/{self.upload_attempts} rejected for call {call_sid}")
+            except Exception as e:
+                logger.warning(f"⚠️ [TRANSFER] Context upload attempt {attempt}/{self.upload_attempts} failed for call {call_sid}: {e}")
+
+            if attempt < self.upload_attempts:
+                await asyncio.sleep(self.upload_backoff * (2 ** (attempt - 1)))
+
+        self.uploads_failed += 1
+        logger.error(f"❌ [TRANSFER] Giving up on context upload for call {call_sid} after {self.upload_attempts} attempts")
+        return False
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Wait for pending context uploads, e.g. before the call's state is cleaned up."""
+        pending = [task for task in self._background_tasks if not task.done()]
+        if not pending:
+            return
+        logger.info(f"Waiting for {len(pending)} pending context upload(s)")
+        done, still_pending = await asyncio.wait(pending, timeout=timeout)
+        if still_pending:
+            logger.warning(f"{len(still_pending)} context upload(s) still pending after {timeout}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get transfer statistics."""
+        return {
+            "transfers": self.transfers,
+            "failed_transfers": self.failed_transfers,
+            "last_latency_ms": self.last_latency_ms,
+            "uploads_succeeded": self.uploads_succeeded,
+            "uploads_failed": self.uploads_failed,
+            "pending_uploads": sum(1 for task in self._background_tasks if not task.done()),
+        }
+
+    async def aclose(self) -> None:
+        """Close the LiveKit API client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+
+# Worker-wide engine instance
+_transfer_engine = None
+
+
+def get_transfer_engine() -> TransferEngine:
+    """Get the worker-wide transfer engine."""
+    global _transfer_engine
+    if _transfer_engine is None:
+        _transfer_engine = TransferEngine()
+    return _transfer_engine
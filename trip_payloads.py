@@ -0,0 +1,75 @@
+"""
+Trip payload templates.
+
+Loads the packaged trip_book_payload.json once per worker and hands out
+independent copies of it for booking legs and for the default transfer
+payload, so neither path touches the disk per call.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from logging_config import get_logger
+
+logger = get_logger('trip_payloads')
+
+TEMPLATE_PATH = os.path.join(Path(__file__).parent, "trip_book_payload.json")
+
+# Serialized template; json.loads of a cached string is cheaper than deepcopy
+_template_json: Optional[str] = None
+
+
+def load_template(path: str = TEMPLATE_PATH) -> None:
+    """Load (or reload) the trip payload template from disk."""
+    global _template_json
+    with open(path, 'r') as file:
+        _template_json = json.dumps(json.load(file))
+    logger.info(f"📄 Trip payload template loaded from {path}")
+
+
+def new_trip_payload() -> dict:
+    """Return a fresh, independently mutable copy of the trip payload template."""
+    if _template_json is None:
+        load_template()
+    return json.loads(_template_json)
+
+
+def build_default_transfer_payload(rider_phone: Optional[str] = None,
+                                   client_id: Optional[str] = None,
+                                   rider_name: str = "Customer") -> dict:
+    """
+    Build the transfer payload used when no booking legs were collected.
+
+    Args:
+        rider_phone: Caller's phone number
+        client_id: Rider's client ID ("None" for unknown riders)
+        rider_name: Name used for the pickup person and stop names
+
+    Returns:
+        dict: Template payload customized with the current rider
+    """
+    payload = new_trip_payload()
+
+    if rider_phone:
+        payload['riderInfo']['PhoneNo'] = rider_phone
+
+    if client_id:
+        payload['riderInfo']['ID'] = "-1" if client_id == "None" else client_id
+
+    payload['riderInfo']['PickupPerson'] = rider_name
+
+    for trip in payload.get('addressInfo', {}).get('Trips', []):
+        for detail in trip.get('Details', []):
+            if detail.get('StopType') in ('pickup', 'dropoff'):
+                detail['Name'] = rider_name
+
+    return payload
+
+
+# Load at import so the first booking or transfer doesn't pay for the read
+try:
+    load_template()
+except Exception as e:
+    logger.error(f"❌ Could not load trip payload template: {e}")